@@ -7,40 +7,15 @@ import sys
 import uuid
 from datetime import datetime
 
-# Import db_lock để đảm bảo xử lý tuần tự
+# Import db_lock để xử lý tuần tự theo từng tài khoản
 # Thêm thư mục gốc vào path để import utils
 root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if root_dir not in sys.path:
     sys.path.insert(0, root_dir)
-from utils.db_lock import with_db_lock
+from utils.db_lock import account_lock, account_locks, with_account_lock
+from utils.storage import get_storage
 
 
-@with_db_lock
-def prepare_add_count(id):
-    """
-    Hàm chuẩn bị request tăng count cho tài khoản theo id
-    Chỉ tạo pending request, chưa thực sự tăng count
-
-    Args:
-        id (str): ID của tài khoản cần tăng count
-
-    Returns:
-        tuple: (success: bool, message: str, data: dict)
-            - success: True nếu thành công, False nếu có lỗi
-            - message: Thông báo kết quả
-            - data: Dữ liệu trả về (bao gồm request_id để verify)
-
-    Logic:
-        1. Tìm id trong db/data.json
-        2. Kiểm tra active:
-           - Nếu false → trả về mã lỗi và báo tài khoản bị khoá
-           - Nếu true → tiếp tục:
-             3. Kiểm tra count > limit:
-                - Nếu đúng → báo tài khoản bị hết lượt
-                - Nếu count <= limit → tạo pending request
-    """
-
-@with_db_lock
 def execute_add_count(request_id):
     """
     Hàm thực hiện tăng count thực sự sau khi verify thành công
@@ -51,122 +26,101 @@ def execute_add_count(request_id):
     Returns:
         tuple: (success: bool, message: str, data: dict)
     """
-    # Đường dẫn đến các file
-    db_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'db', 'data.json')
-    pending_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'db', 'pending_requests.json')
-    temp_count_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'db', 'temp_count.json')
-
     try:
-        # Đọc pending_requests.json
-        if not os.path.exists(pending_path):
-            return False, "File pending_requests.json không tồn tại", {}
+        storage = get_storage()
 
-        with open(pending_path, 'r', encoding='utf-8') as f:
-            pending_requests = json.load(f)
+        # Lấy pending request theo request_id (chưa lock, chỉ để biết tài khoản cần lock)
+        pending_request = storage.pending.get(request_id)
 
         # Kiểm tra request_id có tồn tại không
-        if request_id not in pending_requests:
+        if pending_request is None:
             return False, f"Không tìm thấy request với ID: {request_id}", {}
 
-        pending_request = pending_requests[request_id]
-
-        # Kiểm tra trạng thái
-        if pending_request.get('status') != 'pending':
-            return False, f"Request đã được xử lý với trạng thái: {pending_request.get('status')}", {}
-
         account_id = pending_request['id']
 
-        # Đọc file data.json
-        if not os.path.exists(db_path):
-            return False, "File db/data.json không tồn tại", {}
+        # Lock theo tài khoản rồi kiểm tra lại: request có thể đã được xử lý trong lúc chờ lock
+        with account_lock(account_id):
+            result = _thuc_hien(storage, request_id)
 
-        with open(db_path, 'r', encoding='utf-8') as f:
-            data_list = json.load(f)
+            if result[0]:
+                # Reset count tạm - xóa id khỏi count tạm
+                try:
+                    storage.temp_counts.delete(account_id)
+                except Exception:
+                    # Nếu có lỗi khi xóa count tạm, không ảnh hưởng đến kết quả chính
+                    pass
 
-        # Tìm và cập nhật tài khoản
-        found_index = None
-        found_item = None
+            return result
 
-        for index, item in enumerate(data_list):
-            if isinstance(item, dict) and item.get('id') == account_id:
-                found_index = index
-                found_item = item
-                break
+    except json.JSONDecodeError as e:
+        return False, f"Lỗi đọc file JSON: {str(e)}", {}
 
-        if found_index is None:
-            return False, f"Không tìm thấy tài khoản với id: {account_id}", {}
+    except Exception as e:
+        return False, f"Lỗi không xác định: {str(e)}", {}
 
-        # Kiểm tra lại trạng thái active và limit (để đảm bảo không bị thay đổi)
-        if not found_item.get('active', False):
-            return False, "Tài khoản bị khoá", {
-                "error_code": "ACCOUNT_LOCKED",
-                "id": account_id,
-                "count": found_item.get('count', 0),
-                "limit": found_item.get('limit', 0),
-                "active": False
-            }
 
-        count = found_item.get('count', 0)
-        limit = found_item.get('limit', 0)
+def _thuc_hien(storage, request_id):
+    """
+    Phần của execute_add_count chạy khi đang giữ lock của tài khoản (chưa reset count tạm)
 
-        if count >= limit:
-            return False, "Tài khoản đã đạt giới hạn", {
-                "error_code": "ACCOUNT_LIMIT_EXCEEDED",
-                "id": account_id,
-                "count": count,
-                "limit": limit
-            }
+    Args:
+        storage: Storage đang dùng
+        request_id (str): ID của pending request
 
-        # Tăng count lên 1
-        found_item['count'] = count + 1
+    Returns:
+        tuple: (success: bool, message: str, data: dict)
+    """
+    pending_request = storage.pending.get(request_id)
 
-        # Cập nhật lại vào data_list
-        data_list[found_index] = found_item
+    # Kiểm tra trạng thái
+    if pending_request is None or pending_request.get('status') != 'pending':
+        status = pending_request.get('status') if pending_request else None
+        return False, f"Request đã được xử lý với trạng thái: {status}", {}
 
-        # Ghi lại file data.json
-        with open(db_path, 'w', encoding='utf-8') as f:
-            json.dump(data_list, f, ensure_ascii=False, indent=2)
+    account_id = pending_request['id']
 
-        # Cập nhật trạng thái pending request thành completed
-        pending_request['status'] = 'completed'
-        pending_request['completed_at'] = datetime.now().isoformat()
-        pending_requests[request_id] = pending_request
+    # Tìm tài khoản theo id
+    found_item = storage.accounts.get(account_id)
 
-        # Ghi lại file pending_requests.json
-        with open(pending_path, 'w', encoding='utf-8') as f:
-            json.dump(pending_requests, f, ensure_ascii=False, indent=2)
+    if found_item is None:
+        return False, f"Không tìm thấy tài khoản với id: {account_id}", {}
 
-        # Reset count tạm trong file temp_count.json - xóa id khỏi file
-        if os.path.exists(temp_count_path):
-            try:
-                with open(temp_count_path, 'r', encoding='utf-8') as f:
-                    temp_count_data = json.load(f)
-                    if isinstance(temp_count_data, dict) and account_id in temp_count_data:
-                        # Xóa id khỏi file temp_count.json
-                        del temp_count_data[account_id]
-
-                        # Lưu lại file (nếu file rỗng thì vẫn lưu dict rỗng)
-                        with open(temp_count_path, 'w', encoding='utf-8') as f:
-                            json.dump(temp_count_data, f, ensure_ascii=False, indent=2)
-            except (json.JSONDecodeError, Exception):
-                # Nếu có lỗi khi đọc/ghi file temp_count, không ảnh hưởng đến kết quả chính
-                pass
+    # Kiểm tra lại trạng thái active và limit (để đảm bảo không bị thay đổi)
+    if not found_item.get('active', False):
+        return False, "Tài khoản bị khoá", {
+            "error_code": "ACCOUNT_LOCKED",
+            "id": account_id,
+            "count": found_item.get('count', 0),
+            "limit": found_item.get('limit', 0),
+            "active": False
+        }
+
+    count = found_item.get('count', 0)
+    limit = found_item.get('limit', 0)
 
-        # Trả về kết quả thành công
-        return True, f"Đã tăng count thành công. Count hiện tại: {found_item['count']}", {
-            "request_id": request_id,
+    if count >= limit:
+        return False, "Tài khoản đã đạt giới hạn", {
+            "error_code": "ACCOUNT_LIMIT_EXCEEDED",
             "id": account_id,
-            "count": found_item['count'],
-            "limit": limit,
-            "active": True,
-            "status": "completed"
+            "count": count,
+            "limit": limit
         }
 
-    except json.JSONDecodeError as e:
-        return False, f"Lỗi đọc file JSON: {str(e)}", {}
+    # Tăng count lên 1
+    found_item = storage.accounts.update(account_id, count=count + 1)
 
-    except Exception as e:
-        return False, f"Lỗi không xác định: {str(e)}", {}
+    # Cập nhật trạng thái pending request thành completed
+    storage.pending.update(request_id, status='completed', completed_at=datetime.now().isoformat())
+
+    # Trả về kết quả thành công
+    return True, f"Đã tăng count thành công. Count hiện tại: {found_item['count']}", {
+        "request_id": request_id,
+        "id": account_id,
+        "count": found_item['count'],
+        "limit": limit,
+        "active": True,
+        "status": "completed"
+    }
 
 
 def cancel_pending_request(request_id):
@@ -179,45 +133,114 @@ def cancel_pending_request(request_id):
     Returns:
         tuple: (success: bool, message: str, data: dict)
     """
-    pending_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'db', 'pending_requests.json')
-
     try:
-        # Đọc pending_requests.json
-        if not os.path.exists(pending_path):
-            return False, "File pending_requests.json không tồn tại", {}
+        storage = get_storage()
 
-        with open(pending_path, 'r', encoding='utf-8') as f:
-            pending_requests = json.load(f)
+        # Lấy pending request theo request_id (chưa lock, chỉ để biết tài khoản cần lock)
+        pending_request = storage.pending.get(request_id)
 
         # Kiểm tra request_id có tồn tại không
-        if request_id not in pending_requests:
+        if pending_request is None:
             return False, f"Không tìm thấy request với ID: {request_id}", {}
 
-        pending_request = pending_requests[request_id]
+        # Lock theo tài khoản để không hủy trùng lúc với execute_add_count của cùng request
+        with account_lock(pending_request['id']):
+            return _huy(storage, request_id)
 
-        # Kiểm tra trạng thái
-        if pending_request.get('status') != 'pending':
-            return False, f"Request đã được xử lý với trạng thái: {pending_request.get('status')}", {}
+    except json.JSONDecodeError as e:
+        return False, f"Lỗi đọc file JSON: {str(e)}", {}
 
-        # Cập nhật trạng thái thành cancelled
-        pending_request['status'] = 'cancelled'
-        pending_request['cancelled_at'] = datetime.now().isoformat()
-        pending_requests[request_id] = pending_request
+    except Exception as e:
+        return False, f"Lỗi không xác định: {str(e)}", {}
 
-        # Ghi lại file
-        with open(pending_path, 'w', encoding='utf-8') as f:
-            json.dump(pending_requests, f, ensure_ascii=False, indent=2)
 
-        return True, f"Đã hủy request {request_id}", {
-            "request_id": request_id,
-            "status": "cancelled"
-        }
+def _huy(storage, request_id):
+    """
+    Phần của cancel_pending_request chạy khi đang giữ lock của tài khoản
+
+    Args:
+        storage: Storage đang dùng
+        request_id (str): ID của pending request
+
+    Returns:
+        tuple: (success: bool, message: str, data: dict)
+    """
+    pending_request = storage.pending.get(request_id)
+
+    # Kiểm tra trạng thái
+    if pending_request is None or pending_request.get('status') != 'pending':
+        status = pending_request.get('status') if pending_request else None
+        return False, f"Request đã được xử lý với trạng thái: {status}", {}
+
+    # Cập nhật trạng thái thành cancelled
+    storage.pending.update(request_id, status='cancelled', cancelled_at=datetime.now().isoformat())
+
+    return True, f"Đã hủy request {request_id}", {
+        "request_id": request_id,
+        "status": "cancelled"
+    }
+
+
+def verify_count_batch(items):
+    """
+    Verify nhiều pending request trong một lần: thực hiện (approved = true) hoặc hủy (approved = false)
+
+    Cùng kết quả như gọi execute_add_count / cancel_pending_request lần lượt theo thứ tự items,
+    nhưng chỉ lấy lock các tài khoản liên quan một lần và ghi data.json / pending_requests.json
+    một lần cho cả lô (Storage.batch()); count tạm của các tài khoản được tăng count được reset một lần
+
+    Args:
+        items (list): Danh sách dict {"request_id": str, "approved": bool}
+
+    Returns:
+        list: Kết quả theo thứ tự items, mỗi phần tử là tuple (success: bool, message: str, data: dict)
+    """
+    try:
+        storage = get_storage()
+
+        # Tìm tài khoản của các request (chưa lock, chỉ để biết các tài khoản cần lock)
+        account_ids = set()
+        for item in items:
+            pending_request = storage.pending.get(item['request_id'])
+            if pending_request is not None:
+                account_ids.add(pending_request['id'])
+
+        results = []
+        can_reset = []
+        with account_locks(account_ids):
+            with storage.batch():
+                for item in items:
+                    request_id = item['request_id']
+                    try:
+                        if storage.pending.get(request_id) is None:
+                            result = False, f"Không tìm thấy request với ID: {request_id}", {}
+                        elif item['approved']:
+                            result = _thuc_hien(storage, request_id)
+                            if result[0]:
+                                can_reset.append(result[2]['id'])
+                        else:
+                            result = _huy(storage, request_id)
+                    except json.JSONDecodeError as e:
+                        result = False, f"Lỗi đọc file JSON: {str(e)}", {}
+                    except Exception as e:
+                        result = False, f"Lỗi không xác định: {str(e)}", {}
+                    results.append(result)
+
+            # Reset count tạm của các tài khoản đã tăng count (một lần ghi)
+            if can_reset:
+                try:
+                    storage.temp_counts.write_many({}, deleted=list(dict.fromkeys(can_reset)))
+                except Exception:
+                    # Nếu có lỗi khi xóa count tạm, không ảnh hưởng đến kết quả chính
+                    pass
+
+        return results
 
     except json.JSONDecodeError as e:
-        return False, f"Lỗi đọc file JSON: {str(e)}", {}
+        return [(False, f"Lỗi đọc file JSON: {str(e)}", {}) for _ in items]
 
     except Exception as e:
-        return False, f"Lỗi không xác định: {str(e)}", {}
+        return [(False, f"Lỗi không xác định: {str(e)}", {}) for _ in items]
 
 
 # Hàm cũ để tương thích ngược (sẽ được sử dụng trong verify API)
@@ -227,137 +250,131 @@ def add_count(id):
     Bây giờ sẽ gọi prepare_add_count thay vì thực hiện ngay
     """
     return prepare_add_count(id)
+
+
+@with_account_lock
 def prepare_add_count(id):
     """
-    Hàm chuẩn bị request tăng count - chỉ kiểm tra và tạo pending request
+    Hàm chuẩn bị request tăng count cho tài khoản theo id
+    Chỉ tạo pending request, chưa thực sự tăng count
+
+    Args:
+        id (str): ID của tài khoản cần tăng count
+
+    Returns:
+        tuple: (success: bool, message: str, data: dict)
+            - success: True nếu thành công, False nếu có lỗi
+            - message: Thông báo kết quả
+            - data: Dữ liệu trả về (bao gồm request_id để verify)
+
+    Logic:
+        1. Tìm id trong db/data.json
+        2. Kiểm tra active:
+           - Nếu false → trả về mã lỗi và báo tài khoản bị khoá
+           - Nếu true → tiếp tục:
+             3. Kiểm tra count > limit:
+                - Nếu đúng → báo tài khoản bị hết lượt
+                - Nếu count <= limit → tạo pending request
+    """
+    try:
+        return _chuan_bi(get_storage(), id)
+
+    except json.JSONDecodeError as e:
+        return False, f"Lỗi đọc file JSON: {str(e)}", {
+            "id": id,
+            "count": 0,
+            "limit": 0
+        }
+
+    except Exception as e:
+        return False, f"Lỗi không xác định: {str(e)}", {
+            "id": id,
+            "count": 0,
+            "limit": 0
+        }
+
+
+def prepare_add_count_batch(ids):
     """
-    # Đường dẫn đến các file
-    db_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'db', 'data.json')
-    pending_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'db', 'pending_requests.json')
+    Chuẩn bị request tăng count cho nhiều tài khoản trong một lần
+
+    Cùng kết quả như gọi prepare_add_count lần lượt theo thứ tự ids (id lặp lại tạo nhiều pending
+    request và được tính vào pending_count của các lần sau, nên có thể nhận ACCOUNT_LIMIT_REACHED),
+    nhưng chỉ lấy lock các tài khoản một lần và ghi pending_requests.json một lần cho cả lô
 
+    Args:
+        ids (list): Danh sách ID tài khoản
+
+    Returns:
+        list: Kết quả theo thứ tự ids, mỗi phần tử là tuple (success: bool, message: str, data: dict)
+    """
     try:
-        # Đọc file data.json
-        if not os.path.exists(db_path):
-            return False, "File db/data.json không tồn tại", {
-                "id": id,
-                "count": 0,
-                "limit": 0
-            }
+        storage = get_storage()
+        results = []
+        with account_locks(ids):
+            with storage.batch():
+                for id in ids:
+                    try:
+                        result = _chuan_bi(storage, id)
+                    except json.JSONDecodeError as e:
+                        result = False, f"Lỗi đọc file JSON: {str(e)}", {"id": id, "count": 0, "limit": 0}
+                    except Exception as e:
+                        result = False, f"Lỗi không xác định: {str(e)}", {"id": id, "count": 0, "limit": 0}
+                    results.append(result)
+        return results
 
-        with open(db_path, 'r', encoding='utf-8') as f:
-            data_list = json.load(f)
+    except json.JSONDecodeError as e:
+        return [(False, f"Lỗi đọc file JSON: {str(e)}", {"id": id, "count": 0, "limit": 0}) for id in ids]
 
-        # Kiểm tra data_list có phải là list không
-        if not isinstance(data_list, list):
-            return False, "Dữ liệu trong db/data.json không hợp lệ", {
-                "id": id,
-                "count": 0,
-                "limit": 0
-            }
+    except Exception as e:
+        return [(False, f"Lỗi không xác định: {str(e)}", {"id": id, "count": 0, "limit": 0}) for id in ids]
 
-        # Tìm object có id trùng khớp
-        found_index = None
-        found_item = None
 
-        for index, item in enumerate(data_list):
-            if isinstance(item, dict) and item.get('id') == id:
-                found_index = index
-                found_item = item
-                break
+def consume_count(id):
+    """
+    Tăng count ngay trong một bước (gộp prepare_add_count + verify approved = true)
 
-        # Nếu không tìm thấy id
-        if found_index is None:
-            return False, f"Không tìm thấy tài khoản với id: {id}", {
-                "id": id,
-                "count": 0,
-                "limit": 0
-            }
+    Dùng cùng các điều kiện của prepare_add_count (active, count + pending < limit) nên các request
+    pending đang chờ verify vẫn được giữ chỗ; kiểm tra và tăng count diễn ra trong một lần giữ lock
+    tài khoản và một lần ghi data.json (không tạo pending request)
 
-        # Lấy count và limit từ found_item
-        count = found_item.get('count', 0)
-        limit = found_item.get('limit', 0)
+    Args:
+        id (str): ID của tài khoản cần tăng count
 
-        # Kiểm tra active
-        if not found_item.get('active', False):
-            return False, "Tài khoản bị khoá", {
-                "error_code": "ACCOUNT_LOCKED",
-                "id": id,
-                "count": count,
-                "limit": limit,
-                "active": False
-            }
+    Returns:
+        tuple: (success: bool, message: str, data: dict) - data có error_code như prepare_add_count khi lỗi
+    """
+    try:
+        storage = get_storage()
+        with account_lock(id):
+            loi, found_item = _kiem_tra_han_muc(storage, id)
+            if loi is not None:
+                return loi
 
-        # Kiểm tra count > limit
-        if count > limit:
-            return False, "Tài khoản bị hết lượt", {
-                "error_code": "ACCOUNT_LIMIT_EXCEEDED",
-                "id": id,
-                "count": count,
-                "limit": limit
-            }
+            found_item = storage.accounts.update(id, count=found_item.get('count', 0) + 1)
 
-        # Đọc pending_requests.json
-        pending_requests = {}
-        if os.path.exists(pending_path):
+            # Reset count tạm - xóa id khỏi count tạm (như execute_add_count)
             try:
-                with open(pending_path, 'r', encoding='utf-8') as f:
-                    pending_requests = json.load(f)
-            except json.JSONDecodeError:
-                pending_requests = {}
-
-        # Đếm số lượng request pending cho account này
-        pending_count = 0
-        for req_id, req_data in pending_requests.items():
-            if (isinstance(req_data, dict) and
-                req_data.get('id') == id and
-                req_data.get('status') == 'pending'):
-                pending_count += 1
-
-        # Kiểm tra tổng count + pending_count có vượt quá limit không
-        total_used = count + pending_count
-        if total_used >= limit:
-            return False, f"Tài khoản đã đạt giới hạn sử dụng. Count hiện tại: {count}, Pending requests: {pending_count}, Limit: {limit}", {
-                "error_code": "ACCOUNT_LIMIT_REACHED",
+                storage.temp_counts.delete(id)
+            except Exception:
+                # Nếu có lỗi khi xóa count tạm, không ảnh hưởng đến kết quả chính
+                pass
+
+            return True, f"Đã tăng count thành công. Count hiện tại: {found_item['count']}", {
                 "id": id,
-                "count": count,
-                "pending_count": pending_count,
-                "limit": limit,
-                "total_used": total_used
+                "count": found_item['count'],
+                "limit": found_item.get('limit', 0),
+                "active": True,
+                "status": "completed"
             }
 
-        # Tạo request ID duy nhất
-        request_id = str(uuid.uuid4())
-
-        # Tạo pending request
-        pending_requests[request_id] = {
-            "id": id,
-            "timestamp": datetime.now().isoformat(),
-            "status": "pending",
-            "count": count,
-            "limit": limit
-        }
-
-        # Ghi lại file pending_requests.json
-        with open(pending_path, 'w', encoding='utf-8') as f:
-            json.dump(pending_requests, f, ensure_ascii=False, indent=2)
-
-        # Trả về kết quả thành công với request_id
-        return True, f"Đã tạo request tăng count. Vui lòng verify với request_id: {request_id}", {
-            "request_id": request_id,
-            "id": id,
-            "count": count,
-            "limit": limit,
-            "active": True,
-            "status": "pending"
-        }
-    
     except json.JSONDecodeError as e:
         return False, f"Lỗi đọc file JSON: {str(e)}", {
             "id": id,
             "count": 0,
             "limit": 0
         }
-    
+
     except Exception as e:
         return False, f"Lỗi không xác định: {str(e)}", {
             "id": id,
@@ -365,3 +382,108 @@ def prepare_add_count(id):
             "limit": 0
         }
 
+
+def _kiem_tra_han_muc(storage, id):
+    """
+    Kiểm tra tài khoản còn được tăng count không (chạy khi đang giữ lock của tài khoản)
+
+    Args:
+        storage: Storage đang dùng
+        id (str): ID của tài khoản
+
+    Returns:
+        tuple: (loi, found_item)
+            - loi: (False, message, data) nếu không được tăng, None nếu hợp lệ
+            - found_item: Bản sao tài khoản (None nếu không tồn tại)
+    """
+    # Tìm tài khoản theo id
+    found_item = storage.accounts.get(id)
+
+    # Nếu không tìm thấy id
+    if found_item is None:
+        return (False, f"Không tìm thấy tài khoản với id: {id}", {
+            "id": id,
+            "count": 0,
+            "limit": 0
+        }), None
+
+    # Lấy count và limit từ found_item
+    count = found_item.get('count', 0)
+    limit = found_item.get('limit', 0)
+
+    # Kiểm tra active
+    if not found_item.get('active', False):
+        return (False, "Tài khoản bị khoá", {
+            "error_code": "ACCOUNT_LOCKED",
+            "id": id,
+            "count": count,
+            "limit": limit,
+            "active": False
+        }), found_item
+
+    # Kiểm tra count > limit
+    if count > limit:
+        return (False, "Tài khoản bị hết lượt", {
+            "error_code": "ACCOUNT_LIMIT_EXCEEDED",
+            "id": id,
+            "count": count,
+            "limit": limit
+        }), found_item
+
+    # Đếm số lượng request pending cho account này (đếm sẵn theo tài khoản, request quá hạn đã tự hủy)
+    pending_count = storage.pending.count_pending(id)
+
+    # Kiểm tra tổng count + pending_count có vượt quá limit không
+    total_used = count + pending_count
+    if total_used >= limit:
+        return (False, f"Tài khoản đã đạt giới hạn sử dụng. Count hiện tại: {count}, Pending requests: {pending_count}, Limit: {limit}", {
+            "error_code": "ACCOUNT_LIMIT_REACHED",
+            "id": id,
+            "count": count,
+            "pending_count": pending_count,
+            "limit": limit,
+            "total_used": total_used
+        }), found_item
+
+    return None, found_item
+
+
+def _chuan_bi(storage, id):
+    """
+    Phần của prepare_add_count chạy khi đang giữ lock của tài khoản
+
+    Args:
+        storage: Storage đang dùng
+        id (str): ID của tài khoản cần tăng count
+
+    Returns:
+        tuple: (success: bool, message: str, data: dict)
+    """
+    loi, found_item = _kiem_tra_han_muc(storage, id)
+    if loi is not None:
+        return loi
+
+    count = found_item.get('count', 0)
+    limit = found_item.get('limit', 0)
+
+    # Tạo request ID duy nhất
+    request_id = str(uuid.uuid4())
+
+    # Tạo pending request
+    storage.pending.add(request_id, {
+        "id": id,
+        "timestamp": datetime.now().isoformat(),
+        "status": "pending",
+        "count": count,
+        "limit": limit
+    })
+
+    # Trả về kết quả thành công với request_id
+    return True, f"Đã tạo request tăng count. Vui lòng verify với request_id: {request_id}", {
+        "request_id": request_id,
+        "id": id,
+        "count": count,
+        "limit": limit,
+        "active": True,
+        "status": "pending"
+    }
@@ -1,64 +1,32 @@
 """
 Module xử lý xác thực và tính toán thanh toán
 """
-import json
 import os
 import sys
 from datetime import datetime
 
-# Import db_lock để đảm bảo xử lý tuần tự
+# Import db_lock để xử lý tuần tự theo từng tài khoản
 # Thêm thư mục gốc vào path để import utils
 root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if root_dir not in sys.path:
     sys.path.insert(0, root_dir)
-from utils.db_lock import with_db_lock
+from utils.db_lock import account_lock, account_locks
+from utils.payment_config import PaymentConfig, get_payment_config
+from utils.sepay_content import ParsedContent, parse_sepay_content, tach_id_sl
+from utils.storage import get_storage
 
 
 def doc_config(config_file="config/pay_ment.json"):
     """
-    Đọc thông tin từ file config (định dạng JSON)
+    Đọc thông tin từ file config (định dạng JSON), qua cache config thanh toán
     
     Args:
         config_file: Đường dẫn đến file config
         
     Returns:
-        dict: Dictionary chứa thông tin từ config, {} nếu lỗi
+        dict: Bản sao dictionary chứa thông tin từ config, {} nếu lỗi
     """
-    try:
-        with open(config_file, "r", encoding="utf-8") as f:
-            config_data = json.load(f)
-        return config_data
-    except FileNotFoundError:
-        print(f"❌ Không tìm thấy file config: {config_file}")
-        return {}
-    except json.JSONDecodeError as e:
-        print(f"❌ Lỗi khi parse JSON config: {e}")
-        return {}
-    except Exception as e:
-        print(f"❌ Lỗi khi đọc file config: {e}")
-        return {}
-
-
-def parse_cost(cost_value):
-    """
-    Parse giá trị COST từ string hoặc number
-    
-    Args:
-        cost_value: Giá trị COST (có thể là string "200.000" hoặc number)
-        
-    Returns:
-        float: Giá trị cost đã parse, None nếu lỗi
-    """
-    try:
-        if isinstance(cost_value, str):
-            # Loại bỏ dấu chấm ngăn cách hàng nghìn và chuyển sang float
-            cost_str = cost_value.replace('.', '').replace(',', '.')
-            return float(cost_str)
-        else:
-            return float(cost_value)
-    except (ValueError, TypeError):
-        print(f"❌ Không thể parse giá trị COST: {cost_value}")
-        return None
+    return dict(get_payment_config(config_file).data)
 
 
 def parse_content(content):
@@ -66,7 +34,7 @@ def parse_content(content):
     Parse content để lấy id_sl
     
     Logic:
-    - Tìm đoạn text giữa "AUTO" và "END" trong content
+    - Tìm đoạn text giữa "AUTO" và "END" trong content (nhiều đoạn thì lấy đoạn hợp lệ đầu tiên)
     - Nếu không tìm thấy AUTO hoặc END: Giữ nguyên content
     
     Args:
@@ -82,87 +50,153 @@ def parse_content(content):
         Input: "AUTOtest1234567890123450END"
         Output: "test1234567890123450"
     """
-    try:
-        if not content:
-            return content
-        
-        content_str = str(content).strip()
-        
-        # Kiểm tra nếu content chứa "AUTO" và "END"
-        if "AUTO" in content_str and "END" in content_str:
-            # Tìm vị trí của AUTO và END
-            auto_index = content_str.find("AUTO")
-            end_index = content_str.find("END", auto_index)  # Tìm END sau AUTO
-            
-            if auto_index != -1 and end_index != -1:
-                # Lấy đoạn text giữa AUTO và END
-                id_sl = content_str[auto_index + len("AUTO"):end_index].strip()
-                print(f"📝 Parse content: Tìm thấy AUTO...END, lấy đoạn giữa: {id_sl}")
-                return id_sl
-            else:
-                # Không tìm thấy cả AUTO và END, giữ nguyên content
-                print(f"⚠️ Parse content: Không tìm thấy AUTO hoặc END, giữ nguyên content")
-                return content_str
-        else:
-            # Không có AUTO hoặc END, giữ nguyên content
-            print(f"⚠️ Parse content: Không tìm thấy AUTO hoặc END, giữ nguyên content")
-            return content_str
-            
-    except Exception as e:
-        print(f"❌ Lỗi khi parse content: {e}")
+    if not content:
         return content
+    return parse_sepay_content(content).id_sl
 
 
-def doc_data_json(db_file="db/data.json"):
+def khoa_giao_dich(payload):
     """
-    Đọc dữ liệu từ file data.json
-    (Không cần lock riêng vì sẽ được lock ở hàm gọi)
-    
+    Lấy mã giao dịch để chống xử lý lặp webhook SePay
+
     Args:
-        db_file: Đường dẫn đến file data.json
-        
+        payload: JSON body SePay gửi tới
+
     Returns:
-        list: Danh sách các object trong data.json, [] nếu file không tồn tại hoặc lỗi
+        str: "id:<id>" nếu có trường id, "ref:<referenceCode>" nếu chỉ có referenceCode, None nếu không có cả hai
     """
+    if not isinstance(payload, dict):
+        return None
+    transaction_id = payload.get('id')
+    if transaction_id not in (None, ''):
+        return f"id:{transaction_id}"
+    reference_code = payload.get('referenceCode')
+    if reference_code:
+        return f"ref:{reference_code}"
+    return None
+
+
+def giao_dich_da_xu_ly(transaction_key, db_file="db/data.json"):
+    """
+    Tra cứu giao dịch đã được xử lý thành công trước đó (O(1), không đọc data.json)
+
+    Args:
+        transaction_key: Mã giao dịch (từ khoa_giao_dich), None thì luôn coi là chưa xử lý
+        db_file: Đường dẫn đến file data.json (để chọn thư mục dữ liệu)
+
+    Returns:
+        dict: Thông tin lần xử lý trước (có trường data là object tài khoản đã tạo), None nếu chưa xử lý
+    """
+    if not transaction_key:
+        return None
     try:
-        with open(db_file, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            return data
-    except FileNotFoundError:
-        return []
-    except json.JSONDecodeError as e:
-        print(f"❌ Lỗi khi parse JSON trong file data.json: {e}")
-        return []
+        return get_storage(os.path.dirname(os.path.abspath(db_file))).transactions.get(transaction_key)
     except Exception as e:
-        print(f"❌ Lỗi khi đọc file data.json: {e}")
-        return []
+        # Lỗi đọc chỉ mục không được chặn việc xử lý thanh toán (bước ghi dưới lock sẽ kiểm tra lại)
+        print(f"⚠️ Lỗi khi tra cứu giao dịch {transaction_key}: {e}")
+        return None
 
 
-def luu_data_json(data, db_file="db/data.json"):
+def _tinh_thanh_toan(noi_dung, pay_ment, config):
     """
-    Lưu dữ liệu vào file data.json
-    
+    Tính limit của tài khoản từ số tiền thanh toán (không đọc/ghi dữ liệu)
+
     Args:
-        data: Danh sách các object cần lưu
-        db_file: Đường dẫn đến file data.json
-        
+        noi_dung: ParsedContent (kết quả parse_sepay_content / tach_id_sl)
+        pay_ment: Số tiền thanh toán thực tế
+        config: PaymentConfig (hoặc dict config có COST và LIMIT, {} nếu không đọc được)
+
     Returns:
-        bool: True nếu lưu thành công, False nếu lỗi
+        tuple: (loi: str, id: str, limit: number, message: str) - loi là None nếu hợp lệ
     """
+    if noi_dung.error:
+        return noi_dung.error, None, None, None
+    id, sl_str = noi_dung.id, noi_dung.sl
+    
+    # COST (số nguyên VND) và LIMIT đã được parse sẵn trong PaymentConfig
+    if not isinstance(config, PaymentConfig):
+        config = PaymentConfig(config)
+    if config.error:
+        return config.error, None, None, None
+    cost, limit = config.cost, config.limit
+    
+    # Chuyển sl và pay_ment sang số
     try:
-        # Tạo thư mục db nếu chưa tồn tại
-        os.makedirs(os.path.dirname(db_file), exist_ok=True)
-        
-        with open(db_file, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
-        return True
-    except Exception as e:
-        print(f"❌ Lỗi khi lưu file data.json: {e}")
-        return False
+        sl_num = float(sl_str)
+        pay_ment_num = float(pay_ment)
+    except (ValueError, TypeError):
+        return f"sl hoặc pay_ment không hợp lệ: sl={sl_str}, pay_ment={pay_ment}", None, None, None
+    
+    # Tính toán: COST * (sl/LIMIT)
+    expected_amount = cost * (sl_num / limit)
+    
+    # So sánh với pay_ment (cho phép sai số nhỏ do float)
+    epsilon = 0.01
+    if abs(expected_amount - pay_ment_num) <= epsilon:
+        # Nếu đúng: limit = sl
+        new_limit = int(sl_num) if sl_num.is_integer() else sl_num
+        message = f"✅ Tính toán đúng! Đã tạo object với limit={sl_num}"
+    else:
+        # Nếu sai: limit = pay_ment/COST
+        calculated_limit = pay_ment_num / cost
+        new_limit = int(calculated_limit) if calculated_limit.is_integer() else round(calculated_limit, 2)
+        message = f"⚠️ Tính toán không khớp! Expected: {expected_amount}, Received: {pay_ment_num}. Đã tạo object với limit={pay_ment_num}/COST={calculated_limit}"
+    return None, id, new_limit, message
+
+
+def kiem_tra_webhook(payload, config):
+    """
+    Kiểm tra một payload webhook SePay và tính limit của tài khoản (không đọc/ghi dữ liệu)
+
+    Args:
+        payload: JSON body SePay (cần có content và transferAmount)
+        config: PaymentConfig (hoặc dict config có COST và LIMIT)
+
+    Returns:
+        tuple: (loi: str, id: str, limit: number, message: str) - loi là None nếu hợp lệ
+    """
+    if not isinstance(payload, dict) or payload.get('content') is None or payload.get('transferAmount') is None:
+        return "Payload thiếu 'content' hoặc 'transferAmount'", None, None, None
+    return _tinh_thanh_toan(parse_sepay_content(payload.get('content')), payload.get('transferAmount'), config)
+
+
+def _tao_object(store, id, limit):
+    """
+    Tạo object tài khoản mới (count = 0, active = true), giữ created_at nếu tài khoản đã tồn tại
+    (gọi khi đang giữ lock của tài khoản)
+
+    Args:
+        store: AccountRepository
+        id: ID tài khoản
+        limit: Limit mới
+
+    Returns:
+        dict: Object tài khoản cần upsert
+    """
+    # Tìm tài khoản hiện có theo id trong store (O(1))
+    existing_object = store.get(id)
+
+    # Lấy thời gian hiện tại (ISO format)
+    current_time = datetime.now().isoformat()
+
+    new_object = {
+        "id": id,
+        "limit": limit,
+        "count": 0,
+        "active": True,
+        "created_at": current_time
+    }
+
+    # Cập nhật object đã tồn tại - giữ nguyên created_at nếu có, nếu không thì thêm mới
+    if existing_object is not None:
+        if "created_at" in existing_object:
+            new_object["created_at"] = existing_object["created_at"]
+        # Thêm updated_at để theo dõi thời gian cập nhật
+        new_object["updated_at"] = current_time
+    return new_object
 
 
-@with_db_lock
-def xu_ly_thanh_toan(id_sl, pay_ment, config_file="config/pay_ment.json", db_file="db/data.json"):
+def xu_ly_thanh_toan(id_sl, pay_ment, config_file="config/pay_ment.json", db_file="db/data.json", transaction_key=None):
     """
     Xử lý tính toán thanh toán và tạo đối tượng trong data.json
     
@@ -176,12 +210,14 @@ def xu_ly_thanh_toan(id_sl, pay_ment, config_file="config/pay_ment.json", db_fil
     - Nếu sai: limit = pay_ment/COST
     
     Args:
-        id_sl: Chuỗi kết hợp id và sl
+        id_sl: Chuỗi kết hợp id và sl, hoặc ParsedContent đã tách sẵn (parse_sepay_content)
             - Format 1: "{id}-{sl}" (ví dụ: "id0c0nUPf3rjZwzpA3yD-50")
             - Format 2: "{id}{sl}" (ví dụ: "id0c0nUPf3rjZwzpA3yD50" - 20 ký tự đầu là id)
         pay_ment: Số tiền thanh toán thực tế
         config_file: Đường dẫn đến file config chứa COST và LIMIT
         db_file: Đường dẫn đến file data.json
+        transaction_key: Mã giao dịch (khoa_giao_dich). Nếu giao dịch đã được xử lý thành công thì
+                         không ghi lại tài khoản (tránh reset count/limit khi SePay gửi lại webhook)
         
     Returns:
         tuple: (success: bool, message: str, data: dict)
@@ -190,135 +226,130 @@ def xu_ly_thanh_toan(id_sl, pay_ment, config_file="config/pay_ment.json", db_fil
             - data: Object đã tạo (nếu thành công)
     """
     try:
-        # Chuyển id_sl sang string nếu chưa phải
-        id_sl_str = str(id_sl).strip()
-        
-        # Kiểm tra độ dài id_sl
-        if len(id_sl_str) < 20:
-            return False, f"id_sl phải có ít nhất 20 ký tự, hiện tại có {len(id_sl_str)} ký tự", None
-        
-        # Tách id_sl: 
-        # - Nếu có dấu "-": phần trước dấu "-" là id, phần sau là sl
-        # - Nếu không có dấu "-": 20 ký tự đầu là id, phần còn lại là sl
-        if "-" in id_sl_str:
-            # Format: {id}-{sl}
-            parts = id_sl_str.split("-", 1)  # Tách tại dấu "-" đầu tiên
-            id = parts[0].strip()
-            sl_str = parts[1].strip() if len(parts) > 1 else ""
-            
-            # Kiểm tra id phải có ít nhất 20 ký tự
-            if len(id) < 20:
-                return False, f"id phải có ít nhất 20 ký tự, hiện tại có {len(id)} ký tự", None
-        else:
-            # Format: {id}{sl} (20 ký tự đầu là id, phần còn lại là sl)
-            id = id_sl_str[:20]
-            sl_str = id_sl_str[20:]
-        
-        # Kiểm tra sl không rỗng
-        if not sl_str:
-            return False, "Phần sl không được rỗng", None
-        
-        # Đọc config
-        config = doc_config(config_file)
-        if not config:
-            return False, "Không thể đọc file config", None
-        
-        # Lấy COST và LIMIT từ config
-        cost_value = config.get("COST")
-        limit_value = config.get("LIMIT")
-        
-        if cost_value is None:
-            return False, "Không tìm thấy COST trong config", None
-        if limit_value is None:
-            return False, "Không tìm thấy LIMIT trong config", None
-        
-        # Parse COST
-        cost = parse_cost(cost_value)
-        if cost is None:
-            return False, f"Không thể parse COST: {cost_value}", None
-        
-        # Chuyển LIMIT sang số
-        try:
-            limit = float(limit_value)
-        except (ValueError, TypeError):
-            return False, f"LIMIT không hợp lệ: {limit_value}", None
-        
-        # Chuyển sl và pay_ment sang số
-        try:
-            sl_num = float(sl_str)
-            pay_ment_num = float(pay_ment)
-        except (ValueError, TypeError):
-            return False, f"sl hoặc pay_ment không hợp lệ: sl={sl_str}, pay_ment={pay_ment}", None
-        
-        # Tính toán: COST * (sl/LIMIT)
-        expected_amount = cost * (sl_num / limit)
+        # Tách id_sl, đọc config và tính limit (không cần lock)
+        noi_dung = id_sl if isinstance(id_sl, ParsedContent) else tach_id_sl(id_sl)
+        loi, id, limit, message = _tinh_thanh_toan(noi_dung, pay_ment, get_payment_config(config_file))
+        if loi:
+            return False, loi, None
         
-        # So sánh với pay_ment (cho phép sai số nhỏ do float)
-        epsilon = 0.01
-        is_match = abs(expected_amount - pay_ment_num) <= epsilon
-        
-        # Đọc data.json hiện tại
-        data_list = doc_data_json(db_file)
-        
-        # Kiểm tra xem id đã tồn tại chưa
-        existing_index = None
-        for i, item in enumerate(data_list):
-            if item.get("id") == id:
-                existing_index = i
-                break
-        
-        # Lấy thời gian hiện tại (ISO format)
-        current_time = datetime.now().isoformat()
-        
-        # Tạo object mới
-        if is_match:
-            # Nếu đúng: limit = sl, count = 0, active = true
-            new_object = {
-                "id": id,
-                "limit": int(sl_num) if sl_num.is_integer() else sl_num,
-                "count": 0,
-                "active": True,
-                "created_at": current_time
-            }
-            message = f"✅ Tính toán đúng! Đã tạo object với limit={sl_num}"
-        else:
-            # Nếu sai: limit = pay_ment/COST
-            calculated_limit = pay_ment_num / cost
-            new_object = {
-                "id": id,
-                "limit": int(calculated_limit) if calculated_limit.is_integer() else round(calculated_limit, 2),
-                "count": 0,
-                "active": True,
-                "created_at": current_time
-            }
-            message = f"⚠️ Tính toán không khớp! Expected: {expected_amount}, Received: {pay_ment_num}. Đã tạo object với limit={pay_ment_num}/COST={calculated_limit}"
-        
-        # Cập nhật hoặc thêm mới vào data_list
-        if existing_index is not None:
-            # Cập nhật object đã tồn tại - giữ nguyên created_at nếu có, nếu không thì thêm mới
-            existing_object = data_list[existing_index]
-            if "created_at" not in existing_object:
-                new_object["created_at"] = current_time
-            else:
-                new_object["created_at"] = existing_object["created_at"]
-            # Thêm updated_at để theo dõi thời gian cập nhật
-            new_object["updated_at"] = current_time
-            data_list[existing_index] = new_object
-        else:
-            # Thêm object mới
-            data_list.append(new_object)
+        # Lock theo tài khoản từ lúc đọc object hiện có đến lúc ghi lại
+        with account_lock(id):
+            storage = get_storage(os.path.dirname(os.path.abspath(db_file)))
+
+            # Kiểm tra lại dưới lock: hai lần gửi trùng của cùng giao dịch có thể tới gần như cùng lúc
+            if transaction_key:
+                da_xu_ly = storage.transactions.get(transaction_key)
+                if da_xu_ly is not None:
+                    return True, f"🔁 Giao dịch {transaction_key} đã được xử lý trước đó, bỏ qua", da_xu_ly.get('data')
+
+            store = storage.accounts
+            new_object = _tao_object(store, id, limit)
+
+            # Ghi nhận giao dịch trước khi ghi tài khoản: process dừng giữa hai bước thì SePay gửi lại
+            # sẽ được bỏ qua thay vì reset count/limit của tài khoản lần nữa
+            da_ghi_nhan = False
+            if transaction_key:
+                try:
+                    da_ghi_nhan = storage.transactions.add(transaction_key, {"id": id, "amount": float(pay_ment), "data": new_object})
+                except Exception as e:
+                    print(f"❌ Lỗi khi ghi nhận giao dịch {transaction_key}: {e}")
+                    return False, "Không thể ghi nhận giao dịch", None
         
-        # Lưu vào file
-        if luu_data_json(data_list, db_file):
+            # Thêm mới hoặc thay thế object trong store (store tự ghi xuống file)
+            try:
+                store.upsert(new_object)
+            except Exception as e:
+                print(f"❌ Lỗi khi lưu file data.json: {e}")
+                if da_ghi_nhan:
+                    # Bỏ ghi nhận để lần SePay gửi lại được xử lý
+                    storage.transactions.discard_many([transaction_key])
+                return False, "Không thể lưu vào file data.json", None
+
             return True, message, new_object
-        else:
-            return False, "Không thể lưu vào file data.json", None
             
     except Exception as e:
         error_msg = f"❌ Lỗi khi xử lý thanh toán: {e}"
         return False, error_msg, None
 
 
+def xu_ly_thanh_toan_batch(payloads, config_file="config/pay_ment.json", db_file="db/data.json"):
+    """
+    Xử lý nhiều webhook SePay trong một lần ghi tài khoản (dùng cho hàng đợi webhook)
+
+    - Config thanh toán được đọc một lần cho cả lô
+    - Các giao dịch được ghi nhận trong một lần ghi transactions.jsonl trước, sau đó các tài khoản được
+      ghi trong một batch (một lần ghi data.json/WAL); backend SQLite ghi cả hai trong cùng một transaction.
+      Ghi tài khoản lỗi thì bỏ ghi nhận và ném lỗi (hàng đợi không tăng offset); process dừng giữa hai bước
+      thì các giao dịch của lô được coi là đã xử lý, không bao giờ reset count/limit hai lần
+    - Giao dịch đã xử lý (kể cả giao dịch trùng trong cùng lô) được bỏ qua
+
+    Args:
+        payloads: Danh sách JSON body SePay theo thứ tự nhận
+        config_file: Đường dẫn đến file config chứa COST và LIMIT
+        db_file: Đường dẫn đến file data.json
+
+    Returns:
+        list: (success, message, data) cho từng payload, theo thứ tự payloads
+
+    Raises:
+        Exception: Không ghi nhận được giao dịch hoặc không ghi được tài khoản xuống đĩa (hàng đợi giữ lại
+                   cả lô để thử lại)
+    """
+    ket_qua = [None] * len(payloads)
+    config = get_payment_config(config_file)
+
+    # Tính toán trước khi lấy lock
+    cong_viec = []
+    for index, payload in enumerate(payloads):
+        loi, id, limit, message = kiem_tra_webhook(payload, config)
+        if loi:
+            ket_qua[index] = (False, loi, None)
+            continue
+        cong_viec.append((index, khoa_giao_dich(payload), id, limit, float(payload['transferAmount']), message))
+
+    if not cong_viec:
+        return ket_qua
+
+    storage = get_storage(os.path.dirname(os.path.abspath(db_file)))
+    store = storage.accounts
+    with account_locks([item[2] for item in cong_viec]):
+        da_ghi = {}
+        # Object cần ghi theo id (cùng tài khoản nhiều lần trong lô thì lần sau cùng thắng)
+        cho_ghi = {}
+        for index, transaction_key, id, limit, pay_ment_num, message in cong_viec:
+            if transaction_key:
+                da_xu_ly = da_ghi.get(transaction_key) or storage.transactions.get(transaction_key)
+                if da_xu_ly is not None:
+                    ket_qua[index] = (True, f"🔁 Giao dịch {transaction_key} đã được xử lý trước đó, bỏ qua", da_xu_ly.get('data'))
+                    continue
+            new_object = _tao_object(store, id, limit)
+            if id in cho_ghi:
+                new_object["created_at"] = cho_ghi[id]["created_at"]
+            cho_ghi.pop(id, None)
+            cho_ghi[id] = new_object
+            ket_qua[index] = (True, message, new_object)
+            if transaction_key:
+                da_ghi[transaction_key] = {"id": id, "amount": pay_ment_num, "data": new_object}
+
+        # Ghi nhận giao dịch trước khi ghi tài khoản (SQLite: cùng transaction với batch tài khoản)
+        da_ghi_nhan = []
+        try:
+            with store.batch():
+                if da_ghi:
+                    da_ghi_nhan = storage.transactions.add_many(da_ghi)
+                for new_object in cho_ghi.values():
+                    store.upsert(new_object)
+        except Exception:
+            if da_ghi_nhan:
+                # Tài khoản chưa được ghi: bỏ ghi nhận để lần xử lý lại không bỏ qua các giao dịch này
+                try:
+                    storage.transactions.discard_many(da_ghi_nhan)
+                except Exception as e:
+                    print(f"⚠️ Lỗi khi bỏ ghi nhận {len(da_ghi_nhan)} giao dịch: {e}")
+            raise
+    return ket_qua
+
+
 if __name__ == "__main__":
     # Test hàm parse_content
     print("📝 Test hàm parse_content()")
@@ -10,10 +10,15 @@ import sys
 root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if root_dir not in sys.path:
     sys.path.insert(0, root_dir)
-from utils.db_lock import with_db_lock
+from utils.db_config import doc_db_config
+from utils.db_lock import account_lock, account_locks
+from utils.negative_cache import NegativeCache
+from utils.storage import get_storage
+
+# Cache các id không tồn tại (trả 404 ngay, xóa khi có tài khoản mới)
+negative_cache = NegativeCache(doc_db_config().get("NEGATIVE_CACHE_SIZE"))
 
 
-@with_db_lock
 def check(id):
     """
     Hàm kiểm tra id có tồn tại và active là true hay false
@@ -34,156 +39,56 @@ def check(id):
                 - error: (tùy chọn) Lỗi nếu total_temp_count > limit
     
     Logic:
-        1. Tìm id trong db/data.json
+        1. Tìm id trong db/data.json (qua index trong bộ nhớ của AccountStore)
         2. Nếu không tìm thấy id → trả về 404 với message "Chưa mua thành công", count=0, limit=0
         3. Nếu tìm thấy id nhưng active = false → trả về 300 với message "Tài khoản bị khóa", kèm count và limit
         4. Nếu tìm thấy id và active = true:
-           - Đọc/tạo file db/temp_count.json để lưu count tạm
-           - Nếu id chưa có trong temp_count.json (lần đầu khởi tạo):
+           - Lấy count tạm của id (bảng trong bộ nhớ, ghi trễ xuống db/temp_count.json)
+           - Nếu id chưa có count tạm (lần đầu khởi tạo):
              * temp_count = 0 (không tăng), count giữ nguyên
-           - Nếu id đã có trong temp_count.json (từ lần thứ 2 trở đi):
+           - Nếu id đã có count tạm (từ lần thứ 2 trở đi):
              * Tăng count tạm của id lên 1 (cộng dồn)
-           - Lưu temp_count vào file temp_count.json
+           - Lưu lại count tạm (chỉ cập nhật bộ nhớ, thread nền ghi xuống đĩa theo lô)
            - Tính total_temp_count = count (thực tế) + temp_count (đã cộng dồn)
            - So sánh total_temp_count với limit
            - Nếu total_temp_count > limit → trả về message "Tài khoản đã hết lượt"
            - Nếu total_temp_count <= limit → trả về message "Thành công"
     
-    Lưu ý: - Nếu count = 0: temp_count luôn = 0 (reset về 0 để tránh tích lũy không cần thiết)
+    Lưu ý: - Bước 2 và 3 (id không tồn tại / bị khóa) chỉ đọc trạng thái trong bộ nhớ, không lấy lock
+             của tài khoản; id không tồn tại được nhớ trong negative_cache. Chỉ bước 4 (tài khoản active,
+             cần cập nhật count tạm) mới lock theo tài khoản
+           - Nếu count = 0: temp_count luôn = 0 (reset về 0 để tránh tích lũy không cần thiết)
            - Lần đầu gọi check(id) (khi count > 0): temp_count = 0, count giữ nguyên
            - Từ lần thứ 2 trở đi (khi count > 0): temp_count tăng dần mỗi lần check được gọi
            - Khi add_count được gọi (count thực tế được tăng), count tạm sẽ được reset về 0
     """
-    # Đường dẫn đến file data.json
-    db_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'db', 'data.json')
-    
     try:
-        # Đọc file data.json
-        if not os.path.exists(db_path):
-            return 500, {
-                "id": id,
-                "count": 0,
-                "limit": 0,
-                "message": "File db/data.json không tồn tại"
-            }
-        
-        with open(db_path, 'r', encoding='utf-8') as f:
-            data_list = json.load(f)
-        
-        # Kiểm tra data_list có phải là list không
-        if not isinstance(data_list, list):
-            return 500, {
-                "id": id,
-                "count": 0,
-                "limit": 0,
-                "message": "Dữ liệu trong db/data.json không hợp lệ"
-            }
-        
-        # Tìm object có id trùng khớp
-        found_item = None
-        found_index = -1
-        
-        for index, item in enumerate(data_list):
-            if isinstance(item, dict) and item.get('id') == id:
-                found_item = item
-                found_index = index
-                break
-        
-        # Nếu không tìm thấy id
-        if found_item is None:
-            return 404, {
-                "id": id,
-                "count": 0,
-                "limit": 0,
-                "message": "Chưa mua thành công"
-            }
-        
-        # Lấy count và limit từ found_item
-        count = found_item.get('count', 0)
-        limit = found_item.get('limit', 0)
-        
-        # Kiểm tra active
-        active = found_item.get('active', False)
-        
+        # Id không phải chuỗi (vd. list/dict trong JSON) không thể khớp tài khoản nào, và không dùng được
+        # làm key của negative_cache / index → trả "không tồn tại" như khi tìm trong danh sách
+        if not isinstance(id, str):
+            return _khong_ton_tai(id)
+
+        storage = get_storage()
+
+        # Đường nhanh cho id không tồn tại / tài khoản bị khóa: không lock tài khoản, không sao chép dữ liệu
+        # (số thế hệ được đọc trước khi tra cứu để tài khoản mới thêm trong lúc đó làm cache bị xóa)
+        generation = storage.accounts.generation()
+        if negative_cache.contains(id, generation):
+            return _khong_ton_tai(id)
+
+        status = storage.accounts.status(id, refresh=False)
+        if status is None:
+            negative_cache.add(id, generation)
+            return _khong_ton_tai(id)
+
+        active, count, limit = status
         if not active:
-            return 300, {
-                "id": id,
-                "count": count,
-                "limit": limit,
-                "message": "Tài khoản bị khóa"
-            }
-        
-        # Đường dẫn đến file temp_count.json
-        temp_count_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'db', 'temp_count.json')
-        
-        # Đọc hoặc tạo file temp_count.json
-        temp_count_data = {}
-        if os.path.exists(temp_count_path):
-            try:
-                with open(temp_count_path, 'r', encoding='utf-8') as f:
-                    temp_count_data = json.load(f)
-                    if not isinstance(temp_count_data, dict):
-                        temp_count_data = {}
-            except (json.JSONDecodeError, Exception):
-                temp_count_data = {}
-        
-        # Kiểm tra xem id đã có trong temp_count_data chưa (khởi tạo hay không)
-        is_initializing = id not in temp_count_data
-        
-        # Lấy count tạm hiện tại của id (mặc định là 0)
-        current_temp_count = temp_count_data.get(id, 0)
-        
-        # Nếu count = 0, reset temp_count về 0 (không tích lũy khi count = 0)
-        if count == 0:
-            new_temp_count = 0
-            temp_count_data[id] = new_temp_count
-        # Nếu là lần đầu: temp_count = 0 (không tăng), count giữ nguyên
-        elif is_initializing:
-            new_temp_count = 0
-            temp_count_data[id] = new_temp_count
-        # Nếu không phải lần đầu: tăng count tạm lên 1 (cộng dồn)
-        else:
-            new_temp_count = current_temp_count + 1
-            temp_count_data[id] = new_temp_count
-        
-        # Lưu lại file temp_count.json
-        try:
-            with open(temp_count_path, 'w', encoding='utf-8') as f:
-                json.dump(temp_count_data, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            return 500, {
-                "id": id,
-                "count": count,
-                "limit": limit,
-                "message": f"Lỗi ghi file temp_count.json: {str(e)}"
-            }
-        
-        # Tính tổng count tạm = count thực tế + count tạm đã cộng dồn
-        total_temp_count = count + new_temp_count
-        
-        # Kiểm tra tổng count tạm > limit
-        if total_temp_count > limit:
-            # Trả về lỗi vì đã vượt quá limit
-            return 200, {
-                "id": id,
-                "count": count,  # Count thực tế trong database
-                "temp_count": new_temp_count,  # Count tạm đã cộng dồn
-                "total_temp_count": total_temp_count,  # Tổng count tạm (count + temp_count)
-                "limit": limit,
-                "message": "Tài khoản đã hết lượt",
-                "error": "Vượt quá giới hạn sử dụng"
-            }
-        
-        # Nếu tổng count tạm <= limit → thành công
-        return 200, {
-            "id": id,
-            "count": count,  # Count thực tế trong database
-            "temp_count": new_temp_count,  # Count tạm đã cộng dồn
-            "total_temp_count": total_temp_count,  # Tổng count tạm (count + temp_count)
-            "limit": limit,
-            "message": "Thành công"
-        }
-    
+            return _bi_khoa(id, count, limit)
+
+        # Tài khoản active: lock theo tài khoản rồi đọc lại (có thể vừa thay đổi) trước khi cập nhật count tạm
+        with account_lock(id):
+            return _check_tai_khoan(storage, id)
+
     except json.JSONDecodeError as e:
         return 500, {
             "id": id,
@@ -191,7 +96,7 @@ def check(id):
             "limit": 0,
             "message": f"Lỗi đọc file JSON: {str(e)}"
         }
-    
+
     except Exception as e:
         return 500, {
             "id": id,
@@ -200,3 +105,204 @@ def check(id):
             "message": f"Lỗi không xác định: {str(e)}"
         }
 
+
+def _check_tai_khoan(storage, id):
+    """
+    Phần của check() cập nhật count tạm, chạy khi đang giữ lock của tài khoản
+
+    Args:
+        storage: Storage đang dùng
+        id (str): ID của tài khoản
+
+    Returns:
+        tuple: (status_code: int, data: dict) như check()
+    """
+    # Đọc lại trạng thái tài khoản (O(1), không sao chép object): có thể vừa bị xóa/khóa trước khi lấy được lock
+    status = storage.accounts.status(id)
+    
+    # Nếu không tìm thấy id
+    if status is None:
+        return _khong_ton_tai(id)
+    
+    # Lấy active, count và limit
+    active, count, limit = status
+    
+    if not active:
+        return _bi_khoa(id, count, limit)
+    
+    # Lấy count tạm hiện tại của id (None nếu id chưa được khởi tạo)
+    new_temp_count = _tinh_temp_count(count, storage.temp_counts.get(id))
+    
+    # Lưu lại count tạm
+    try:
+        storage.temp_counts.set(id, new_temp_count)
+    except Exception as e:
+        return _loi_ghi_temp_count(id, count, limit, e)
+    
+    return _ket_qua_active(id, count, limit, new_temp_count)
+
+
+def check_batch(ids):
+    """
+    Kiểm tra nhiều id trong một lần gọi (cùng ngữ nghĩa với gọi check() lần lượt cho từng id)
+
+    Args:
+        ids (list): Danh sách ID tài khoản (id lặp lại được xử lý như nhiều lần gọi check liên tiếp)
+
+    Returns:
+        list: Kết quả theo đúng thứ tự ids, mỗi phần tử là data của check() kèm status_code
+
+    Logic:
+        1. Tra trạng thái tất cả id trong một lần (negative_cache + status_many, không lock)
+        2. Id không tồn tại / bị khóa → 404 / 300 như check()
+        3. Các id active: lấy lock của các tài khoản đó (mỗi sọc một lần, theo thứ tự cố định), đọc lại
+           trạng thái và count tạm của cả lô, tính count tạm mới như check() rồi ghi một lần (write_many)
+    """
+    try:
+        storage = get_storage()
+
+        generation = storage.accounts.generation()
+        # Id không phải chuỗi được trả "không tồn tại" như check() (không đưa vào cache / index)
+        unique_ids = list(dict.fromkeys(id for id in ids if isinstance(id, str)))
+        candidates = [id for id in unique_ids if not negative_cache.contains(id, generation)]
+        statuses = storage.accounts.status_many(candidates, refresh=False)
+        for id in candidates:
+            if id not in statuses:
+                negative_cache.add(id, generation)
+
+        # Lock các tài khoản active (danh sách rỗng → không lấy lock nào)
+        active_ids = [id for id in unique_ids if id in statuses and statuses[id][0]]
+        with account_locks(active_ids):
+            temp_counts = {}
+            if active_ids:
+                # Đọc lại trạng thái các tài khoản active (có thể vừa bị xóa/khóa trước khi lấy được lock)
+                moi = storage.accounts.status_many(active_ids)
+                for id in active_ids:
+                    if id in moi:
+                        statuses[id] = moi[id]
+                    else:
+                        del statuses[id]
+                temp_counts = storage.temp_counts.get_many(active_ids)
+
+            # Tính kết quả theo thứ tự ids (id lặp lại được cộng dồn như các lần gọi check liên tiếp)
+            results = []
+            new_values = {}
+            active_results = []  # (vị trí, id, count, limit) để đổi sang 500 nếu ghi count tạm lỗi
+            for id in ids:
+                status = statuses.get(id) if isinstance(id, str) else None
+                if status is None:
+                    status_code, data = _khong_ton_tai(id)
+                elif not status[0]:
+                    status_code, data = _bi_khoa(id, status[1], status[2])
+                else:
+                    _, count, limit = status
+                    new_temp_count = _tinh_temp_count(count, temp_counts.get(id))
+                    temp_counts[id] = new_values[id] = new_temp_count
+                    status_code, data = _ket_qua_active(id, count, limit, new_temp_count)
+                    active_results.append((len(results), id, count, limit))
+                data['status_code'] = status_code
+                results.append(data)
+
+            # Ghi count tạm của cả lô một lần
+            if new_values:
+                try:
+                    storage.temp_counts.write_many(new_values)
+                except Exception as e:
+                    for i, id, count, limit in active_results:
+                        status_code, data = _loi_ghi_temp_count(id, count, limit, e)
+                        data['status_code'] = status_code
+                        results[i] = data
+        return results
+
+    except json.JSONDecodeError as e:
+        return [_loi_batch(id, f"Lỗi đọc file JSON: {str(e)}") for id in ids]
+
+    except Exception as e:
+        return [_loi_batch(id, f"Lỗi không xác định: {str(e)}") for id in ids]
+
+
+def _tinh_temp_count(count, current_temp_count):
+    """
+    Tính count tạm mới của một tài khoản active
+
+    Args:
+        count: Count thực tế trong database
+        current_temp_count: Count tạm hiện tại (None nếu id chưa được khởi tạo)
+
+    Returns:
+        int: Count tạm mới
+    """
+    # Nếu count = 0, reset temp_count về 0 (không tích lũy khi count = 0)
+    if count == 0:
+        return 0
+    # Nếu là lần đầu: temp_count = 0 (không tăng), count giữ nguyên
+    if current_temp_count is None:
+        return 0
+    # Nếu không phải lần đầu: tăng count tạm lên 1 (cộng dồn)
+    return current_temp_count + 1
+
+
+def _khong_ton_tai(id):
+    return 404, {
+        "id": id,
+        "count": 0,
+        "limit": 0,
+        "message": "Chưa mua thành công"
+    }
+
+
+def _bi_khoa(id, count, limit):
+    return 300, {
+        "id": id,
+        "count": count,
+        "limit": limit,
+        "message": "Tài khoản bị khóa"
+    }
+
+
+def _loi_ghi_temp_count(id, count, limit, e):
+    return 500, {
+        "id": id,
+        "count": count,
+        "limit": limit,
+        "message": f"Lỗi ghi count tạm: {str(e)}"
+    }
+
+
+def _loi_batch(id, message):
+    return {
+        "id": id,
+        "count": 0,
+        "limit": 0,
+        "message": message,
+        "status_code": 500
+    }
+
+
+def _ket_qua_active(id, count, limit, new_temp_count):
+    """Kết quả 200 của tài khoản active sau khi đã cập nhật count tạm"""
+    # Tính tổng count tạm = count thực tế + count tạm đã cộng dồn
+    total_temp_count = count + new_temp_count
+    
+    # Kiểm tra tổng count tạm > limit
+    if total_temp_count > limit:
+        # Trả về lỗi vì đã vượt quá limit
+        return 200, {
+            "id": id,
+            "count": count,  # Count thực tế trong database
+            "temp_count": new_temp_count,  # Count tạm đã cộng dồn
+            "total_temp_count": total_temp_count,  # Tổng count tạm (count + temp_count)
+            "limit": limit,
+            "message": "Tài khoản đã hết lượt",
+            "error": "Vượt quá giới hạn sử dụng"
+        }
+    
+    # Nếu tổng count tạm <= limit → thành công
+    return 200, {
+        "id": id,
+        "count": count,  # Count thực tế trong database
+        "temp_count": new_temp_count,  # Count tạm đã cộng dồn
+        "total_temp_count": total_temp_count,  # Tổng count tạm (count + temp_count)
+        "limit": limit,
+        "message": "Thành công"
+    }
@@ -1,8 +1,14 @@
 """
 Module kiểm tra mã OTP để đăng nhập
 """
-import json
 import os
+import sys
+
+# Thêm thư mục gốc vào path để import utils
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if root_dir not in sys.path:
+    sys.path.insert(0, root_dir)
+from utils.storage import get_storage
 
 
 def doc_otp_tu_file(email, otp_file="db/otp.txt"):
@@ -21,26 +27,14 @@ def doc_otp_tu_file(email, otp_file="db/otp.txt"):
         base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
         otp_path = os.path.join(base_dir, otp_file)
         
-        # Kiểm tra file có tồn tại không
-        if not os.path.exists(otp_path):
-            return None
+        # Tìm OTP theo email (chuyển về lowercase để so sánh)
+        otp_info = get_storage(os.path.dirname(otp_path)).otps.get(email.strip().lower())
+        if otp_info is not None:
+            return otp_info.get("otp")
         
-        # Đọc file
-        with open(otp_path, 'r', encoding='utf-8') as f:
-            content = f.read().strip()
-            if not content:
-                return None
-            
-            otp_data = json.loads(content)
-            
-            # Tìm OTP theo email (chuyển về lowercase để so sánh)
-            email_lower = email.strip().lower()
-            if email_lower in otp_data:
-                return otp_data[email_lower].get("otp")
-            
-            return None
+        return None
             
-    except (json.JSONDecodeError, KeyError, Exception) as e:
+    except Exception as e:
         print(f"Lỗi khi đọc OTP từ file: {e}")
         return None
 
@@ -61,28 +55,10 @@ def xoa_otp_sau_khi_dung(email, otp_file="db/otp.txt"):
         base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
         otp_path = os.path.join(base_dir, otp_file)
         
-        # Kiểm tra file có tồn tại không
-        if not os.path.exists(otp_path):
-            return True  # Không có gì để xóa
+        # Xóa OTP của email này (không có thì không cần làm gì)
+        get_storage(os.path.dirname(otp_path)).otps.delete(email.strip().lower())
         
-        # Đọc file
-        with open(otp_path, 'r', encoding='utf-8') as f:
-            content = f.read().strip()
-            if not content:
-                return True
-            
-            otp_data = json.loads(content)
-            
-            # Xóa OTP của email này
-            email_lower = email.strip().lower()
-            if email_lower in otp_data:
-                del otp_data[email_lower]
-            
-            # Ghi lại file
-            with open(otp_path, 'w', encoding='utf-8') as f:
-                json.dump(otp_data, f, ensure_ascii=False, indent=2)
-            
-            return True
+        return True
             
     except Exception as e:
         print(f"Lỗi khi xóa OTP: {e}")
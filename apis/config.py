@@ -5,8 +5,17 @@ Hỗ trợ đọc, ghi và chỉnh sửa các trường thông tin trong các fi
 
 import json
 import os
+import sys
 from pathlib import Path
 
+# Thêm thư mục gốc vào path để import utils
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if root_dir not in sys.path:
+    sys.path.insert(0, root_dir)
+from utils.json_codec import doc_file
+from utils.json_file import ghi_json_atomic
+from utils.payment_config import invalidate_payment_config
+
 
 # Đường dẫn đến thư mục config
 CONFIG_DIR = Path(__file__).parent.parent / "config"
@@ -80,8 +89,7 @@ def get_config(file_name):
     config_path = _get_config_path(file_name)
     
     try:
-        with open(config_path, 'r', encoding='utf-8') as f:
-            config_data = json.load(f)
+        config_data = doc_file(config_path)
         return config_data
     except json.JSONDecodeError as e:
         raise json.JSONDecodeError(f"File '{file_name}' không phải JSON hợp lệ: {str(e)}", e.doc, e.pos)
@@ -146,10 +154,10 @@ def set_field(file_name, field_name, value):
     # Cập nhật trường
     config_data[field_name] = value
     
-    # Ghi lại file
+    # Ghi lại file (atomic, giữ bản trước thành .bak)
     try:
-        with open(config_path, 'w', encoding='utf-8') as f:
-            json.dump(config_data, f, ensure_ascii=False, indent=4)
+        ghi_json_atomic(config_path, config_data, indent=4, backup=True)
+        invalidate_payment_config()
         return config_data
     except IOError as e:
         raise IOError(f"Không thể ghi file '{file_name}': {str(e)}")
@@ -185,10 +193,10 @@ def set_config(file_name, config_dict):
     
     config_path = _get_config_path(file_name)
     
-    # Ghi lại file
+    # Ghi lại file (atomic, giữ bản trước thành .bak)
     try:
-        with open(config_path, 'w', encoding='utf-8') as f:
-            json.dump(config_dict, f, ensure_ascii=False, indent=4)
+        ghi_json_atomic(config_path, config_dict, indent=4, backup=True)
+        invalidate_payment_config()
         return config_dict
     except IOError as e:
         raise IOError(f"Không thể ghi file '{file_name}': {str(e)}")
@@ -222,10 +230,10 @@ def update_fields(file_name, **fields):
     # Cập nhật các trường
     config_data.update(fields)
     
-    # Ghi lại file
+    # Ghi lại file (atomic, giữ bản trước thành .bak)
     try:
-        with open(config_path, 'w', encoding='utf-8') as f:
-            json.dump(config_data, f, ensure_ascii=False, indent=4)
+        ghi_json_atomic(config_path, config_data, indent=4, backup=True)
+        invalidate_payment_config()
         return config_data
     except IOError as e:
         raise IOError(f"Không thể ghi file '{file_name}': {str(e)}")
@@ -5,10 +5,18 @@ import json
 import os
 import random
 import smtplib
+import sys
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from datetime import datetime
 
+# Thêm thư mục gốc vào path để import utils
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if root_dir not in sys.path:
+    sys.path.insert(0, root_dir)
+from utils.json_codec import doc_file
+from utils.storage import get_storage
+
 
 def doc_config_mail(config_file="config/mail.json"):
     """
@@ -16,8 +24,7 @@ def doc_config_mail(config_file="config/mail.json"):
     """
     try:
         config_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), config_file)
-        with open(config_path, 'r', encoding='utf-8') as f:
-            config_data = json.load(f)
+        config_data = doc_file(config_path)
         return config_data
     except FileNotFoundError:
         return {}
@@ -116,30 +123,11 @@ def luu_otp_vao_file(email, otp_code, otp_file="db/otp.txt"):
         base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
         otp_path = os.path.join(base_dir, otp_file)
         
-        # Đảm bảo thư mục tồn tại
-        os.makedirs(os.path.dirname(otp_path), exist_ok=True)
-        
-        # Đọc dữ liệu hiện có (nếu có)
-        otp_data = {}
-        if os.path.exists(otp_path):
-            try:
-                with open(otp_path, 'r', encoding='utf-8') as f:
-                    content = f.read().strip()
-                    if content:
-                        otp_data = json.loads(content)
-            except (json.JSONDecodeError, Exception):
-                # Nếu file không hợp lệ, tạo mới
-                otp_data = {}
-        
-        # Lưu OTP với timestamp
-        otp_data[email.lower()] = {
+        # Lưu OTP với timestamp (ghi đè OTP cũ của email nếu có)
+        get_storage(os.path.dirname(otp_path)).otps.set(email.lower(), {
             "otp": otp_code,
             "timestamp": datetime.now().isoformat()
-        }
-        
-        # Ghi vào file
-        with open(otp_path, 'w', encoding='utf-8') as f:
-            json.dump(otp_data, f, ensure_ascii=False, indent=2)
+        })
         
         return True
     except Exception as e:
@@ -2,52 +2,49 @@
 Module xử lý QR Code
 Tự động tạo ID (20 ký tự ngẫu nhiên) và tạo QR code thanh toán VietQR
 """
+import binascii
 import json
+import os
 import random
-import requests
+import sys
+import zlib
 from urllib.parse import quote
 
+# Thêm thư mục gốc vào path để import utils
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if root_dir not in sys.path:
+    sys.path.insert(0, root_dir)
+from utils.db_config import doc_db_config
+from utils.http_pool import get_qr_http_client
+from utils.payment_config import get_payment_config
+from utils.qr_pool import QrPool
+from utils.vietqr import tao_qr_png
+
+_qr_config = doc_db_config()
+# Cách tạo ảnh QR: "local" (tạo trong process) hoặc "remote" (tải từ img.vietqr.io)
+QR_RENDER = str(_qr_config.get("QR_RENDER") or "local").lower()
+if QR_RENDER not in ("local", "remote"):
+    print(f"⚠️ QR_RENDER không hợp lệ: {QR_RENDER}, dùng \"local\"")
+    QR_RENDER = "local"
+# Tạo tại chỗ lỗi (chưa cài qrcode, không biết BIN ngân hàng) thì tải từ img.vietqr.io
+QR_REMOTE_FALLBACK = bool(_qr_config.get("QR_REMOTE_FALLBACK"))
+# Số pixel mỗi ô của ảnh QR tạo tại chỗ
+QR_BOX_SIZE = max(int(_qr_config.get("QR_BOX_SIZE") or 10), 1)
+# Địa chỉ API ảnh QR của VietQR.io
+VIETQR_IMAGE_URL = "https://img.vietqr.io/image"
+# Giới hạn ban đầu để tính toán amount của /qr (amount = COST * sl / 100)
+QR_LIMIT_CALCULATION = 100
+# Pool QR tạo sẵn: số QR giữ sẵn cho mỗi sl, các sl được tạo sẵn (null là /qr không có sl), tốc độ tạo tối đa
+QR_POOL_SIZE = max(int(_qr_config.get("QR_POOL_SIZE") or 0), 0)
+QR_POOL_SL = [None if sl is None else int(sl) for sl in (_qr_config.get("QR_POOL_SL") or [])]
+QR_POOL_REFILL_PER_SEC = float(_qr_config.get("QR_POOL_REFILL_PER_SEC") or 0)
+
 
 def doc_config(config_file="config/pay_ment.json"):
     """
-    Đọc thông tin từ file config (định dạng JSON)
+    Đọc thông tin từ file config (định dạng JSON), qua cache config thanh toán
     """
-    config_data = {}
-    try:
-        with open(config_file, "r", encoding="utf-8") as f:
-            config_data = json.load(f)
-    except FileNotFoundError:
-        print(f"❌ Không tìm thấy file config: {config_file}")
-    except json.JSONDecodeError as e:
-        print(f"❌ Lỗi khi parse JSON config: {e}")
-    except Exception as e:
-        print(f"❌ Lỗi khi đọc file config: {e}")
-    
-    return config_data
-
-
-def doc_data_json(db_file="db/data.json"):
-    """Đọc dữ liệu từ file data.json"""
-    try:
-        with open(db_file, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            return data
-    except FileNotFoundError:
-        return []
-    except Exception as e:
-        print(f"❌ Lỗi khi đọc file data.json: {e}")
-        return []
-
-
-def luu_data_json(data, db_file="db/data.json"):
-    """Lưu dữ liệu vào file data.json"""
-    try:
-        with open(db_file, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
-        return True
-    except Exception as e:
-        print(f"❌ Lỗi khi lưu file data.json: {e}")
-        return False
+    return dict(get_payment_config(config_file).data)
 
 
 def tao_id():
@@ -66,18 +63,21 @@ def tao_id():
 
 def xu_ly_amount(cost_str, sl=None, limit=None):
     """
-    Xử lý chuỗi số tiền từ config (loại bỏ dấu chấm và khoảng trắng)
+    Xử lý số tiền từ config (chuỗi thì loại bỏ dấu chấm và khoảng trắng)
     
     Args:
-        cost_str: Chuỗi số tiền từ config
+        cost_str: Chuỗi số tiền từ config, hoặc COST đã parse (số nguyên VND)
         sl: Số lượng (nếu có)
         limit: Giới hạn ban đầu (mặc định 100)
     
     Returns:
         int: Số tiền đã xử lý
     """
-    cost_str = cost_str.replace(".", "").replace(" ", "")
-    base_amount = int(cost_str) if cost_str.isdigit() else 0
+    if isinstance(cost_str, int):
+        base_amount = cost_str
+    else:
+        cost_str = cost_str.replace(".", "").replace(" ", "")
+        base_amount = int(cost_str) if cost_str.isdigit() else 0
     
     # Nếu có số lượng, tính amount = cost_str * (sl/limit)
     if sl is not None and limit is not None and limit > 0:
@@ -88,9 +88,41 @@ def xu_ly_amount(cost_str, sl=None, limit=None):
     return amount
 
 
+def tai_qr_vietqr_io(bank_code, account_no, account_name, amount, add_info, timeout=None):
+    """
+    Tải ảnh QR code thanh toán từ img.vietqr.io (dùng khi QR_RENDER = "remote" hoặc khi không tạo được tại chỗ)
+    
+    Args:
+        bank_code: Mã ngân hàng (BNK)
+        account_no: Số tài khoản (STK)
+        account_name: Tên chủ tài khoản (UN)
+        amount: Số tiền VND
+        add_info: Nội dung chuyển khoản
+        timeout: Số giây chờ mỗi lần gọi (mặc định QR_HTTP_TIMEOUT)
+        
+    Returns:
+        tuple: (success, qr_bytes, error_message)
+    """
+    # URL encode add_info để đảm bảo ký tự đặc biệt không bị bỏ đi (giữ nguyên ký tự -)
+    add_info_encoded = quote(add_info, safe='-')
+    
+    # Tạo link chuẩn VietQR
+    url = f"{VIETQR_IMAGE_URL}/{bank_code}-{account_no}-compact.png?amount={amount}&addInfo={add_info_encoded}&accountName={account_name}"
+    
+    # Tải qua session dùng chung (keep-alive, thử lại có jitter, circuit breaker)
+    success, content, error_message = get_qr_http_client().get(url, timeout=timeout)
+    if not success:
+        return False, None, f"Không tải được QR từ VietQR.io ({error_message})"
+    return True, content, None
+
+
 def tao_qr_code_bytes(id, config_file="config/pay_ment.json", sl=None, limit=None):
     """
-    Tải QR code thanh toán VietQR từ API VietQR.io và trả về bytes
+    Tạo QR code thanh toán VietQR và trả về bytes PNG
+    
+    Mặc định (QR_RENDER = "local") mã QR được tạo ngay trong process (utils/vietqr.py); chỉ tải từ
+    img.vietqr.io khi QR_RENDER = "remote", hoặc khi không tạo được tại chỗ và QR_REMOTE_FALLBACK bật.
+    Ở chế độ "remote", tải lỗi (hoặc circuit breaker đang mở sau nhiều lần lỗi liên tiếp) thì tạo tại chỗ
     
     Args:
         id: ID của đơn hàng (20 ký tự ngẫu nhiên)
@@ -101,18 +133,17 @@ def tao_qr_code_bytes(id, config_file="config/pay_ment.json", sl=None, limit=Non
     Returns:
         tuple: (success, qr_bytes, error_message)
     """
-    # Đọc thông tin từ config
-    config_data = doc_config(config_file)
+    # Đọc thông tin từ config (cache, không mở file ở mỗi request)
+    config = get_payment_config(config_file)
     
     # Kiểm tra config có đầy đủ không
-    if not config_data:
+    if not config.data:
         return False, None, "Không đọc được thông tin từ config"
     
     # Lấy thông tin từ config
-    bank_code = config_data.get("BNK", "").upper()
-    account_no = config_data.get("STK", "")
-    account_name = config_data.get("UN", "")
-    cost_str = config_data.get("COST", "0")
+    bank_code = config.bank
+    account_no = config.account_no
+    account_name = config.account_name
     
     # Kiểm tra thông tin có đầy đủ không
     if not all([bank_code, account_no, account_name]):
@@ -123,7 +154,7 @@ def tao_qr_code_bytes(id, config_file="config/pay_ment.json", sl=None, limit=Non
         return False, None, "Thiếu id"
     
     # Xử lý số tiền: amount = cost_str * (sl/limit) nếu có sl và limit
-    amount = xu_ly_amount(cost_str, sl=sl, limit=limit)
+    amount = xu_ly_amount(config.cost or 0, sl=sl, limit=limit)
     
     # Tạo add_info từ id và sl (chỉ thêm sl nếu không phải None)
     if sl is not None:  
@@ -131,30 +162,109 @@ def tao_qr_code_bytes(id, config_file="config/pay_ment.json", sl=None, limit=Non
     else:
         add_info = f"AUTO{id}END"
     
-    # URL encode add_info để đảm bảo ký tự đặc biệt không bị bỏ đi (giữ nguyên ký tự -)
-    add_info_encoded = quote(add_info, safe='-')
+    if QR_RENDER == "local":
+        success, qr_bytes, error_message = tao_qr_png(bank_code, account_no, amount, add_info, box_size=QR_BOX_SIZE)
+        if success or not QR_REMOTE_FALLBACK:
+            return success, qr_bytes, error_message
+        print(f"⚠️ Không tạo được QR tại chỗ ({error_message}), tải từ VietQR.io")
+        return tai_qr_vietqr_io(bank_code, account_no, account_name, amount, add_info)
     
-    # Tạo link chuẩn VietQR
-    url = f"https://img.vietqr.io/image/{bank_code}-{account_no}-compact.png?amount={amount}&addInfo={add_info_encoded}&accountName={account_name}"
+    success, qr_bytes, error_message = tai_qr_vietqr_io(bank_code, account_no, account_name, amount, add_info)
+    if success:
+        return True, qr_bytes, None
+    # Tải lỗi hoặc circuit breaker đang mở: tạo tại chỗ
+    local_success, local_bytes, _ = tao_qr_png(bank_code, account_no, amount, add_info, box_size=QR_BOX_SIZE)
+    if local_success:
+        return True, local_bytes, None
+    return False, None, error_message
+
+
+def tao_etag(qr_bytes):
+    """
+    ETag của ảnh QR (CRC32 và độ dài nội dung PNG)
+
+    Args:
+        qr_bytes: Nội dung ảnh PNG
+
+    Returns:
+        str: ETag dạng strong (gồm cả dấu ngoặc kép), ví dụ "1a2b3c4d-34c"
+    """
+    return f'"{zlib.crc32(qr_bytes) & 0xFFFFFFFF:08x}-{len(qr_bytes):x}"'
+
+
+def ma_hoa_base64(qr_bytes):
+    """
+    Mã hóa base64 ảnh QR thẳng từ memoryview (không tạo chuỗi str trung gian)
+
+    Returns:
+        bytes: Base64 (ASCII), không có xuống dòng
+    """
+    return binascii.b2a_base64(memoryview(qr_bytes), newline=False)
+
+
+def tao_json_qr(result, sl=None):
+    """
+    Ghép body JSON của /qr?format=json thành bytes
+
+    Base64 của ảnh được ghép thẳng vào body (không qua jsonify/str), nội dung giống jsonify:
+    key sắp xếp theo thứ tự chữ cái, không khoảng trắng, xuống dòng ở cuối
+
+    Args:
+        result: result_dict của xu_ly_qr_code (id, qr_bytes, có thể có qr_base64)
+        sl: Số lượng (None nếu không có)
+
+    Returns:
+        bytes: Body JSON {"id", "qr_code": "data:image/png;base64,...", "sl", "status_code", "success"}
+    """
+    qr_base64 = result.get('qr_base64') or ma_hoa_base64(result['qr_bytes'])
+    return b''.join((
+        b'{"id":', json.dumps(result['id']).encode('ascii'),
+        b',"qr_code":"data:image/png;base64,', qr_base64,
+        b'","sl":', json.dumps(sl).encode('ascii'),
+        b',"status_code":200,"success":true}\n',
+    ))
+
+
+def _tao_qr_cho_pool(sl):
+    """
+    Tạo một QR cho pool tạo sẵn (chạy trong thread nền)
     
-    try:
-        # Tải ảnh QR từ VietQR.io
-        response = requests.get(url, timeout=10)
-        
-        if response.status_code == 200:
-            return True, response.content, None
-        else:
-            return False, None, f"Không tải được QR từ VietQR.io (Status code: {response.status_code})"
-            
-    except Exception as e:
-        return False, None, f"Lỗi khi tải QR code: {e}"
+    Args:
+        sl: Số lượng (None là /qr không có sl)
+    
+    Returns:
+        tuple: (success, item, error_message) - item gồm id, qr_bytes, qr_base64 (bytes), etag và version
+               (config lúc tạo)
+    """
+    # Lấy phiên bản config trước khi tạo: config đổi trong lúc tạo thì QR này bị bỏ khi lấy ra
+    version = _phien_ban_config()
+    id = tao_id()
+    success, qr_bytes, error_message = tao_qr_code_bytes(id, sl=sl, limit=QR_LIMIT_CALCULATION)
+    if not success:
+        return False, None, error_message
+    return True, {
+        'id': id,
+        'qr_bytes': qr_bytes,
+        'qr_base64': ma_hoa_base64(qr_bytes),
+        'etag': tao_etag(qr_bytes),
+        'version': version
+    }, None
+
+
+def _phien_ban_config():
+    """Config thanh toán hiện tại (object đổi mỗi khi file config được đọc lại)"""
+    return get_payment_config("config/pay_ment.json")
+
+
+# Pool QR tạo sẵn cho các sl thường dùng (thread nền khởi động ở lần gọi /qr đầu tiên hoặc khi server chạy)
+qr_pool = QrPool(_tao_qr_cho_pool, QR_POOL_SL, QR_POOL_SIZE, QR_POOL_REFILL_PER_SEC, version=_phien_ban_config)
 
 
 def xu_ly_qr_code(sl=None):
     """
     Xử lý tạo QR code tự động:
-    1. Tạo ID ngẫu nhiên (20 ký tự)
-    2. Tạo QR code từ VietQR.io
+    1. Lấy QR tạo sẵn trong pool (nếu có cho sl này)
+    2. Nếu không có: tạo ID ngẫu nhiên (20 ký tự) và tạo QR code ngay
     3. Trả về QR code bytes
     
     Args:
@@ -165,27 +275,39 @@ def xu_ly_qr_code(sl=None):
         tuple: (success, result_dict, error_message)
         result_dict: {
             'id': str,
-            'qr_bytes': bytes
+            'qr_bytes': bytes,
+            'etag': str,
+            'qr_base64': bytes (chỉ có khi lấy từ pool)
         }
     """
     try:
-        # Tạo ID ngẫu nhiên (20 ký tự)
-        id = tao_id()
-        
-        # Giới hạn ban đầu để tính toán amount (mặc định 100)
-        limit_for_calculation = 100
-        
-        # Tạo QR code với sl và limit để tính toán amount
-        success, qr_bytes, error_message = tao_qr_code_bytes(id, sl=sl, limit=limit_for_calculation)
-        
-        if not success:
-            return False, None, error_message
-        
-        # Trả về kết quả
-        result = {
-            'id': id,
-            'qr_bytes': qr_bytes
-        }
+        item = qr_pool.pop(sl)
+        if item is not None:
+            id = item['id']
+            result = {
+                'id': id,
+                'qr_bytes': item['qr_bytes'],
+                'etag': item['etag'],
+                'qr_base64': item['qr_base64']
+            }
+        else:
+            qr_pool.start()
+            
+            # Tạo ID ngẫu nhiên (20 ký tự)
+            id = tao_id()
+            
+            # Tạo QR code với sl và limit để tính toán amount
+            success, qr_bytes, error_message = tao_qr_code_bytes(id, sl=sl, limit=QR_LIMIT_CALCULATION)
+            
+            if not success:
+                return False, None, error_message
+            
+            # Trả về kết quả
+            result = {
+                'id': id,
+                'qr_bytes': qr_bytes,
+                'etag': tao_etag(qr_bytes)
+            }
         
         # Tính toán add_info để hiển thị
         add_info_display = f"{id}-{sl}" if sl is not None else f"{id}"
@@ -2,75 +2,46 @@
 Module quản lý session đăng nhập
 Quản lý session với thời hạn 2 ngày
 """
-import json
 import os
 import secrets
+import sys
 import time
 from datetime import datetime, timedelta
 
+# Thêm thư mục gốc vào path để import utils
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if root_dir not in sys.path:
+    sys.path.insert(0, root_dir)
+from utils.storage import get_storage
+
 
 # Thời hạn session: 2 ngày (tính bằng giây)
 SESSION_DURATION = 2 * 24 * 60 * 60  # 2 ngày = 172800 giây
 
-# Đường dẫn file lưu session
-SESSION_FILE = "db/sessions.json"
-
-
-def get_session_file_path():
-    """
-    Lấy đường dẫn tuyệt đối của file session
-    
-    Returns:
-        str: Đường dẫn tuyệt đối đến file sessions.json
-    """
-    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    return os.path.join(base_dir, SESSION_FILE)
-
 
 def load_sessions():
     """
-    Đọc tất cả sessions từ file
+    Đọc tất cả sessions
     
     Returns:
         dict: Dictionary chứa tất cả sessions, key là token, value là session info
     """
     try:
-        session_path = get_session_file_path()
-        
-        # Tạo thư mục db nếu chưa tồn tại
-        os.makedirs(os.path.dirname(session_path), exist_ok=True)
-        
-        # Kiểm tra file có tồn tại không
-        if not os.path.exists(session_path):
-            return {}
-        
-        # Đọc file
-        with open(session_path, 'r', encoding='utf-8') as f:
-            content = f.read().strip()
-            if not content:
-                return {}
-            return json.loads(content)
-    except (json.JSONDecodeError, Exception) as e:
+        return get_storage().sessions.all()
+    except Exception as e:
         print(f"Lỗi khi đọc sessions: {e}")
         return {}
 
 
 def save_sessions(sessions):
     """
-    Lưu sessions vào file
+    Ghi đè toàn bộ sessions
     
     Args:
         sessions: Dictionary chứa tất cả sessions
     """
     try:
-        session_path = get_session_file_path()
-        
-        # Tạo thư mục db nếu chưa tồn tại
-        os.makedirs(os.path.dirname(session_path), exist_ok=True)
-        
-        # Ghi file
-        with open(session_path, 'w', encoding='utf-8') as f:
-            json.dump(sessions, f, ensure_ascii=False, indent=2)
+        get_storage().sessions.replace_all(sessions)
     except Exception as e:
         print(f"Lỗi khi lưu sessions: {e}")
 
@@ -100,17 +71,11 @@ def create_session(email):
             "expires_at": expires_at
         }
         
-        # Load sessions hiện tại
-        sessions = load_sessions()
-        
-        # Thêm session mới
-        sessions[token] = session_info
+        # Lưu session mới
+        get_storage().sessions.set(token, session_info)
         
-        # Xóa các session hết hạn trước khi lưu
-        clean_expired_sessions(sessions)
-        
-        # Lưu lại
-        save_sessions(sessions)
+        # Xóa các session hết hạn
+        clean_expired_sessions()
         
         print(f"✅ Đã tạo session cho email: {email}")
         return token
@@ -134,23 +99,20 @@ def verify_session(token):
         if not token:
             return False, None, "Token không được để trống"
         
-        # Load sessions
-        sessions = load_sessions()
+        # Lấy session theo token
+        session_info = get_storage().sessions.get(token)
         
         # Kiểm tra token có tồn tại không
-        if token not in sessions:
+        if session_info is None:
             return False, None, "Token không hợp lệ"
         
-        session_info = sessions[token]
-        
         # Kiểm tra thời gian hết hạn
         current_time = time.time()
         expires_at = session_info.get("expires_at", 0)
         
         if current_time > expires_at:
             # Xóa session hết hạn
-            del sessions[token]
-            save_sessions(sessions)
+            get_storage().sessions.delete(token)
             return False, None, "Session đã hết hạn"
         
         # Session hợp lệ
@@ -173,11 +135,7 @@ def delete_session(token):
         bool: True nếu xóa thành công, False nếu có lỗi
     """
     try:
-        sessions = load_sessions()
-        
-        if token in sessions:
-            del sessions[token]
-            save_sessions(sessions)
+        if get_storage().sessions.delete(token):
             print(f"✅ Đã xóa session: {token[:20]}...")
             return True
         
@@ -192,7 +150,7 @@ def clean_expired_sessions(sessions=None):
     Xóa tất cả các session đã hết hạn
     
     Args:
-        sessions: Dictionary sessions (nếu None thì sẽ load từ file)
+        sessions: Dictionary sessions (nếu None thì sẽ đọc toàn bộ sessions đã lưu)
     
     Returns:
         int: Số lượng session đã xóa
@@ -214,7 +172,7 @@ def clean_expired_sessions(sessions=None):
             del sessions[token]
         
         if expired_tokens:
-            save_sessions(sessions)
+            get_storage().sessions.delete_many(expired_tokens)
             print(f"✅ Đã xóa {len(expired_tokens)} session hết hạn")
         
         return len(expired_tokens)
@@ -234,10 +192,9 @@ def get_session_info(token):
         dict: Thông tin session hoặc None nếu không tìm thấy
     """
     try:
-        sessions = load_sessions()
+        session_info = get_storage().sessions.get(token)
         
-        if token in sessions:
-            session_info = sessions[token].copy()
+        if session_info is not None:
             # Chuyển đổi timestamp sang datetime string để dễ đọc
             if "created_at" in session_info:
                 session_info["created_at_str"] = datetime.fromtimestamp(session_info["created_at"]).strftime("%Y-%m-%d %H:%M:%S")
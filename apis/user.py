@@ -12,11 +12,13 @@ root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if root_dir not in sys.path:
     sys.path.insert(0, root_dir)
 
-from utils.db_lock import with_db_lock
-from apis.qr_code import doc_data_json, luu_data_json, tao_id
+from utils.db_lock import account_lock, with_account_lock, with_read_lock, with_structure_lock
+from utils.storage import get_storage
+from apis.qr_code import tao_id
 import datetime
 
 
+@with_read_lock
 def get_users():
     """
     Lấy danh sách tất cả users từ db/data.json
@@ -24,10 +26,11 @@ def get_users():
     Returns:
         list: Danh sách users
     """
-    return doc_data_json("db/data.json")
+    return get_storage().accounts.all()
 
 
-@with_db_lock
+@with_structure_lock
+@with_account_lock
 def delete_user(user_id):
     """
     Xóa user theo ID
@@ -38,47 +41,21 @@ def delete_user(user_id):
     Returns:
         tuple: (success: bool, message: str, data: dict)
     """
-    db_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'db', 'data.json')
-    
     try:
-        # Đọc file data.json
-        if not os.path.exists(db_path):
-            return False, "File db/data.json không tồn tại", None
-        
-        users = doc_data_json(db_path)
-        
-        # Kiểm tra users có phải là list không
-        if not isinstance(users, list):
-            return False, "Dữ liệu trong db/data.json không hợp lệ", None
-        
-        # Tìm user có id trùng khớp
-        found_index = None
-        found_user = None
-        
-        for index, user in enumerate(users):
-            if isinstance(user, dict) and user.get('id') == user_id:
-                found_index = index
-                found_user = user
-                break
+        # Xóa user khỏi store theo id (store tự ghi lại file)
+        found_user = get_storage().accounts.delete(user_id)
         
         # Nếu không tìm thấy user
-        if found_index is None:
+        if found_user is None:
             return False, f"Không tìm thấy user với id: {user_id}", None
         
-        # Xóa user khỏi danh sách
-        users.pop(found_index)
-        
-        # Lưu lại file
-        if luu_data_json(users, db_path):
-            return True, f"Đã xóa user thành công", found_user
-        else:
-            return False, "Lỗi khi lưu file", None
+        return True, f"Đã xóa user thành công", found_user
             
     except Exception as e:
         return False, f"Lỗi khi xóa user: {str(e)}", None
 
 
-@with_db_lock
+@with_structure_lock
 def create_user(limit, active=True):
     """
     Tạo user mới với ID ngẫu nhiên
@@ -90,50 +67,38 @@ def create_user(limit, active=True):
     Returns:
         tuple: (success: bool, message: str, data: dict)
     """
-    db_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'db', 'data.json')
-    
     try:
-        # Đọc file data.json
-        if not os.path.exists(db_path):
-            # Nếu file không tồn tại, tạo file mới với danh sách rỗng
-            users = []
-        else:
-            users = doc_data_json(db_path)
-        
-        # Kiểm tra users có phải là list không
-        if not isinstance(users, list):
-            return False, "Dữ liệu trong db/data.json không hợp lệ", None
-        
-        # Tạo ID ngẫu nhiên
-        new_id = tao_id()
-        
-        # Kiểm tra ID có trùng không (rất hiếm nhưng vẫn kiểm tra)
-        while any(user.get('id') == new_id for user in users if isinstance(user, dict)):
-            new_id = tao_id()
+        store = get_storage().accounts
         
-        # Tạo user mới
+        # Tạo user mới (id được gán bên dưới)
         new_user = {
-            "id": new_id,
+            "id": None,
             "limit": int(limit),
             "count": 0,
             "active": bool(active),
             "created_at": datetime.datetime.utcnow().isoformat() + "Z"
         }
         
-        # Thêm user vào danh sách
-        users.append(new_user)
-        
-        # Lưu lại file
-        if luu_data_json(users, db_path):
-            return True, f"Đã tạo user thành công", new_user
-        else:
-            return False, "Lỗi khi lưu file", None
+        while True:
+            # Tạo ID ngẫu nhiên
+            new_id = tao_id()
+            
+            # Kiểm tra ID có trùng không (rất hiếm nhưng vẫn kiểm tra) và thêm user dưới lock của
+            # id mới, để không trùng lúc với webhook thanh toán tạo tài khoản cùng id
+            with account_lock(new_id):
+                if store.get(new_id) is not None:
+                    continue
+                new_user["id"] = new_id
+                
+                # Thêm user vào store (store tự ghi lại file)
+                store.upsert(new_user)
+                return True, f"Đã tạo user thành công", new_user
             
     except Exception as e:
         return False, f"Lỗi khi tạo user: {str(e)}", None
 
 
-@with_db_lock
+@with_account_lock
 def update_user(user_id, **fields):
     """
     Cập nhật thông tin user
@@ -145,43 +110,22 @@ def update_user(user_id, **fields):
     Returns:
         tuple: (success: bool, message: str, data: dict)
     """
-    db_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'db', 'data.json')
-    
     try:
-        # Đọc file data.json
-        if not os.path.exists(db_path):
-            return False, "File db/data.json không tồn tại", None
-        
-        users = doc_data_json(db_path)
-        
-        # Kiểm tra users có phải là list không
-        if not isinstance(users, list):
-            return False, "Dữ liệu trong db/data.json không hợp lệ", None
+        store = get_storage().accounts
         
         # Tìm user có id trùng khớp
-        found_index = None
-        
-        for index, user in enumerate(users):
-            if isinstance(user, dict) and user.get('id') == user_id:
-                found_index = index
-                break
+        found_user = store.get(user_id)
         
         # Nếu không tìm thấy user
-        if found_index is None:
+        if found_user is None:
             return False, f"Không tìm thấy user với id: {user_id}", None
         
-        # Cập nhật các trường
-        updated_fields = []
-        for field, value in fields.items():
-            if field in users[found_index]:
-                users[found_index][field] = value
-                updated_fields.append(field)
+        # Chỉ cập nhật các trường đã có trong user
+        updated_fields = {field: value for field, value in fields.items() if field in found_user}
         
-        # Lưu lại file
-        if luu_data_json(users, db_path):
-            return True, f"Đã cập nhật user thành công", users[found_index]
-        else:
-            return False, "Lỗi khi lưu file", None
+        # Lưu lại qua store
+        updated_user = store.update(user_id, **updated_fields)
+        return True, f"Đã cập nhật user thành công", updated_user
             
     except Exception as e:
         return False, f"Lỗi khi cập nhật user: {str(e)}", None
@@ -290,6 +234,7 @@ def handle_update_user(user_id, fields_dict):
         return False, None, status_code, message
 
 
+@with_read_lock
 def search_user(user_id):
     """
     Tìm kiếm user theo ID
@@ -300,19 +245,7 @@ def search_user(user_id):
     Returns:
         tuple: (success: bool, message: str, data: dict or list)
     """
-    db_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'db', 'data.json')
-    
     try:
-        # Đọc file data.json
-        if not os.path.exists(db_path):
-            return False, "File db/data.json không tồn tại", None
-        
-        users = doc_data_json(db_path)
-        
-        # Kiểm tra users có phải là list không
-        if not isinstance(users, list):
-            return False, "Dữ liệu trong db/data.json không hợp lệ", None
-        
         # Tìm user có id chứa chuỗi tìm kiếm (case-insensitive)
         if not user_id:
             return False, "user_id không được để trống", None
@@ -320,7 +253,7 @@ def search_user(user_id):
         user_id_lower = user_id.lower()
         found_users = []
         
-        for user in users:
+        for user in get_storage().accounts.all():
             if isinstance(user, dict):
                 user_id_in_db = str(user.get('id', '')).lower()
                 if user_id_lower in user_id_in_db:
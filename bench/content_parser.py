@@ -0,0 +1,180 @@
+"""
+Benchmark tách nội dung chuyển khoản SePay: parser một lượt str.find (utils/sepay_content.py) so với
+cách find/split nhiều lượt trước đây và parser regex AUTO...END, trên một tập nội dung chuyển khoản giống thực tế của nhiều ngân hàng
+
+Chạy:
+    python bench/content_parser.py --size 20000 --repeat 5
+"""
+import argparse
+import os
+import random
+import re
+import string
+import sys
+import time
+
+# Thêm thư mục gốc vào path để import utils
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if root_dir not in sys.path:
+    sys.path.insert(0, root_dir)
+
+from utils.sepay_content import parse_sepay_content, tach_id_sl
+
+# Parser regex dùng trước đây (đoạn giữa AUTO và END gần nhất phía sau, viết dạng "unrolled")
+_SEGMENT_RE = re.compile(r'AUTO([^E]*(?:E(?!ND)[^E]*)*)END')
+
+# Mẫu nội dung theo từng ngân hàng ({ma} là đoạn AUTO...END, {so}/{ten} là số tài khoản/tên người chuyển)
+MAU_NOI_DUNG = [
+    "MBVCB.{so}.{ref} {ma} tu {so} {ten} toi 0966549624 {ten} tai MB- Ma GD ACSP/ br{ref}",
+    "IBFT {ma} {ten} chuyen tien",
+    "CT DEN:{ref} {ma}",
+    "TKThe :{so}, tai MB. {ma} -CTLNHIDO000{ref}",
+    "{ten} chuyen khoan {ma} FT{ref}",
+    "REM Tfr Ac: {so} {ma} O@L_{ref}",
+    "{ma}",
+    "QR - {ma} - {ten}",
+    "NHAN TU {so} TRACE {ref} ND {ma}\nGD {ref}",
+    "{ten} chuyen tien",
+    "AUTOloi-50END sau do {ma}",
+]
+TEN = ["HOANG NGOC HIEP", "NGUYEN VAN A", "TRAN THI B", "LE VAN CUONG", "PHAM MINH DUC"]
+
+
+def tao_ma(rng):
+    """Tạo đoạn AUTO{id}-{sl}END hoặc AUTO{id}{sl}END"""
+    id = ''.join(rng.choice(string.ascii_letters + string.digits) for _ in range(20))
+    sl = str(rng.choice([10, 20, 50, 100, 500]))
+    return f"AUTO{id}{'-' if rng.random() < 0.7 else ''}{sl}END"
+
+
+def tao_du_lieu(size, seed=1):
+    """
+    Tạo tập nội dung chuyển khoản
+
+    Args:
+        size: Số nội dung
+        seed: Seed ngẫu nhiên (cùng seed thì cùng dữ liệu)
+
+    Returns:
+        list: Danh sách chuỗi content
+    """
+    rng = random.Random(seed)
+    return [
+        rng.choice(MAU_NOI_DUNG).format(
+            ma=tao_ma(rng),
+            so=''.join(rng.choice(string.digits) for _ in range(10)),
+            ref=''.join(rng.choice(string.digits) for _ in range(6)),
+            ten=rng.choice(TEN),
+        )
+        for _ in range(size)
+    ]
+
+
+def tach_cu(content):
+    """Cách tách cũ: tìm AUTO/END bằng find, rồi tách id_sl theo hai nhánh (không in log)"""
+    content_str = str(content).strip()
+    id_sl = content_str
+    if "AUTO" in content_str and "END" in content_str:
+        auto_index = content_str.find("AUTO")
+        end_index = content_str.find("END", auto_index)
+        if auto_index != -1 and end_index != -1:
+            id_sl = content_str[auto_index + len("AUTO"):end_index].strip()
+
+    if len(id_sl) < 20:
+        return None, None
+    if "-" in id_sl:
+        parts = id_sl.split("-", 1)
+        id = parts[0].strip()
+        sl = parts[1].strip() if len(parts) > 1 else ""
+        if len(id) < 20:
+            return None, None
+    else:
+        id = id_sl[:20]
+        sl = id_sl[20:]
+    if not sl:
+        return None, None
+    return id, sl
+
+
+def tach_cu_co_log(content):
+    """Như tach_cu kèm dòng log mỗi lần parse như parse_content trước đây (stdout chuyển vào os.devnull)"""
+    id, sl = tach_cu(content)
+    print(f"📝 Parse content: Tìm thấy AUTO...END, lấy đoạn giữa: {id}{sl}")
+    return id, sl
+
+
+def tach_regex(content):
+    """Parser regex: đoạn AUTO...END hợp lệ đầu tiên, trả về ParsedContent như parse_sepay_content"""
+    if not isinstance(content, str):
+        content = str(content) if content is not None else ''
+    dau_tien = None
+    for segment in _SEGMENT_RE.finditer(content):
+        result = tach_id_sl(segment.group(1))
+        if result.error is None:
+            return result
+        if dau_tien is None:
+            dau_tien = result
+    return dau_tien if dau_tien is not None else tach_id_sl(content)
+
+
+def tach_moi(content):
+    result = parse_sepay_content(content)
+    return result.id, result.sl
+
+
+def do_toc_do(func, corpus, repeat):
+    """Trả về thời gian tốt nhất (giây) để tách toàn bộ corpus"""
+    best = None
+    for _ in range(repeat):
+        bat_dau = time.perf_counter()
+        for content in corpus:
+            func(content)
+        elapsed = time.perf_counter() - bat_dau
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark tách nội dung chuyển khoản SePay")
+    parser.add_argument("--size", type=int, default=20000, help="Số nội dung chuyển khoản")
+    parser.add_argument("--repeat", type=int, default=5, help="Số lần chạy (lấy lần nhanh nhất)")
+    parser.add_argument("--seed", type=int, default=1, help="Seed tạo dữ liệu")
+    args = parser.parse_args(argv)
+
+    corpus = tao_du_lieu(args.size, args.seed)
+
+    # Kiểm tra kết quả: chỉ được khác khi đoạn AUTO...END đầu tiên không hợp lệ (parser mới dùng đoạn hợp lệ sau đó)
+    khac = [content for content in corpus if tach_cu(content) != tach_moi(content)]
+    khac_regex = sum(1 for content in corpus if tach_regex(content) != parse_sepay_content(content))
+    hop_le = sum(1 for content in corpus if tach_moi(content)[0] is not None)
+
+    cu = do_toc_do(tach_cu, corpus, args.repeat)
+    regex = do_toc_do(tach_regex, corpus, args.repeat)
+    moi = do_toc_do(parse_sepay_content, corpus, args.repeat)
+    stdout = sys.stdout
+    with open(os.devnull, 'w', encoding='utf-8') as devnull:
+        sys.stdout = devnull
+        try:
+            cu_co_log = do_toc_do(tach_cu_co_log, corpus, args.repeat)
+        finally:
+            sys.stdout = stdout
+    print(f"📋 {len(corpus)} nội dung, {hop_le} hợp lệ, {len(khac)} khác cách cũ (nhiều đoạn AUTO...END), "
+          f"{khac_regex} khác parser regex")
+    print(f"   • find/split + log (cũ): {cu_co_log * 1e6 / len(corpus):.2f} µs/nội dung ({len(corpus) / cu_co_log:,.0f}/s)")
+    print(f"   • find/split (cũ):       {cu * 1e6 / len(corpus):.2f} µs/nội dung ({len(corpus) / cu:,.0f}/s)")
+    print(f"   • regex:                 {regex * 1e6 / len(corpus):.2f} µs/nội dung ({len(corpus) / regex:,.0f}/s)")
+    print(f"   • str.find (mới):        {moi * 1e6 / len(corpus):.2f} µs/nội dung ({len(corpus) / moi:,.0f}/s)")
+    # So sánh cùng điều kiện: chỉ các nội dung có một đoạn AUTO...END (cách cũ không tìm đoạn phía sau)
+    mot_doan = [content for content in corpus if content.count("AUTO") == 1]
+    cu = do_toc_do(tach_cu, mot_doan, args.repeat)
+    regex = do_toc_do(tach_regex, mot_doan, args.repeat)
+    moi = do_toc_do(parse_sepay_content, mot_doan, args.repeat)
+    print(f"   Chỉ {len(mot_doan)} nội dung có một đoạn AUTO...END: find/split (cũ) {cu * 1e6 / len(mot_doan):.2f} µs, "
+          f"regex {regex * 1e6 / len(mot_doan):.2f} µs, str.find (mới) {moi * 1e6 / len(mot_doan):.2f} µs")
+    for content in khac[:3]:
+        print(f"   ↳ {content!r}: {tach_cu(content)} → {tach_moi(content)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
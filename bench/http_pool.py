@@ -0,0 +1,143 @@
+"""
+Benchmark tải ảnh QR: requests.get mỗi lần (kết nối mới mỗi lần) so với session dùng chung có pool
+kết nối keep-alive (utils/http_pool.py)
+
+Mặc định chạy với một server HTTP cục bộ trả về ảnh PNG; --connect-ms giả lập thời gian thiết lập kết nối
+(DNS + TCP + TLS tới img.vietqr.io) cho mỗi kết nối mới. Dùng --url để đo với server thật.
+
+Chạy:
+    python bench/http_pool.py --count 400 --threads 8 --connect-ms 30
+    python bench/http_pool.py --url "https://img.vietqr.io/image/MB-0966549624-compact.png?amount=1000" --count 20
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Thêm thư mục gốc vào path để import utils
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if root_dir not in sys.path:
+    sys.path.insert(0, root_dir)
+
+import requests
+
+from utils.http_pool import PooledHttpClient
+from utils.vietqr import tao_qr_png
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Trả về ảnh PNG cố định, giữ kết nối (HTTP/1.1); chờ connect_ms khi có kết nối mới"""
+
+    protocol_version = "HTTP/1.1"
+    # Header và body được gửi bằng hai lần ghi: tắt Nagle để kết nối keep-alive không bị trễ ACK 40 ms
+    disable_nagle_algorithm = True
+    body = b''
+    connect_ms = 0
+    connections = 0
+    _lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        with _Handler._lock:
+            _Handler.connections += 1
+        if self.connect_ms:
+            time.sleep(self.connect_ms / 1000)
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def chay_server(connect_ms):
+    """Khởi động server cục bộ, trả về (server, url)"""
+    _, png, _ = tao_qr_png("MB", "0966549624", 1000, "AUTOabcdefghijabcdefghij-50END")
+    _Handler.body = png or b'\x89PNG' + b'\x00' * 800
+    _Handler.connect_ms = connect_ms
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/qr.png"
+
+
+def do(func, url, count, threads):
+    """
+    Gọi func(url) count lần trên threads thread
+
+    Returns:
+        tuple: (danh sách thời gian ms đã sắp xếp, số lần lỗi, tổng thời gian giây)
+    """
+    def mot_lan(_):
+        bat_dau = time.perf_counter()
+        ok = func(url)
+        return (time.perf_counter() - bat_dau) * 1000, ok
+
+    bat_dau = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        ket_qua = list(executor.map(mot_lan, range(count)))
+    tong = time.perf_counter() - bat_dau
+    times = sorted(ms for ms, ok in ket_qua if ok)
+    return times, sum(1 for _, ok in ket_qua if not ok), tong
+
+
+def in_ket_qua(ten, count, ket_qua, connections=None):
+    times, loi, tong = ket_qua
+    if not times:
+        print(f"   • {ten}: không lần nào thành công ({loi} lỗi)")
+        return
+    p50 = times[len(times) // 2]
+    p99 = times[min(int(len(times) * 0.99), len(times) - 1)]
+    them = f", {connections} kết nối" if connections is not None else ""
+    print(f"   • {ten}: p50 {p50:.2f} ms, p99 {p99:.2f} ms, {count / tong:,.0f} req/s, {loi} lỗi{them}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark requests.get mỗi lần so với session dùng chung có pool")
+    parser.add_argument("--count", type=int, default=400, help="Số lần tải mỗi cách")
+    parser.add_argument("--threads", type=int, default=8, help="Số thread tải đồng thời")
+    parser.add_argument("--connect-ms", type=float, default=30,
+                        help="Server cục bộ: mili giây giả lập thiết lập mỗi kết nối mới (DNS + TCP + TLS)")
+    parser.add_argument("--pool-size", type=int, default=10, help="Số kết nối tối đa của pool")
+    parser.add_argument("--url", help="Đo với URL thật thay vì server cục bộ")
+    args = parser.parse_args(argv)
+
+    server = None
+    url = args.url
+    if not url:
+        server, url = chay_server(args.connect_ms)
+        print(f"📋 Server cục bộ {url}, giả lập {args.connect_ms:g} ms cho mỗi kết nối mới")
+    else:
+        print(f"📋 {url}")
+
+    def tai_moi_lan(url):
+        response = requests.get(url, timeout=10)
+        return response.status_code == 200 and bool(response.content)
+
+    client = PooledHttpClient(pool_size=args.pool_size, timeout=10, retries=0)
+
+    def tai_pool(url):
+        return client.get(url)[0]
+
+    try:
+        _Handler.connections = 0
+        ket_qua = do(tai_moi_lan, url, args.count, args.threads)
+        in_ket_qua("requests.get mỗi lần", args.count, ket_qua, _Handler.connections if server else None)
+        _Handler.connections = 0
+        ket_qua = do(tai_pool, url, args.count, args.threads)
+        in_ket_qua(f"session dùng chung (pool {args.pool_size})", args.count, ket_qua, _Handler.connections if server else None)
+    finally:
+        if server is not None:
+            server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
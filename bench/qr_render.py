@@ -0,0 +1,109 @@
+"""
+Benchmark tạo ảnh QR cho /qr: tạo tại chỗ (utils/vietqr.py) so với tải từ img.vietqr.io
+
+Chạy:
+    python bench/qr_render.py --count 200 --remote 20
+    python bench/qr_render.py --remote 0          # chỉ đo tạo tại chỗ (không có mạng)
+"""
+import argparse
+import os
+import random
+import string
+import sys
+import time
+
+# Thêm thư mục gốc vào path để import apis/utils
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if root_dir not in sys.path:
+    sys.path.insert(0, root_dir)
+
+from utils.payment_config import get_payment_config
+from utils.vietqr import tao_qr_png
+
+
+def tao_noi_dung(rng):
+    """Tạo nội dung chuyển khoản AUTO{id}-{sl}END giống /qr"""
+    id = ''.join(rng.choice(string.ascii_letters + string.digits) for _ in range(20))
+    sl = rng.choice([10, 20, 50, 100])
+    return f"AUTO{id}-{sl}END", sl
+
+
+def phan_vi(values, p):
+    """Phân vị p (0-100) của danh sách đã sắp xếp"""
+    if not values:
+        return None
+    return values[min(int(len(values) * p / 100), len(values) - 1)]
+
+
+def do(func, count, rng):
+    """
+    Gọi func(add_info, sl) count lần
+
+    Returns:
+        tuple: (danh sách thời gian ms đã sắp xếp, số lần lỗi, lỗi gần nhất, kích thước ảnh gần nhất)
+    """
+    times = []
+    loi = 0
+    loi_cuoi = None
+    size = None
+    for _ in range(count):
+        add_info, sl = tao_noi_dung(rng)
+        bat_dau = time.perf_counter()
+        success, qr_bytes, error_message = func(add_info, sl)
+        elapsed = (time.perf_counter() - bat_dau) * 1000
+        if success:
+            times.append(elapsed)
+            size = len(qr_bytes)
+        else:
+            loi += 1
+            loi_cuoi = error_message
+    times.sort()
+    return times, loi, loi_cuoi, size
+
+
+def in_ket_qua(ten, count, ket_qua):
+    times, loi, loi_cuoi, size = ket_qua
+    if times:
+        print(f"   • {ten}: p50 {phan_vi(times, 50):.2f} ms, p99 {phan_vi(times, 99):.2f} ms, "
+              f"max {times[-1]:.2f} ms, ảnh {size:,} byte ({len(times)}/{count} thành công)")
+    else:
+        print(f"   • {ten}: không lần nào thành công")
+    if loi:
+        print(f"     ↳ {loi} lỗi, lỗi gần nhất: {loi_cuoi}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark tạo ảnh QR tại chỗ so với tải từ img.vietqr.io")
+    parser.add_argument("--count", type=int, default=200, help="Số ảnh QR tạo tại chỗ")
+    parser.add_argument("--remote", type=int, default=10, help="Số ảnh tải từ img.vietqr.io (0 là bỏ qua)")
+    parser.add_argument("--config", default=os.path.join(root_dir, "config", "pay_ment.json"),
+                        help="File config thanh toán (mặc định config/pay_ment.json)")
+    parser.add_argument("--seed", type=int, default=1, help="Seed tạo nội dung")
+    args = parser.parse_args(argv)
+
+    config = get_payment_config(args.config)
+    if config.error and not config.data:
+        print(f"❌ {config.error}")
+        return 1
+    cost = config.cost or 0
+    limit = config.limit or 100
+
+    def tai_cho(add_info, sl):
+        return tao_qr_png(config.bank, config.account_no, int(cost * sl / limit), add_info)
+
+    print(f"📋 {config.bank} - {config.account_no}, COST={cost}, LIMIT={limit}")
+    in_ket_qua("tạo tại chỗ (EMVCo + PNG)", args.count, do(tai_cho, args.count, random.Random(args.seed)))
+
+    if args.remote > 0:
+        # Import ở đây để chạy được phần đo tại chỗ khi chưa cài requests
+        from apis.qr_code import tai_qr_vietqr_io
+
+        def tai_remote(add_info, sl):
+            return tai_qr_vietqr_io(config.bank, config.account_no, config.account_name, int(cost * sl / limit), add_info)
+
+        in_ket_qua("tải từ img.vietqr.io", args.remote, do(tai_remote, args.remote, random.Random(args.seed)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+"""
+Benchmark body response của /qr: JSON qua jsonify (base64 → str → f-string → json) so với JSON ghép thẳng
+thành bytes (base64 từ memoryview, apis/qr_code.tao_json_qr) và ảnh PNG (format=image, id/ETag trong header)
+
+Đo kích thước body và thời gian tạo body (không tính thời gian tạo ảnh QR). jsonify được giả lập bằng
+json.dumps như Flask (sort_keys, không khoảng trắng, xuống dòng ở cuối) nên không cần cài Flask.
+
+Chạy:
+    python bench/qr_response.py --count 2000
+"""
+import argparse
+import base64
+import json
+import os
+import random
+import string
+import sys
+import time
+
+# Thêm thư mục gốc vào path để import apis/utils
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if root_dir not in sys.path:
+    sys.path.insert(0, root_dir)
+
+from apis.qr_code import ma_hoa_base64, tao_etag, tao_json_qr
+from utils.vietqr import tao_qr_png
+
+
+def json_cu(result, sl):
+    """Body JSON như trước: base64 → str, f-string data URI, jsonify"""
+    qr_base64 = base64.b64encode(result['qr_bytes']).decode('utf-8')
+    data = {
+        "success": True,
+        "status_code": 200,
+        "id": result['id'],
+        "qr_code": f"data:image/png;base64,{qr_base64}",
+        "sl": sl
+    }
+    return f"{json.dumps(data, sort_keys=True, separators=(',', ':'))}\n".encode('utf-8')
+
+
+def json_moi(result, sl):
+    """Body JSON ghép thẳng thành bytes, base64 mã hóa trong request"""
+    return tao_json_qr(result, sl)
+
+
+def json_pool(result, sl):
+    """Body JSON khi QR lấy từ pool (base64 đã tạo sẵn ở thread nền)"""
+    return tao_json_qr(result, sl)
+
+
+def anh_png(result, sl):
+    """Body của format=image: chính ảnh PNG (ETag đã có trong result)"""
+    return result['qr_bytes']
+
+
+def do(func, items, repeat):
+    """
+    Gọi func cho mỗi item, lặp repeat vòng
+
+    Returns:
+        tuple: (danh sách thời gian µs đã sắp xếp, kích thước body trung bình)
+    """
+    times = []
+    tong_size = 0
+    for _ in range(repeat):
+        for result, sl in items:
+            bat_dau = time.perf_counter()
+            body = func(result, sl)
+            times.append((time.perf_counter() - bat_dau) * 1e6)
+            tong_size += len(body)
+    times.sort()
+    return times, tong_size / max(len(times), 1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark body JSON/ảnh của /qr")
+    parser.add_argument("--count", type=int, default=200, help="Số ảnh QR khác nhau")
+    parser.add_argument("--repeat", type=int, default=10, help="Số vòng lặp qua các ảnh")
+    parser.add_argument("--box-size", type=int, default=10, help="Số pixel mỗi ô (QR_BOX_SIZE)")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(1)
+    items = []
+    for _ in range(args.count):
+        id = ''.join(rng.choice(string.ascii_letters + string.digits) for _ in range(20))
+        sl = rng.choice([None, 50, 100])
+        add_info = f"AUTO{id}-{sl}END" if sl is not None else f"AUTO{id}END"
+        success, png, error_message = tao_qr_png("MB", "0966549624", 1000, add_info, box_size=args.box_size)
+        if not success:
+            print(f"❌ {error_message}")
+            return 1
+        items.append(({'id': id, 'qr_bytes': png, 'etag': tao_etag(png)}, sl))
+    pool_items = [(dict(result, qr_base64=ma_hoa_base64(result['qr_bytes'])), sl) for result, sl in items]
+
+    # Body JSON mới phải giống hệt body cũ
+    for result, sl in items[:20]:
+        if json_moi(result, sl) != json_cu(result, sl):
+            print("❌ Body JSON mới khác body jsonify")
+            return 1
+
+    png_size = sum(len(result['qr_bytes']) for result, _ in items) / len(items)
+    print(f"📋 {args.count} ảnh QR, {args.repeat} vòng, PNG trung bình {png_size:.0f} bytes")
+    for ten, func, data in (
+        ("JSON jsonify (trước đây)", json_cu, items),
+        ("JSON bytes + memoryview", json_moi, items),
+        ("JSON bytes, base64 từ pool", json_pool, pool_items),
+        ("format=image (PNG)", anh_png, items),
+    ):
+        times, size = do(func, data, args.repeat)
+        p50 = times[len(times) // 2]
+        p99 = times[min(int(len(times) * 0.99), len(times) - 1)]
+        print(f"   • {ten}: body {size:.0f} bytes ({size / png_size:.2f}× PNG), p50 {p50:.2f} µs, p99 {p99:.2f} µs")
+
+    times, _ = do(lambda result, sl: tao_etag(result['qr_bytes']).encode(), items, args.repeat)
+    print(f"   • ETag (CRC32): p50 {times[len(times) // 2]:.2f} µs")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
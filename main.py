@@ -6,7 +6,6 @@ Flask API đơn giản để tạo QR code thanh toán
 import sys
 import socket
 import json
-import base64
 import os
 from flask import Flask, jsonify, Response, request, send_from_directory
 
@@ -85,6 +84,23 @@ except ImportError as e:
     print(f"❌ Lỗi khi import apis.user: {e}")
     # Không exit vì có thể chưa có module này
 
+# Import storage dùng chung (backend theo config/db.json) và lock manager
+from utils.storage import get_storage
+from utils.db_config import doc_db_config
+from utils.db_lock import LockTimeout, lock_stats
+from utils import json_codec
+from utils.pending_compaction import bat_dau_nen_dinh_ky
+from utils.webhook_queue import doc_webhook_mode, get_webhook_queue, ghi_log_webhook
+from utils.sepay_content import parse_sepay_content
+from utils.payment_config import payment_config_stats
+from utils.http_pool import get_qr_http_client
+from utils.vietqr import qr_cache_stats
+
+# Chế độ xử lý webhook /authentication (đọc một lần khi khởi động, đổi cần khởi động lại server)
+WEBHOOK_MODE = doc_webhook_mode()
+# Ghi mọi webhook hợp lệ vào db/webhook_log.jsonl (để replay/khôi phục)
+WEBHOOK_LOG = bool(doc_db_config().get("WEBHOOK_LOG"))
+
 
 def lay_ip_local():
     """Lấy địa chỉ IP local của máy"""
@@ -136,6 +152,49 @@ def xac_thuc_token(token):
     return token == valid_token
 
 
+def kiem_tra_danh_sach(json_data, field, config_key):
+    """
+    Kiểm tra trường danh sách của các API theo lô
+
+    Args:
+        json_data: JSON body của request
+        field: Tên trường danh sách ('ids', 'items')
+        config_key: Key trong config/db.json chứa số phần tử tối đa
+
+    Returns:
+        tuple: (danh_sach: list, loi: str) - loi là None nếu hợp lệ
+    """
+    if not json_data:
+        return None, "Request phải chứa JSON body"
+    
+    items = json_data.get(field)
+    if items is None:
+        return None, f"Thiếu trường '{field}' trong JSON body"
+    
+    if not isinstance(items, list) or not items:
+        return None, f"Trường '{field}' phải là danh sách không rỗng"
+    
+    gioi_han = int(doc_db_config().get(config_key) or 0)
+    if gioi_han and len(items) > gioi_han:
+        return None, f"Trường '{field}' có tối đa {gioi_han} phần tử, nhận được: {len(items)}"
+    
+    return items, None
+
+
+def loi_400(message):
+    """Response 400 (kèm header CORS) cho request không hợp lệ"""
+    print(f"❌ {message}")
+    response = jsonify({
+        "success": False,
+        "status_code": 400,
+        "message": message
+    })
+    response.headers.add('Access-Control-Allow-Origin', '*')
+    response.headers.add('Access-Control-Allow-Methods', 'POST')
+    response.headers.add('Access-Control-Allow-Headers', 'Content-Type, Authorization')
+    return response, 400
+
+
 def in_thong_tin_api(port, local_ip):
     """In thông tin các API endpoints"""
     print("="*60)
@@ -153,6 +212,11 @@ def in_thong_tin_api(port, local_ip):
     print(f"   • POST http://localhost:{port}/authentication  - API authentication (hiển thị thông tin nhận được)")
     print(f"   • POST http://localhost:{port}/add_count       - Chuẩn bị tăng count cho tài khoản theo id (tạo pending request)")
     print(f"   • POST http://localhost:{port}/verify_count    - Verify và thực hiện tăng count hoặc hủy request")
+    print(f"   • POST http://localhost:{port}/consume         - Tăng count ngay trong một bước (không cần verify)")
+    print(f"   • POST http://localhost:{port}/add_count_batch - Tạo pending request cho nhiều id trong một request")
+    print(f"   • POST http://localhost:{port}/verify_count_batch - Verify nhiều request add_count trong một request")
+    print(f"   • POST http://localhost:{port}/check          - Kiểm tra trạng thái tài khoản theo id")
+    print(f"   • POST http://localhost:{port}/check_batch    - Kiểm tra nhiều id trong một request")
     print(f"   • POST http://localhost:{port}/creat_otp      - Tạo và gửi mã OTP qua email")
     print(f"   • POST http://localhost:{port}/check_login    - Kiểm tra mã OTP để đăng nhập (trả về session token)")
     print(f"   • GET  http://localhost:{port}/dashboard      - Trang dashboard quản lý hệ thống")
@@ -160,6 +224,7 @@ def in_thong_tin_api(port, local_ip):
     print(f"   • POST http://localhost:{port}/logout         - Đăng xuất (xóa session)")
     print(f"   • GET  http://localhost:{port}/users           - Lấy danh sách users từ db/data.json")
     print(f"   • GET  http://localhost:{port}/users/search    - Tìm kiếm user theo ID (query: ?id=<user_id>)")
+    print(f"   • GET  http://localhost:{port}/stats           - Thống kê vận hành (backend lưu trữ, lock)")
     print(f"   • GET  http://localhost:{port}/config          - Lấy danh sách tất cả config")
     print(f"   • GET  http://localhost:{port}/config/<name>   - Lấy config theo tên file")
     print(f"   • GET  http://localhost:{port}/config/<name>/fields - Lấy danh sách các trường")
@@ -180,6 +245,7 @@ def qr_code_endpoint():
     Query Parameters:
         - sl (optional): Số lượng để tính toán số tiền trong QR code
         - format (optional): Định dạng trả về. 'json' để nhận JSON với id và qr_code base64 (mặc định), 'image' để nhận ảnh PNG với id trong header X-QR-ID
+          (nhỏ hơn JSON khoảng 1/3, không mã hóa base64; header ETag là CRC32 và độ dài ảnh)
     
     Returns:
         - 200: JSON với id và qr_code base64 (mặc định) hoặc Ảnh QR code (image/png) nếu format=image
@@ -233,14 +299,8 @@ def qr_code_endpoint():
     
     # Nếu format=json, trả về JSON với id và qr_code base64
     if format_param == 'json':
-        qr_base64 = base64.b64encode(qr_bytes).decode('utf-8')
-        response = jsonify({
-            "success": True,
-            "status_code": 200,
-            "id": id,
-            "qr_code": f"data:image/png;base64,{qr_base64}",
-            "sl": sl
-        })
+        # Body được ghép thẳng thành bytes (base64 mã hóa từ memoryview, QR lấy từ pool đã có sẵn base64)
+        response = Response(qr_code.tao_json_qr(result, sl), mimetype='application/json')
         response.headers.add('Access-Control-Allow-Origin', '*')
         response.headers.add('Access-Control-Allow-Methods', 'GET, OPTIONS')
         response.headers.add('Access-Control-Allow-Headers', 'Content-Type')
@@ -253,13 +313,14 @@ def qr_code_endpoint():
         headers={
             'Content-Disposition': f'inline; filename=qr_{id}.png',
             'X-QR-ID': id,  # Thêm id vào header
+            'ETag': result['etag'],
             'Cache-Control': 'no-cache, no-store, must-revalidate',
             'Pragma': 'no-cache',
             'Expires': '0',
             'Access-Control-Allow-Origin': '*',
             'Access-Control-Allow-Methods': 'GET, OPTIONS',
             'Access-Control-Allow-Headers': 'Content-Type',
-            'Access-Control-Expose-Headers': 'X-QR-ID'  # Cho phép client đọc header này
+            'Access-Control-Expose-Headers': 'X-QR-ID, ETag'  # Cho phép client đọc các header này
         }
     )
 
@@ -287,7 +348,8 @@ def authentication_endpoint():
     }
     
     Returns:
-        - 200: Request đã được xử lý thành công (JSON)
+        - 200: Request đã được xử lý thành công, hoặc đã được ghi vào hàng đợi khi WEBHOOK_MODE = "queue"
+               ("queued": true) (JSON)
         - 400: Request không hợp lệ (JSON)
         - 500: Lỗi server (JSON)
     
@@ -356,15 +418,75 @@ def authentication_endpoint():
     print(f"   • content (gốc): {content}")
     print(f"   • transferAmount: {transfer_amount}")
     
-    # Parse content để lấy id_sl (nếu có .CT thì lấy phần trước .CT)
-    id_sl = authencation.parse_content(content)
-    print(f"   • id_sl (sau parse): {id_sl}")
+    # Lưu payload gốc để có thể replay/khôi phục (lỗi ghi log không chặn việc xử lý thanh toán)
+    if WEBHOOK_LOG:
+        try:
+            ghi_log_webhook(json_data)
+        except Exception as e:
+            print(f"⚠️ Lỗi khi ghi log webhook: {e}")
+    
+    # SePay gửi lại webhook khi chưa nhận được phản hồi: giao dịch đã xử lý thì trả lời ngay,
+    # không đọc/ghi lại data.json (tránh reset count/limit của tài khoản)
+    transaction_key = authencation.khoa_giao_dich(json_data)
+    da_xu_ly = authencation.giao_dich_da_xu_ly(transaction_key)
+    if da_xu_ly is not None:
+        print(f"🔁 Giao dịch {transaction_key} đã được xử lý trước đó, bỏ qua")
+        print("="*60 + "\n")
+        response = jsonify({
+            "success": True,
+            "status_code": 200,
+            "message": "Giao dịch đã được xử lý trước đó",
+            "duplicate": True,
+            "data": da_xu_ly.get('data')
+        })
+        response.headers.add('Access-Control-Allow-Origin', '*')
+        response.headers.add('Access-Control-Allow-Methods', 'POST')
+        response.headers.add('Access-Control-Allow-Headers', 'Content-Type, Authorization')
+        return response, 200
+    
+    # Chế độ hàng đợi: ghi payload vào db/webhook_queue.jsonl rồi trả lời ngay,
+    # thread nền xử lý theo lô (thời gian phản hồi không phụ thuộc kích thước data.json)
+    if WEBHOOK_MODE == "queue":
+        try:
+            queue = get_webhook_queue()
+            queue.start(authencation.xu_ly_thanh_toan_batch)
+            queue.put(json_data)
+        except Exception as e:
+            print(f"❌ Lỗi khi ghi webhook vào hàng đợi: {e}")
+            print("="*60 + "\n")
+            response = jsonify({
+                "success": False,
+                "status_code": 500,
+                "message": f"Không thể ghi webhook vào hàng đợi: {str(e)}"
+            })
+            response.headers.add('Access-Control-Allow-Origin', '*')
+            response.headers.add('Access-Control-Allow-Methods', 'POST')
+            response.headers.add('Access-Control-Allow-Headers', 'Content-Type, Authorization')
+            return response, 500
+        
+        print("📥 Đã ghi webhook vào hàng đợi, sẽ được xử lý nền")
+        print("="*60 + "\n")
+        response = jsonify({
+            "success": True,
+            "status_code": 200,
+            "message": "Đã nhận webhook, giao dịch đang được xử lý",
+            "queued": True
+        })
+        response.headers.add('Access-Control-Allow-Origin', '*')
+        response.headers.add('Access-Control-Allow-Methods', 'POST')
+        response.headers.add('Access-Control-Allow-Headers', 'Content-Type, Authorization')
+        return response, 200
+    
+    # Parse content một lần để lấy id_sl, id và sl (đoạn giữa AUTO và END)
+    noi_dung = parse_sepay_content(content)
+    print(f"   • id_sl (sau parse): {noi_dung.id_sl}")
     
     # Gọi hàm xử lý thanh toán từ module authentication
     print(f"\n🔄 Đang xử lý thanh toán...")
     success, message, data = authencation.xu_ly_thanh_toan(
-        id_sl=id_sl,
-        pay_ment=transfer_amount
+        id_sl=noi_dung,
+        pay_ment=transfer_amount,
+        transaction_key=transaction_key
     )
     
     print(f"📊 Kết quả: {message}")
@@ -661,6 +783,243 @@ def verify_count_endpoint():
         return response, 400
 
 
+@app.route('/consume', methods=['POST'])
+def consume_endpoint():
+    """
+    API endpoint để tăng count ngay trong một bước (gộp /add_count và /verify_count với approved = true)
+    
+    Body JSON format:
+    {
+        "id": "id0c0nUPf3rjZwzpA3yD"  // ID của tài khoản cần tăng count
+    }
+    
+    Returns:
+        - 200: Tăng count thành công (JSON)
+        - 400: Request không hợp lệ, tài khoản bị khoá/hết lượt (JSON)
+        - 500: Lỗi server hoặc đã đạt giới hạn (tính cả request pending) (JSON), như /add_count
+    
+    Example:
+        POST /consume
+        Body: {"id": "id0c0nUPf3rjZwzpA3yD"}
+    """
+    # Lấy JSON body từ request
+    json_data = request.get_json(silent=True)
+    
+    # Print nội dung request ra console
+    print("\n" + "="*60)
+    print("✅ Nhận được request consume!")
+    print("="*60)
+    print(f"📋 Method: {request.method}")
+    print(f"📋 URL: {request.url}")
+    
+    if json_data:
+        print(f"📋 JSON Body:")
+        print(json.dumps(json_data, ensure_ascii=False, indent=2))
+    
+    # Kiểm tra JSON body có tồn tại không
+    if not json_data:
+        return loi_400("Request phải chứa JSON body")
+    
+    # Trích xuất id từ JSON body
+    id = json_data.get('id')
+    
+    # Kiểm tra trường bắt buộc
+    if id is None:
+        return loi_400("Thiếu trường 'id' trong JSON body")
+    
+    # Kiểm tra id có phải là string không
+    if not isinstance(id, str):
+        return loi_400(f"Trường 'id' phải là chuỗi, nhận được: {type(id).__name__}")
+    
+    # Gọi hàm consume_count từ module add_count (kiểm tra + tăng count trong một lần giữ lock)
+    print(f"\n🔄 Đang tăng count cho tài khoản {id}...")
+    success, message, data = add_count.consume_count(id)
+    
+    print(f"📊 Kết quả: {message}")
+    if data:
+        print(f"📋 Dữ liệu: {json.dumps(data, ensure_ascii=False, indent=2)}")
+    
+    print("="*60 + "\n")
+    
+    # Xác định mã trạng thái HTTP theo cùng quy tắc với /add_count
+    if success:
+        status_code = 200
+    elif data.get('error_code') in ('ACCOUNT_LOCKED', 'ACCOUNT_LIMIT_EXCEEDED'):
+        status_code = 400
+    else:
+        status_code = 500
+    
+    response = jsonify({
+        "success": success,
+        "status_code": status_code,
+        "message": message,
+        "data": data
+    })
+    response.headers.add('Access-Control-Allow-Origin', '*')
+    response.headers.add('Access-Control-Allow-Methods', 'POST')
+    response.headers.add('Access-Control-Allow-Headers', 'Content-Type, Authorization')
+    return response, status_code
+
+
+@app.route('/add_count_batch', methods=['POST'])
+def add_count_batch_endpoint():
+    """
+    API endpoint để chuẩn bị tăng count cho nhiều tài khoản trong một request
+    (tạo pending request cho từng id, ghi pending_requests.json một lần)
+    
+    Body JSON format:
+    {
+        "ids": ["id0c0nUPf3rjZwzpA3yD", "..."]  // Danh sách ID (tối đa COUNT_BATCH_MAX, id lặp lại tạo nhiều request)
+    }
+    
+    Returns:
+        - 200: Đã xử lý, kết quả từng id nằm trong "results" (cùng thứ tự với "ids")
+        - 400: Request không hợp lệ
+        
+    Response body:
+        {
+            "success": true,
+            "status_code": 200,
+            "total": number,
+            "succeeded": number,
+            "results": [
+                {"success", "status_code", "message", "data"}  // Giống response của /add_count
+            ]
+        }
+    """
+    # Lấy JSON body từ request
+    json_data = request.get_json(silent=True)
+    
+    # Print tóm tắt request ra console (không in toàn bộ danh sách id)
+    print("\n" + "="*60)
+    print("✅ Nhận được request add_count_batch!")
+    print("="*60)
+    print(f"📋 Method: {request.method}")
+    print(f"📋 URL: {request.url}")
+    
+    # Kiểm tra danh sách id
+    ids, loi = kiem_tra_danh_sach(json_data, 'ids', "COUNT_BATCH_MAX")
+    if loi:
+        return loi_400(loi)
+    
+    for id in ids:
+        if not isinstance(id, str):
+            return loi_400(f"Mỗi id trong 'ids' phải là chuỗi, nhận được: {type(id).__name__}")
+    
+    print(f"\n🔄 Đang chuẩn bị {len(ids)} request tăng count...")
+    results = []
+    for success, message, data in add_count.prepare_add_count_batch(ids):
+        # Mã trạng thái của từng id theo cùng quy tắc với /add_count
+        if success:
+            status_code = 200
+        elif data.get('error_code') in ('ACCOUNT_LOCKED', 'ACCOUNT_LIMIT_EXCEEDED'):
+            status_code = 400
+        else:
+            status_code = 500
+        results.append({
+            "success": success,
+            "status_code": status_code,
+            "message": message,
+            "data": data
+        })
+    
+    succeeded = sum(1 for item in results if item['success'])
+    print(f"📊 Kết quả: {succeeded}/{len(results)} request được tạo")
+    print("="*60 + "\n")
+    
+    response = jsonify({
+        "success": True,
+        "status_code": 200,
+        "total": len(results),
+        "succeeded": succeeded,
+        "results": results
+    })
+    response.headers.add('Access-Control-Allow-Origin', '*')
+    response.headers.add('Access-Control-Allow-Methods', 'POST')
+    response.headers.add('Access-Control-Allow-Headers', 'Content-Type, Authorization')
+    return response, 200
+
+
+@app.route('/verify_count_batch', methods=['POST'])
+def verify_count_batch_endpoint():
+    """
+    API endpoint để verify nhiều request add_count trong một request
+    (thực hiện hoặc hủy từng request, ghi data.json và pending_requests.json một lần)
+    
+    Body JSON format:
+    {
+        "items": [
+            {"request_id": "uuid-string", "approved": true},   // true: thực hiện add_count
+            {"request_id": "uuid-string", "approved": false}   // false: hủy request
+        ]
+    }
+    
+    Returns:
+        - 200: Đã xử lý, kết quả từng request nằm trong "results" (cùng thứ tự với "items")
+        - 400: Request không hợp lệ
+        
+    Response body:
+        {
+            "success": true,
+            "status_code": 200,
+            "total": number,
+            "succeeded": number,
+            "results": [
+                {"request_id", "success", "status_code", "message", "data"}  // Giống response của /verify_count
+            ]
+        }
+    """
+    # Lấy JSON body từ request
+    json_data = request.get_json(silent=True)
+    
+    # Print tóm tắt request ra console (không in toàn bộ danh sách)
+    print("\n" + "="*60)
+    print("✅ Nhận được request verify_count_batch!")
+    print("="*60)
+    print(f"📋 Method: {request.method}")
+    print(f"📋 URL: {request.url}")
+    
+    # Kiểm tra danh sách items
+    items, loi = kiem_tra_danh_sach(json_data, 'items', "COUNT_BATCH_MAX")
+    if loi:
+        return loi_400(loi)
+    
+    for item in items:
+        if not isinstance(item, dict):
+            return loi_400(f"Mỗi phần tử trong 'items' phải là object, nhận được: {type(item).__name__}")
+        if not isinstance(item.get('request_id'), str):
+            return loi_400("Mỗi phần tử trong 'items' phải có 'request_id' là chuỗi")
+        if not isinstance(item.get('approved'), bool):
+            return loi_400("Mỗi phần tử trong 'items' phải có 'approved' là boolean")
+    
+    print(f"\n🔄 Đang verify {len(items)} request...")
+    results = []
+    for item, (success, message, data) in zip(items, add_count.verify_count_batch(items)):
+        results.append({
+            "request_id": item['request_id'],
+            "success": success,
+            "status_code": 200 if success else 400,
+            "message": message,
+            "data": data
+        })
+    
+    succeeded = sum(1 for item in results if item['success'])
+    print(f"📊 Kết quả: {succeeded}/{len(results)} request được xử lý thành công")
+    print("="*60 + "\n")
+    
+    response = jsonify({
+        "success": True,
+        "status_code": 200,
+        "total": len(results),
+        "succeeded": succeeded,
+        "results": results
+    })
+    response.headers.add('Access-Control-Allow-Origin', '*')
+    response.headers.add('Access-Control-Allow-Methods', 'POST')
+    response.headers.add('Access-Control-Allow-Headers', 'Content-Type, Authorization')
+    return response, 200
+
+
 @app.route('/test', methods=['GET'])
 def test_endpoint():
     """Endpoint test đơn giản"""
@@ -920,6 +1279,77 @@ def check_endpoint():
     return response, status_code
 
 
+@app.route('/check_batch', methods=['POST'])
+def check_batch_endpoint():
+    """
+    API endpoint để kiểm tra trạng thái nhiều tài khoản trong một request
+    
+    Body JSON format:
+    {
+        "ids": ["id0c0nUPf3rjZwzpA3yD", "..."]  // Danh sách ID cần kiểm tra (tối đa CHECK_BATCH_MAX)
+    }
+    
+    Returns:
+        - 200: Đã xử lý, kết quả từng id nằm trong "results" (cùng thứ tự với "ids")
+        - 400: Request không hợp lệ
+        
+    Response body:
+        {
+            "success": true,
+            "status_code": 200,
+            "total": number,
+            "results": [
+                {"id", "count", "limit", "message", "status_code", ...}  // Giống response của /check
+            ]
+        }
+    
+    Example:
+        POST /check_batch
+        Body: {"ids": ["id0c0nUPf3rjZwzpA3yD", "idAbc"]}
+    """
+    # Lấy JSON body từ request
+    json_data = request.get_json(silent=True)
+    
+    # Print tóm tắt request ra console (không in toàn bộ danh sách id)
+    print("\n" + "="*60)
+    print("✅ Nhận được request check_batch!")
+    print("="*60)
+    print(f"📋 Method: {request.method}")
+    print(f"📋 URL: {request.url}")
+    
+    # Kiểm tra danh sách id
+    ids, loi = kiem_tra_danh_sach(json_data, 'ids', "CHECK_BATCH_MAX")
+    if loi:
+        return loi_400(loi)
+    
+    for id in ids:
+        if not isinstance(id, str):
+            return loi_400(f"Mỗi id trong 'ids' phải là chuỗi, nhận được: {type(id).__name__}")
+    
+    # Gọi hàm check_batch từ module check
+    results = check.check_batch(ids)
+    
+    # In tóm tắt kết quả ra console
+    theo_status = {}
+    for item in results:
+        theo_status[item['status_code']] = theo_status.get(item['status_code'], 0) + 1
+    print(f"\n📥 Kết quả: {len(results)} id")
+    for status_code, so_luong in sorted(theo_status.items()):
+        print(f"   • status_code {status_code}: {so_luong}")
+    print("="*60 + "\n")
+    
+    response = jsonify({
+        "success": True,
+        "status_code": 200,
+        "total": len(results),
+        "results": results
+    })
+    response.headers.add('Access-Control-Allow-Origin', '*')
+    response.headers.add('Access-Control-Allow-Methods', 'POST')
+    response.headers.add('Access-Control-Allow-Headers', 'Content-Type, Authorization')
+    return response, 200
+
+
 @app.route('/creat_otp', methods=['POST'])
 def creat_otp_endpoint():
     """
@@ -1659,6 +2089,90 @@ def api_url_endpoint():
         return response, 500
 
 
+@app.route('/stats', methods=['GET'])
+def stats_endpoint():
+    """
+    API endpoint trả về thống kê vận hành của service
+    
+    Returns:
+        - 200: Thành công - Thống kê (JSON)
+            - storage: backend lưu trữ, codec JSON đang dùng, chế độ ghi gọn và số liệu ghi trễ count tạm
+              (temp_counts là null khi count tạm được ghi thẳng xuống đĩa)
+            - negative_cache: cache id không tồn tại của /check (size, max_size, hits, misses, invalidations)
+            - webhook_queue: số liệu hàng đợi webhook khi WEBHOOK_MODE = "queue" (null ở chế độ "sync")
+            - payment_config: cache config thanh toán (files, loads: số lần đọc file, stats: số lần stat file, check_ms)
+            - qr_http: số liệu tải ảnh QR từ img.vietqr.io (requests, retried, failures, rejected: bị circuit breaker
+              chặn, breaker: trạng thái circuit breaker, breaker_opened)
+            - qr_pool: pool QR tạo sẵn (size, refill_per_sec, ready: số QR sẵn theo sl, hits, misses, stale: QR bị bỏ
+              vì config đã đổi, produced, errors, last_error, last_produce_ms, running)
+            - qr_cache: cache phần đầu payload VietQR (prefix) và cache ảnh QR (image): size, bytes, max_bytes,
+              hits, misses, evictions
+            - locks: chế độ lock, số sọc lock tài khoản và số liệu chờ lock
+              (acquired, contended, timeouts, wait_total_ms, wait_max_ms theo từng loại lock)
+        - 500: Lỗi server (JSON)
+    
+    Example:
+        GET /stats
+    """
+    try:
+        storage = get_storage()
+        temp_counts = storage.temp_counts
+        response = jsonify({
+            "success": True,
+            "status_code": 200,
+            "pid": os.getpid(),
+            "storage": {
+                "backend": storage.backend,
+                "json_codec": json_codec.CODEC,
+                "json_compact": json_codec.COMPACT,
+                "temp_counts": temp_counts.stats() if hasattr(temp_counts, 'stats') else None
+            },
+            "locks": lock_stats(),
+            "negative_cache": check.negative_cache.stats(),
+            "webhook_queue": get_webhook_queue().stats() if WEBHOOK_MODE == "queue" else None,
+            "payment_config": payment_config_stats(),
+            "qr_http": get_qr_http_client().stats(),
+            "qr_cache": qr_cache_stats(),
+            "qr_pool": qr_code.qr_pool.stats()
+        })
+        response.headers.add('Access-Control-Allow-Origin', '*')
+        response.headers.add('Access-Control-Allow-Methods', 'GET')
+        response.headers.add('Access-Control-Allow-Headers', 'Content-Type')
+        return response, 200
+    except Exception as e:
+        response = jsonify({
+            "success": False,
+            "status_code": 500,
+            "message": f"Lỗi server: {str(e)}"
+        })
+        response.headers.add('Access-Control-Allow-Origin', '*')
+        response.headers.add('Access-Control-Allow-Methods', 'GET')
+        response.headers.add('Access-Control-Allow-Headers', 'Content-Type')
+        return response, 500
+
+
+@app.before_request
+def khoi_dong_nen_dinh_ky():
+    """
+    Khởi động thread nén lưu trữ pending request ở request đầu tiên của mỗi process: worker của WSGI server
+    (gunicorn -w 4 main:app) không chạy main(). Các lần sau chỉ kiểm tra thread đã chạy (không lấy lock)
+    """
+    bat_dau_nen_dinh_ky()
+
+
+@app.errorhandler(LockTimeout)
+def lock_timeout_handler(e):
+    """Trả về 503 khi chờ lock liên process quá LOCK_TIMEOUT (client có thể thử lại)"""
+    response = jsonify({
+        "success": False,
+        "status_code": 503,
+        "message": f"Server đang bận, vui lòng thử lại: {str(e)}"
+    })
+    response.headers.add('Access-Control-Allow-Origin', '*')
+    response.headers.add('Access-Control-Allow-Headers', 'Content-Type')
+    return response, 503
+
+
 @app.route('/users', methods=['GET', 'POST'])
 def users_endpoint():
     """
@@ -2044,6 +2558,24 @@ def main():
     # In thông tin API
     in_thong_tin_api(port, local_ip)
     
+    # Khởi tạo backend lưu trữ (config/db.json) và nạp tài khoản một lần khi khởi động
+    try:
+        storage = get_storage()
+        so_tai_khoan = len(storage.accounts.all())
+        print(f"✅ Backend lưu trữ: {storage.backend} - đã nạp {so_tai_khoan} tài khoản")
+    except Exception as e:
+        print(f"⚠️ Không thể khởi tạo backend lưu trữ: {e}")
+    
+    # Nén lưu trữ pending request định kỳ (chỉ trong process phục vụ request, không chạy ở process reloader;
+    # chạy dưới WSGI server thì thread được khởi động ở request đầu tiên, xem khoi_dong_nen_dinh_ky)
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        bat_dau_nen_dinh_ky()
+        # Bắt đầu tạo sẵn QR cho /qr
+        qr_code.qr_pool.start()
+        # Xử lý nốt các webhook còn trong hàng đợi từ lần chạy trước
+        if WEBHOOK_MODE == "queue":
+            get_webhook_queue().start(authencation.xu_ly_thanh_toan_batch)
+    
     print("\n🚀 Đang khởi động Flask server...")
     print("="*60)
     
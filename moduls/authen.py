@@ -1,9 +1,19 @@
 import json
+import os
+import sys
+
+# Thêm thư mục gốc vào path để import utils
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if root_dir not in sys.path:
+    sys.path.insert(0, root_dir)
+from utils.db_lock import with_account_lock
+from utils.payment_config import get_payment_config
+from utils.storage import get_storage
 
 
 def doc_cost_tu_config(config_file="config/pay_ment.json"):
     """
-    Đọc giá trị COST từ file config (định dạng JSON)
+    Đọc giá trị COST từ file config (định dạng JSON), qua cache config thanh toán
     
     Args:
         config_file: Đường dẫn đến file config
@@ -11,40 +21,21 @@ def doc_cost_tu_config(config_file="config/pay_ment.json"):
     Returns:
         float: Giá trị cost, None nếu không tìm thấy hoặc lỗi
     """
-    try:
-        with open(config_file, "r", encoding="utf-8") as f:
-            config_data = json.load(f)
-        
-        # Lấy giá trị COST từ JSON
-        cost_value = config_data.get("COST")
-        if cost_value is None:
-            print(f"❌ Không tìm thấy COST trong file config")
-            return None
-        
-        # Xử lý giá trị COST (có thể là string hoặc number)
-        if isinstance(cost_value, str):
-            # Loại bỏ dấu chấm ngăn cách hàng nghìn và chuyển sang float
-            cost_str = cost_value.replace('.', '').replace(',', '.')
-            try:
-                return float(cost_str)
-            except ValueError:
-                print(f"❌ Không thể parse giá trị COST: {cost_value}")
-                return None
-        else:
-            # Nếu đã là số thì trả về trực tiếp
-            return float(cost_value)
-            
-    except FileNotFoundError:
-        print(f"❌ Không tìm thấy file config: {config_file}")
+    config = get_payment_config(config_file)
+    if not config.data:
         return None
-    except json.JSONDecodeError as e:
-        print(f"❌ Lỗi khi parse JSON config: {e}")
+    
+    cost_value = config.data.get("COST")
+    if cost_value is None:
+        print(f"❌ Không tìm thấy COST trong file config")
         return None
-    except Exception as e:
-        print(f"❌ Lỗi khi đọc file config: {e}")
+    if config.cost is None:
+        print(f"❌ Không thể parse giá trị COST: {cost_value}")
         return None
+    return float(config.cost)
 
 
+@with_account_lock
 def kiem_tra_va_active_token(id, token, cost, db_file="db/data.json", config_file="config/pay_ment.json"):
     """
     Kiểm tra token và cost tương ứng với id trong database và so sánh cost với giá trị trong config,
@@ -77,31 +68,22 @@ def kiem_tra_va_active_token(id, token, cost, db_file="db/data.json", config_fil
             print(f"❌ Cost không hợp lệ: {cost}")
             return False
         
-        # Đọc database
-        with open(db_file, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        
-        # Tìm id trong database
-        found = False
-        for item in data:
-            if item.get("id") == id:
-                found = True
-                # Kiểm tra token có khớp không
-                if item.get("token") == token:
-                    # Cập nhật active thành true
-                    item["active"] = True
-                    # Ghi lại vào file
-                    with open(db_file, "w", encoding="utf-8") as f:
-                        json.dump(data, f, indent=2, ensure_ascii=False)
-                    print(f"✅ Token và cost khớp! Đã cập nhật active = true cho id: {id}")
-                    return True
-                else:
-                    print(f"❌ Token không khớp với id: {id}")
-                    return False
-        
-        if not found:
+        # Tìm id trong database (qua index của store)
+        store = get_storage(os.path.dirname(os.path.abspath(db_file))).accounts
+        item = store.get(id)
+        if item is None:
             print(f"❌ Không tìm thấy id: {id} trong database")
             return False
+        
+        # Kiểm tra token có khớp không
+        if item.get("token") == token:
+            # Cập nhật active thành true
+            store.update(id, active=True)
+            print(f"✅ Token và cost khớp! Đã cập nhật active = true cho id: {id}")
+            return True
+        else:
+            print(f"❌ Token không khớp với id: {id}")
+            return False
             
     except FileNotFoundError:
         print(f"❌ Không tìm thấy file database: {db_file}")
@@ -1,6 +1,16 @@
 import json
+import os
+import sys
 
+# Thêm thư mục gốc vào path để import utils
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if root_dir not in sys.path:
+    sys.path.insert(0, root_dir)
+from utils.db_lock import with_account_lock
+from utils.storage import get_storage
 
+
+@with_account_lock
 def kiem_tra_va_tang_count(id, db_file="db/data.json"):
     """
     Kiểm tra active và count trước khi tăng count.
@@ -18,55 +28,40 @@ def kiem_tra_va_tang_count(id, db_file="db/data.json"):
             - False: không thể tăng count (tài khoản chưa kích hoạt hoặc đã đến giới hạn)
     """
     try:
-        # Đọc database
-        with open(db_file, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        
-        # Tìm id trong database
-        found = False
-        for item in data:
-            if item.get("id") == id:
-                found = True
-                
-                # Kiểm tra active trước
-                active = item.get("active", False)
-                if not active:
-                    message = "tài khoản chưa được kích hoạt"
-                    print(f"❌ {message}")
-                    return False, message
-                
-                # Lấy giá trị count và limit
-                count = item.get("count", 0)
-                limit = item.get("limit", 0)
-                
-                # Kiểm tra count có vượt quá limit không
-                if count > limit:
-                    # Chuyển active về false
-                    item["active"] = False
-                    
-                    # Ghi lại vào file
-                    with open(db_file, "w", encoding="utf-8") as f:
-                        json.dump(data, f, indent=2, ensure_ascii=False)
-                    
-                    message = "kí tự đã đến giới hạn"
-                    print(f"❌ {message}. Đã chuyển active về false.")
-                    return False, message
-                
-                # Nếu chưa vượt giới hạn, tăng count lên 1
-                item["count"] = count + 1
-                
-                # Ghi lại vào file
-                with open(db_file, "w", encoding="utf-8") as f:
-                    json.dump(data, f, indent=2, ensure_ascii=False)
-                
-                message = f"✅ Đã tăng count từ {count} lên {count + 1}. Limit: {limit}"
-                print(f"✅ {message}")
-                return True, message
-        
-        if not found:
+        # Tìm id trong database (qua index của store)
+        store = get_storage(os.path.dirname(os.path.abspath(db_file))).accounts
+        item = store.get(id)
+        if item is None:
             message = f"❌ Không tìm thấy id: {id} trong database"
             print(message)
             return False, message
+        
+        # Kiểm tra active trước
+        active = item.get("active", False)
+        if not active:
+            message = "tài khoản chưa được kích hoạt"
+            print(f"❌ {message}")
+            return False, message
+        
+        # Lấy giá trị count và limit
+        count = item.get("count", 0)
+        limit = item.get("limit", 0)
+        
+        # Kiểm tra count có vượt quá limit không
+        if count > limit:
+            # Chuyển active về false (store ghi một bản ghi WAL, không ghi lại toàn bộ file)
+            store.update(id, active=False)
+            
+            message = "kí tự đã đến giới hạn"
+            print(f"❌ {message}. Đã chuyển active về false.")
+            return False, message
+        
+        # Nếu chưa vượt giới hạn, tăng count lên 1
+        store.update(id, count=count + 1)
+        
+        message = f"✅ Đã tăng count từ {count} lên {count + 1}. Limit: {limit}"
+        print(f"✅ {message}")
+        return True, message
             
     except FileNotFoundError:
         message = f"❌ Không tìm thấy file database: {db_file}"
@@ -1,5 +1,13 @@
 import json
-import requests
+import os
+import sys
+
+# Thêm thư mục gốc vào path để import utils
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if root_dir not in sys.path:
+    sys.path.insert(0, root_dir)
+from utils.http_pool import get_qr_http_client
+from utils.vietqr import tao_qr_png
 
 
 def doc_config(config_file="config/pay_ment.json"):
@@ -59,7 +67,7 @@ def xu_ly_amount(cost_str):
 
 def tao_qr_code(id, token, config_file="config/pay_ment.json", output_file="qr_vietqr.png"):
     """
-    Tải QR code thanh toán VietQR từ API VietQR.io
+    Tạo QR code thanh toán VietQR (tạo tại chỗ, không được thì tải từ API VietQR.io)
     
     Args:
         id: ID của đơn hàng
@@ -100,31 +108,34 @@ def tao_qr_code(id, token, config_file="config/pay_ment.json", output_file="qr_v
     # Tạo add_info từ id và token
     add_info = tao_add_info(id, token)
     
-    # Tạo link chuẩn VietQR
-    url = f"https://img.vietqr.io/image/{bank_code}-{account_no}-compact.png?amount={amount}&addInfo={add_info}&accountName={account_name}"
-    
-    try:
-        # Tải ảnh QR từ VietQR.io
-        response = requests.get(url)
+    # Tạo mã QR tại chỗ, không được (chưa cài qrcode, không biết BIN ngân hàng) thì tải từ VietQR.io
+    success, qr_bytes, error_message = tao_qr_png(bank_code, account_no, amount, add_info, cache=True)
+    if not success:
+        print(f"⚠️ Không tạo được QR tại chỗ ({error_message}), tải từ VietQR.io")
+        
+        # Tạo link chuẩn VietQR
+        url = f"https://img.vietqr.io/image/{bank_code}-{account_no}-compact.png?amount={amount}&addInfo={add_info}&accountName={account_name}"
         
-        if response.status_code == 200:
-            # Lưu ảnh vào file
-            with open(output_file, "wb") as f:
-                f.write(response.content)
-            
-            # In thông tin
-            print("✅ QR thanh toán VietQR đã được tải:", output_file)
-            print(f"📋 Thông tin: {bank_code} - {account_no} - {account_name} - {amount:,}đ")
-            print(f"📝 Nội dung: {add_info}")
-            
-            return True
-        else:
-            print(f"❌ Không tải được QR từ VietQR.io (Status code: {response.status_code})")
+        # Tải ảnh QR từ VietQR.io (session dùng chung, có thử lại)
+        success, qr_bytes, error_message = get_qr_http_client().get(url)
+        if not success:
+            print(f"❌ Không tải được QR từ VietQR.io ({error_message})")
             return False
-            
+    
+    # Lưu ảnh vào file
+    try:
+        with open(output_file, "wb") as f:
+            f.write(qr_bytes)
     except Exception as e:
-        print(f"❌ Lỗi khi tải QR code: {e}")
+        print(f"❌ Lỗi khi lưu QR code: {e}")
         return False
+    
+    # In thông tin
+    print("✅ QR thanh toán VietQR đã được tạo:", output_file)
+    print(f"📋 Thông tin: {bank_code} - {account_no} - {account_name} - {amount:,}đ")
+    print(f"📝 Nội dung: {add_info}")
+    
+    return True
 
 
 if __name__ == "__main__":
@@ -0,0 +1,13 @@
+"""
+Cấu hình chung cho pytest
+
+Chạy từ thư mục gốc của project:
+    python -m pytest -q
+"""
+import os
+import sys
+
+# Thêm thư mục gốc vào path để import apis/utils/bench
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if root_dir not in sys.path:
+    sys.path.insert(0, root_dir)
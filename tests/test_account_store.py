@@ -0,0 +1,59 @@
+"""
+Test AccountStore (utils/account_store.py, user-001): index theo id trong bộ nhớ, các hàm đọc trả về bản sao
+"""
+import json
+
+import pytest
+
+import utils.account_store as account_store
+from utils.account_store import AccountStore
+
+
+@pytest.fixture
+def db_file(tmp_path, monkeypatch):
+    """data.json tạm (WAL tắt: mỗi thay đổi ghi lại toàn bộ file)"""
+    config = dict(account_store.doc_db_config())
+    config.update({"WAL_ENABLED": False})
+    monkeypatch.setattr(account_store, "doc_db_config", lambda: config)
+    path = tmp_path / "data.json"
+    path.write_text(json.dumps([
+        {"id": "a" * 20, "limit": 100, "count": 0, "active": True},
+        "khong phai tai khoan",
+        {"id": "b" * 20, "limit": 50, "count": 3, "active": False},
+    ]))
+    return str(path)
+
+
+def test_index_tra_ve_ban_sao(db_file):
+    store = AccountStore(db_file)
+    item = store.get("a" * 20)
+    item["count"] = 99
+    assert store.get("a" * 20)["count"] == 0
+    assert store.status("b" * 20) == (False, 3, 50)
+    assert store.status_many(["a" * 20, "khong_ton_tai"]) == {"a" * 20: (True, 0, 100)}
+    assert store.get("khong_ton_tai") is None
+
+
+def test_thay_doi_ghi_xuong_file_va_giu_phan_tu_khac(db_file):
+    store = AccountStore(db_file)
+    store.update("a" * 20, count=7)
+    store.upsert({"id": "c" * 20, "limit": 10, "count": 0, "active": True})
+    assert store.delete("b" * 20)["id"] == "b" * 20
+    assert store.update("khong_ton_tai", count=1) is None
+
+    data = json.load(open(db_file))
+    assert data == [
+        {"id": "a" * 20, "limit": 100, "count": 7, "active": True},
+        {"id": "c" * 20, "limit": 10, "count": 0, "active": True},
+        "khong phai tai khoan",
+    ]
+    assert AccountStore(db_file).all() == [item for item in data if isinstance(item, dict)]
+
+
+def test_nap_lai_khi_file_bi_sua_tu_ben_ngoai(db_file):
+    store = AccountStore(db_file)
+    assert store.get("a" * 20)["count"] == 0
+    with open(db_file, "w") as f:
+        json.dump([{"id": "a" * 20, "limit": 100, "count": 42, "active": True}], f)
+    assert store.get("a" * 20)["count"] == 42
+    assert store.get("b" * 20) is None
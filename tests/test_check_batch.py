@@ -0,0 +1,63 @@
+"""
+Test /check_batch (apis/check.py, user-013): cùng kết quả như gọi check() lần lượt cho từng id
+"""
+import json
+
+import pytest
+
+import apis.check as check
+from utils.negative_cache import NegativeCache
+from utils.storage import get_storage
+
+ID_1 = "id0c0nUPf3rjZwzpA3yD"
+ID_2 = "id1c0nUPf3rjZwzpA3yD"
+ID_KHOA = "id2c0nUPf3rjZwzpA3yD"
+
+
+def _tao_storage(db_dir):
+    """Thư mục db/ với hai tài khoản active (một tài khoản sắp hết lượt) và một tài khoản bị khóa"""
+    db_dir.mkdir()
+    (db_dir / "data.json").write_text(json.dumps([
+        {"id": ID_1, "limit": 100, "count": 5, "active": True},
+        {"id": ID_2, "limit": 3, "count": 2, "active": True},
+        {"id": ID_KHOA, "limit": 50, "count": 1, "active": False},
+    ]))
+    return get_storage(str(db_dir))
+
+
+@pytest.fixture
+def dung_storage(monkeypatch):
+    """Cho apis.check dùng storage tạm (và negative_cache riêng) thay cho db/ của project"""
+    def dung(storage):
+        monkeypatch.setattr(check, "get_storage", lambda: storage)
+        monkeypatch.setattr(check, "negative_cache", NegativeCache(100))
+    return dung
+
+
+def test_id_lap_lai_cong_don_nhu_goi_lan_luot(tmp_path, dung_storage):
+    ids = [ID_1, ID_2, "khong_ton_tai", ID_1, ID_KHOA, ID_2, ID_1, ID_2, ["khong", "phai", "chuoi"]]
+
+    dung_storage(_tao_storage(tmp_path / "lan_luot"))
+    expected = []
+    for id in ids:
+        status_code, data = check.check(id)
+        data["status_code"] = status_code
+        expected.append(data)
+
+    storage = _tao_storage(tmp_path / "batch")
+    dung_storage(storage)
+    assert check.check_batch(ids) == expected
+    assert storage.temp_counts.all() == {ID_1: 2, ID_2: 2}
+
+
+def test_ket_qua_theo_thu_tu_ids(tmp_path, dung_storage):
+    dung_storage(_tao_storage(tmp_path / "db"))
+    results = check.check_batch([ID_KHOA, "khong_ton_tai", ID_2, ID_2, ID_2])
+    assert [(r["id"], r["status_code"]) for r in results] == [
+        (ID_KHOA, 300), ("khong_ton_tai", 404), (ID_2, 200), (ID_2, 200), (ID_2, 200),
+    ]
+    assert results[1]["message"] == "Chưa mua thành công"
+    assert results[0]["message"] == "Tài khoản bị khóa"
+    # count 2 + count tạm 0, 1, 2 so với limit 3: lần thứ ba vượt limit
+    assert [r["temp_count"] for r in results[2:]] == [0, 1, 2]
+    assert results[4]["message"] == "Tài khoản đã hết lượt"
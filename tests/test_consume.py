@@ -0,0 +1,64 @@
+"""
+Test /consume (apis/add_count.py, user-015): kiểm tra và tăng count trong một lần giữ lock tài khoản
+"""
+import json
+import threading
+
+import pytest
+
+import apis.add_count as add_count
+from utils.account_store import AccountStore
+from utils.storage import get_storage
+
+ID_1 = "id0c0nUPf3rjZwzpA3yD"
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    """Storage tạm với một tài khoản limit 10 cho apis.add_count"""
+    db_dir = tmp_path / "db"
+    db_dir.mkdir()
+    (db_dir / "data.json").write_text(json.dumps([{"id": ID_1, "limit": 10, "count": 0, "active": True}]))
+    storage = get_storage(str(db_dir))
+    monkeypatch.setattr(add_count, "get_storage", lambda: storage)
+    return storage
+
+
+def test_dung_limit_khi_nhieu_thread(storage):
+    results = []
+    bat_dau = threading.Barrier(16)
+
+    def chay():
+        bat_dau.wait()
+        for _ in range(2):
+            results.append(add_count.consume_count(ID_1))
+
+    threads = [threading.Thread(target=chay) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # 32 lần gọi cho limit 10: đúng 10 lần thành công, không lần nào vượt limit
+    thanh_cong = [r for r in results if r[0]]
+    assert len(results) == 32 and len(thanh_cong) == 10
+    assert sorted(r[2]["count"] for r in thanh_cong) == list(range(1, 11))
+    assert all(r[2]["error_code"] == "ACCOUNT_LIMIT_REACHED" for r in results if not r[0])
+    assert storage.accounts.get(ID_1)["count"] == 10
+    # Đọc lại từ đĩa (data.json + WAL) cũng thấy đúng 10
+    assert AccountStore(storage.accounts.db_file).get(ID_1)["count"] == 10
+
+
+def test_pending_duoc_giu_cho(storage):
+    storage.accounts.update(ID_1, count=8)
+    success, _, data = add_count.prepare_add_count(ID_1)
+    assert success
+    storage.temp_counts.set(ID_1, 3)
+
+    success, _, data = add_count.consume_count(ID_1)
+    assert success and data["count"] == 9
+    assert storage.temp_counts.get(ID_1) is None
+
+    # count 9 + 1 request pending = limit
+    success, _, data = add_count.consume_count(ID_1)
+    assert not success and data["error_code"] == "ACCOUNT_LIMIT_REACHED"
@@ -0,0 +1,70 @@
+"""
+Test /add_count_batch và /verify_count_batch (apis/add_count.py, user-014): cùng kết quả như gọi
+prepare_add_count / execute_add_count / cancel_pending_request lần lượt
+"""
+import json
+
+import pytest
+
+import apis.add_count as add_count
+from utils.storage import get_storage
+
+ID_1 = "id0c0nUPf3rjZwzpA3yD"
+ID_KHOA = "id2c0nUPf3rjZwzpA3yD"
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    """Storage tạm (một tài khoản còn 2 lượt, một tài khoản bị khóa) cho apis.add_count"""
+    db_dir = tmp_path / "db"
+    db_dir.mkdir()
+    (db_dir / "data.json").write_text(json.dumps([
+        {"id": ID_1, "limit": 3, "count": 1, "active": True},
+        {"id": ID_KHOA, "limit": 50, "count": 1, "active": False},
+    ]))
+    storage = get_storage(str(db_dir))
+    monkeypatch.setattr(add_count, "get_storage", lambda: storage)
+    return storage
+
+
+def test_pending_duoc_tinh_vao_limit(storage):
+    results = add_count.prepare_add_count_batch([ID_1, ID_KHOA, "khong_ton_tai", ID_1, ID_1])
+    assert [r[0] for r in results] == [True, False, False, True, False]
+    assert results[1][2]["error_code"] == "ACCOUNT_LOCKED"
+    assert results[4][2]["error_code"] == "ACCOUNT_LIMIT_REACHED"
+    assert results[4][2]["pending_count"] == 2
+    assert storage.pending.count_pending(ID_1) == 2
+
+    # Lần gọi lẻ sau lô cũng thấy các request pending của lô
+    success, _, data = add_count.prepare_add_count(ID_1)
+    assert not success and data["error_code"] == "ACCOUNT_LIMIT_REACHED"
+
+
+def test_verify_request_da_xu_ly_bi_tu_choi(storage):
+    storage.temp_counts.set(ID_1, 4)
+    ids = [r[2]["request_id"] for r in add_count.prepare_add_count_batch([ID_1, ID_1])]
+
+    results = add_count.verify_count_batch([
+        {"request_id": ids[0], "approved": True},
+        {"request_id": ids[1], "approved": False},
+        {"request_id": ids[0], "approved": True},
+        {"request_id": ids[1], "approved": True},
+        {"request_id": "khong_ton_tai", "approved": True},
+    ])
+    assert [r[0] for r in results] == [True, True, False, False, False]
+    assert results[0][2]["count"] == 2
+    assert "completed" in results[2][1]
+    assert "cancelled" in results[3][1]
+    assert "Không tìm thấy request" in results[4][1]
+
+    assert storage.accounts.get(ID_1)["count"] == 2
+    assert storage.pending.get(ids[0])["status"] == "completed"
+    assert storage.pending.get(ids[1])["status"] == "cancelled"
+    assert storage.pending.count_pending(ID_1) == 0
+    # Count tạm của tài khoản đã được tăng count được reset
+    assert storage.temp_counts.get(ID_1) is None
+
+    # Verify lại request đã xong bằng các hàm lẻ cũng bị từ chối
+    assert not add_count.execute_add_count(ids[0])[0]
+    assert not add_count.cancel_pending_request(ids[0])[0]
+    assert storage.accounts.get(ID_1)["count"] == 2
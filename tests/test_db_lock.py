@@ -0,0 +1,71 @@
+"""
+Test lock file dữ liệu trong process (ThreadResourceLock trong utils/db_lock.py, user-005)
+"""
+import threading
+import time
+
+import pytest
+
+from utils.db_lock import ThreadResourceLock
+
+
+def test_lay_long_nhau_trong_cung_thread():
+    lock = ThreadResourceLock()
+    with lock:
+        with lock.write():
+            with lock.read():
+                with lock.read():
+                    pass
+    with lock.read():
+        with lock.read():
+            pass
+        with pytest.raises(RuntimeError):
+            with lock.write():
+                pass
+    # Lock đã được trả hết: thread khác lấy được phía ghi
+    t = threading.Thread(target=lambda: lock.write().__enter__())
+    t.start()
+    t.join(timeout=1)
+    assert not t.is_alive()
+
+
+def test_nhieu_reader_cung_luc():
+    lock = ThreadResourceLock()
+    barrier = threading.Barrier(4, timeout=2)
+
+    def doc():
+        with lock.read():
+            # Cả 4 reader phải cùng giữ phía đọc thì mới qua được barrier
+            barrier.wait()
+
+    threads = [threading.Thread(target=doc) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not barrier.broken
+
+
+def test_writer_doc_quyen():
+    lock = ThreadResourceLock()
+    log = []
+
+    def ghi():
+        with lock:
+            log.append("w+")
+            time.sleep(0.01)
+            log.append("w-")
+
+    def doc():
+        with lock.read():
+            log.append("r")
+
+    threads = [threading.Thread(target=f) for f in (ghi, doc, ghi, doc, ghi)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    # Không có reader/writer nào chen vào giữa w+ và w-
+    for i, item in enumerate(log):
+        if item == "w+":
+            assert log[i + 1] == "w-"
@@ -0,0 +1,101 @@
+"""
+Test nén lưu trữ pending request đã xong (utils/pending_compaction.py, user-010)
+"""
+import gzip
+import os
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+import utils.pending_compaction as pending_compaction
+from utils.pending_compaction import doc_phan_vung, ghi_phan_vung, nen_neu_den_han, nen_pending
+from utils.storage import get_storage
+
+
+def _ngay(days_ago):
+    return (datetime.now() - timedelta(days=days_ago)).isoformat()
+
+
+@pytest.fixture
+def db_dir(tmp_path):
+    """Thư mục db/ tạm có 3 request đã xong (2 cũ, 1 mới) và 1 request đang pending"""
+    db_dir = str(tmp_path / "db")
+    os.makedirs(db_dir)
+    pending = get_storage(db_dir).pending
+    pending.add("cu_1", {"id": "a" * 20, "status": "completed", "timestamp": _ngay(11), "completed_at": _ngay(10)})
+    pending.add("cu_2", {"id": "a" * 20, "status": "cancelled", "timestamp": _ngay(11), "cancelled_at": _ngay(9)})
+    pending.add("moi", {"id": "a" * 20, "status": "completed", "timestamp": _ngay(2), "completed_at": _ngay(1)})
+    pending.add("dang_cho", {"id": "a" * 20, "status": "pending", "timestamp": _ngay(20)})
+    return db_dir
+
+
+def test_ghi_phan_vung_chay_lai_khong_trung(tmp_path):
+    records = [
+        {"request_id": "r1", "status": "completed", "completed_at": "2024-05-01T10:00:00"},
+        {"request_id": "r2", "status": "cancelled", "cancelled_at": "2024-05-02T10:00:00"},
+    ]
+    da_ghi = ghi_phan_vung(str(tmp_path), records)
+    assert sorted(os.path.basename(path) for path in da_ghi) == ["2024-05-01.jsonl.gz", "2024-05-02.jsonl.gz"]
+    with open(tmp_path / "2024-05-01.jsonl.gz", "rb") as f:
+        lan_dau = f.read()
+
+    # Chạy lại cùng dữ liệu (vd. bị dừng trước khi ghi lại file lưu trữ): file nén giống hệt, không trùng request
+    ghi_phan_vung(str(tmp_path), records[:1])
+    with open(tmp_path / "2024-05-01.jsonl.gz", "rb") as f:
+        assert f.read() == lan_dau
+    assert list(doc_phan_vung(str(tmp_path / "2024-05-01.jsonl.gz"))) == ["r1"]
+    assert doc_phan_vung(str(tmp_path / "khong_co.jsonl.gz")) == {}
+
+
+def test_nen_pending_chi_chuyen_request_cu_va_chay_lai_khong_doi(db_dir):
+    report = nen_pending(db_dir, days=7)
+    assert report["moved"] == 2
+    assert len(report["partitions"]) == 2
+    pending = get_storage(db_dir).pending
+    assert pending.get("cu_1") is None and pending.get("cu_2") is None
+    assert pending.get("moi")["status"] == "completed"
+    assert pending.get("dang_cho")["status"] == "pending"
+
+    partitions = os.path.join(db_dir, "pending_archive")
+    noi_dung = {name: gzip.open(os.path.join(partitions, name)).read() for name in os.listdir(partitions)}
+    report = nen_pending(db_dir, days=7)
+    assert report["moved"] == 0 and report["partitions"] == []
+    assert {name: gzip.open(os.path.join(partitions, name)).read() for name in os.listdir(partitions)} == noi_dung
+
+
+def test_nen_neu_den_han_dung_chung_lich_giua_cac_lan_goi(db_dir):
+    assert nen_neu_den_han(3600, db_dir)["moved"] == 2
+    # Vừa nén (ở process này hoặc worker khác): chưa đến hạn
+    assert nen_neu_den_han(3600, db_dir) is None
+    assert os.path.exists(os.path.join(db_dir, pending_compaction.LAST_RUN_FILE_NAME))
+    assert nen_neu_den_han(0, db_dir)["moved"] == 0
+
+
+def test_moi_process_chi_mot_thread(db_dir, monkeypatch):
+    monkeypatch.setattr(pending_compaction, "_thread", None)
+    monkeypatch.setattr(pending_compaction, "_thread_pid", None)
+    assert pending_compaction.bat_dau_nen_dinh_ky(interval=0, db_dir=db_dir) is None
+
+    threads = []
+    cac_thread = [threading.Thread(target=lambda: threads.append(pending_compaction.bat_dau_nen_dinh_ky(3600, db_dir)))
+                  for _ in range(8)]
+    for t in cac_thread:
+        t.start()
+    for t in cac_thread:
+        t.join()
+    assert len({id(thread) for thread in threads}) == 1
+    assert threads[0].is_alive()
+
+    # Sau fork (pid khác) process con khởi động thread của mình
+    monkeypatch.setattr(pending_compaction, "_thread_pid", -1)
+    assert pending_compaction.bat_dau_nen_dinh_ky(3600, db_dir) is not threads[0]
+
+
+def test_cli_tu_choi_khi_lock_thread(db_dir, monkeypatch):
+    config = dict(pending_compaction.doc_db_config(), LOCK_MODE="thread")
+    monkeypatch.setattr(pending_compaction, "doc_db_config", lambda: config)
+    assert pending_compaction.main(["--db-dir", db_dir, "--days", "7"]) == 1
+    assert get_storage(db_dir).pending.get("cu_1") is not None
+    assert pending_compaction.main(["--db-dir", db_dir, "--days", "7", "--force"]) == 0
+    assert get_storage(db_dir).pending.get("cu_1") is None
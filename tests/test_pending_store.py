@@ -0,0 +1,126 @@
+"""
+Test kho pending request (utils/pending_store.py, user-009): đếm theo tài khoản, file lưu trữ request đã xong
+và tự hủy theo PENDING_TTL
+"""
+import json
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+import utils.pending_compaction as pending_compaction
+from utils.pending_store import PendingStore
+from utils.storage import get_storage
+
+ID_A = "a" * 20
+ID_B = "b" * 20
+
+
+def _luc(seconds_ago):
+    return (datetime.now() - timedelta(seconds=seconds_ago)).isoformat()
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "pending_requests.json")
+
+
+def _doc(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def test_dem_theo_tai_khoan_va_luu_tru_request_da_xong(path):
+    store = PendingStore(path, ttl=0)
+    store.add("r1", {"id": ID_A, "status": "pending", "timestamp": _luc(3)})
+    store.add("r2", {"id": ID_A, "status": "pending", "timestamp": _luc(2)})
+    store.add("r3", {"id": ID_B, "status": "pending", "timestamp": _luc(1)})
+    assert (store.count_pending(ID_A), store.count_pending(ID_B)) == (2, 1)
+
+    store.update("r1", status="completed", completed_at=_luc(0))
+    assert store.count_pending(ID_A) == 1
+    # Request đã xong rời pending_requests.json nhưng vẫn tra cứu được qua file lưu trữ
+    assert set(_doc(path)) == {"r2", "r3"}
+    assert store.get("r1")["status"] == "completed"
+
+    # Đổi tài khoản của request pending: bộ đếm chuyển theo
+    store.update("r3", id=ID_A)
+    assert (store.count_pending(ID_A), store.count_pending(ID_B)) == (2, 0)
+
+    moi = PendingStore(path, ttl=0)
+    assert moi.get("r1")["status"] == "completed"
+    assert moi.count_pending(ID_A) == 2
+
+
+def test_chuyen_request_da_xong_con_sot_khi_nap(path):
+    with open(path, "w") as f:
+        json.dump({
+            "cu": {"id": ID_A, "status": "completed", "timestamp": _luc(10)},
+            "dang_cho": {"id": ID_A, "status": "pending", "timestamp": _luc(5)},
+        }, f)
+    store = PendingStore(path, ttl=0)
+    assert store.count_pending(ID_A) == 1
+    assert store.get("cu")["status"] == "completed"
+    assert set(_doc(path)) == {"dang_cho"}
+
+
+def test_qua_ttl_doc_nhu_da_huy_nhung_khong_ghi_file(path):
+    store = PendingStore(path, ttl=60)
+    store.add("moi", {"id": ID_A, "status": "pending", "timestamp": _luc(1)})
+    # Thêm sau cùng (lần ghi kế tiếp sẽ ghi trạng thái hủy của request này)
+    store.add("cu", {"id": ID_A, "status": "pending", "timestamp": _luc(120)})
+    truoc = os.stat(path).st_mtime_ns
+
+    item = store.get("cu")
+    assert item["status"] == "cancelled" and item["cancel_reason"] == "expired"
+    assert store.get("moi")["status"] == "pending"
+    assert store.count_pending(ID_A) == 1
+    # Đường đọc không ghi file
+    assert os.stat(path).st_mtime_ns == truoc
+    assert _doc(path)["cu"]["status"] == "pending"
+
+
+def test_expire_ghi_trang_thai_huy(path):
+    store = PendingStore(path, ttl=60)
+    store.add("cu", {"id": ID_A, "status": "pending", "timestamp": _luc(120)})
+    assert store.expire() == 1
+    assert store.expire() == 0
+    assert "cu" not in _doc(path)
+    assert PendingStore(path, ttl=60).get("cu")["cancel_reason"] == "expired"
+
+
+def test_lan_ghi_ke_tiep_ghi_trang_thai_huy(path):
+    store = PendingStore(path, ttl=60)
+    store.add("cu", {"id": ID_A, "status": "pending", "timestamp": _luc(120)})
+    store.add("moi", {"id": ID_B, "status": "pending", "timestamp": _luc(1)})
+    assert set(_doc(path)) == {"moi"}
+    assert PendingStore(path, ttl=0).get("cu")["status"] == "cancelled"
+
+
+def test_ttl_0_khong_tu_huy(path):
+    store = PendingStore(path, ttl=0)
+    store.add("cu", {"id": ID_A, "status": "pending", "timestamp": _luc(10 ** 6)})
+    assert store.get("cu")["status"] == "pending"
+    assert store.count_pending(ID_A) == 1
+    assert store.expire() == 0
+
+
+def test_thread_nen_ghi_trang_thai_huy_khi_chi_bat_ttl(tmp_path, monkeypatch):
+    db_dir = str(tmp_path / "db")
+    os.makedirs(db_dir)
+    pending = get_storage(db_dir).pending
+    monkeypatch.setattr(pending, "ttl", 60)
+    monkeypatch.setattr(pending_compaction, "doc_pending_ttl", lambda: 0.05)
+    monkeypatch.setattr(pending_compaction, "_thread", None)
+    monkeypatch.setattr(pending_compaction, "_thread_pid", None)
+    pending.add("cu", {"id": ID_A, "status": "pending", "timestamp": _luc(120)})
+
+    # PENDING_COMPACT_INTERVAL = 0 nhưng PENDING_TTL bật: thread vẫn chạy để ghi trạng thái hủy
+    thread = pending_compaction.bat_dau_nen_dinh_ky(interval=0, db_dir=db_dir)
+    assert thread is not None
+    for _ in range(100):
+        if "cu" not in _doc(pending.path):
+            break
+        thread.join(0.05)
+    assert "cu" not in _doc(pending.path)
+    assert not os.path.exists(os.path.join(db_dir, pending_compaction.LAST_RUN_FILE_NAME))
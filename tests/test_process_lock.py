@@ -0,0 +1,109 @@
+"""
+Test chế độ lock liên process (ProcessLock / ProcessReadWriteLock trong utils/db_lock.py, user-006) và việc cắt
+dòng WAL ghi dở ở phía ghi (AccountStore._ghi)
+"""
+import json
+import subprocess
+import sys
+
+import pytest
+
+import utils.account_store as account_store
+import utils.db_lock as db_lock
+from utils.account_store import AccountStore
+from utils.db_lock import LockTimeout, ProcessLock, ProcessReadWriteLock
+
+pytestmark = pytest.mark.skipif(db_lock.fcntl is None, reason="Hệ điều hành không có fcntl")
+
+# Process con giữ flock (LOCK_SH nếu argv[2] == "sh") đến khi stdin đóng
+GIU_LOCK = """
+import fcntl, os, sys
+fd = os.open(sys.argv[1], os.O_RDWR | os.O_CREAT)
+fcntl.flock(fd, fcntl.LOCK_SH if sys.argv[2] == "sh" else fcntl.LOCK_EX)
+print("ok", flush=True)
+sys.stdin.read()
+"""
+
+
+@pytest.fixture
+def giu_lock():
+    """Chạy process con giữ flock trên một file, trả lại process khi đã lấy được lock"""
+    processes = []
+
+    def chay(path, kind):
+        process = subprocess.Popen([sys.executable, "-c", GIU_LOCK, path, kind],
+                                   stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+        assert process.stdout.readline().strip() == "ok"
+        processes.append(process)
+        return process
+
+    yield chay
+    for process in processes:
+        process.stdin.close()
+        process.wait(timeout=5)
+
+
+def test_lay_long_nhau_va_ghi_trong_doc(tmp_path):
+    lock = ProcessLock(str(tmp_path / "a.lock"), "test")
+    with lock:
+        with lock.read():
+            with lock.write():
+                pass
+    with lock.read():
+        with lock.read():
+            pass
+        with pytest.raises(RuntimeError):
+            with lock.write():
+                pass
+    # Đã trả hết: lấy lại được phía ghi
+    with lock.write():
+        pass
+
+
+def test_loai_tru_giua_cac_process(tmp_path, giu_lock):
+    path = str(tmp_path / "b.lock")
+    process = giu_lock(path, "ex")
+    with pytest.raises(LockTimeout):
+        with ProcessLock(path, "test", timeout=0.1).read():
+            pass
+    process.stdin.close()
+    process.wait(timeout=5)
+    with ProcessLock(path, "test", timeout=1):
+        pass
+
+
+def test_nhieu_process_cung_doc(tmp_path, giu_lock):
+    path = str(tmp_path / "c.lock")
+    giu_lock(path, "sh")
+    rw = ProcessReadWriteLock(path, "test", timeout=0.1)
+    with rw.read():
+        pass
+    with pytest.raises(LockTimeout):
+        with rw.write():
+            pass
+
+
+def test_dong_wal_ghi_do_bi_cat_o_lan_ghi_sau(tmp_path, monkeypatch):
+    config = dict(account_store.doc_db_config())
+    config.update({"WAL_ENABLED": True, "WAL_CHECKPOINT_EVERY": 0, "WAL_CHECKPOINT_INTERVAL": 0})
+    monkeypatch.setattr(account_store, "doc_db_config", lambda: config)
+    db_file = str(tmp_path / "data.json")
+    with open(db_file, "w") as f:
+        json.dump([{"id": "a" * 20, "limit": 100, "count": 0, "active": True}], f)
+
+    AccountStore(db_file).update("a" * 20, count=5)
+    with open(db_file + ".wal", "ab") as f:
+        f.write(b'{"op": "set", "id": "' + b"a" * 20 + b'", "f": "cou')
+
+    # Đọc bỏ qua dòng ghi dở và không sửa file (chỉ giữ lock đọc)
+    store = AccountStore(db_file)
+    assert store.get("a" * 20)["count"] == 5
+    with open(db_file + ".wal", "rb") as f:
+        assert not f.read().endswith(b"\n")
+
+    # Lần ghi kế tiếp cắt dòng ghi dở trước khi nối bản ghi mới: mọi dòng đều là JSON hoàn chỉnh
+    store.update("a" * 20, count=6)
+    with open(db_file + ".wal", "rb") as f:
+        lines = f.read().splitlines()
+    assert [json.loads(line)["v"] for line in lines] == [5, 6]
+    assert AccountStore(db_file).get("a" * 20)["count"] == 6
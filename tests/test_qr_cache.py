@@ -0,0 +1,54 @@
+"""
+Test cache LRU theo số byte (utils/lru_cache.py, user-023) và việc dùng cache khi tạo payload / ảnh VietQR
+"""
+import pytest
+
+import utils.vietqr as vietqr
+from utils.lru_cache import ByteLRUCache
+from utils.vietqr import crc16, tao_payload, tao_qr_png
+
+
+def test_bo_phan_tu_lau_nhat_khi_vuot_gioi_han():
+    cache = ByteLRUCache(10)
+    cache.put("a", b"1234")
+    cache.put("b", b"1234")
+    assert cache.get("a") == b"1234"
+    cache.put("c", b"1234")
+    # "b" lâu nhất không được dùng → bị bỏ
+    assert cache.get("b") is None
+    assert cache.get("a") == b"1234" and cache.get("c") == b"1234"
+    assert cache.evictions == 1
+
+    # Giá trị lớn hơn giới hạn không được lưu
+    cache.put("d", b"x" * 11)
+    assert cache.get("d") is None
+
+
+def test_tat_cache():
+    cache = ByteLRUCache(0)
+    cache.put("a", b"1")
+    assert cache.get("a") is None
+
+
+@pytest.mark.parametrize("amount", [1000, None])
+def test_payload_tu_cache_giong_khong_cache(amount, monkeypatch):
+    # Lần đầu tạo và lưu phần đầu payload, các lần sau tính CRC tiếp từ CRC phần đầu đã cache
+    dau_tien = tao_payload("970422", "0966549624", amount, "AUTOid0c0nUPf3rjZwzpA3yD-50END")
+    khac = tao_payload("970422", "0966549624", amount, "AUTOtesttesttesttesttest100END")
+    assert khac[-4:] == crc16(khac[:-4])
+
+    monkeypatch.setattr(vietqr, "_prefix_cache", ByteLRUCache(0))
+    assert tao_payload("970422", "0966549624", amount, "AUTOid0c0nUPf3rjZwzpA3yD-50END") == dau_tien
+    assert tao_payload("970422", "0966549624", amount, "AUTOtesttesttesttesttest100END") == khac
+
+
+def test_anh_tu_cache(monkeypatch):
+    pytest.importorskip("qrcode")
+    monkeypatch.setattr(vietqr, "_image_cache", ByteLRUCache(1 << 20))
+    _, png, _ = tao_qr_png("MB", "0966549624", 1000, "AUTOid0c0nUPf3rjZwzpA3yD-50END", cache=True)
+    _, lan_sau, _ = tao_qr_png("MB", "0966549624", 1000, "AUTOid0c0nUPf3rjZwzpA3yD-50END", cache=True)
+    assert lan_sau is png
+    assert vietqr._image_cache.hits == 1
+
+    _, khong_cache, _ = tao_qr_png("MB", "0966549624", 1000, "AUTOid0c0nUPf3rjZwzpA3yD-50END")
+    assert khong_cache == png and khong_cache is not png
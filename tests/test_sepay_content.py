@@ -0,0 +1,45 @@
+"""
+Test parser nội dung chuyển khoản SePay (utils/sepay_content.py, user-018) so với cách find/split trước đây
+"""
+import pytest
+
+from bench.content_parser import tach_cu, tao_du_lieu
+from utils.sepay_content import parse_sepay_content
+
+
+def test_giong_cach_cu_voi_mot_doan_auto_end():
+    corpus = [content for content in tao_du_lieu(2000) if content.count("AUTO") <= 1]
+    assert corpus
+    for content in corpus:
+        result = parse_sepay_content(content)
+        assert (result.id, result.sl) == tach_cu(content), content
+
+
+@pytest.mark.parametrize("content, id, sl", [
+    # Các dạng nội dung trong phần test của apis/authencation.py
+    ("MBVCB.11605994255.405978 AUTOid0c0nUPf3rjZwzpA3yD-50END tu 1015360468 HOANG NGOC HIEP",
+     "id0c0nUPf3rjZwzpA3yD", "50"),
+    ("MBVCB AUTOtest123456789012345650END chuyen tien", "test1234567890123456", "50"),
+    ("test123456789012345650", "test1234567890123456", "50"),
+    ("AUTO id0c0nUPf3rjZwzpA3yD - 100 END", "id0c0nUPf3rjZwzpA3yD", "100"),
+    # Không có END: toàn bộ nội dung là id_sl
+    ("AUTOtest1234567890123450 chuyen tien", "AUTOtest123456789012", "3450 chuyen tien"),
+])
+def test_noi_dung_hop_le(content, id, sl):
+    result = parse_sepay_content(content)
+    assert result.ok
+    assert (result.id, result.sl) == (id, sl)
+    assert (result.id, result.sl) == tach_cu(content)
+
+
+@pytest.mark.parametrize("content", ["", "   ", "AUTOngan-50END", "AUTOid0c0nUPf3rjZwzpA3yDEND", None])
+def test_noi_dung_khong_hop_le(content):
+    result = parse_sepay_content(content)
+    assert not result.ok
+    assert result.id is None and result.sl is None
+
+
+def test_dung_doan_auto_end_hop_le_dau_tien():
+    # Cách cũ chỉ xét đoạn đầu tiên; parser mới bỏ qua đoạn không hợp lệ để dùng đoạn phía sau
+    result = parse_sepay_content("AUTOloi-50END sau do AUTOid0c0nUPf3rjZwzpA3yD-20END")
+    assert (result.id, result.sl) == ("id0c0nUPf3rjZwzpA3yD", "20")
@@ -0,0 +1,71 @@
+"""
+Test nhập dữ liệu JSON sang SQLite (utils/storage_sqlite.py, user-003): chỉ đọc các file JSON
+"""
+import hashlib
+import json
+import os
+import time
+
+import utils.account_store as account_store
+from utils.storage_sqlite import tao_sqlite_storage
+
+ID_1 = "id0c0nUPf3rjZwzpA3yD"
+ID_2 = "id1c0nUPf3rjZwzpA3yD"
+
+
+def _dong(record):
+    return json.dumps(record) + "\n"
+
+
+def _noi_dung(db_dir):
+    """Nội dung (hash) của mọi file trong thư mục"""
+    return {
+        name: hashlib.sha256(open(os.path.join(db_dir, name), "rb").read()).hexdigest()
+        for name in sorted(os.listdir(db_dir))
+    }
+
+
+def test_nhap_khong_sua_file_json(tmp_path, monkeypatch):
+    config = dict(account_store.doc_db_config())
+    config.update({"WAL_ENABLED": True})
+    monkeypatch.setattr(account_store, "doc_db_config", lambda: config)
+
+    db_dir = tmp_path / "db"
+    db_dir.mkdir()
+    (db_dir / "data.json").write_text(json.dumps([{"id": ID_1, "limit": 100, "count": 0, "active": True}]))
+    # WAL có một dòng cuối bị ghi dở: được bỏ qua nhưng không bị cắt khỏi file
+    (db_dir / "data.json.wal").write_text(
+        _dong({"op": "set", "id": ID_1, "f": "count", "v": 7})
+        + _dong({"op": "put", "id": ID_2, "v": {"id": ID_2, "limit": 50, "count": 0, "active": True}})
+        + '{"op": "del", "id": "'
+    )
+    # pending_requests.json còn request đã xong (dữ liệu cũ): PendingStore sẽ chuyển sang file lưu trữ khi nạp
+    (db_dir / "pending_requests.json").write_text(json.dumps({
+        "r1": {"id": ID_1, "status": "pending", "timestamp": "2026-01-01T00:00:00"},
+        "r2": {"id": ID_1, "status": "completed", "timestamp": "2026-01-01T00:00:00"},
+        "r3": {"id": ID_2, "status": "pending", "timestamp": "2026-01-01T00:00:00"},
+    }))
+    (db_dir / "pending_archive.jsonl").write_text(
+        _dong({"request_id": "r0", "id": ID_2, "status": "cancelled", "timestamp": "2025-12-31T00:00:00"})
+        + _dong({"request_id": "r3", "id": ID_2, "status": "completed", "timestamp": "2026-01-01T00:00:00"})
+    )
+    (db_dir / "temp_count.json").write_text(json.dumps({ID_1: 2}))
+    (db_dir / "transactions.jsonl").write_text(
+        _dong({"key": "id:1", "ts": time.time(), "id": ID_1})
+        + _dong({"key": "id:2", "ts": time.time(), "id": ID_2})
+        + _dong({"key": "id:2", "del": True, "ts": time.time()})
+    )
+    truoc = _noi_dung(str(db_dir))
+
+    storage = tao_sqlite_storage(str(db_dir), str(tmp_path / "server.sqlite3"))
+
+    assert _noi_dung(str(db_dir)) == truoc
+    assert storage.accounts.get(ID_1)["count"] == 7
+    assert storage.accounts.get(ID_2)["limit"] == 50
+    assert sorted(storage.pending.all()) == ["r0", "r1", "r2", "r3"]
+    assert storage.pending.get("r3")["status"] == "completed"
+    assert storage.pending.count_pending(ID_1) == 1
+    assert storage.pending.count_pending(ID_2) == 0
+    assert storage.temp_counts.get(ID_1) == 2
+    assert storage.transactions.get("id:1")["id"] == ID_1
+    assert storage.transactions.get("id:2") is None
@@ -0,0 +1,73 @@
+"""
+Test bảng count tạm ghi trễ (utils/temp_counter.py, user-011): thay đổi nằm trong bộ nhớ tới khi flush
+"""
+import json
+import time
+
+import pytest
+
+from utils.storage_json import JsonTempCountRepository
+from utils.temp_counter import TempCounterTable
+
+
+@pytest.fixture
+def backing(tmp_path):
+    """temp_count.json tạm có sẵn một count tạm"""
+    path = tmp_path / "temp_count.json"
+    path.write_text(json.dumps({"cu": 3}))
+    return JsonTempCountRepository(str(path))
+
+
+def test_ghi_xuong_file_khi_flush(backing):
+    table = TempCounterTable(backing, flush_ms=60000, flush_every=0)
+    assert table.get("cu") == 3
+    table.set("moi", 1)
+    assert table.delete("cu")
+    assert not table.delete("khong_ton_tai")
+    assert table.all() == {"moi": 1}
+
+    # Chưa tới chu kỳ ghi: file vẫn như cũ
+    assert backing.all() == {"cu": 3}
+    assert table.stats()["dirty"] == 2
+
+    assert table.flush() == 2
+    assert backing.all() == {"moi": 1}
+    assert table.flush() == 0
+    assert table.stats()["dirty"] == 0
+
+
+def test_write_many_co_id_bi_xoa(backing):
+    table = TempCounterTable(backing, flush_ms=60000, flush_every=0)
+    table.write_many({"a": 1, "b": 2}, deleted=["cu", "khong_ton_tai"])
+    assert table.get_many(["a", "cu"]) == {"a": 1}
+    table.flush()
+    assert backing.all() == {"a": 1, "b": 2}
+
+
+def test_du_so_thay_doi_thi_ghi_som(backing):
+    table = TempCounterTable(backing, flush_ms=60000, flush_every=3)
+    for i in range(3):
+        table.set(f"id{i}", i)
+
+    # Thread nền được đánh thức ngay, không đợi hết chu kỳ 60 giây
+    deadline = time.time() + 5
+    while backing.get("id2") is None and time.time() < deadline:
+        time.sleep(0.01)
+    assert backing.all() == {"cu": 3, "id0": 0, "id1": 1, "id2": 2}
+
+
+def test_ghi_loi_thi_giu_lai_de_ghi_lai(backing, monkeypatch):
+    table = TempCounterTable(backing, flush_ms=60000, flush_every=0)
+    table.set("moi", 1)
+
+    def write_many_loi(values, deleted=()):
+        raise OSError("đĩa đầy")
+
+    with monkeypatch.context() as m:
+        m.setattr(backing, "write_many", write_many_loi)
+        with pytest.raises(OSError):
+            table.flush()
+    assert table.stats()["dirty"] == 1
+
+    assert table.flush() == 1
+    assert backing.all() == {"cu": 3, "moi": 1}
@@ -0,0 +1,84 @@
+"""
+Test tạo mã QR VietQR trong process (utils/vietqr.py, user-021): payload EMVCo, CRC16 và ảnh PNG
+"""
+import struct
+import zlib
+
+import pytest
+
+from utils.vietqr import crc16, tao_payload, tao_qr_png, tim_bin
+
+
+def _tach_truong(payload):
+    """Tách payload EMVCo thành danh sách (tag, value)"""
+    fields = []
+    i = 0
+    while i < len(payload):
+        tag, length = payload[i:i + 2], int(payload[i + 2:i + 4])
+        fields.append((tag, payload[i + 4:i + 4 + length]))
+        i += 4 + length
+    return fields
+
+
+def test_crc16_ccitt():
+    # Giá trị kiểm tra chuẩn của CRC-16/CCITT-FALSE
+    assert crc16("123456789") == "29B1"
+
+
+@pytest.mark.parametrize("amount, add_info", [
+    (1000, "AUTOid0c0nUPf3rjZwzpA3yD-50END"),
+    (None, "AUTOid0c0nUPf3rjZwzpA3yD-50END"),
+    (25000, None),
+])
+def test_crc_khop_tinh_lai_toan_bo(amount, add_info):
+    payload = tao_payload("970422", "0966549624", amount, add_info)
+    assert payload[-8:-4] == "6304"
+    assert payload[-4:] == crc16(payload[:-4])
+
+
+def test_cac_truong_payload():
+    payload = tao_payload("970422", "0966549624", 1000, "AUTOid0c0nUPf3rjZwzpA3yD-50END")
+    fields = dict(_tach_truong(payload))
+    assert fields["00"] == "01"
+    assert fields["01"] == "12"
+    assert dict(_tach_truong(fields["38"])) == {
+        "00": "A000000727",
+        "01": "00069704220110" + "0966549624",
+        "02": "QRIBFTTA",
+    }
+    assert fields["53"] == "704"
+    assert fields["54"] == "1000"
+    assert fields["58"] == "VN"
+    assert fields["62"] == "0830AUTOid0c0nUPf3rjZwzpA3yD-50END"
+
+    # Không có số tiền: QR tĩnh, không có trường 54
+    fields = dict(_tach_truong(tao_payload("970422", "0966549624")))
+    assert fields["01"] == "11"
+    assert "54" not in fields and "62" not in fields
+
+
+def test_tim_bin():
+    assert tim_bin("Mbbank") == "970422"
+    assert tim_bin("mb") == "970422"
+    assert tim_bin("970436") == "970436"
+    assert tim_bin("KHONG_CO") is None
+
+
+def test_anh_png():
+    pytest.importorskip("qrcode")
+    success, png, error_message = tao_qr_png("MB", "0966549624", 1000, "AUTOid0c0nUPf3rjZwzpA3yD-50END", box_size=2)
+    assert success and error_message is None
+    assert png[:8] == b'\x89PNG\r\n\x1a\n'
+
+    # IHDR: ảnh vuông 1 bit; dữ liệu gồm size hàng, mỗi hàng 1 byte filter + size bit
+    width, height, bit_depth = struct.unpack('>IIB', png[16:25])
+    assert width == height and bit_depth == 1
+    idat_length = struct.unpack('>I', png[33:37])[0]
+    assert png[37:41] == b'IDAT'
+    rows = zlib.decompress(png[41:41 + idat_length])
+    assert len(rows) == height * (1 + (width + 7) // 8)
+    # Góc trên trái là viền trắng (bit 1)
+    assert rows[1] & 0x80
+
+    success, _, error_message = tao_qr_png("KHONG_CO", "0966549624", 1000, "x")
+    assert not success and "BIN" in error_message
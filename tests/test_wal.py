@@ -0,0 +1,83 @@
+"""
+Test WAL của db/data.json (utils/wal.py và AccountStore, user-002): phát lại sau khi khởi động lại, checkpoint
+"""
+import json
+import os
+
+import pytest
+
+import utils.account_store as account_store
+from utils.account_store import AccountStore
+from utils.wal import WriteAheadLog
+
+
+@pytest.fixture
+def db_file(tmp_path, monkeypatch):
+    """data.json tạm với WAL bật và không tự checkpoint (chỉ checkpoint khi gọi checkpoint())"""
+    config = dict(account_store.doc_db_config())
+    config.update({"WAL_ENABLED": True, "WAL_CHECKPOINT_EVERY": 0, "WAL_CHECKPOINT_INTERVAL": 0})
+    monkeypatch.setattr(account_store, "doc_db_config", lambda: config)
+    path = tmp_path / "data.json"
+    path.write_text(json.dumps([
+        {"id": "a" * 20, "limit": 100, "count": 0, "active": True},
+        {"id": "b" * 20, "limit": 50, "count": 3, "active": False},
+    ]))
+    return str(path)
+
+
+def _thay_doi(store):
+    store.update("a" * 20, count=7)
+    store.upsert({"id": "c" * 20, "limit": 10, "count": 0, "active": True})
+    store.delete("b" * 20)
+    with store.batch():
+        store.update("c" * 20, count=1)
+        store.update("c" * 20, active=False)
+
+
+def test_doc_lai_bo_qua_dong_ghi_do(tmp_path):
+    wal = WriteAheadLog(str(tmp_path / "x.wal"))
+    end = wal.append([{"op": "del", "id": "1"}, {"op": "del", "id": "2"}])
+    with open(wal.path, "ab") as f:
+        f.write(b'{"op": "del", "i')
+    records, offset = wal.read_from(0)
+    assert [record["id"] for record in records] == ["1", "2"]
+    assert offset == end
+
+
+def test_wal_phat_lai_sau_khi_khoi_dong_lai(db_file):
+    store = AccountStore(db_file)
+    _thay_doi(store)
+    truoc = store.all()
+
+    # Snapshot chưa đổi, mọi thay đổi nằm trong WAL
+    assert [item["id"] for item in json.load(open(db_file))] == ["a" * 20, "b" * 20]
+    assert os.path.getsize(db_file + ".wal") > 0
+
+    assert AccountStore(db_file).all() == truoc
+    assert truoc == [
+        {"id": "a" * 20, "limit": 100, "count": 7, "active": True},
+        {"id": "c" * 20, "limit": 10, "count": 1, "active": False},
+    ]
+
+
+def test_checkpoint_ghi_snapshot_va_xoa_wal(db_file):
+    store = AccountStore(db_file)
+    _thay_doi(store)
+    truoc = store.all()
+
+    store.checkpoint()
+    assert os.path.getsize(db_file + ".wal") == 0
+    assert json.load(open(db_file)) == truoc
+    assert AccountStore(db_file).all() == truoc
+
+    # Ghi tiếp sau checkpoint rồi phát lại trên snapshot mới
+    store.update("a" * 20, count=8)
+    assert AccountStore(db_file).get("a" * 20)["count"] == 8
+
+
+def test_phat_lai_wal_tu_store_khac(db_file):
+    store = AccountStore(db_file)
+    khac = AccountStore(db_file)
+    assert store.get("a" * 20)["count"] == 0
+    khac.update("a" * 20, count=9)
+    assert store.get("a" * 20)["count"] == 9
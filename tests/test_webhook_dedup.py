@@ -0,0 +1,88 @@
+"""
+Test chống xử lý lặp webhook SePay (user-016): khoa_giao_dich, TransactionStore và xu_ly_thanh_toan
+với transaction_key
+"""
+import json
+import time
+
+import pytest
+
+from apis.authencation import khoa_giao_dich, xu_ly_thanh_toan
+from utils.storage import get_storage
+from utils.transaction_store import TransactionStore
+
+ID_1 = "id0c0nUPf3rjZwzpA3yD"
+
+
+@pytest.fixture
+def moi_truong(tmp_path):
+    """Thư mục db/ tạm và config thanh toán (COST 2000 cho LIMIT 100 lượt)"""
+    db_dir = tmp_path / "db"
+    db_dir.mkdir()
+    (db_dir / "data.json").write_text("[]")
+    config_file = tmp_path / "pay_ment.json"
+    config_file.write_text(json.dumps({"COST": "2000", "LIMIT": 100}))
+    return str(config_file), str(db_dir / "data.json"), get_storage(str(db_dir))
+
+
+def test_khoa_giao_dich():
+    assert khoa_giao_dich({"id": 92704, "referenceCode": "FT1"}) == "id:92704"
+    assert khoa_giao_dich({"id": "", "referenceCode": "FT1"}) == "ref:FT1"
+    assert khoa_giao_dich({"content": "x"}) is None
+    assert khoa_giao_dich(["id"]) is None
+
+
+def test_gui_lai_khong_reset_tai_khoan(moi_truong):
+    config_file, db_file, storage = moi_truong
+    success, _, data = xu_ly_thanh_toan(f"{ID_1}-50", 1000, config_file=config_file, db_file=db_file,
+                                        transaction_key="id:1")
+    assert success and data["limit"] == 50
+    storage.accounts.update(ID_1, count=7)
+
+    success, message, data = xu_ly_thanh_toan(f"{ID_1}-50", 1000, config_file=config_file, db_file=db_file,
+                                              transaction_key="id:1")
+    assert success and "đã được xử lý" in message
+    assert data["limit"] == 50
+    assert storage.accounts.get(ID_1)["count"] == 7
+
+    # Giao dịch khác của cùng tài khoản vẫn được xử lý (reset count)
+    xu_ly_thanh_toan(f"{ID_1}-50", 1000, config_file=config_file, db_file=db_file, transaction_key="id:2")
+    assert storage.accounts.get(ID_1)["count"] == 0
+
+
+def test_ghi_tai_khoan_loi_thi_bo_ghi_nhan(moi_truong, monkeypatch):
+    config_file, db_file, storage = moi_truong
+
+    def upsert_loi(item):
+        raise OSError("đĩa đầy")
+
+    monkeypatch.setattr(storage.accounts, "upsert", upsert_loi)
+    success, _, _ = xu_ly_thanh_toan(f"{ID_1}-50", 1000, config_file=config_file, db_file=db_file,
+                                     transaction_key="id:1")
+    assert not success
+    assert storage.transactions.get("id:1") is None
+
+
+def test_chi_muc_luu_qua_khoi_dong_lai(tmp_path):
+    path = str(tmp_path / "transactions.jsonl")
+    store = TransactionStore(path, ttl=0, max_size=0)
+    assert store.add_many({"id:1": {"id": ID_1}, "id:2": {"id": ID_1}}) == ["id:1", "id:2"]
+    assert store.add("id:1", {"id": "khac"}) is False
+    assert store.discard_many(["id:2", "id:3"]) == ["id:2"]
+
+    moi = TransactionStore(path, ttl=0, max_size=0)
+    assert moi.get("id:1")["id"] == ID_1
+    assert moi.get("id:2") is None
+
+
+def test_chi_muc_bo_giao_dich_qua_han_va_qua_nhieu(tmp_path):
+    store = TransactionStore(str(tmp_path / "transactions.jsonl"), ttl=0, max_size=2)
+    for key in ("id:1", "id:2", "id:3"):
+        store.add(key, {})
+    assert list(store.all()) == ["id:2", "id:3"]
+
+    store = TransactionStore(str(tmp_path / "ttl.jsonl"), ttl=60, max_size=0)
+    store.add("id:1", {})
+    store._items["id:1"]["ts"] = time.time() - 120
+    store.add("id:2", {})
+    assert list(store.all()) == ["id:2"]
@@ -0,0 +1,121 @@
+"""
+Test xử lý webhook SePay theo lô từ hàng đợi (user-017, xu_ly_thanh_toan_batch trong apis/authencation.py):
+chống xử lý lặp trong lô và khi phát lại lô
+"""
+import json
+
+import pytest
+
+from apis.authencation import xu_ly_thanh_toan_batch
+from utils.storage import get_storage
+from utils.webhook_queue import WebhookQueue
+
+ID_1 = "id0c0nUPf3rjZwzpA3yD"
+ID_2 = "testtesttesttesttest"
+
+
+@pytest.fixture
+def moi_truong(tmp_path):
+    """Thư mục db/ tạm và config thanh toán (COST 2000 cho LIMIT 100 lượt)"""
+    db_dir = tmp_path / "db"
+    db_dir.mkdir()
+    (db_dir / "data.json").write_text("[]")
+    config_file = tmp_path / "pay_ment.json"
+    config_file.write_text(json.dumps({"COST": "2000", "LIMIT": 100}))
+    return str(config_file), str(db_dir / "data.json"), get_storage(str(db_dir))
+
+
+def _lo():
+    return [
+        {"id": 1001, "content": f"MBVCB.123 AUTO{ID_1}-50END tu 0123", "transferAmount": 1000},
+        {"id": 1002, "content": f"AUTO{ID_2}100END", "transferAmount": 2000},
+        # SePay gửi lại giao dịch 1001 trong cùng lô
+        {"id": 1001, "content": f"MBVCB.123 AUTO{ID_1}-50END tu 0123", "transferAmount": 1000},
+    ]
+
+
+def test_giao_dich_trung_trong_lo_bi_bo_qua(moi_truong):
+    config_file, db_file, storage = moi_truong
+    ket_qua = xu_ly_thanh_toan_batch(_lo(), config_file=config_file, db_file=db_file)
+
+    assert [success for success, _, _ in ket_qua] == [True, True, True]
+    assert "đã được xử lý" in ket_qua[2][1]
+    assert storage.accounts.get(ID_1)["limit"] == 50
+    assert storage.accounts.get(ID_2)["limit"] == 100
+    assert storage.transactions.get("id:1001") is not None
+    assert storage.transactions.get("id:1002") is not None
+
+
+def test_phat_lai_lo_khong_reset_tai_khoan(moi_truong):
+    config_file, db_file, storage = moi_truong
+    xu_ly_thanh_toan_batch(_lo(), config_file=config_file, db_file=db_file)
+    storage.accounts.update(ID_1, count=7)
+
+    # Hàng đợi phát lại cả lô (vd. process dừng trước khi tăng offset): không giao dịch nào được áp dụng lại
+    ket_qua = xu_ly_thanh_toan_batch(_lo(), config_file=config_file, db_file=db_file)
+    assert all("đã được xử lý" in message for _, message, _ in ket_qua)
+    assert storage.accounts.get(ID_1)["count"] == 7
+
+
+def test_ghi_tai_khoan_loi_thi_bo_ghi_nhan(moi_truong, monkeypatch):
+    config_file, db_file, storage = moi_truong
+
+    def upsert_loi(item):
+        raise OSError("đĩa đầy")
+
+    monkeypatch.setattr(storage.accounts, "upsert", upsert_loi)
+    with pytest.raises(OSError):
+        xu_ly_thanh_toan_batch(_lo(), config_file=config_file, db_file=db_file)
+    assert storage.transactions.get("id:1001") is None
+    assert storage.transactions.get("id:1002") is None
+
+    # Thử lại sau khi hết lỗi: giao dịch được áp dụng chứ không bị coi là đã xử lý
+    monkeypatch.undo()
+    ket_qua = xu_ly_thanh_toan_batch(_lo(), config_file=config_file, db_file=db_file)
+    assert "đã được xử lý" not in ket_qua[0][1]
+    assert storage.accounts.get(ID_1)["limit"] == 50
+
+
+def test_ghi_nhan_loi_thi_khong_ghi_tai_khoan(moi_truong, monkeypatch):
+    config_file, db_file, storage = moi_truong
+    xu_ly_thanh_toan_batch(_lo()[:1], config_file=config_file, db_file=db_file)
+    storage.accounts.update(ID_1, count=7)
+
+    def add_many_loi(items):
+        raise OSError("đĩa đầy")
+
+    # Không ghi nhận được giao dịch: lỗi phải được ném ra (hàng đợi thử lại) và tài khoản không bị ghi,
+    # nếu không lần phát lại sau sẽ không biết giao dịch đã được áp dụng
+    monkeypatch.setattr(storage.transactions, "add_many", add_many_loi)
+    lo = [{"id": 1003, "content": f"AUTO{ID_1}-50END", "transferAmount": 1000}]
+    with pytest.raises(OSError):
+        xu_ly_thanh_toan_batch(lo, config_file=config_file, db_file=db_file)
+    assert storage.accounts.get(ID_1)["count"] == 7
+
+
+def test_hang_doi_xu_ly_theo_lo_va_giu_lai_lo_loi(tmp_path):
+    queue = WebhookQueue(str(tmp_path / "webhook_queue.jsonl"), batch_max=2, poll=1)
+    for i in range(5):
+        queue.put({"id": i})
+
+    def handler_loi(payloads):
+        raise OSError("đĩa đầy")
+
+    # Lô lỗi: vị trí đã xử lý không đổi
+    with pytest.raises(OSError):
+        queue.process_once(handler_loi)
+    assert queue.pending_bytes() > 0
+
+    cac_lo = []
+
+    def handler(payloads):
+        cac_lo.append([payload["id"] for payload in payloads])
+        return [(True, "ok", None)] * len(payloads)
+
+    assert queue.process_once(handler) == 2
+    # Khởi động lại giữa chừng: xử lý tiếp từ vị trí đã lưu
+    queue = WebhookQueue(queue.path, batch_max=2, poll=1)
+    assert queue.drain(handler) == 3
+    assert cac_lo == [[0, 1], [2, 3], [4]]
+    assert queue.pending_bytes() == 0
+    assert queue.drain(handler) == 0
@@ -0,0 +1,316 @@
+"""
+Công cụ replay webhook SePay từ file JSONL vào một thư mục dữ liệu tạm (scratch)
+
+File đầu vào được đọc lần lượt từng dòng (không nạp cả file vào bộ nhớ), mỗi dòng là một trong các dạng:
+    - JSON body SePay gốc: {"id": 92704, "content": "...", "transferAmount": 100000, ...}
+    - Bản ghi của db/webhook_log.jsonl hoặc db/webhook_queue.jsonl: {"ts": ..., "payload": {...}}
+File .gz được giải nén khi đọc.
+
+Dùng để:
+    - Khôi phục tài khoản khi mất data.json: replay db/webhook_log.jsonl (WEBHOOK_LOG = true) vào thư mục
+      tạm rồi chép data.json sang db/ khi server đang dừng
+    - Tạo tải giống thực tế cho đường xử lý webhook (--mode sync: từng webhook như /authentication,
+      --mode batch: theo lô như hàng đợi webhook)
+    - Kiểm tra nhanh một file webhook mà không ghi gì (--dry-run, chia lô cho nhiều process với --workers)
+
+Chạy:
+    python tools/replay_webhooks.py db/webhook_log.jsonl --db-dir /tmp/replay_db
+    python tools/replay_webhooks.py capture.jsonl.gz --db-dir /tmp/replay_db --mode sync
+    python tools/replay_webhooks.py capture.jsonl --dry-run --workers 4
+"""
+import argparse
+import gzip
+import itertools
+import json
+import os
+import sys
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+
+# Thêm thư mục gốc vào path để import apis/utils
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if root_dir not in sys.path:
+    sys.path.insert(0, root_dir)
+
+from apis.authencation import khoa_giao_dich, kiem_tra_webhook, xu_ly_thanh_toan, xu_ly_thanh_toan_batch
+from utils.json_codec import loads
+from utils.payment_config import get_payment_config
+from utils.sepay_content import parse_sepay_content
+from utils.storage import DEFAULT_DB_DIR, get_storage
+
+
+def doc_dong(paths):
+    """
+    Đọc lần lượt các dòng khác rỗng của các file JSONL (chưa giải mã)
+
+    Args:
+        paths: Danh sách đường dẫn file (.jsonl hoặc .jsonl.gz)
+
+    Yields:
+        bytes: Từng dòng theo thứ tự trong file
+    """
+    for path in paths:
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rb') as f:
+            for line in f:
+                if line.strip():
+                    yield line
+
+
+def giai_ma(line):
+    """
+    Giải mã một dòng thành payload webhook
+
+    Returns:
+        dict: Payload (đã bỏ lớp {"payload": ...} nếu có), None nếu dòng không hợp lệ
+    """
+    try:
+        record = loads(line)
+    except ValueError:
+        return None
+    if isinstance(record, dict) and isinstance(record.get('payload'), dict):
+        record = record['payload']
+    return record if isinstance(record, dict) else None
+
+
+def doc_payload(paths, thong_ke):
+    """
+    Đọc lần lượt các payload webhook từ các file JSONL
+
+    Args:
+        paths: Danh sách đường dẫn file (.jsonl hoặc .jsonl.gz)
+        thong_ke: Counter để đếm số dòng không đọc được (key "invalid_lines")
+
+    Yields:
+        dict: Payload webhook theo thứ tự trong file
+    """
+    for line in doc_dong(paths):
+        payload = giai_ma(line)
+        if payload is None:
+            thong_ke["invalid_lines"] += 1
+            continue
+        yield payload
+
+
+def chia_lo(iterable, size):
+    """Chia iterable thành các list tối đa size phần tử (chỉ giữ một lô trong bộ nhớ)"""
+    iterator = iter(iterable)
+    while True:
+        lo = list(itertools.islice(iterator, size))
+        if not lo:
+            return
+        yield lo
+
+
+def tom_tat_tai_khoan(limits):
+    """
+    Tóm tắt trạng thái tài khoản
+
+    Args:
+        limits: Danh sách limit của các tài khoản
+
+    Returns:
+        dict: {"accounts": số tài khoản, "total_limit": tổng limit}
+    """
+    limits = [limit for limit in limits if isinstance(limit, (int, float))]
+    return {"accounts": len(limits), "total_limit": sum(limits)}
+
+
+def _xu_ly_dong_bo(payload, config_file, db_file):
+    """Xử lý một webhook giống /authentication ở chế độ sync"""
+    if payload.get('content') is None or payload.get('transferAmount') is None:
+        return False, "Payload thiếu 'content' hoặc 'transferAmount'", None
+    return xu_ly_thanh_toan(
+        id_sl=parse_sepay_content(payload.get('content')),
+        pay_ment=payload.get('transferAmount'),
+        config_file=config_file,
+        db_file=db_file,
+        transaction_key=khoa_giao_dich(payload)
+    )
+
+
+def replay(paths, db_dir, mode="batch", batch_size=200, config_file="config/pay_ment.json", limit=None):
+    """
+    Replay webhook vào thư mục dữ liệu db_dir (giao dịch đã xử lý trong db_dir được bỏ qua)
+
+    Args:
+        paths: Danh sách file JSONL
+        db_dir: Thư mục dữ liệu tạm (không được là db/ của server)
+        mode: "batch" (xu_ly_thanh_toan_batch theo lô) hoặc "sync" (xu_ly_thanh_toan từng webhook)
+        batch_size: Số webhook mỗi lô ở chế độ "batch"
+        config_file: File config thanh toán (COST, LIMIT)
+        limit: Chỉ replay tối đa số webhook này (None là tất cả)
+
+    Returns:
+        dict: Báo cáo gồm payloads, ok, duplicate, failed, invalid_lines, seconds, per_second, errors, state
+    """
+    thong_ke = Counter()
+    loi = Counter()
+    db_file = os.path.join(db_dir, 'data.json')
+    payloads = itertools.islice(doc_payload(paths, thong_ke), limit)
+
+    bat_dau = time.perf_counter()
+    for lo in chia_lo(payloads, batch_size if mode == "batch" else 1):
+        if mode == "batch":
+            ket_qua = xu_ly_thanh_toan_batch(lo, config_file=config_file, db_file=db_file)
+        else:
+            ket_qua = [_xu_ly_dong_bo(payload, config_file, db_file) for payload in lo]
+        for success, message, _ in ket_qua:
+            thong_ke["payloads"] += 1
+            if not success:
+                thong_ke["failed"] += 1
+                loi[message] += 1
+            elif message.startswith("🔁"):
+                thong_ke["duplicate"] += 1
+            else:
+                thong_ke["ok"] += 1
+    elapsed = time.perf_counter() - bat_dau
+
+    accounts = get_storage(db_dir).accounts.all()
+    return {
+        "payloads": thong_ke["payloads"],
+        "ok": thong_ke["ok"],
+        "duplicate": thong_ke["duplicate"],
+        "failed": thong_ke["failed"],
+        "invalid_lines": thong_ke["invalid_lines"],
+        "seconds": round(elapsed, 3),
+        "per_second": round(thong_ke["payloads"] / elapsed, 1) if elapsed > 0 else None,
+        "errors": loi.most_common(5),
+        "state": tom_tat_tai_khoan(item.get('limit') for item in accounts),
+    }
+
+
+def _kiem_tra_lo(args):
+    """
+    Kiểm tra một lô dòng JSONL (chạy trong process con)
+
+    Returns:
+        list: (key, loi, id, limit) theo thứ tự; dòng không giải mã được có loi là None và id là False
+    """
+    lines, config = args
+    ket_qua = []
+    for line in lines:
+        payload = giai_ma(line)
+        if payload is None:
+            ket_qua.append((None, None, False, None))
+            continue
+        loi, id, new_limit, _ = kiem_tra_webhook(payload, config)
+        ket_qua.append((khoa_giao_dich(payload), loi, id, new_limit))
+    return ket_qua
+
+
+def dry_run(paths, workers=1, batch_size=200, config_file="config/pay_ment.json", limit=None):
+    """
+    Kiểm tra các webhook mà không ghi dữ liệu: tách nội dung, tính limit và dựng trạng thái tài khoản dự kiến
+
+    Giải mã và kiểm tra từng lô chạy song song trên `workers` process (process chính chỉ đọc dòng và gộp
+    kết quả theo thứ tự); số lô đang chờ được giới hạn để không nạp cả file vào bộ nhớ. Giao dịch trùng
+    được xác định khi gộp, giống replay: chỉ giao dịch hợp lệ mới được ghi nhận là đã xử lý
+
+    Args:
+        paths: Danh sách file JSONL
+        workers: Số process kiểm tra (1 là chạy ngay trong process hiện tại)
+        batch_size: Số dòng mỗi lô gửi cho process con
+        config_file: File config thanh toán (COST, LIMIT)
+        limit: Chỉ kiểm tra tối đa số dòng này (None là tất cả)
+
+    Returns:
+        dict: Báo cáo cùng dạng với replay()
+    """
+    thong_ke = Counter()
+    loi = Counter()
+    config = get_payment_config(config_file)
+    da_xu_ly = set()
+    # id tài khoản → limit của webhook hợp lệ cuối cùng (mỗi thanh toán ghi đè tài khoản)
+    trang_thai = {}
+
+    def gom(ket_qua):
+        for key, loi_payload, id, new_limit in ket_qua:
+            if id is False:
+                thong_ke["invalid_lines"] += 1
+                continue
+            thong_ke["payloads"] += 1
+            if key is not None and key in da_xu_ly:
+                thong_ke["duplicate"] += 1
+            elif loi_payload:
+                thong_ke["failed"] += 1
+                loi[loi_payload] += 1
+            else:
+                thong_ke["ok"] += 1
+                trang_thai[id] = new_limit
+                if key is not None:
+                    da_xu_ly.add(key)
+
+    cac_lo = chia_lo(itertools.islice(doc_dong(paths), limit), batch_size)
+    bat_dau = time.perf_counter()
+    if workers <= 1:
+        for lo in cac_lo:
+            gom(_kiem_tra_lo((lo, config)))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            dang_cho = deque()
+            for lo in cac_lo:
+                dang_cho.append(executor.submit(_kiem_tra_lo, (lo, config)))
+                if len(dang_cho) >= workers * 2:
+                    gom(dang_cho.popleft().result())
+            while dang_cho:
+                gom(dang_cho.popleft().result())
+    elapsed = time.perf_counter() - bat_dau
+
+    return {
+        "payloads": thong_ke["payloads"],
+        "ok": thong_ke["ok"],
+        "duplicate": thong_ke["duplicate"],
+        "failed": thong_ke["failed"],
+        "invalid_lines": thong_ke["invalid_lines"],
+        "seconds": round(elapsed, 3),
+        "per_second": round(thong_ke["payloads"] / elapsed, 1) if elapsed > 0 else None,
+        "errors": loi.most_common(5),
+        "state": tom_tat_tai_khoan(trang_thai.values()),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay webhook SePay từ file JSONL vào thư mục dữ liệu tạm")
+    parser.add_argument("files", nargs="+", help="File JSONL (.jsonl hoặc .jsonl.gz), đọc theo thứ tự")
+    parser.add_argument("--db-dir", default=None, help="Thư mục dữ liệu tạm để replay vào (bắt buộc trừ khi --dry-run)")
+    parser.add_argument("--mode", choices=("batch", "sync"), default="batch",
+                        help="batch: theo lô như hàng đợi webhook (mặc định); sync: từng webhook như /authentication")
+    parser.add_argument("--batch-size", type=int, default=200, help="Số webhook mỗi lô (mặc định 200)")
+    parser.add_argument("--config", default=os.path.join(root_dir, "config", "pay_ment.json"),
+                        help="File config thanh toán (mặc định config/pay_ment.json)")
+    parser.add_argument("--limit", type=int, default=None, help="Chỉ xử lý tối đa số webhook này")
+    parser.add_argument("--dry-run", action="store_true", help="Chỉ kiểm tra, không ghi dữ liệu")
+    parser.add_argument("--workers", type=int, default=1, help="Số process kiểm tra khi --dry-run (mặc định 1)")
+    parser.add_argument("--json", action="store_true", help="In báo cáo dạng JSON")
+    args = parser.parse_args(argv)
+
+    batch_size = max(args.batch_size, 1)
+    if args.dry_run:
+        report = dry_run(args.files, args.workers, batch_size, args.config, args.limit)
+    else:
+        if not args.db_dir:
+            parser.error("cần --db-dir (thư mục dữ liệu tạm) hoặc --dry-run")
+        db_dir = os.path.abspath(args.db_dir)
+        if db_dir == DEFAULT_DB_DIR:
+            parser.error("không replay vào db/ của server; replay vào thư mục tạm rồi chép data.json khi server đang dừng")
+        os.makedirs(db_dir, exist_ok=True)
+        report = replay(args.files, db_dir, args.mode, batch_size, args.config, args.limit)
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return 0
+
+    tieu_de = "Kiểm tra (dry-run)" if args.dry_run else f"Replay ({args.mode}) vào {os.path.abspath(args.db_dir)}"
+    print(f"✅ {tieu_de}: {report['payloads']} webhook trong {report['seconds']} giây ({report['per_second']}/s)")
+    print(f"   • Hợp lệ: {report['ok']}, trùng: {report['duplicate']}, lỗi: {report['failed']}, "
+          f"dòng không đọc được: {report['invalid_lines']}")
+    print(f"📋 Tài khoản: {report['state']['accounts']} (tổng limit {report['state']['total_limit']})")
+    for message, count in report["errors"]:
+        print(f"   ⚠️ {count} × {message}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
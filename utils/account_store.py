@@ -0,0 +1,466 @@
+"""
+Module quản lý dữ liệu tài khoản (db/data.json) thường trú trong bộ nhớ
+Nạp file một lần, tra cứu theo id qua dict index (O(1)) và ghi thay đổi xuống đĩa
+
+Khi bật WAL (config/db.json → WAL_ENABLED), mỗi thay đổi chỉ ghi nối một bản ghi nhỏ
+vào db/data.json.wal; data.json đóng vai trò snapshot và chỉ được ghi lại khi checkpoint.
+Lúc khởi động, store nạp snapshot rồi phát lại (replay) WAL để khôi phục trạng thái mới nhất.
+"""
+import atexit
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from utils.db_config import doc_db_config
+from utils.db_lock import lock_manager, resource_lock
+from utils.json_codec import DB_INDENT, doc_file
+from utils.json_file import ghi_json_atomic
+from utils.repository import AccountRepository
+from utils.wal import WriteAheadLog
+
+# Đường dẫn mặc định đến file data.json
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_DB_FILE = os.path.join(root_dir, 'db', 'data.json')
+
+# Các store đã tạo, key là đường dẫn tuyệt đối của file data.json
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+class AccountStore(AccountRepository):
+    """
+    Kho tài khoản trong bộ nhớ với index theo id
+
+    - Dữ liệu được nạp từ file một lần, các lần gọi sau chỉ stat snapshot và WAL
+      để nạp lại / phát lại phần mới nếu file bị thay đổi từ bên ngoài
+    - Tra cứu theo id là O(1) thông qua dict (dict giữ nguyên thứ tự các tài khoản trong file)
+    - Mọi thay đổi (upsert, update, delete) được lưu ngay: ghi nối vào WAL nếu bật WAL,
+      nếu không thì ghi lại toàn bộ file data.json
+    - Các hàm đọc trả về bản sao để nơi gọi không sửa trực tiếp dữ liệu trong store
+
+    Bản ghi WAL (mỗi dòng một thay đổi):
+        {"op": "set", "id": ..., "f": <tên trường>, "v": <giá trị mới>, "ts": <epoch>}
+        {"op": "put", "id": ..., "v": <toàn bộ object>, "ts": <epoch>}
+        {"op": "del", "id": ..., "ts": <epoch>}
+    """
+
+    def __init__(self, db_file=DEFAULT_DB_FILE):
+        self.db_file = os.path.abspath(db_file)
+        # Lock của file data.json: reader-writer trong process, thêm flock <data.json>.lock khi LOCK_MODE = "process"
+        self._lock = resource_lock(self.db_file)
+        # Nhiều reader có thể cùng gọi _dam_bao_moi_nhat (nạp lại / phát lại WAL), chỉ cho một thread làm
+        self._nap_lock = threading.Lock()
+        self._index = {}
+        # Các phần tử không hợp lệ (không phải dict hoặc không có id), vẫn giữ lại khi ghi file
+        self._khac = []
+        self._mtime = None
+        self._da_nap = False
+        # Tăng mỗi khi có tài khoản mới hoặc nạp lại dữ liệu (xem generation())
+        self._generation = 0
+
+        config = doc_db_config()
+        self._wal = WriteAheadLog(self.db_file + '.wal') if config.get("WAL_ENABLED") else None
+        self._checkpoint_every = int(config.get("WAL_CHECKPOINT_EVERY") or 0)
+        self._checkpoint_interval = float(config.get("WAL_CHECKPOINT_INTERVAL") or 0)
+        # Vị trí đã phát lại trong WAL và số bản ghi chưa được checkpoint
+        self._wal_offset = 0
+        self._wal_chua_checkpoint = 0
+        self._lan_checkpoint_cuoi = time.time()
+        # Bản ghi chờ ghi khi đang trong batch() (None là không trong batch)
+        self._lo = None
+
+    def _lay_mtime(self):
+        try:
+            return os.stat(self.db_file).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _nap(self):
+        """
+        Nạp snapshot data.json vào bộ nhớ, dựng lại index rồi phát lại WAL
+
+        Raises:
+            json.JSONDecodeError: Nếu file không phải JSON hợp lệ
+            ValueError: Nếu dữ liệu trong file không phải là list
+        """
+        mtime = self._lay_mtime()
+        data_list = []
+        if mtime is not None:
+            data_list = doc_file(self.db_file)
+            if not isinstance(data_list, list):
+                raise ValueError("Dữ liệu trong db/data.json không hợp lệ")
+
+        index = {}
+        khac = []
+        for item in data_list:
+            if isinstance(item, dict) and item.get('id') is not None:
+                index[item['id']] = item
+            else:
+                khac.append(item)
+
+        self._index = index
+        self._khac = khac
+        self._mtime = mtime
+        self._da_nap = True
+        self._generation += 1
+        self._wal_offset = 0
+        self._wal_chua_checkpoint = 0
+
+        if self._wal is not None:
+            # Dòng cuối bị ghi dở (nếu có) được cắt ở lần ghi kế tiếp (_ghi), không cắt ở đây vì
+            # _nap cũng chạy trên đường đọc (chỉ giữ lock đọc)
+            self._phat_lai_wal()
+
+    def _phat_lai_wal(self):
+        """Áp dụng các bản ghi WAL mới (từ vị trí đã phát lại) lên dữ liệu trong bộ nhớ"""
+        records, end_offset = self._wal.read_from(self._wal_offset)
+        if records:
+            # Áp dụng lên bản sao của index: reader khác (chỉ giữ lock đọc) có thể đang duyệt index cũ
+            self._index = dict(self._index)
+        for record in records:
+            self._ap_dung(record)
+        self._wal_offset = end_offset
+        self._wal_chua_checkpoint += len(records)
+
+    def _ap_dung(self, record):
+        """Áp dụng một bản ghi WAL lên index"""
+        if _ap_dung_ban_ghi(self._index, record):
+            self._generation += 1
+
+    def _dam_bao_moi_nhat(self):
+        """Nạp lần đầu, nạp lại nếu snapshot bị thay đổi, hoặc phát lại phần WAL mới ghi thêm"""
+        with self._nap_lock:
+            if not self._da_nap or self._lay_mtime() != self._mtime:
+                self._nap()
+                return
+            if self._wal is not None:
+                wal_size = self._wal.size()
+                if wal_size < self._wal_offset:
+                    # WAL đã bị cắt (checkpoint từ nơi khác) → nạp lại từ snapshot
+                    self._nap()
+                elif wal_size > self._wal_offset:
+                    self._phat_lai_wal()
+
+    def _ghi_snapshot(self):
+        """Ghi toàn bộ dữ liệu trong bộ nhớ xuống file data.json"""
+        data_list = list(self._index.values()) + self._khac
+        # Ghi atomic (file tạm + rename), giữ bản snapshot trước thành data.json.bak
+        ghi_json_atomic(self.db_file, data_list, indent=DB_INDENT, backup=True)
+        self._mtime = self._lay_mtime()
+
+    def _ghi(self, records):
+        """
+        Lưu các thay đổi vừa áp dụng trong bộ nhớ
+
+        - Bật WAL: ghi nối records vào WAL (một lần fsync), checkpoint khi đủ số bản ghi/thời gian
+        - Tắt WAL: ghi lại toàn bộ data.json
+        - Đang trong batch(): chỉ gom lại, ghi một lần khi batch kết thúc
+        """
+        if self._lo is not None:
+            self._lo.extend(records)
+            return
+
+        if self._wal is None:
+            self._ghi_snapshot()
+            return
+
+        # Đang giữ lock ghi và đã phát lại hết bản ghi hoàn chỉnh: phần còn lại sau offset là dòng
+        # bị ghi dở (process dừng giữa lúc ghi), cắt bỏ để bản ghi mới không bị dính vào nó
+        if self._wal.size() > self._wal_offset:
+            self._wal.truncate(self._wal_offset)
+        self._wal_offset = self._wal.append(records)
+        self._wal_chua_checkpoint += len(records)
+
+        du_so_ban_ghi = self._checkpoint_every and self._wal_chua_checkpoint >= self._checkpoint_every
+        du_thoi_gian = self._checkpoint_interval and time.time() - self._lan_checkpoint_cuoi >= self._checkpoint_interval
+        if du_so_ban_ghi or du_thoi_gian:
+            self.checkpoint()
+
+    @contextmanager
+    def batch(self):
+        """
+        Giữ lock data.json và gom mọi thay đổi bên trong thành một lần ghi (một lần fsync WAL
+        hoặc một lần ghi data.json). Batch lồng nhau dùng chung batch ngoài cùng
+
+        Usage:
+            with store.batch():
+                store.update(id1, count=1)
+                store.update(id2, count=2)
+        """
+        with self._lock:
+            if self._lo is not None:
+                yield
+                return
+            self._lo = []
+            try:
+                yield
+            finally:
+                # Kể cả khi có lỗi: các thay đổi đã áp dụng trong bộ nhớ vẫn được ghi để đĩa khớp với bộ nhớ
+                records, self._lo = self._lo, None
+                if records:
+                    self._ghi(records)
+
+    def checkpoint(self):
+        """
+        Ghi snapshot data.json từ dữ liệu trong bộ nhớ rồi xóa sạch WAL
+
+        Nếu process dừng giữa lúc ghi snapshot và cắt WAL, lần khởi động sau sẽ phát lại
+        WAL lên snapshot mới; các bản ghi chứa giá trị tuyệt đối nên phát lại không làm sai dữ liệu.
+        """
+        with self._lock:
+            if self._wal is None or not self._da_nap:
+                return
+            self._dam_bao_moi_nhat()
+            if self._wal_offset == 0 and self._wal_chua_checkpoint == 0:
+                return
+            self._ghi_snapshot()
+            self._wal.truncate()
+            self._wal_offset = 0
+            self._wal_chua_checkpoint = 0
+            self._lan_checkpoint_cuoi = time.time()
+
+    def get(self, id):
+        """
+        Lấy tài khoản theo id
+
+        Args:
+            id (str): ID của tài khoản
+
+        Returns:
+            dict: Bản sao của tài khoản, None nếu không tồn tại
+        """
+        with self._lock.read():
+            self._dam_bao_moi_nhat()
+            item = self._index.get(id)
+            return dict(item) if item is not None else None
+
+    def status(self, id, refresh=True):
+        """
+        Lấy nhanh trạng thái tài khoản từ dữ liệu trong bộ nhớ (không sao chép object)
+
+        Args:
+            id (str): ID của tài khoản
+            refresh: False → không lock và không stat file (dùng ngay sau generation(), vốn đã kiểm tra
+                     thay đổi từ process khác khi cần). Đọc không lock vẫn an toàn vì dict.get và
+                     việc gán lại self._index khi nạp lại đều nguyên tử (GIL)
+
+        Returns:
+            tuple: (active: bool, count: int, limit: int), None nếu không tồn tại
+        """
+        if not refresh and self._da_nap:
+            item = self._index.get(id)
+            if item is None:
+                return None
+            return bool(item.get('active', False)), item.get('count', 0), item.get('limit', 0)
+
+        with self._lock.read():
+            self._dam_bao_moi_nhat()
+            item = self._index.get(id)
+            if item is None:
+                return None
+            return bool(item.get('active', False)), item.get('count', 0), item.get('limit', 0)
+
+    def status_many(self, ids, refresh=True):
+        """
+        Như status() cho nhiều id: chỉ lock/kiểm tra file một lần cho cả lô
+
+        Args:
+            ids: Danh sách ID tài khoản
+            refresh: Như status()
+
+        Returns:
+            dict: {id: (active, count, limit)}, không chứa id không tồn tại
+        """
+        if not refresh and self._da_nap:
+            return self._trang_thai(self._index, ids)
+
+        with self._lock.read():
+            self._dam_bao_moi_nhat()
+            return self._trang_thai(self._index, ids)
+
+    @staticmethod
+    def _trang_thai(index, ids):
+        """Tra (active, count, limit) của các id trong index"""
+        result = {}
+        for id in ids:
+            item = index.get(id)
+            if item is not None:
+                result[id] = (bool(item.get('active', False)), item.get('count', 0), item.get('limit', 0))
+        return result
+
+    def generation(self):
+        """
+        Số thế hệ của tập id tài khoản: tăng mỗi khi có tài khoản mới được thêm hoặc dữ liệu được nạp lại
+
+        - LOCK_MODE = "thread": mọi thay đổi đi qua store này nên chỉ đọc bộ đếm (không stat file);
+          file bị sửa tay từ bên ngoài được nhận ra ở lần get/status kế tiếp
+        - LOCK_MODE = "process": tài khoản có thể được thêm từ process khác, nên stat snapshot và WAL
+          (chỉ lấy lock đọc khi có thay đổi)
+
+        Returns:
+            int: Số thế hệ hiện tại
+        """
+        if self._da_nap and lock_manager.mode != "process":
+            return self._generation
+        wal_thay_doi = self._wal is not None and self._wal.size() != self._wal_offset
+        if not self._da_nap or wal_thay_doi or self._lay_mtime() != self._mtime:
+            with self._lock.read():
+                self._dam_bao_moi_nhat()
+        return self._generation
+
+    def all(self):
+        """
+        Lấy danh sách tất cả tài khoản theo thứ tự trong file
+
+        Returns:
+            list: Danh sách bản sao các tài khoản
+        """
+        with self._lock.read():
+            self._dam_bao_moi_nhat()
+            return [dict(item) for item in self._index.values()]
+
+    def upsert(self, item):
+        """
+        Thêm mới hoặc thay thế toàn bộ tài khoản có cùng id, sau đó lưu xuống đĩa
+
+        Args:
+            item (dict): Object tài khoản, bắt buộc có trường id
+
+        Returns:
+            dict: Bản sao của tài khoản đã lưu
+        """
+        with self._lock:
+            self._dam_bao_moi_nhat()
+            record = {"op": "put", "id": item['id'], "v": dict(item), "ts": time.time()}
+            self._ap_dung(record)
+            self._ghi([record])
+            return dict(item)
+
+    def update(self, id, **fields):
+        """
+        Cập nhật một số trường của tài khoản, sau đó lưu xuống đĩa
+
+        Args:
+            id (str): ID của tài khoản
+            **fields: Các trường cần cập nhật
+
+        Returns:
+            dict: Bản sao của tài khoản sau khi cập nhật, None nếu không tồn tại
+        """
+        with self._lock:
+            self._dam_bao_moi_nhat()
+            if id not in self._index:
+                return None
+            ts = time.time()
+            records = [{"op": "set", "id": id, "f": field, "v": value, "ts": ts} for field, value in fields.items()]
+            for record in records:
+                self._ap_dung(record)
+            if records:
+                self._ghi(records)
+            return dict(self._index[id])
+
+    def delete(self, id):
+        """
+        Xóa tài khoản theo id, sau đó lưu xuống đĩa
+
+        Args:
+            id (str): ID của tài khoản
+
+        Returns:
+            dict: Tài khoản đã bị xóa, None nếu không tồn tại
+        """
+        with self._lock:
+            self._dam_bao_moi_nhat()
+            item = self._index.get(id)
+            if item is None:
+                return None
+            record = {"op": "del", "id": id, "ts": time.time()}
+            self._ap_dung(record)
+            self._ghi([record])
+            return item
+
+
+def _ap_dung_ban_ghi(index, record):
+    """
+    Áp dụng một bản ghi WAL lên index {id: tài khoản}
+
+    Returns:
+        bool: True nếu bản ghi thêm một id mới vào index
+    """
+    op = record.get('op')
+    id = record.get('id')
+    if op == 'set':
+        item = index.get(id)
+        if item is not None:
+            item[record['f']] = record.get('v')
+    elif op == 'put':
+        them_moi = id not in index
+        index[id] = dict(record['v'])
+        return them_moi
+    elif op == 'del':
+        index.pop(id, None)
+    return False
+
+
+def doc_tai_khoan(db_file):
+    """
+    Đọc danh sách tài khoản từ data.json và WAL mà không ghi gì (không lấy lock, không cắt WAL, không checkpoint)
+
+    Args:
+        db_file: Đường dẫn đến file data.json
+
+    Returns:
+        list: Các tài khoản (dict có id) theo thứ tự như AccountStore.all()
+
+    Raises:
+        json.JSONDecodeError: Nếu file không phải JSON hợp lệ
+        ValueError: Nếu dữ liệu trong file không phải là list
+    """
+    try:
+        data_list = doc_file(db_file)
+    except FileNotFoundError:
+        data_list = []
+    if not isinstance(data_list, list):
+        raise ValueError("Dữ liệu trong db/data.json không hợp lệ")
+
+    index = {item['id']: dict(item) for item in data_list if isinstance(item, dict) and item.get('id') is not None}
+    if doc_db_config().get("WAL_ENABLED"):
+        # Như AccountStore: chỉ phát lại các dòng hoàn chỉnh, dòng cuối bị ghi dở được bỏ qua
+        records, _ = WriteAheadLog(db_file + '.wal').read_from(0)
+        for record in records:
+            _ap_dung_ban_ghi(index, record)
+    return list(index.values())
+
+
+def get_account_store(db_file=None):
+    """
+    Lấy AccountStore dùng chung cho file data.json (mỗi file chỉ có một store trong process)
+
+    Args:
+        db_file: Đường dẫn đến file data.json (mặc định là db/data.json của project)
+
+    Returns:
+        AccountStore: Store tương ứng với file
+    """
+    db_path = os.path.abspath(db_file) if db_file else DEFAULT_DB_FILE
+    with _stores_lock:
+        store = _stores.get(db_path)
+        if store is None:
+            store = AccountStore(db_path)
+            _stores[db_path] = store
+        return store
+
+
+def checkpoint_all():
+    """Checkpoint WAL của tất cả store đang mở (gọi khi process thoát)"""
+    with _stores_lock:
+        stores = list(_stores.values())
+    for store in stores:
+        try:
+            store.checkpoint()
+        except Exception as e:
+            print(f"⚠️ Lỗi khi checkpoint {store.db_file}: {e}")
+
+
+atexit.register(checkpoint_all)
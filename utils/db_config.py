@@ -0,0 +1,126 @@
+"""
+Module đọc cấu hình lưu trữ từ config/db.json
+Thiếu file hoặc thiếu trường thì dùng giá trị mặc định
+"""
+import json
+import os
+
+# Đường dẫn đến file config/db.json
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DB_CONFIG_FILE = os.path.join(root_dir, 'config', 'db.json')
+
+# Giá trị mặc định cho các trường cấu hình
+DEFAULTS = {
+    # Backend lưu trữ: "json" (các file trong db/) hoặc "sqlite"
+    "BACKEND": "json",
+    # Tên file database SQLite (nằm trong thư mục db/)
+    "SQLITE_FILE": "server.sqlite3",
+    # Bật write-ahead log cho db/data.json
+    "WAL_ENABLED": True,
+    # Checkpoint WAL vào data.json sau số bản ghi này
+    "WAL_CHECKPOINT_EVERY": 1000,
+    # Hoặc sau số giây này kể từ lần checkpoint trước (nếu có bản ghi chưa checkpoint)
+    "WAL_CHECKPOINT_INTERVAL": 60,
+    # Chế độ lock: "thread" (một process) hoặc "process" (nhiều worker process, dùng fcntl.flock)
+    "LOCK_MODE": "thread",
+    # Số giây chờ lock liên process tối đa trước khi báo lỗi (0 là chờ mãi)
+    "LOCK_TIMEOUT": 30,
+    # Codec JSON: "auto" (orjson → ujson → json chuẩn) hoặc chỉ định "orjson" / "ujson" / "json"
+    "JSON_CODEC": "auto",
+    # Ghi gọn các file trong db/ (không thụt lề, không khoảng trắng sau dấu phân cách)
+    "JSON_COMPACT": True,
+    # Số giây một pending request của add_count được chờ verify trước khi tự hủy (0 là không tự hủy)
+    "PENDING_TTL": 0,
+    # Request đã xong quá số ngày này được chuyển sang file nén db/pending_archive/<ngày>.jsonl.gz
+    "PENDING_ARCHIVE_DAYS": 7,
+    # Số giây giữa hai lần nén lưu trữ chạy nền trong server (0 là không chạy nền)
+    "PENDING_COMPACT_INTERVAL": 3600,
+    # Count tạm của /check giữ trong bộ nhớ, ghi xuống đĩa mỗi số mili giây này (0 là ghi ngay mỗi lần).
+    # Chỉ áp dụng khi LOCK_MODE = "thread" (một process)
+    "TEMP_COUNT_FLUSH_MS": 500,
+    # Ghi sớm khi số thay đổi chưa ghi đạt ngưỡng này
+    "TEMP_COUNT_FLUSH_EVERY": 1000,
+    # Số id không tồn tại tối đa được /check nhớ để trả 404 ngay (0 là tắt)
+    "NEGATIVE_CACHE_SIZE": 10000,
+    # Số id tối đa trong một request /check_batch
+    "CHECK_BATCH_MAX": 500,
+    # Số phần tử tối đa trong một request /add_count_batch hoặc /verify_count_batch
+    "COUNT_BATCH_MAX": 500,
+    # Số giây ghi nhớ một giao dịch webhook SePay đã xử lý để bỏ qua khi SePay gửi lại (0 là không hết hạn)
+    "WEBHOOK_DEDUP_TTL": 604800,
+    # Số giao dịch đã xử lý tối đa được ghi nhớ (bỏ cũ nhất, 0 là không giới hạn)
+    "WEBHOOK_DEDUP_MAX": 100000,
+    # Xử lý webhook /authentication: "sync" (xử lý ngay trong request) hoặc "queue"
+    # (ghi vào db/webhook_queue.jsonl, trả lời ngay, thread nền xử lý theo lô)
+    "WEBHOOK_MODE": "sync",
+    # Số webhook tối đa được xử lý trong một lô (một lần ghi tài khoản)
+    "WEBHOOK_BATCH_MAX": 200,
+    # Số giây giữa hai lần thread nền kiểm tra hàng đợi (ngoài các lần được đánh thức khi có webhook mới)
+    "WEBHOOK_QUEUE_POLL": 1,
+    # Ghi mọi webhook hợp lệ nhận được vào db/webhook_log.jsonl (để replay/khôi phục bằng tools/replay_webhooks.py)
+    "WEBHOOK_LOG": False,
+    # Config thanh toán (config/pay_ment.json) được cache trong bộ nhớ; file chỉ được stat lại để phát hiện
+    # thay đổi tối đa một lần mỗi số mili giây này (0 là stat ở mỗi lần đọc)
+    "PAYMENT_CONFIG_CHECK_MS": 1000,
+    # Tạo ảnh QR /qr: "local" (tạo payload VietQR và ảnh PNG trong process) hoặc "remote" (tải từ img.vietqr.io)
+    "QR_RENDER": "local",
+    # Không tạo được QR tại chỗ (chưa cài qrcode, không biết BIN của ngân hàng) thì tải từ img.vietqr.io
+    "QR_REMOTE_FALLBACK": True,
+    # Số pixel mỗi ô của ảnh QR tạo tại chỗ
+    "QR_BOX_SIZE": 10,
+    # Số byte tối đa của cache phần đầu payload VietQR (theo tài khoản/số tiền) và cache ảnh QR của
+    # các request cố định (0 là tắt)
+    "QR_PREFIX_CACHE_BYTES": 65536,
+    "QR_IMAGE_CACHE_BYTES": 4194304,
+    # Tải ảnh từ img.vietqr.io: số kết nối keep-alive tối đa, số giây chờ mỗi lần gọi,
+    # số lần thử lại khi lỗi 5xx/timeout và thời gian chờ cơ sở giữa các lần thử (có jitter)
+    "QR_HTTP_POOL_SIZE": 10,
+    "QR_HTTP_TIMEOUT": 10,
+    "QR_HTTP_RETRIES": 2,
+    "QR_HTTP_BACKOFF_MS": 100,
+    # Sau số lần tải lỗi liên tiếp này thì ngừng gọi img.vietqr.io trong QR_BREAKER_COOLDOWN giây,
+    # /qr tạo QR tại chỗ (0 là tắt)
+    "QR_BREAKER_FAILURES": 5,
+    "QR_BREAKER_COOLDOWN": 30,
+    # Pool QR tạo sẵn cho /qr: số QR giữ sẵn cho mỗi sl (0 là tắt), các giá trị sl được tạo sẵn
+    # (null là /qr không có sl) và số QR tối đa thread nền tạo mỗi giây
+    "QR_POOL_SIZE": 20,
+    "QR_POOL_SL": [None, 50, 100],
+    "QR_POOL_REFILL_PER_SEC": 20,
+}
+
+
+def doc_db_config(config_file=DB_CONFIG_FILE):
+    """
+    Đọc cấu hình lưu trữ, gộp với giá trị mặc định
+
+    Args:
+        config_file: Đường dẫn đến file config/db.json
+
+    Returns:
+        dict: Cấu hình đầy đủ các trường trong DEFAULTS
+    """
+    config_data = dict(DEFAULTS)
+    try:
+        with open(config_file, 'r', encoding='utf-8') as f:
+            loaded = json.load(f)
+        if isinstance(loaded, dict):
+            config_data.update(loaded)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"⚠️ Lỗi khi đọc config/db.json, dùng giá trị mặc định: {e}")
+    return config_data
+
+
+def get_db_setting(name):
+    """
+    Lấy một trường cấu hình lưu trữ
+
+    Args:
+        name: Tên trường (ví dụ: "WAL_ENABLED")
+
+    Returns:
+        Giá trị của trường (mặc định nếu không có trong file)
+    """
+    return doc_db_config().get(name, DEFAULTS.get(name))
@@ -1,18 +1,706 @@
 """
 Module quản lý lock cho database operations
-Đảm bảo các request được xử lý tuần tự để tránh race condition
+- Lock theo tài khoản (chia sọc - striped): các request của cùng một tài khoản được xử lý tuần tự,
+  các tài khoản khác nhau chạy song song
+- Lock cấu trúc (reader-writer): thao tác thay đổi tập tài khoản (tạo/xóa user) lấy phía ghi (độc quyền),
+  các thao tác chỉ đọc danh sách (get_users, search_user) lấy phía đọc (nhiều reader cùng lúc)
+Thứ tự lấy lock luôn là: lock cấu trúc → lock tài khoản → lock file dữ liệu, để tránh deadlock
+
+Chế độ lock (config/db.json → LOCK_MODE):
+- "thread" (mặc định): lock trong process (threading), đủ khi chỉ chạy một process
+- "process": thêm lock liên process bằng fcntl.flock trên các file lock trong db/locks/
+  (và <file dữ liệu>.lock), dùng khi chạy nhiều worker process. Chờ quá LOCK_TIMEOUT giây
+  sẽ ném LockTimeout. Trên hệ điều hành không có fcntl (Windows) tự quay về "thread"
 """
+import inspect
+import os
 import threading
+import time
+import zlib
+from contextlib import ExitStack, contextmanager
 from functools import wraps
 
-# Tạo một lock toàn cục cho database operations
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from utils.db_config import doc_db_config
+
+# Số sọc lock tài khoản (các id có cùng hash sẽ dùng chung một lock)
+LOCK_STRIPES = 64
+
+# Thư mục chứa các file lock của lock tài khoản / lock cấu trúc ở chế độ "process"
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LOCK_DIR = os.path.join(root_dir, 'db', 'locks')
+
+# Lock toàn cục cũ, chỉ giữ lại để tương thích với code bên ngoài còn dùng with_db_lock
 db_lock = threading.Lock()
 
 
+class ReadWriteLock:
+    """
+    Lock nhiều reader / một writer, ưu tiên writer: khi có writer đang chờ thì reader mới phải
+    chờ writer xong, để luồng đọc liên tục (dashboard polling) không làm writer bị đói
+
+    Lưu ý: không reentrant - thread đang giữ phía đọc không được lấy lại phía đọc hoặc phía ghi
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    def acquire_read(self):
+        """Lấy phía đọc (chờ nếu có writer đang giữ hoặc đang chờ)"""
+        with self._cond:
+            while self._writer or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+
+    def release_read(self):
+        """Trả phía đọc"""
+        with self._cond:
+            self._readers -= 1
+            if self._readers == 0:
+                self._cond.notify_all()
+
+    def acquire_write(self):
+        """Lấy phía ghi (chờ đến khi không còn reader và writer nào)"""
+        with self._cond:
+            self._writers_waiting += 1
+            try:
+                while self._writer or self._readers:
+                    self._cond.wait()
+            finally:
+                self._writers_waiting -= 1
+            self._writer = True
+
+    def release_write(self):
+        """Trả phía ghi"""
+        with self._cond:
+            self._writer = False
+            self._cond.notify_all()
+
+    @contextmanager
+    def read(self):
+        """
+        Phía đọc dùng với câu lệnh with
+
+        Usage:
+            with rw_lock.read():
+                pass
+        """
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write(self):
+        """
+        Phía ghi dùng với câu lệnh with
+
+        Usage:
+            with rw_lock.write():
+                pass
+        """
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
+
+
+class LockTimeout(TimeoutError):
+    """Chờ lock liên process quá thời gian LOCK_TIMEOUT"""
+
+
+class LockMetrics:
+    """
+    Thống kê lock liên process theo loại (account, structure, file)
+
+    Mỗi loại gồm: số lần lấy lock, số lần phải chờ (contended), số lần timeout,
+    tổng và lớn nhất thời gian chờ (ms)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = {}
+
+    def ghi_nhan(self, kind, waited, timed_out=False):
+        """
+        Ghi nhận một lần lấy lock
+
+        Args:
+            kind: Loại lock
+            waited: Thời gian chờ (giây), 0 nếu lấy được ngay
+            timed_out: True nếu hết thời gian chờ
+        """
+        with self._lock:
+            item = self._data.get(kind)
+            if item is None:
+                item = self._data[kind] = {
+                    "acquired": 0, "contended": 0, "timeouts": 0, "wait_total_ms": 0.0, "wait_max_ms": 0.0
+                }
+            if timed_out:
+                item["timeouts"] += 1
+            else:
+                item["acquired"] += 1
+            if waited > 0:
+                waited_ms = waited * 1000
+                item["contended"] += 1
+                item["wait_total_ms"] += waited_ms
+                item["wait_max_ms"] = max(item["wait_max_ms"], waited_ms)
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: Bản sao thống kê {kind: {...}}
+        """
+        with self._lock:
+            return {
+                kind: dict(item, wait_total_ms=round(item["wait_total_ms"], 3), wait_max_ms=round(item["wait_max_ms"], 3))
+                for kind, item in self._data.items()
+            }
+
+
+lock_metrics = LockMetrics()
+
+
+class _LockFile:
+    """
+    Một file lock dùng fcntl.flock (chỉ dùng bên trong các lock liên process ở dưới)
+
+    File descriptor được mở khi cần và mở lại nếu process đã fork, vì flock gắn với
+    open file description: process con dùng chung fd với cha sẽ không loại trừ lẫn nhau
+    """
+
+    def __init__(self, path, kind):
+        self.path = os.path.abspath(path)
+        self.kind = kind
+        self._fd = None
+        self._pid = None
+
+    def _lay_fd(self):
+        if self._fd is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            self._pid = os.getpid()
+        return self._fd
+
+    def lock(self, shared, deadline):
+        """
+        Lấy flock, thử không chặn rồi chờ lùi dần (backoff) đến deadline
+
+        Args:
+            shared: True → LOCK_SH, False → LOCK_EX
+            deadline: Thời điểm (time.monotonic) hết hạn chờ, None là chờ mãi
+
+        Raises:
+            LockTimeout: Nếu quá deadline mà chưa lấy được lock
+        """
+        fd = self._lay_fd()
+        flags = (fcntl.LOCK_SH if shared else fcntl.LOCK_EX) | fcntl.LOCK_NB
+        start = time.monotonic()
+        delay = 0.001
+        while True:
+            try:
+                fcntl.flock(fd, flags)
+                lock_metrics.ghi_nhan(self.kind, time.monotonic() - start if delay > 0.001 else 0)
+                return
+            except BlockingIOError:
+                pass
+            now = time.monotonic()
+            if deadline is not None and now >= deadline:
+                lock_metrics.ghi_nhan(self.kind, now - start, timed_out=True)
+                raise LockTimeout(f"Hết thời gian chờ lock {os.path.basename(self.path)}")
+            sleep_for = delay if deadline is None else min(delay, max(deadline - now, 0))
+            time.sleep(sleep_for)
+            delay = min(delay * 2, 0.05)
+
+    def unlock(self):
+        fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+
+def _tinh_deadline(timeout):
+    return time.monotonic() + timeout if timeout else None
+
+
+def _con_lai(deadline):
+    """Thời gian còn lại (giây) cho threading.Lock.acquire, -1 là chờ mãi"""
+    return -1 if deadline is None else max(deadline - time.monotonic(), 0)
+
+
+class ProcessLock:
+    """
+    Lock độc quyền liên process (flock) kết hợp lock trong process, có thể lấy lồng nhau
+    trong cùng một thread. read() lấy flock dạng chia sẻ (các process khác cũng chỉ đọc thì
+    không phải chờ); trong cùng process các thread vẫn tuần tự
+
+    Lấy phía ghi lồng trong phía đọc ném RuntimeError: flock chia sẻ không bảo vệ được việc ghi,
+    còn nâng lên LOCK_EX thì không nguyên tử (process khác có thể ghi xen vào giữa)
+
+    Args:
+        path: Đường dẫn file lock
+        kind: Loại lock (để thống kê)
+        timeout: Số giây chờ tối đa, None/0 là chờ mãi
+    """
+
+    def __init__(self, path, kind, timeout=None):
+        self._file = _LockFile(path, kind)
+        self._timeout = timeout
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        # Kiểu flock đang giữ (True là chia sẻ), chỉ có nghĩa khi _depth > 0
+        self._shared = False
+
+    def acquire(self, shared=False):
+        deadline = _tinh_deadline(self._timeout)
+        if not self._thread_lock.acquire(timeout=_con_lai(deadline)):
+            lock_metrics.ghi_nhan(self._file.kind, self._timeout or 0, timed_out=True)
+            raise LockTimeout(f"Hết thời gian chờ lock {os.path.basename(self._file.path)}")
+        if self._depth == 0:
+            try:
+                self._file.lock(shared, deadline)
+            except BaseException:
+                self._thread_lock.release()
+                raise
+            self._shared = shared
+        elif self._shared and not shared:
+            self._thread_lock.release()
+            raise RuntimeError(f"Không được lấy lock ghi {os.path.basename(self._file.path)} khi đang giữ lock đọc")
+        self._depth += 1
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0:
+            self._file.unlock()
+        self._thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+        return False
+
+    @contextmanager
+    def read(self):
+        """Phía đọc: flock chia sẻ (nếu thread đang giữ lock ghi thì giữ nguyên flock độc quyền)"""
+        self.acquire(shared=True)
+        try:
+            yield
+        finally:
+            self.release()
+
+    @contextmanager
+    def write(self):
+        """Phía ghi: flock độc quyền"""
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+
+class ProcessReadWriteLock:
+    """
+    ReadWriteLock liên process: ReadWriteLock trong process (giữ ưu tiên writer giữa các thread)
+    kết hợp flock chia sẻ / độc quyền. Reader đầu tiên trong process lấy flock chia sẻ,
+    reader cuối cùng trả lại
+
+    Args:
+        path: Đường dẫn file lock
+        kind: Loại lock (để thống kê)
+        timeout: Số giây chờ flock tối đa, None/0 là chờ mãi
+    """
+
+    def __init__(self, path, kind, timeout=None):
+        self._rw = ReadWriteLock()
+        self._file = _LockFile(path, kind)
+        self._timeout = timeout
+        self._mutex = threading.Lock()
+        self._readers = 0
+
+    @contextmanager
+    def read(self):
+        self._rw.acquire_read()
+        try:
+            with self._mutex:
+                if self._readers == 0:
+                    self._file.lock(True, _tinh_deadline(self._timeout))
+                self._readers += 1
+        except BaseException:
+            self._rw.release_read()
+            raise
+        try:
+            yield
+        finally:
+            with self._mutex:
+                self._readers -= 1
+                if self._readers == 0:
+                    self._file.unlock()
+            self._rw.release_read()
+
+    @contextmanager
+    def write(self):
+        self._rw.acquire_write()
+        try:
+            self._file.lock(False, _tinh_deadline(self._timeout))
+        except BaseException:
+            self._rw.release_write()
+            raise
+        try:
+            yield
+        finally:
+            self._file.unlock()
+            self._rw.release_write()
+
+
+class _PhiaLock:
+    """Context manager của một phía lock (gọi thẳng acquire/release, không qua generator như @contextmanager)"""
+    __slots__ = ('_acquire', '_release')
+
+    def __init__(self, acquire, release):
+        self._acquire = acquire
+        self._release = release
+
+    def __enter__(self):
+        self._acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._release()
+        return False
+
+
+class ThreadResourceLock:
+    """
+    Lock nhiều reader / một writer trong process cho một file dữ liệu, cùng giao diện với ProcessLock:
+    dùng trực tiếp với câu lệnh with (phía ghi) hoặc qua read()/write()
+
+    Khác ReadWriteLock, lock này reentrant trong cùng một thread: writer lấy lại phía ghi hoặc
+    phía đọc (batch → upsert → get), reader lấy lại phía đọc đều không phải chờ. Ưu tiên writer
+    như ReadWriteLock. Lấy phía ghi lồng trong phía đọc ném RuntimeError (như ProcessLock)
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        # Thread đang giữ phía ghi (None nếu không có) và số lần lấy lồng nhau của nó
+        self._writer = None
+        self._write_depth = 0
+        # {thread ident: số lần lấy lồng nhau} của các thread đang giữ phía đọc
+        self._readers = {}
+        self._writers_waiting = 0
+        self._read = _PhiaLock(self.acquire_read, self.release_read)
+        self._write = _PhiaLock(self.acquire_write, self.release_write)
+
+    def acquire_read(self):
+        """Lấy phía đọc (chờ nếu có writer khác đang giữ hoặc đang chờ)"""
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer == me:
+                self._write_depth += 1
+                return
+            depth = self._readers.get(me)
+            if depth:
+                self._readers[me] = depth + 1
+                return
+            while self._writer is not None or self._writers_waiting:
+                self._cond.wait()
+            self._readers[me] = 1
+
+    def release_read(self):
+        """Trả phía đọc"""
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer == me:
+                self._write_depth -= 1
+                return
+            depth = self._readers[me] - 1
+            if depth:
+                self._readers[me] = depth
+                return
+            del self._readers[me]
+            if not self._readers:
+                self._cond.notify_all()
+
+    def acquire_write(self):
+        """
+        Lấy phía ghi (chờ đến khi không còn reader và writer nào khác)
+
+        Raises:
+            RuntimeError: Nếu thread đang giữ phía đọc
+        """
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer == me:
+                self._write_depth += 1
+                return
+            if me in self._readers:
+                raise RuntimeError("Không được lấy lock ghi khi đang giữ lock đọc")
+            self._writers_waiting += 1
+            try:
+                while self._writer is not None or self._readers:
+                    self._cond.wait()
+            finally:
+                self._writers_waiting -= 1
+            self._writer = me
+            self._write_depth = 1
+
+    def release_write(self):
+        """Trả phía ghi"""
+        with self._cond:
+            self._write_depth -= 1
+            if self._write_depth == 0:
+                self._writer = None
+                self._cond.notify_all()
+
+    def __enter__(self):
+        self.acquire_write()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release_write()
+        return False
+
+    def read(self):
+        """Phía đọc dùng với câu lệnh with"""
+        return self._read
+
+    def write(self):
+        """Phía ghi dùng với câu lệnh with"""
+        return self._write
+
+
+def doc_lock_mode():
+    """
+    Đọc chế độ lock từ config/db.json
+
+    Returns:
+        tuple: (mode: str, timeout: float)
+            - mode: "thread" hoặc "process" ("process" quay về "thread" nếu không có fcntl)
+            - timeout: Số giây chờ lock liên process tối đa (0 là chờ mãi)
+    """
+    config = doc_db_config()
+    mode = str(config.get("LOCK_MODE") or "thread").lower()
+    timeout = float(config.get("LOCK_TIMEOUT") or 0)
+    if mode not in ("thread", "process"):
+        print(f"⚠️ LOCK_MODE không hợp lệ: {mode}, dùng \"thread\"")
+        mode = "thread"
+    if mode == "process" and fcntl is None:
+        print("⚠️ Hệ điều hành không hỗ trợ fcntl, LOCK_MODE quay về \"thread\"")
+        mode = "thread"
+    return mode, timeout
+
+
+class LockManager:
+    """
+    Quản lý lock theo tài khoản (chia sọc) và lock cấu trúc
+
+    Args:
+        stripes: Số sọc lock tài khoản
+        mode: "thread" hoặc "process"
+        timeout: Số giây chờ lock liên process tối đa (chế độ "process")
+        lock_dir: Thư mục chứa file lock (chế độ "process")
+    """
+
+    def __init__(self, stripes=LOCK_STRIPES, mode="thread", timeout=None, lock_dir=LOCK_DIR):
+        self.mode = mode
+        self.timeout = timeout
+        self.stripes = stripes
+        if mode == "process":
+            self._stripes = [
+                ProcessLock(os.path.join(lock_dir, f'account-{i:02d}.lock'), "account", timeout)
+                for i in range(stripes)
+            ]
+            self.structure_lock = ProcessReadWriteLock(os.path.join(lock_dir, 'structure.lock'), "structure", timeout)
+        else:
+            self._stripes = [threading.Lock() for _ in range(stripes)]
+            self.structure_lock = ReadWriteLock()
+
+    def stripe_index(self, account_id):
+        """
+        Vị trí sọc lock của một tài khoản (crc32 ổn định giữa các lần chạy và giữa các process,
+        khác với hash() của str)
+
+        Args:
+            account_id: ID tài khoản
+
+        Returns:
+            int: Chỉ số sọc trong khoảng [0, stripes)
+        """
+        return zlib.crc32(str(account_id).encode('utf-8')) % len(self._stripes)
+
+    def account_lock(self, account_id):
+        """
+        Lấy lock của một tài khoản
+
+        Args:
+            account_id: ID tài khoản
+
+        Returns:
+            threading.Lock hoặc ProcessLock: Dùng với câu lệnh with
+        """
+        return self._stripes[self.stripe_index(account_id)]
+
+    @contextmanager
+    def account_locks(self, account_ids):
+        """
+        Lấy lock của nhiều tài khoản cùng lúc (mỗi sọc chỉ lấy một lần, theo thứ tự chỉ số sọc
+        tăng dần để hai batch chồng nhau không deadlock)
+
+        Args:
+            account_ids: Danh sách ID tài khoản
+        """
+        indexes = sorted({self.stripe_index(account_id) for account_id in account_ids})
+        with ExitStack() as stack:
+            for index in indexes:
+                stack.enter_context(self._stripes[index])
+            yield
+
+    def resource_lock(self, path):
+        """
+        Tạo lock cho một file dữ liệu (data.json, pending_requests.json, ...)
+
+        Args:
+            path: Đường dẫn file dữ liệu (file lock là <path>.lock ở chế độ "process")
+
+        Returns:
+            ProcessLock hoặc ThreadResourceLock
+        """
+        if self.mode == "process":
+            return ProcessLock(os.path.abspath(path) + '.lock', "file", self.timeout)
+        return ThreadResourceLock()
+
+
+# Lock manager dùng chung cho toàn bộ service (chế độ đọc từ config/db.json khi import)
+_mode, _timeout = doc_lock_mode()
+lock_manager = LockManager(mode=_mode, timeout=_timeout)
+
+
+def account_lock(account_id):
+    """
+    Lock của một tài khoản, dùng khi id chỉ biết được bên trong hàm
+
+    Usage:
+        with account_lock(account_id):
+            # Đọc - kiểm tra - ghi dữ liệu của account_id
+            pass
+    """
+    return lock_manager.account_lock(account_id)
+
+
+def account_locks(account_ids):
+    """
+    Lock của nhiều tài khoản (dùng cho các API xử lý theo lô)
+
+    Usage:
+        with account_locks(ids):
+            # Đọc - kiểm tra - ghi dữ liệu của các tài khoản trong ids
+            pass
+    """
+    return lock_manager.account_locks(account_ids)
+
+
+def structure_lock():
+    """Lock cấu trúc (ReadWriteLock): write() khi tạo/xóa tài khoản, read() khi đọc danh sách"""
+    return lock_manager.structure_lock
+
+
+def resource_lock(path):
+    """
+    Lock cho một file dữ liệu, theo chế độ lock hiện tại
+
+    Usage:
+        lock = resource_lock('db/pending_requests.json')
+        with lock:
+            # Đọc - sửa - ghi file
+            pass
+    """
+    return lock_manager.resource_lock(path)
+
+
+def lock_stats():
+    """
+    Thống kê lock (dùng cho endpoint /stats)
+
+    Returns:
+        dict: {"mode", "timeout", "stripes", "metrics"}; metrics chỉ có số liệu ở chế độ "process"
+    """
+    return {
+        "mode": lock_manager.mode,
+        "timeout": lock_manager.timeout,
+        "stripes": lock_manager.stripes,
+        "metrics": lock_metrics.snapshot()
+    }
+
+
+def with_account_lock(func):
+    """
+    Decorator lấy lock của tài khoản có id là tham số đầu tiên của function
+
+    Usage:
+        @with_account_lock
+        def my_function(id):
+            # Code xử lý dữ liệu của tài khoản id
+            pass
+    """
+    param_name = next(iter(inspect.signature(func).parameters))
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        account_id = args[0] if args else kwargs[param_name]
+        with lock_manager.account_lock(account_id):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+def with_structure_lock(func):
+    """
+    Decorator lấy phía ghi (độc quyền) của lock cấu trúc cho function tạo/xóa tài khoản
+
+    Usage:
+        @with_structure_lock
+        def create_something():
+            pass
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with lock_manager.structure_lock.write():
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+def with_read_lock(func):
+    """
+    Decorator lấy phía đọc của lock cấu trúc cho function chỉ đọc danh sách tài khoản
+    (nhiều request đọc chạy song song, chỉ chờ khi đang tạo/xóa user)
+
+    Usage:
+        @with_read_lock
+        def list_something():
+            pass
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with lock_manager.structure_lock.read():
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
 def with_db_lock(func):
     """
-    Decorator để đảm bảo function chỉ được thực thi khi có lock
-    
+    Decorator để đảm bảo function chỉ được thực thi khi có lock toàn cục
+    (cách cũ, các module trong apis/ đã chuyển sang with_account_lock / with_structure_lock)
+
     Usage:
         @with_db_lock
         def my_function():
@@ -29,6 +717,5 @@ def with_db_lock(func):
         finally:
             # Luôn giải phóng lock
             db_lock.release()
-    
-    return wrapper
 
+    return wrapper
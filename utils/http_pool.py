@@ -0,0 +1,226 @@
+"""
+Module HTTP client dùng chung (requests.Session có pool kết nối) cho các lần tải ảnh QR từ img.vietqr.io
+
+- Một Session dùng chung giữa các thread: giữ kết nối keep-alive, không phải DNS + TCP + TLS lại mỗi lần tải
+- Số kết nối tới mỗi host bị giới hạn (QR_HTTP_POOL_SIZE), thread vượt quá sẽ chờ kết nối rảnh
+- Lỗi 5xx/429, timeout hoặc lỗi kết nối được thử lại tối đa QR_HTTP_RETRIES lần, chờ theo backoff
+  lũy thừa có jitter (ngẫu nhiên trong [0, QR_HTTP_BACKOFF_MS * 2^lần])
+- Circuit breaker: sau QR_BREAKER_FAILURES lần tải lỗi liên tiếp thì ngừng gọi ra ngoài trong
+  QR_BREAKER_COOLDOWN giây (/qr tạo QR tại chỗ), hết thời gian thì cho một request thử lại
+"""
+import random
+import threading
+import time
+
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+except ImportError:
+    requests = None
+
+from utils.db_config import doc_db_config
+
+# Mã HTTP được thử lại
+RETRY_STATUS = frozenset((429, 500, 502, 503, 504))
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker đếm số lần lỗi liên tiếp
+
+    Trạng thái: "closed" (gọi bình thường), "open" (không gọi), "half_open" (hết cooldown, đang có
+    một request thử; thành công thì đóng lại, lỗi thì mở tiếp một cooldown nữa)
+
+    Args:
+        failures: Số lần lỗi liên tiếp để mở (0 là tắt circuit breaker)
+        cooldown: Số giây giữ trạng thái mở
+    """
+
+    def __init__(self, failures=5, cooldown=30):
+        self.failures = max(int(failures), 0)
+        self.cooldown = max(float(cooldown), 0.0)
+        self._lock = threading.Lock()
+        self._loi_lien_tiep = 0
+        self._mo_luc = None
+        self._dang_thu = False
+        # Số lần mở (cho /stats)
+        self.opened = 0
+
+    def allow(self):
+        """
+        Returns:
+            bool: True nếu được gọi ra ngoài
+        """
+        with self._lock:
+            if self._mo_luc is None:
+                return True
+            if self._dang_thu or time.monotonic() - self._mo_luc < self.cooldown:
+                return False
+            # Hết cooldown: chỉ cho một request thử
+            self._dang_thu = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._loi_lien_tiep = 0
+            self._mo_luc = None
+            self._dang_thu = False
+
+    def record_failure(self):
+        with self._lock:
+            self._loi_lien_tiep += 1
+            if not self.failures:
+                return
+            if self._dang_thu or self._loi_lien_tiep >= self.failures:
+                if self._mo_luc is None:
+                    self.opened += 1
+                self._mo_luc = time.monotonic()
+                self._dang_thu = False
+
+    def state(self):
+        """
+        Returns:
+            str: "closed", "open" hoặc "half_open"
+        """
+        with self._lock:
+            if self._mo_luc is None:
+                return "closed"
+            if self._dang_thu or time.monotonic() - self._mo_luc >= self.cooldown:
+                return "half_open"
+            return "open"
+
+
+class PooledHttpClient:
+    """
+    HTTP client có pool kết nối, thử lại có jitter và circuit breaker
+
+    Args:
+        pool_size: Số kết nối tối đa tới mỗi host
+        timeout: Số giây chờ mặc định của một lần gọi
+        retries: Số lần thử lại tối đa (không tính lần đầu)
+        backoff_ms: Thời gian chờ cơ sở giữa các lần thử (mili giây)
+        breaker: CircuitBreaker (None là không dùng)
+    """
+
+    def __init__(self, pool_size=10, timeout=10, retries=2, backoff_ms=100, breaker=None):
+        self.pool_size = max(int(pool_size), 1)
+        self.timeout = float(timeout)
+        self.retries = max(int(retries), 0)
+        self.backoff = max(float(backoff_ms), 0.0) / 1000
+        self.breaker = breaker
+        self._session = None
+        self._lock = threading.Lock()
+        # Số liệu cho /stats
+        self.requests = 0
+        self.retried = 0
+        self.failures = 0
+        self.rejected = 0
+
+    def _lay_session(self):
+        """Tạo Session dùng chung (một lần)"""
+        session = self._session
+        if session is None:
+            with self._lock:
+                session = self._session
+                if session is None:
+                    session = requests.Session()
+                    # pool_block=True: vượt quá pool_size thì chờ kết nối rảnh thay vì mở kết nối không giữ lại
+                    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_size, pool_block=True, max_retries=0)
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    self._session = session
+        return session
+
+    def _tang(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def get(self, url, timeout=None):
+        """
+        GET url, thử lại khi gặp lỗi tạm thời
+
+        Args:
+            url: URL cần tải
+            timeout: Số giây chờ (mặc định self.timeout)
+
+        Returns:
+            tuple: (success, content: bytes, error_message)
+        """
+        if requests is None:
+            return False, None, "Chưa cài thư viện requests"
+        if self.breaker is not None and not self.breaker.allow():
+            self._tang('rejected')
+            return False, None, "Circuit breaker đang mở (tải lỗi liên tiếp), tạm ngừng gọi ra ngoài"
+
+        session = self._lay_session()
+        timeout = self.timeout if timeout is None else timeout
+        error_message = None
+        for lan in range(self.retries + 1):
+            if lan:
+                self._tang('retried')
+                time.sleep(random.uniform(0, self.backoff * (2 ** (lan - 1))))
+            self._tang('requests')
+            try:
+                response = session.get(url, timeout=timeout)
+            except (requests.Timeout, requests.ConnectionError) as e:
+                error_message = f"Lỗi khi tải: {e}"
+                continue
+            except Exception as e:
+                # Lỗi không tạm thời (URL sai, ...): không thử lại
+                error_message = f"Lỗi khi tải: {e}"
+                break
+            if response.status_code == 200:
+                if self.breaker is not None:
+                    self.breaker.record_success()
+                return True, response.content, None
+            error_message = f"Status code: {response.status_code}"
+            if response.status_code not in RETRY_STATUS:
+                break
+
+        self._tang('failures')
+        if self.breaker is not None:
+            self.breaker.record_failure()
+        return False, None, error_message
+
+    def stats(self):
+        """
+        Returns:
+            dict: Số liệu client (pool_size, requests, retried, failures, rejected, breaker, breaker_opened)
+        """
+        with self._lock:
+            result = {
+                "pool_size": self.pool_size,
+                "requests": self.requests,
+                "retried": self.retried,
+                "failures": self.failures,
+                "rejected": self.rejected,
+            }
+        result["breaker"] = self.breaker.state() if self.breaker is not None else None
+        result["breaker_opened"] = self.breaker.opened if self.breaker is not None else 0
+        return result
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_qr_http_client():
+    """
+    Lấy HTTP client dùng chung cho các lần tải ảnh QR (cấu hình QR_HTTP_* / QR_BREAKER_* trong config/db.json)
+
+    Returns:
+        PooledHttpClient: Client dùng chung trong process
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                config = doc_db_config()
+                _client = PooledHttpClient(
+                    pool_size=config.get("QR_HTTP_POOL_SIZE") or 10,
+                    timeout=config.get("QR_HTTP_TIMEOUT") or 10,
+                    retries=config.get("QR_HTTP_RETRIES") or 0,
+                    backoff_ms=config.get("QR_HTTP_BACKOFF_MS") or 0,
+                    breaker=CircuitBreaker(config.get("QR_BREAKER_FAILURES") or 0, config.get("QR_BREAKER_COOLDOWN") or 0),
+                )
+    return _client
@@ -0,0 +1,121 @@
+"""
+Module codec JSON dùng chung cho mọi nơi đọc/ghi file dữ liệu và file config
+Dùng orjson hoặc ujson nếu đã cài (nhanh hơn json chuẩn nhiều lần), không có thì dùng thư viện json chuẩn
+
+Cấu hình trong config/db.json:
+    - JSON_CODEC: "auto" (orjson → ujson → json), hoặc chỉ định "orjson" / "ujson" / "json"
+    - JSON_COMPACT: true → các file trong db/ ghi gọn (không thụt lề, không khoảng trắng sau , và :)
+"""
+import json
+
+from utils.db_config import doc_db_config
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+# Dấu phân cách khi ghi gọn (json chuẩn mặc định có khoảng trắng sau , và :)
+COMPACT_SEPARATORS = (',', ':')
+
+
+def _chon_codec(ten):
+    """
+    Chọn codec theo cấu hình, thư viện chưa cài thì lùi về json chuẩn
+
+    Args:
+        ten: Tên codec trong config ("auto", "orjson", "ujson", "json")
+
+    Returns:
+        str: Tên codec được dùng
+    """
+    ten = str(ten or "auto").lower()
+    if ten in ("auto", "orjson") and orjson is not None:
+        return "orjson"
+    if ten in ("auto", "ujson") and ujson is not None:
+        return "ujson"
+    if ten not in ("auto", "json"):
+        print(f"⚠️ Không dùng được codec JSON '{ten}' (chưa cài hoặc không hỗ trợ), dùng json chuẩn")
+    return "json"
+
+
+_config = doc_db_config()
+# Codec đang dùng: "orjson", "ujson" hoặc "json"
+CODEC = _chon_codec(_config.get("JSON_CODEC"))
+# Ghi gọn các file dữ liệu trong db/
+COMPACT = bool(_config.get("JSON_COMPACT"))
+# Thụt lề dùng khi ghi các file trong db/ (None là ghi gọn)
+DB_INDENT = None if COMPACT else 2
+
+
+def dumps(data, indent=None):
+    """
+    Chuyển dữ liệu thành JSON dạng bytes UTF-8 (giữ nguyên ký tự tiếng Việt, không escape)
+
+    Args:
+        data: Dữ liệu cần chuyển (dict, list, ...)
+        indent: Số khoảng trắng thụt lề, None là ghi gọn
+
+    Returns:
+        bytes: Nội dung JSON
+    """
+    if CODEC == "orjson" and indent in (None, 2):
+        try:
+            return orjson.dumps(data, option=orjson.OPT_INDENT_2 if indent else 0)
+        except TypeError:
+            # orjson không hỗ trợ key không phải chuỗi / số nguyên quá lớn → để json chuẩn xử lý
+            pass
+    elif CODEC == "ujson":
+        return ujson.dumps(data, ensure_ascii=False, escape_forward_slashes=False, indent=indent or 0).encode('utf-8')
+
+    separators = COMPACT_SEPARATORS if indent is None else None
+    return json.dumps(data, ensure_ascii=False, indent=indent, separators=separators).encode('utf-8')
+
+
+def loads(content):
+    """
+    Parse nội dung JSON
+
+    Args:
+        content: Nội dung JSON (str hoặc bytes)
+
+    Returns:
+        Dữ liệu đã parse
+
+    Raises:
+        json.JSONDecodeError: Nếu nội dung không phải JSON hợp lệ (với mọi codec, để nơi gọi
+                              chỉ cần bắt một loại lỗi như trước)
+    """
+    if CODEC == "orjson":
+        # orjson.JSONDecodeError là lớp con của json.JSONDecodeError
+        return orjson.loads(content)
+    if CODEC == "ujson":
+        try:
+            return ujson.loads(content)
+        except ValueError as e:
+            doc = content.decode('utf-8', 'replace') if isinstance(content, (bytes, bytearray)) else content
+            raise json.JSONDecodeError(str(e), doc, 0) from None
+    return json.loads(content)
+
+
+def doc_file(path):
+    """
+    Đọc và parse một file JSON
+
+    Args:
+        path: Đường dẫn file
+
+    Returns:
+        Dữ liệu đã parse
+
+    Raises:
+        FileNotFoundError: Nếu file không tồn tại
+        json.JSONDecodeError: Nếu file không phải JSON hợp lệ
+    """
+    with open(path, 'rb') as f:
+        return loads(f.read())
@@ -0,0 +1,95 @@
+"""
+Module ghi file JSON an toàn khi crash (atomic write)
+Ghi ra file tạm trong cùng thư mục, fsync rồi os.replace sang file đích: nơi đọc luôn thấy
+file cũ hoặc file mới đầy đủ, không bao giờ thấy file ghi dở hay file rỗng
+"""
+import os
+import tempfile
+
+from utils.json_codec import dumps
+
+
+def _fsync_thu_muc(dir_path):
+    """fsync thư mục để thao tác đổi tên được ghi xuống đĩa (bỏ qua trên hệ điều hành không hỗ trợ)"""
+    try:
+        fd = os.open(dir_path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _sao_luu(path):
+    """
+    Giữ bản hiện tại của file thành <path>.bak trước khi bị thay thế
+
+    Dùng hard link (không phải copy dữ liệu); hệ thống file không hỗ trợ link thì copy
+    """
+    if not os.path.exists(path):
+        return
+    bak_path = path + '.bak'
+    tmp_bak = bak_path + '.tmp'
+    try:
+        if os.path.exists(tmp_bak):
+            os.remove(tmp_bak)
+        os.link(path, tmp_bak)
+    except OSError:
+        with open(path, 'rb') as src, open(tmp_bak, 'wb') as dst:
+            dst.write(src.read())
+    os.replace(tmp_bak, bak_path)
+
+
+def ghi_bytes_atomic(path, data, backup=False):
+    """
+    Ghi nội dung bytes vào file theo kiểu atomic: file tạm → fsync → os.replace
+
+    Args:
+        path: Đường dẫn file đích
+        data: Nội dung (bytes)
+        backup: True → giữ bản trước đó thành <path>.bak
+
+    Returns:
+        int: Số byte đã ghi
+    """
+    path = os.path.abspath(path)
+    dir_path = os.path.dirname(path)
+    os.makedirs(dir_path, exist_ok=True)
+
+    fd, tmp_path = tempfile.mkstemp(prefix='.' + os.path.basename(path) + '.', suffix='.tmp', dir=dir_path)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        if backup:
+            _sao_luu(path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+    _fsync_thu_muc(dir_path)
+    return len(data)
+
+
+def ghi_json_atomic(path, data, indent=2, backup=False):
+    """
+    Ghi dữ liệu JSON vào file theo kiểu atomic
+
+    Args:
+        path: Đường dẫn file đích
+        data: Dữ liệu cần ghi (dict, list, ...)
+        indent: Số khoảng trắng thụt lề, None là ghi gọn (file trong db/ dùng json_codec.DB_INDENT)
+        backup: True → giữ bản trước đó thành <path>.bak
+
+    Returns:
+        int: Số byte đã ghi
+    """
+    return ghi_bytes_atomic(path, dumps(data, indent=indent), backup=backup)
@@ -0,0 +1,91 @@
+"""
+Module cache LRU giới hạn theo tổng số byte
+
+Dùng cho các phần lặp lại của việc tạo mã QR (đầu payload VietQR theo tài khoản/số tiền, ảnh PNG của
+các request cố định). Khi tổng kích thước vượt max_bytes, các phần tử lâu nhất không được dùng bị bỏ.
+"""
+import threading
+from collections import OrderedDict
+
+
+class ByteLRUCache:
+    """
+    Cache LRU có giới hạn tổng số byte, an toàn khi dùng từ nhiều thread
+
+    Args:
+        max_bytes: Tổng kích thước tối đa của các giá trị (0 là tắt cache)
+    """
+
+    def __init__(self, max_bytes=1048576):
+        self.max_bytes = max(int(max_bytes or 0), 0)
+        self._items = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # Số liệu cho /stats
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """
+        Lấy giá trị theo key (đánh dấu vừa được dùng)
+
+        Returns:
+            Giá trị đã lưu, None nếu không có
+        """
+        if not self.max_bytes:
+            return None
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, size=None):
+        """
+        Lưu giá trị; giá trị lớn hơn max_bytes không được lưu
+
+        Args:
+            key: Key (hashable)
+            value: Giá trị
+            size: Kích thước tính vào giới hạn (mặc định len(value))
+        """
+        if not self.max_bytes:
+            return
+        size = len(value) if size is None else int(size)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            cu = self._items.pop(key, None)
+            if cu is not None:
+                self._bytes -= cu[1]
+            self._items[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, bo) = self._items.popitem(last=False)
+                self._bytes -= bo
+                self.evictions += 1
+
+    def clear(self):
+        """Xóa toàn bộ cache"""
+        with self._lock:
+            self._items.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """
+        Returns:
+            dict: size, bytes, max_bytes, hits, misses, evictions
+        """
+        with self._lock:
+            return {
+                "size": len(self._items),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
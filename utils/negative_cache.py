@@ -0,0 +1,91 @@
+"""
+Module cache các id tài khoản không tồn tại (tra cứu âm)
+
+Dùng cho /check: phần lớn request rác/bot gửi id không tồn tại, cache giúp trả lời 404 mà không
+tra repository. Cache có kích thước giới hạn (bỏ id cũ nhất khi đầy) và gắn với số thế hệ của
+tập tài khoản (AccountRepository.generation()): khi có tài khoản mới, toàn bộ cache bị xóa để
+không trả 404 sai cho id vừa được tạo.
+"""
+import threading
+
+
+class NegativeCache:
+    """
+    Tập id không tồn tại có giới hạn kích thước
+
+    Args:
+        max_size: Số id tối đa giữ trong cache (0 là tắt cache)
+    """
+
+    def __init__(self, max_size=10000):
+        self.max_size = int(max_size or 0)
+        self._ids = {}
+        self._generation = None
+        self._lock = threading.Lock()
+        # Số liệu cho /stats
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _dong_bo(self, generation):
+        """Xóa cache nếu tập tài khoản đã thay đổi (gọi khi đang giữ _lock)"""
+        if generation != self._generation:
+            if self._ids:
+                self._ids = {}
+                self.invalidations += 1
+            self._generation = generation
+
+    def contains(self, id, generation):
+        """
+        Kiểm tra id có nằm trong cache (đã biết là không tồn tại ở thế hệ generation)
+
+        Args:
+            id: ID tài khoản
+            generation: Số thế hệ hiện tại của tập tài khoản
+
+        Returns:
+            bool: True nếu chắc chắn id không tồn tại
+        """
+        if not self.max_size:
+            return False
+        with self._lock:
+            self._dong_bo(generation)
+            if id in self._ids:
+                self.hits += 1
+                return True
+            self.misses += 1
+            return False
+
+    def add(self, id, generation):
+        """
+        Ghi nhận id không tồn tại
+
+        Args:
+            id: ID tài khoản
+            generation: Số thế hệ đọc được TRƯỚC khi tra cứu id (để tài khoản được thêm
+                        trong lúc tra cứu làm cache bị xóa ở lần kiểm tra sau)
+        """
+        if not self.max_size:
+            return
+        with self._lock:
+            if generation != self._generation:
+                # Thế hệ đã đổi trong lúc tra cứu → không ghi nhận (kết quả có thể đã cũ)
+                return
+            if len(self._ids) >= self.max_size:
+                # Bỏ id cũ nhất (dict giữ thứ tự thêm vào)
+                del self._ids[next(iter(self._ids))]
+            self._ids[id] = None
+
+    def stats(self):
+        """
+        Returns:
+            dict: size, max_size, hits, misses, invalidations
+        """
+        with self._lock:
+            return {
+                "size": len(self._ids),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+            }
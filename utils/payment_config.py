@@ -0,0 +1,216 @@
+"""
+Module cache config thanh toán (config/pay_ment.json)
+
+File config được đọc và parse một lần rồi giữ trong bộ nhớ cùng các giá trị đã chuyển kiểu
+(COST là số nguyên VND, LIMIT là số), nên /qr, webhook /authentication và xác thực token
+không phải mở lại file ở mỗi request.
+
+- Mỗi file chỉ được stat lại tối đa một lần mỗi PAYMENT_CONFIG_CHECK_MS mili giây; mtime/size/inode
+  thay đổi (sửa tay, process khác ghi) thì file được đọc lại
+- Ghi qua apis/config (set_config, set_field, update_fields) xóa cache ngay trong process hiện tại
+"""
+import json
+import math
+import os
+import threading
+import time
+
+from utils.db_config import doc_db_config
+from utils.json_codec import doc_file
+
+# Đường dẫn mặc định đến file config/pay_ment.json
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PAYMENT_CONFIG_FILE = os.path.join(root_dir, 'config', 'pay_ment.json')
+
+# Cache theo đường dẫn config_file: [PaymentConfig, khóa stat, thời điểm kiểm tra gần nhất]
+_cache = {}
+_cache_lock = threading.Lock()
+# Khoảng thời gian (giây) giữa hai lần stat một file, đọc từ config/db.json khi dùng lần đầu
+_check_interval = None
+# Số liệu cho /stats
+_so_lan_nap = 0
+_so_lan_stat = 0
+
+
+def parse_cost_vnd(cost_value):
+    """
+    Chuyển giá trị COST sang số nguyên VND
+
+    Args:
+        cost_value: Giá trị COST (string "200.000" với dấu chấm ngăn cách hàng nghìn, hoặc number)
+
+    Returns:
+        int: Số tiền VND (> 0), None nếu không hợp lệ
+    """
+    if cost_value is None or isinstance(cost_value, bool):
+        return None
+    if isinstance(cost_value, str):
+        cost_value = cost_value.replace('.', '').replace(',', '.').replace(' ', '')
+    try:
+        cost = float(cost_value)
+    except (ValueError, TypeError):
+        return None
+    if not math.isfinite(cost) or cost <= 0:
+        return None
+    return int(round(cost))
+
+
+def parse_limit(limit_value):
+    """
+    Chuyển giá trị LIMIT sang số
+
+    Args:
+        limit_value: Giá trị LIMIT (number hoặc string)
+
+    Returns:
+        int | float: LIMIT (> 0, int nếu là số nguyên), None nếu không hợp lệ
+    """
+    if limit_value is None or isinstance(limit_value, bool):
+        return None
+    try:
+        limit = float(limit_value)
+    except (ValueError, TypeError):
+        return None
+    if not math.isfinite(limit) or limit <= 0:
+        return None
+    return int(limit) if limit.is_integer() else limit
+
+
+class PaymentConfig:
+    """
+    Config thanh toán đã parse (không sửa trực tiếp, các object này được dùng chung giữa các request)
+
+    Attributes:
+        data: Dict config gốc ({} nếu không đọc được file)
+        bank: Mã ngân hàng (BNK, chữ hoa)
+        account_no: Số tài khoản (STK)
+        account_name: Tên chủ tài khoản (UN)
+        cost: COST dạng số nguyên VND, None nếu thiếu hoặc không hợp lệ
+        limit: LIMIT dạng số, None nếu thiếu hoặc không hợp lệ
+        error: Lỗi khiến không tính được thanh toán (thiếu/sai COST hoặc LIMIT), None nếu hợp lệ
+    """
+
+    __slots__ = ('data', 'bank', 'account_no', 'account_name', 'cost', 'limit', 'error')
+
+    def __init__(self, data):
+        data = data if isinstance(data, dict) else {}
+        self.data = data
+        self.bank = str(data.get("BNK") or "").upper()
+        self.account_no = str(data.get("STK") or "")
+        self.account_name = str(data.get("UN") or "")
+
+        cost_value = data.get("COST")
+        limit_value = data.get("LIMIT")
+        self.cost = parse_cost_vnd(cost_value)
+        self.limit = parse_limit(limit_value)
+
+        if not data:
+            self.error = "Không thể đọc file config"
+        elif cost_value is None:
+            self.error = "Không tìm thấy COST trong config"
+        elif limit_value is None:
+            self.error = "Không tìm thấy LIMIT trong config"
+        elif self.cost is None:
+            self.error = f"Không thể parse COST: {cost_value}"
+        elif self.limit is None:
+            self.error = f"LIMIT không hợp lệ: {limit_value}"
+        else:
+            self.error = None
+
+    def __repr__(self):
+        return f"PaymentConfig(cost={self.cost!r}, limit={self.limit!r}, error={self.error!r})"
+
+
+def _lay_check_interval():
+    """Đọc PAYMENT_CONFIG_CHECK_MS (một lần) và trả về số giây giữa hai lần stat file"""
+    global _check_interval
+    if _check_interval is None:
+        try:
+            _check_interval = max(float(doc_db_config().get("PAYMENT_CONFIG_CHECK_MS") or 0), 0) / 1000
+        except (ValueError, TypeError):
+            _check_interval = 1.0
+    return _check_interval
+
+
+def _khoa_stat(path):
+    """Trả về (mtime_ns, size, inode) của file, None nếu không stat được"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size, st.st_ino
+
+
+def _nap(path):
+    """Đọc và parse file config (in lỗi như các hàm doc_config trước đây)"""
+    config_data = {}
+    try:
+        config_data = doc_file(path)
+    except FileNotFoundError:
+        print(f"❌ Không tìm thấy file config: {path}")
+    except json.JSONDecodeError as e:
+        print(f"❌ Lỗi khi parse JSON config: {e}")
+    except Exception as e:
+        print(f"❌ Lỗi khi đọc file config: {e}")
+    return PaymentConfig(config_data)
+
+
+def get_payment_config(config_file=None):
+    """
+    Lấy config thanh toán từ cache, chỉ đọc lại file khi file đã thay đổi
+
+    Args:
+        config_file: Đường dẫn đến file config (mặc định là config/pay_ment.json của project)
+
+    Returns:
+        PaymentConfig: Config đã parse (dùng chung, không được sửa)
+    """
+    global _so_lan_nap, _so_lan_stat
+    path = config_file or PAYMENT_CONFIG_FILE
+    entry = _cache.get(path)
+    now = time.monotonic()
+    if entry is not None and now - entry[2] < _lay_check_interval():
+        return entry[0]
+
+    with _cache_lock:
+        entry = _cache.get(path)
+        if entry is not None and now - entry[2] < _lay_check_interval():
+            return entry[0]
+        # Stat trước khi đọc: file đổi giữa hai bước thì lần kiểm tra sau sẽ đọc lại
+        khoa = _khoa_stat(path)
+        _so_lan_stat += 1
+        if entry is not None and entry[1] == khoa:
+            entry[2] = now
+            return entry[0]
+        config = _nap(path)
+        _so_lan_nap += 1
+        _cache[path] = [config, khoa, now]
+        return config
+
+
+def invalidate_payment_config(config_file=None):
+    """
+    Xóa config thanh toán khỏi cache (gọi sau khi ghi file config)
+
+    Args:
+        config_file: Đường dẫn file config cần xóa, None để xóa toàn bộ cache
+    """
+    with _cache_lock:
+        if config_file is None:
+            _cache.clear()
+        else:
+            _cache.pop(config_file, None)
+
+
+def payment_config_stats():
+    """
+    Returns:
+        dict: Số liệu cache config thanh toán (files, loads, stats, check_ms)
+    """
+    with _cache_lock:
+        return {
+            "files": len(_cache),
+            "loads": _so_lan_nap,
+            "stats": _so_lan_stat,
+            "check_ms": round(_lay_check_interval() * 1000, 3),
+        }
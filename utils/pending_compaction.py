@@ -0,0 +1,243 @@
+"""
+Module nén lưu trữ pending request đã xong (completed/cancelled)
+
+Request kết thúc quá PENDING_ARCHIVE_DAYS ngày được chuyển từ db/pending_archive.jsonl (backend json)
+hoặc bảng pending_requests (backend sqlite) sang các file nén theo ngày kết thúc:
+    db/pending_archive/<YYYY-MM-DD>.jsonl.gz  (mỗi dòng một request, có trường request_id)
+
+Chạy định kỳ trong server (PENDING_COMPACT_INTERVAL giây, mỗi lần chỉ một worker process nén) hoặc chạy tay:
+    python utils/pending_compaction.py --days 7
+    python utils/pending_compaction.py --days 7 --force   # LOCK_MODE "thread": chỉ khi server đang dừng
+"""
+import argparse
+import gzip
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+
+# Thêm thư mục gốc vào path để import utils (khi chạy trực tiếp file này)
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if root_dir not in sys.path:
+    sys.path.insert(0, root_dir)
+
+from utils.db_config import doc_db_config
+from utils.db_lock import resource_lock
+from utils.json_codec import dumps, loads
+from utils.json_file import ghi_bytes_atomic
+from utils.pending_store import doc_pending_ttl, thoi_diem_ket_thuc
+from utils.storage import get_storage
+
+# Thư mục chứa các phân vùng nén (nằm trong thư mục dữ liệu db/)
+ARCHIVE_DIR_NAME = 'pending_archive'
+# File lưu thời điểm nén định kỳ gần nhất (dùng chung giữa các worker process)
+LAST_RUN_FILE_NAME = 'pending_compaction.last'
+
+# Thread nén định kỳ của process hiện tại và pid đã khởi động nó (thread không còn sau fork)
+_thread = None
+_thread_pid = None
+_thread_lock = threading.Lock()
+
+
+def _thu_muc_du_lieu(db_dir):
+    """Thư mục dữ liệu (mặc định db/ của project)"""
+    return os.path.abspath(db_dir) if db_dir else os.path.join(root_dir, 'db')
+
+
+def doc_phan_vung(path):
+    """
+    Đọc một phân vùng lưu trữ
+
+    Args:
+        path: Đường dẫn file <YYYY-MM-DD>.jsonl.gz
+
+    Returns:
+        dict: {request_id: request}, {} nếu file không tồn tại
+    """
+    try:
+        with gzip.open(path, 'rb') as f:
+            content = f.read()
+    except FileNotFoundError:
+        return {}
+    result = {}
+    for line in content.splitlines():
+        if line.strip():
+            record = loads(line)
+            result[record['request_id']] = record
+    return result
+
+
+def ghi_phan_vung(archive_dir, records):
+    """
+    Gộp các request vào phân vùng theo ngày kết thúc (ghi lại atomic từng file nén)
+
+    Request trùng request_id với bản đã có trong phân vùng sẽ thay thế bản cũ, nên chạy lại
+    sau khi bị dừng giữa chừng không tạo bản ghi trùng
+
+    Args:
+        archive_dir: Thư mục chứa các phân vùng
+        records: Danh sách request (dict có trường request_id)
+
+    Returns:
+        dict: {đường dẫn phân vùng: số byte đã ghi}
+    """
+    theo_ngay = {}
+    bay_gio = time.time()
+    for record in records:
+        ngay = datetime.fromtimestamp(thoi_diem_ket_thuc(record, bay_gio)).strftime('%Y-%m-%d')
+        theo_ngay.setdefault(ngay, []).append(record)
+
+    da_ghi = {}
+    for ngay, items in sorted(theo_ngay.items()):
+        path = os.path.join(archive_dir, f"{ngay}.jsonl.gz")
+        phan_vung = doc_phan_vung(path)
+        for record in items:
+            phan_vung[record['request_id']] = record
+        content = b''.join(dumps(record) + b'\n' for record in phan_vung.values())
+        # mtime=0: cùng nội dung thì file nén giống hệt nhau
+        da_ghi[path] = ghi_bytes_atomic(path, gzip.compress(content, mtime=0))
+    return da_ghi
+
+
+def nen_pending(db_dir=None, days=None):
+    """
+    Chuyển các request đã xong quá `days` ngày sang phân vùng nén
+
+    Args:
+        db_dir: Thư mục dữ liệu (mặc định db/ của project)
+        days: Số ngày giữ lại (mặc định PENDING_ARCHIVE_DAYS trong config/db.json)
+
+    Returns:
+        dict: Báo cáo gồm moved, partitions, bytes_before, bytes_after, reclaimed, archive_bytes
+    """
+    if days is None:
+        days = doc_db_config().get("PENDING_ARCHIVE_DAYS")
+    days = float(days or 0)
+
+    storage = get_storage(db_dir)
+    archive_dir = os.path.join(_thu_muc_du_lieu(db_dir), ARCHIVE_DIR_NAME)
+    da_ghi = {}
+
+    def archive_writer(records):
+        da_ghi.update(ghi_phan_vung(archive_dir, records))
+
+    before = time.time() - days * 86400
+    moved, bytes_before, bytes_after = storage.pending.compact(before, archive_writer)
+    return {
+        "moved": moved,
+        "partitions": sorted(os.path.basename(path) for path in da_ghi),
+        "bytes_before": bytes_before,
+        "bytes_after": bytes_after,
+        "reclaimed": bytes_before - bytes_after,
+        "archive_bytes": sum(da_ghi.values()),
+    }
+
+
+def nen_neu_den_han(interval, db_dir=None):
+    """
+    Chạy nen_pending nếu lần chạy gần nhất (của bất kỳ process nào dùng cùng thư mục dữ liệu) đã quá
+    interval giây. Thời điểm chạy được lưu trong db/pending_compaction.last và kiểm tra dưới lock của file đó
+    (flock ở LOCK_MODE "process"), nên khi chạy nhiều worker chỉ một worker nén mỗi lần
+
+    Args:
+        interval: Số giây tối thiểu giữa hai lần nén
+        db_dir: Thư mục dữ liệu (mặc định db/ của project)
+
+    Returns:
+        dict: Báo cáo của nen_pending, None nếu chưa đến hạn
+    """
+    last_path = os.path.join(_thu_muc_du_lieu(db_dir), LAST_RUN_FILE_NAME)
+    with resource_lock(last_path):
+        try:
+            with open(last_path, 'rb') as f:
+                lan_cuoi = float(f.read().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            lan_cuoi = 0.0
+        bay_gio = time.time()
+        if 0 <= bay_gio - lan_cuoi < interval:
+            return None
+        report = nen_pending(db_dir)
+        ghi_bytes_atomic(last_path, str(bay_gio).encode())
+        return report
+
+
+def bat_dau_nen_dinh_ky(interval=None, db_dir=None):
+    """
+    Chạy nen_pending định kỳ trong một thread nền (daemon), mỗi process một thread
+
+    Gọi nhiều lần chỉ khởi động một thread cho mỗi process (process con sau fork, ví dụ worker của
+    gunicorn --preload, tự khởi động thread của mình). Server gọi hàm này ở mỗi request nên thread chạy
+    cả khi không khởi động qua main() (gunicorn -w 4 main:app); các worker dùng chung lịch nén qua nen_neu_den_han
+
+    Mỗi vòng, thread ghi trạng thái cancelled cho các request quá PENDING_TTL (các hàm đọc của PendingStore
+    không ghi file) rồi nén nếu đến hạn. Chu kỳ là số nhỏ hơn trong interval và PENDING_TTL (bỏ qua giá trị 0),
+    nên khi chỉ bật PENDING_TTL thread vẫn chạy để ghi trạng thái hủy
+
+    Args:
+        interval: Số giây giữa hai lần nén (mặc định PENDING_COMPACT_INTERVAL, 0 là không nén)
+        db_dir: Thư mục dữ liệu (mặc định db/ của project)
+
+    Returns:
+        threading.Thread: Thread đang chạy của process, None nếu không chạy (interval và PENDING_TTL đều là 0)
+    """
+    global _thread, _thread_pid
+    if _thread is not None and _thread_pid == os.getpid():
+        return _thread
+
+    with _thread_lock:
+        if _thread is not None and _thread_pid == os.getpid():
+            return _thread
+
+        if interval is None:
+            interval = doc_db_config().get("PENDING_COMPACT_INTERVAL")
+        interval = max(float(interval or 0), 0.0)
+        chu_ky = min([value for value in (interval, doc_pending_ttl()) if value > 0], default=0)
+        if not chu_ky:
+            return None
+
+        def chay():
+            while True:
+                try:
+                    # Ghi trạng thái cancelled cho request quá PENDING_TTL (các hàm đọc không ghi file)
+                    get_storage(db_dir).pending.expire()
+                    report = nen_neu_den_han(interval, db_dir) if interval else None
+                    if report and report["moved"]:
+                        print(f"🗜️ Đã nén {report['moved']} pending request vào {', '.join(report['partitions'])}, "
+                              f"giải phóng {report['reclaimed']} byte")
+                except Exception as e:
+                    print(f"⚠️ Lỗi khi nén pending request: {e}")
+                time.sleep(chu_ky)
+
+        thread = threading.Thread(target=chay, name="pending-compaction", daemon=True)
+        thread.start()
+        _thread, _thread_pid = thread, os.getpid()
+        return thread
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Nén lưu trữ các pending request đã xong (completed/cancelled)")
+    parser.add_argument("--days", type=float, default=None,
+                        help="Chỉ chuyển request kết thúc quá số ngày này (mặc định PENDING_ARCHIVE_DAYS)")
+    parser.add_argument("--db-dir", default=None, help="Thư mục dữ liệu (mặc định db/ của project)")
+    parser.add_argument("--force", action="store_true",
+                        help="Vẫn chạy khi LOCK_MODE không phải \"process\" (chỉ dùng khi chắc chắn server đang dừng)")
+    args = parser.parse_args(argv)
+
+    if str(doc_db_config().get("LOCK_MODE")).lower() != "process" and not args.force:
+        # Lock "thread" không loại trừ được server đang chạy: ghi lại file lưu trữ sẽ làm mất các dòng
+        # server ghi nối vào file cũ
+        print("❌ LOCK_MODE không phải \"process\": dừng server rồi chạy lại với --force")
+        return 1
+
+    report = nen_pending(args.db_dir, args.days)
+    print(f"✅ Đã chuyển {report['moved']} request sang {len(report['partitions'])} phân vùng nén")
+    for name in report["partitions"]:
+        print(f"   • {name}")
+    print(f"📦 Dung lượng: {report['bytes_before']} → {report['bytes_after']} byte "
+          f"(giải phóng {report['reclaimed']} byte, file nén {report['archive_bytes']} byte)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,552 @@
+"""
+Module quản lý pending request của add_count (db/pending_requests.json) thường trú trong bộ nhớ
+
+- File pending_requests.json chỉ còn chứa các request đang pending; request đã xong (completed/cancelled)
+  được chuyển sang file lưu trữ db/pending_archive.jsonl (mỗi dòng một request, chỉ ghi nối)
+- Số request pending của từng tài khoản được đếm sẵn trong bộ nhớ, nên prepare_add_count là O(1)
+  dù lịch sử request lớn đến đâu
+- Request pending quá PENDING_TTL giây (config/db.json, mặc định 0 là tắt) được coi là đã hủy để trả lại
+  lượt cho tài khoản: các hàm đọc (get, count_pending) chỉ tính như đã hủy, không ghi file; trạng thái
+  cancelled được ghi xuống ở lần ghi kế tiếp (add, update) hoặc khi thread nền của pending_compaction gọi
+  expire() (chạy trong mỗi process phục vụ request, chu kỳ tối đa PENDING_TTL giây)
+"""
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from utils.db_config import doc_db_config
+from utils.db_lock import resource_lock
+from utils.json_codec import DB_INDENT, doc_file, dumps
+from utils.json_file import ghi_bytes_atomic, ghi_json_atomic
+from utils.repository import PendingRequestRepository
+from utils.wal import WriteAheadLog
+
+# Tên file lưu trữ request đã xong (nằm cùng thư mục với pending_requests.json)
+ARCHIVE_FILE_NAME = 'pending_archive.jsonl'
+
+
+def doc_pending_ttl():
+    """
+    Đọc thời gian sống của pending request từ config/db.json
+
+    Returns:
+        float: Số giây (0 là không tự hủy)
+    """
+    try:
+        return max(float(doc_db_config().get("PENDING_TTL") or 0), 0.0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _epoch(value, mac_dinh=None):
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except (TypeError, ValueError):
+        return mac_dinh
+
+
+def thoi_diem_tao(item, mac_dinh=None):
+    """
+    Lấy thời điểm tạo (epoch) của pending request từ trường timestamp (isoformat giờ địa phương)
+
+    Args:
+        item: Dict pending request
+        mac_dinh: Giá trị trả về nếu không có/không parse được timestamp
+
+    Returns:
+        float: Epoch giây
+    """
+    return _epoch(item.get('timestamp'), mac_dinh)
+
+
+def thoi_diem_ket_thuc(item, mac_dinh=None):
+    """
+    Lấy thời điểm request kết thúc (completed_at / cancelled_at), không có thì dùng thời điểm tạo
+
+    Args:
+        item: Dict pending request
+        mac_dinh: Giá trị trả về nếu không parse được thời điểm nào
+
+    Returns:
+        float: Epoch giây
+    """
+    for field in ('completed_at', 'cancelled_at', 'timestamp'):
+        epoch = _epoch(item.get(field))
+        if epoch is not None:
+            return epoch
+    return mac_dinh
+
+
+def danh_dau_het_han(item):
+    """Chuyển pending request quá hạn sang trạng thái cancelled (tự hủy do hết TTL)"""
+    item['status'] = 'cancelled'
+    item['cancelled_at'] = datetime.now().isoformat()
+    item['cancel_reason'] = 'expired'
+    return item
+
+
+def doc_pending_requests(path, archive_path=None):
+    """
+    Đọc toàn bộ request (đã lưu trữ và còn trong pending_requests.json) mà không ghi gì:
+    không chuyển request đã xong sang file lưu trữ, không tự hủy request quá TTL
+
+    Args:
+        path: Đường dẫn đến file pending_requests.json
+        archive_path: Đường dẫn file lưu trữ (mặc định db/pending_archive.jsonl cùng thư mục)
+
+    Returns:
+        dict: {request_id: data} như PendingStore.all() (bỏ qua phần tử không phải dict)
+
+    Raises:
+        json.JSONDecodeError: Nếu file không phải JSON hợp lệ
+        ValueError: Nếu dữ liệu trong file không phải là dict
+    """
+    archive_path = archive_path or os.path.join(os.path.dirname(os.path.abspath(path)), ARCHIVE_FILE_NAME)
+    result = {}
+    records, _ = WriteAheadLog(archive_path).read_from(0)
+    for record in records:
+        if isinstance(record, dict) and record.get('request_id') is not None:
+            record = dict(record)
+            result[record.pop('request_id')] = record
+
+    data = {}
+    if os.path.exists(path) and os.path.getsize(path) > 0:
+        data = doc_file(path)
+        if not isinstance(data, dict):
+            raise ValueError("Dữ liệu trong db/pending_requests.json không hợp lệ")
+    for request_id, item in data.items():
+        # Request đã có trong file lưu trữ là bản cuối cùng (như PendingStore._nap)
+        if isinstance(item, dict) and request_id not in result:
+            result[request_id] = item
+    return result
+
+
+class PendingStore(PendingRequestRepository):
+    """
+    Kho pending request trong bộ nhớ với index đếm theo tài khoản
+
+    - _pending: request_id → request đang pending, theo thứ tự thời điểm tạo (cũ nhất trước)
+    - _dem: account_id → số request pending của tài khoản
+    - _luu_tru: request_id → vị trí dòng của request trong file lưu trữ (tra cứu trạng thái request đã xong)
+
+    Khi một request chuyển sang trạng thái khác pending, request được ghi nối vào file lưu trữ (fsync)
+    trước rồi mới ghi lại pending_requests.json; nếu crash ở giữa, lần nạp sau bỏ qua request
+    đã có trong file lưu trữ. Các request completed/cancelled còn sót trong pending_requests.json
+    (dữ liệu cũ) được chuyển sang file lưu trữ ở lần nạp đầu tiên.
+
+    Args:
+        path: Đường dẫn đến file pending_requests.json
+        archive_path: Đường dẫn file lưu trữ (mặc định db/pending_archive.jsonl)
+        ttl: Số giây trước khi request pending tự hủy (mặc định đọc PENDING_TTL trong config/db.json)
+    """
+
+    def __init__(self, path, archive_path=None, ttl=None):
+        self.path = os.path.abspath(path)
+        self.archive_path = os.path.abspath(archive_path or os.path.join(os.path.dirname(self.path), ARCHIVE_FILE_NAME))
+        self.ttl = doc_pending_ttl() if ttl is None else float(ttl)
+        # Lock của file pending_requests.json, dùng chung cho cả file lưu trữ
+        self._lock = resource_lock(self.path)
+        self._archive = WriteAheadLog(self.archive_path)
+
+        self._pending = {}
+        self._tao_luc = {}
+        # Thời điểm tạo lớn nhất đã thêm vào _pending (cận trên, không giảm khi request rời pending)
+        self._tao_luc_max = None
+        self._dem = {}
+        # Các phần tử không hợp lệ (không phải dict), vẫn giữ lại khi ghi file
+        self._khac = {}
+        self._mtime = None
+        self._da_nap = False
+
+        self._luu_tru = {}
+        self._archive_offset = 0
+        self._archive_ino = None
+
+        # Trong batch(): request chờ ghi vào file lưu trữ và cờ cần ghi lại pending_requests.json
+        self._lo_luu_tru = None
+        self._lo_ghi = False
+
+    def _lay_mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _cap_nhat_luu_tru(self):
+        """Đọc phần mới ghi thêm của file lưu trữ vào index (kể cả phần do process khác ghi)"""
+        try:
+            st = os.stat(self.archive_path)
+            ino, size = st.st_ino, st.st_size
+        except FileNotFoundError:
+            ino, size = None, 0
+
+        if ino != self._archive_ino or size < self._archive_offset:
+            # File lưu trữ bị thay thế/cắt ngắn (ví dụ sau khi nén lưu trữ) → dựng lại index từ đầu
+            self._archive.close()
+            self._luu_tru = {}
+            self._archive_offset = 0
+            self._archive_ino = ino
+
+        if size > self._archive_offset:
+            entries, self._archive_offset = self._archive.read_entries_from(self._archive_offset)
+            for offset, record in entries:
+                request_id = record.get('request_id') if isinstance(record, dict) else None
+                if request_id is not None:
+                    self._luu_tru[request_id] = offset
+
+    def _nap(self):
+        """
+        Nạp pending_requests.json, dựng lại index đếm theo tài khoản
+
+        Raises:
+            json.JSONDecodeError: Nếu file không phải JSON hợp lệ
+            ValueError: Nếu dữ liệu trong file không phải là dict
+        """
+        self._cap_nhat_luu_tru()
+
+        mtime = self._lay_mtime()
+        data = {}
+        if mtime is not None and os.path.getsize(self.path) > 0:
+            data = doc_file(self.path)
+            if not isinstance(data, dict):
+                raise ValueError("Dữ liệu trong db/pending_requests.json không hợp lệ")
+
+        bay_gio = time.time()
+        pending = []
+        khac = {}
+        da_xong = {}
+        for request_id, item in data.items():
+            if not isinstance(item, dict):
+                khac[request_id] = item
+            elif request_id in self._luu_tru:
+                # Đã được lưu trữ nhưng chưa kịp xóa khỏi file (crash giữa hai lần ghi)
+                da_xong[request_id] = None
+            elif item.get('status') != 'pending':
+                da_xong[request_id] = item
+            else:
+                pending.append((thoi_diem_tao(item, bay_gio), request_id, item))
+
+        pending.sort(key=lambda entry: entry[0])
+        self._pending = {request_id: item for _, request_id, item in pending}
+        self._tao_luc = {request_id: tao_luc for tao_luc, request_id, _ in pending}
+        self._tao_luc_max = pending[-1][0] if pending else None
+        self._dem = {}
+        for item in self._pending.values():
+            self._dem[item.get('id')] = self._dem.get(item.get('id'), 0) + 1
+        self._khac = khac
+        self._mtime = mtime
+        self._da_nap = True
+
+        if da_xong:
+            # Chuyển request đã xong (dữ liệu cũ) sang file lưu trữ rồi ghi lại file chỉ còn pending
+            self._ghi_luu_tru([(request_id, item) for request_id, item in da_xong.items() if item is not None])
+            self._ghi()
+
+    def _dam_bao_moi_nhat(self):
+        """Nạp lần đầu hoặc nạp lại nếu file bị thay đổi từ bên ngoài"""
+        if not self._da_nap or self._lay_mtime() != self._mtime:
+            self._nap()
+
+    def _qua_han(self):
+        """
+        Các request pending quá TTL (chỉ xét từ request cũ nhất nên thường là O(1)), không ghi gì
+
+        Returns:
+            list: request_id theo thứ tự tạo
+        """
+        if not self.ttl or not self._pending:
+            return []
+        han = time.time() - self.ttl
+        qua_han = []
+        for request_id in self._pending:
+            if self._tao_luc[request_id] > han:
+                break
+            qua_han.append(request_id)
+        return qua_han
+
+    def _huy_qua_han(self):
+        """
+        Ghi trạng thái cancelled cho các request pending quá TTL (chỉ gọi trên đường ghi)
+
+        Returns:
+            int: Số request đã hủy
+        """
+        qua_han = self._qua_han()
+        if not qua_han:
+            return 0
+        for request_id in qua_han:
+            danh_dau_het_han(self._pending[request_id])
+        self._ket_thuc(qua_han)
+        print(f"⏱️ Đã tự hủy {len(qua_han)} pending request quá {int(self.ttl)} giây")
+        return len(qua_han)
+
+    def _bo_pending(self, request_id):
+        """Xóa request khỏi danh sách pending và giảm bộ đếm của tài khoản"""
+        item = self._pending.pop(request_id)
+        self._tao_luc.pop(request_id, None)
+        account_id = item.get('id')
+        con_lai = self._dem.get(account_id, 0) - 1
+        if con_lai > 0:
+            self._dem[account_id] = con_lai
+        else:
+            self._dem.pop(account_id, None)
+        return item
+
+    def _ket_thuc(self, request_ids):
+        """Chuyển các request (đã đổi trạng thái trong bộ nhớ) từ pending sang file lưu trữ"""
+        items = [(request_id, self._bo_pending(request_id)) for request_id in request_ids]
+        self._ghi_luu_tru(items)
+        self._ghi()
+
+    def _ghi_luu_tru(self, items):
+        """Ghi nối các request vào file lưu trữ (một lần fsync) và cập nhật index"""
+        if not items:
+            return
+        if self._lo_luu_tru is not None:
+            for request_id, item in items:
+                self._lo_luu_tru[request_id] = item
+            return
+        self._cap_nhat_luu_tru()
+        self._archive.append([dict(item, request_id=request_id) for request_id, item in items])
+        if self._archive_ino is None:
+            self._archive_ino = os.stat(self.archive_path).st_ino
+        self._cap_nhat_luu_tru()
+
+    def _ghi(self):
+        """Ghi lại pending_requests.json (chỉ gồm các request đang pending)"""
+        if self._lo_luu_tru is not None:
+            self._lo_ghi = True
+            return
+        data = dict(self._pending)
+        data.update(self._khac)
+        ghi_json_atomic(self.path, data, indent=DB_INDENT)
+        self._mtime = self._lay_mtime()
+
+    def _doc_luu_tru(self, request_id):
+        """Đọc request đã xong từ file lưu trữ, None nếu không có"""
+        if self._lo_luu_tru is not None and request_id in self._lo_luu_tru:
+            # Request vừa kết thúc trong batch hiện tại, chưa ghi xuống file
+            return dict(self._lo_luu_tru[request_id])
+        if request_id not in self._luu_tru:
+            # Có thể request vừa được process khác lưu trữ
+            self._cap_nhat_luu_tru()
+        offset = self._luu_tru.get(request_id)
+        if offset is None:
+            return None
+        record = self._archive.read_at(offset)
+        if not isinstance(record, dict) or record.get('request_id') != request_id:
+            # File lưu trữ vừa được nén lại ở process khác (offset cũ không còn đúng) → dựng lại index
+            self._archive_ino = None
+            self._cap_nhat_luu_tru()
+            offset = self._luu_tru.get(request_id)
+            record = self._archive.read_at(offset) if offset is not None else None
+            if not isinstance(record, dict) or record.get('request_id') != request_id:
+                return None
+        record.pop('request_id', None)
+        return record
+
+    @contextmanager
+    def batch(self):
+        """
+        Giữ lock và gom mọi thay đổi bên trong thành một lần ghi: một lần ghi nối file lưu trữ
+        rồi một lần ghi lại pending_requests.json (cùng thứ tự như khi ghi từng request)
+        """
+        with self._lock:
+            if self._lo_luu_tru is not None:
+                yield
+                return
+            self._lo_luu_tru = {}
+            self._lo_ghi = False
+            try:
+                yield
+            finally:
+                items, can_ghi = list(self._lo_luu_tru.items()), self._lo_ghi
+                self._lo_luu_tru = None
+                self._lo_ghi = False
+                self._ghi_luu_tru(items)
+                if can_ghi:
+                    self._ghi()
+
+    def get(self, request_id):
+        """
+        Lấy request theo request_id (đang pending hoặc đã lưu trữ)
+
+        Args:
+            request_id (str): ID của request
+
+        Returns:
+            dict: Bản sao của request, None nếu không tồn tại
+        """
+        with self._lock:
+            self._dam_bao_moi_nhat()
+            item = self._pending.get(request_id)
+            if item is not None:
+                if self.ttl and self._tao_luc[request_id] <= time.time() - self.ttl:
+                    # Quá hạn nhưng chưa được ghi là đã hủy: trả về như đã hủy, không ghi file trên đường đọc
+                    return danh_dau_het_han(dict(item))
+                return dict(item)
+            return self._doc_luu_tru(request_id)
+
+    def add(self, request_id, data):
+        """
+        Thêm request mới (thường ở trạng thái pending), sau đó lưu xuống đĩa
+
+        Args:
+            request_id (str): ID của request
+            data (dict): Nội dung request (id, timestamp, status, ...)
+        """
+        with self._lock:
+            self._dam_bao_moi_nhat()
+            self._huy_qua_han()
+            item = dict(data)
+            if item.get('status', 'pending') != 'pending':
+                self._ghi_luu_tru([(request_id, item)])
+                return
+            if request_id in self._pending:
+                self._bo_pending(request_id)
+            tao_luc = thoi_diem_tao(item, time.time())
+            self._pending[request_id] = item
+            self._tao_luc[request_id] = tao_luc
+            if self._tao_luc_max is not None and tao_luc < self._tao_luc_max:
+                # Request tạo trước request mới nhất (hiếm): sắp xếp lại để _qua_han vẫn chỉ xét từ đầu
+                self._pending = dict(sorted(self._pending.items(), key=lambda entry: self._tao_luc[entry[0]]))
+            else:
+                self._tao_luc_max = tao_luc
+            self._dem[item.get('id')] = self._dem.get(item.get('id'), 0) + 1
+            self._ghi()
+
+    def update(self, request_id, **fields):
+        """
+        Cập nhật một số trường của request; request rời trạng thái pending được chuyển sang file lưu trữ
+
+        Args:
+            request_id (str): ID của request
+            **fields: Các trường cần cập nhật
+
+        Returns:
+            dict: Bản sao của request sau khi cập nhật, None nếu không tồn tại
+        """
+        with self._lock:
+            self._dam_bao_moi_nhat()
+            self._huy_qua_han()
+            item = self._pending.get(request_id)
+            if item is None:
+                # Request đã lưu trữ: ghi nối bản mới, index trỏ tới dòng mới nhất
+                item = self._doc_luu_tru(request_id)
+                if item is None:
+                    return None
+                item.update(fields)
+                self._ghi_luu_tru([(request_id, item)])
+                return dict(item)
+
+            account_id = item.get('id')
+            item.update(fields)
+            if item.get('status', 'pending') != 'pending':
+                self._ket_thuc([request_id])
+            else:
+                if item.get('id') != account_id:
+                    # Đổi tài khoản của request: chuyển bộ đếm sang tài khoản mới
+                    self._dem[account_id] -= 1
+                    if not self._dem[account_id]:
+                        del self._dem[account_id]
+                    self._dem[item.get('id')] = self._dem.get(item.get('id'), 0) + 1
+                self._ghi()
+            return dict(item)
+
+    def count_pending(self, account_id):
+        """
+        Đếm số request pending của một tài khoản (O(1), đã trừ các request quá hạn)
+
+        Args:
+            account_id (str): ID của tài khoản
+
+        Returns:
+            int: Số request pending
+        """
+        with self._lock:
+            self._dam_bao_moi_nhat()
+            so_luong = self._dem.get(account_id, 0)
+            if so_luong:
+                so_luong -= sum(1 for request_id in self._qua_han() if self._pending[request_id].get('id') == account_id)
+            return so_luong
+
+    def expire(self):
+        """
+        Ghi trạng thái cancelled cho các request pending quá TTL (gọi từ thread nén lưu trữ)
+
+        Returns:
+            int: Số request đã hủy
+        """
+        if not self.ttl:
+            return 0
+        with self._lock:
+            self._dam_bao_moi_nhat()
+            return self._huy_qua_han()
+
+    def all(self):
+        """
+        Lấy toàn bộ request (đã lưu trữ và đang pending) dạng dict {request_id: data}
+
+        Đọc toàn bộ file lưu trữ, chỉ dùng cho các thao tác hiếm (ví dụ nhập dữ liệu sang SQLite)
+        """
+        with self._lock:
+            self._dam_bao_moi_nhat()
+            result = {}
+            records, _ = self._archive.read_from(0)
+            for record in records:
+                if isinstance(record, dict) and record.get('request_id') is not None:
+                    record = dict(record)
+                    result[record.pop('request_id')] = record
+            for request_id, item in self._pending.items():
+                result[request_id] = dict(item)
+            result.update(self._khac)
+            return result
+
+    def compact(self, before, archive_writer):
+        """
+        Chuyển các request đã xong trước thời điểm before ra khỏi file lưu trữ
+
+        Request cũ được giao cho archive_writer (ghi ra phân vùng nén) trước, sau đó file lưu trữ
+        được ghi lại (atomic) chỉ với các request còn lại; bản ghi trùng request_id chỉ giữ bản mới nhất
+
+        Args:
+            before: Epoch giây; request kết thúc trước thời điểm này bị chuyển đi
+            archive_writer: Hàm nhận list request (có trường request_id)
+
+        Returns:
+            tuple: (so_request: int, bytes_truoc: int, bytes_sau: int)
+                - bytes: tổng kích thước pending_requests.json và file lưu trữ
+        """
+        with self._lock:
+            # Nạp lại (cũng chuyển request đã xong còn sót trong pending_requests.json sang file lưu trữ)
+            self._da_nap = False
+            self._dam_bao_moi_nhat()
+            bytes_truoc = _kich_thuoc(self.path) + _kich_thuoc(self.archive_path)
+
+            moi_nhat = {}
+            records, _ = self._archive.read_from(0)
+            for record in records:
+                if isinstance(record, dict) and record.get('request_id') is not None:
+                    moi_nhat[record['request_id']] = record
+            bay_gio = time.time()
+            cu = [record for record in moi_nhat.values() if thoi_diem_ket_thuc(record, bay_gio) < before]
+            if not cu and len(moi_nhat) == len(records):
+                return 0, bytes_truoc, bytes_truoc
+
+            if cu:
+                archive_writer(cu)
+            con_lai = b''.join(
+                dumps(record) + b'\n' for record in moi_nhat.values()
+                if thoi_diem_ket_thuc(record, bay_gio) >= before
+            )
+            ghi_bytes_atomic(self.archive_path, con_lai)
+            self._cap_nhat_luu_tru()
+            return len(cu), bytes_truoc, _kich_thuoc(self.path) + _kich_thuoc(self.archive_path)
+
+
+def _kich_thuoc(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
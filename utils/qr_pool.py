@@ -0,0 +1,186 @@
+"""
+Module pool QR code tạo sẵn cho /qr
+
+id của /qr là ngẫu nhiên và không phụ thuộc người gọi, nên QR có thể được tạo trước. Một thread nền giữ
+cho mỗi giá trị sl thường dùng (QR_POOL_SL) một hàng đợi tối đa QR_POOL_SIZE cặp (id, ảnh PNG, base64)
+sẵn sàng; /qr chỉ lấy một phần tử ra khỏi hàng đợi. Hàng đợi rỗng (hoặc sl không có trong pool) thì /qr
+tạo QR ngay trong request như trước.
+
+- Thread nền tạo tối đa QR_POOL_REFILL_PER_SEC QR mỗi giây (không chiếm hết CPU khi bù lại cả pool)
+- Mỗi QR gắn với phiên bản config thanh toán lúc tạo; config đổi (COST, tài khoản) thì QR cũ bị bỏ
+  (khi lấy ra, và ở vòng tạo kế tiếp của thread nền để bù lại ngay)
+- Mỗi id chỉ được trả ra một lần; pool nằm trong bộ nhớ, khởi động lại thì các id chưa dùng bị bỏ
+"""
+import threading
+import time
+from collections import deque
+
+
+class QrPool:
+    """
+    Pool QR tạo sẵn theo sl
+
+    Args:
+        producer: Hàm producer(sl) → (success, item: dict, error_message), tạo một QR mới
+        sl_values: Các giá trị sl được tạo sẵn (None là /qr không có sl)
+        size: Số QR tối đa giữ sẵn cho mỗi sl
+        refill_per_sec: Số QR tối đa thread nền tạo mỗi giây (0 là không giới hạn)
+        version: Hàm trả về phiên bản config hiện tại; item có "version" khác thì bị bỏ khi lấy ra
+    """
+
+    def __init__(self, producer, sl_values, size=20, refill_per_sec=50, version=None):
+        self.producer = producer
+        self.size = max(int(size or 0), 0)
+        self.refill_per_sec = max(float(refill_per_sec or 0), 0.0)
+        self.version = version
+        self._queues = {sl: deque() for sl in sl_values}
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        # Phiên bản config ở lần kiểm tra QR cũ gần nhất của thread nền
+        self._version_seen = None
+        # Số liệu cho /stats
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.produced = 0
+        self.errors = 0
+        self.last_error = None
+        self.last_produce_ms = 0.0
+
+    def pop(self, sl):
+        """
+        Lấy một QR tạo sẵn cho sl (đánh thức thread nền để bù lại)
+
+        Args:
+            sl: Số lượng (None là /qr không có sl)
+
+        Returns:
+            dict: Item của producer, None nếu pool không có QR phù hợp
+        """
+        queue = self._queues.get(sl)
+        if queue is None or not self.size:
+            return None
+        hien_tai = self.version() if self.version is not None else None
+        while True:
+            try:
+                item = queue.popleft()
+            except IndexError:
+                with self._lock:
+                    self.misses += 1
+                self._event.set()
+                return None
+            if self.version is not None and item.get("version") is not hien_tai:
+                with self._lock:
+                    self.stale += 1
+                continue
+            with self._lock:
+                self.hits += 1
+            self._event.set()
+            return item
+
+    def _bo_qr_cu(self):
+        """Bỏ các QR tạo theo config cũ khỏi mọi hàng đợi (để thread nền tạo lại ngay)"""
+        if self.version is None:
+            return
+        hien_tai = self.version()
+        if hien_tai is self._version_seen:
+            return
+        self._version_seen = hien_tai
+        for queue in self._queues.values():
+            so_cu = 0
+            for _ in range(len(queue)):
+                try:
+                    item = queue.popleft()
+                except IndexError:
+                    break
+                if item.get("version") is hien_tai:
+                    queue.append(item)
+                else:
+                    so_cu += 1
+            if so_cu:
+                with self._lock:
+                    self.stale += so_cu
+
+    def _tao_mot(self):
+        """
+        Tạo một QR cho hàng đợi thiếu nhiều nhất
+
+        Returns:
+            bool: True nếu có hàng đợi chưa đầy (đã thử tạo)
+        """
+        self._bo_qr_cu()
+        sl, queue = min(self._queues.items(), key=lambda kv: len(kv[1]))
+        if len(queue) >= self.size:
+            return False
+        bat_dau = time.perf_counter()
+        success, item, error_message = self.producer(sl)
+        with self._lock:
+            self.last_produce_ms = round((time.perf_counter() - bat_dau) * 1000, 3)
+            if not success:
+                self.errors += 1
+                self.last_error = error_message
+                raise RuntimeError(error_message)
+            self.produced += 1
+        queue.append(item)
+        return True
+
+    def fill(self):
+        """
+        Tạo đến khi mọi hàng đợi đầy (chạy trong thread hiện tại, không giới hạn tốc độ)
+
+        Returns:
+            int: Số QR đã tạo
+        """
+        total = 0
+        while self._tao_mot():
+            total += 1
+        return total
+
+    def _chay(self):
+        """Vòng lặp của thread nền"""
+        khoang_cach = 1.0 / self.refill_per_sec if self.refill_per_sec else 0.0
+        while True:
+            try:
+                if not self._tao_mot():
+                    # Mọi hàng đợi đã đầy: chờ tới khi có QR được lấy ra
+                    self._event.wait(1.0)
+                    self._event.clear()
+                    continue
+            except Exception as e:
+                print(f"⚠️ Lỗi khi tạo sẵn QR code, thử lại sau 1 giây: {e}")
+                time.sleep(1.0)
+                continue
+            if khoang_cach:
+                time.sleep(khoang_cach)
+
+    def start(self):
+        """Khởi động thread nền (gọi nhiều lần chỉ chạy một thread)"""
+        if not self.size or not self._queues:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._chay, name="qr-pool", daemon=True)
+                self._thread.start()
+
+    def stats(self):
+        """
+        Returns:
+            dict: Số liệu pool (size, refill_per_sec, ready theo sl, hits, misses, stale, produced, errors,
+                  last_error, last_produce_ms, running)
+        """
+        ready = {"default" if sl is None else str(sl): len(queue) for sl, queue in self._queues.items()}
+        with self._lock:
+            return {
+                "size": self.size,
+                "refill_per_sec": self.refill_per_sec,
+                "ready": ready,
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale": self.stale,
+                "produced": self.produced,
+                "errors": self.errors,
+                "last_error": self.last_error,
+                "last_produce_ms": self.last_produce_ms,
+                "running": self._thread is not None,
+            }
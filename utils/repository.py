@@ -0,0 +1,221 @@
+"""
+Module định nghĩa các interface repository cho dữ liệu của service
+Mỗi backend lưu trữ (JSON, SQLite) cài đặt các class này để code trong apis/ không phụ thuộc vào cách lưu
+"""
+from contextlib import contextmanager
+
+
+class AccountRepository:
+    """Tài khoản (db/data.json): mỗi tài khoản là một dict có trường id"""
+
+    def get(self, id):
+        """Lấy bản sao tài khoản theo id, None nếu không tồn tại"""
+        raise NotImplementedError
+
+    def all(self):
+        """Lấy danh sách bản sao tất cả tài khoản theo thứ tự thêm vào"""
+        raise NotImplementedError
+
+    def upsert(self, item):
+        """Thêm mới hoặc thay thế toàn bộ tài khoản có cùng id, trả về bản sao đã lưu"""
+        raise NotImplementedError
+
+    def update(self, id, **fields):
+        """Cập nhật một số trường, trả về bản sao sau khi cập nhật hoặc None nếu không tồn tại"""
+        raise NotImplementedError
+
+    def delete(self, id):
+        """Xóa tài khoản, trả về tài khoản đã xóa hoặc None nếu không tồn tại"""
+        raise NotImplementedError
+
+    def status(self, id, refresh=True):
+        """
+        Lấy nhanh (active, count, limit) của tài khoản (không sao chép object), None nếu không tồn tại
+        refresh=False cho phép dùng dữ liệu đã nạp mà không kiểm tra lại file (gọi ngay sau generation())
+        """
+        raise NotImplementedError
+
+    def status_many(self, ids, refresh=True):
+        """Như status() cho nhiều id trong một lần tra cứu, trả về dict {id: (active, count, limit)} (bỏ qua id không tồn tại)"""
+        raise NotImplementedError
+
+    def generation(self):
+        """Giá trị thay đổi mỗi khi có tài khoản mới được thêm (dùng để làm mới cache id không tồn tại)"""
+        raise NotImplementedError
+
+    def batch(self):
+        """Context manager giữ lock và gom mọi thay đổi bên trong thành một lần ghi xuống đĩa khi thoát"""
+        raise NotImplementedError
+
+
+class PendingRequestRepository:
+    """Pending request của add_count (db/pending_requests.json), key là request_id"""
+
+    def get(self, request_id):
+        """Lấy bản sao pending request, None nếu không tồn tại"""
+        raise NotImplementedError
+
+    def add(self, request_id, data):
+        """Thêm pending request mới"""
+        raise NotImplementedError
+
+    def update(self, request_id, **fields):
+        """Cập nhật một số trường, trả về bản sao sau khi cập nhật hoặc None nếu không tồn tại"""
+        raise NotImplementedError
+
+    def count_pending(self, account_id):
+        """Đếm số request đang ở trạng thái pending của một tài khoản"""
+        raise NotImplementedError
+
+    def all(self):
+        """Lấy toàn bộ pending request dạng dict {request_id: data}"""
+        raise NotImplementedError
+
+    def batch(self):
+        """Context manager giữ lock và gom mọi thay đổi bên trong thành một lần ghi xuống đĩa khi thoát"""
+        raise NotImplementedError
+
+    def expire(self):
+        """Ghi trạng thái cancelled cho các request pending quá PENDING_TTL, trả về số request đã hủy"""
+        raise NotImplementedError
+
+    def compact(self, before, archive_writer):
+        """
+        Chuyển request đã xong (completed/cancelled) kết thúc trước epoch before sang archive_writer
+        rồi xóa khỏi nơi lưu, trả về (số request, số byte trước, số byte sau)
+        """
+        raise NotImplementedError
+
+
+class TempCountRepository:
+    """Count tạm của /check (db/temp_count.json), key là id tài khoản"""
+
+    def get(self, id):
+        """Lấy count tạm, None nếu id chưa được khởi tạo"""
+        raise NotImplementedError
+
+    def get_many(self, ids):
+        """Lấy count tạm của nhiều id trong một lần đọc, dict {id: value} (bỏ qua id chưa được khởi tạo)"""
+        raise NotImplementedError
+
+    def set(self, id, value):
+        """Gán count tạm cho id"""
+        raise NotImplementedError
+
+    def delete(self, id):
+        """Xóa count tạm của id (reset), trả về True nếu id có tồn tại"""
+        raise NotImplementedError
+
+    def all(self):
+        """Lấy toàn bộ count tạm dạng dict {id: value}"""
+        raise NotImplementedError
+
+    def write_many(self, values, deleted=()):
+        """Gán nhiều count tạm ({id: value}) và xóa các id trong deleted trong một lần ghi"""
+        raise NotImplementedError
+
+
+class SessionRepository:
+    """Session đăng nhập (db/sessions.json), key là session token"""
+
+    def get(self, token):
+        """Lấy bản sao thông tin session, None nếu không tồn tại"""
+        raise NotImplementedError
+
+    def set(self, token, info):
+        """Thêm hoặc thay thế session"""
+        raise NotImplementedError
+
+    def delete(self, token):
+        """Xóa session, trả về True nếu token có tồn tại"""
+        raise NotImplementedError
+
+    def delete_many(self, tokens):
+        """Xóa nhiều session cùng lúc, trả về số session đã xóa"""
+        raise NotImplementedError
+
+    def all(self):
+        """Lấy toàn bộ session dạng dict {token: info}"""
+        raise NotImplementedError
+
+    def replace_all(self, sessions):
+        """Ghi đè toàn bộ session bằng dict {token: info}"""
+        raise NotImplementedError
+
+
+class OtpRepository:
+    """Mã OTP đăng nhập (db/otp.txt), key là email (chữ thường)"""
+
+    def get(self, email):
+        """Lấy bản sao thông tin OTP ({"otp", "timestamp"}), None nếu không tồn tại"""
+        raise NotImplementedError
+
+    def set(self, email, info):
+        """Lưu thông tin OTP cho email"""
+        raise NotImplementedError
+
+    def delete(self, email):
+        """Xóa OTP của email, trả về True nếu email có tồn tại"""
+        raise NotImplementedError
+
+    def all(self):
+        """Lấy toàn bộ OTP dạng dict {email: info}"""
+        raise NotImplementedError
+
+
+class TransactionRepository:
+    """Giao dịch webhook SePay đã xử lý (db/transactions.jsonl), key là mã giao dịch; có giới hạn số lượng và thời hạn"""
+
+    def get(self, key):
+        """Lấy bản sao thông tin giao dịch đã xử lý (còn hạn), None nếu chưa xử lý"""
+        raise NotImplementedError
+
+    def add(self, key, info):
+        """Ghi nhận giao dịch đã xử lý, trả về False nếu key đã có (không ghi đè)"""
+        raise NotImplementedError
+
+    def add_many(self, items):
+        """Ghi nhận nhiều giao dịch ({key: info}) trong một lần ghi, trả về danh sách key được ghi nhận mới"""
+        raise NotImplementedError
+
+    def discard_many(self, keys):
+        """Bỏ ghi nhận các giao dịch (khi ghi tài khoản sau khi ghi nhận bị lỗi), key không có thì bỏ qua"""
+        raise NotImplementedError
+
+    def all(self):
+        """Lấy toàn bộ giao dịch còn giữ dạng dict {key: info}"""
+        raise NotImplementedError
+
+
+class Storage:
+    """
+    Gom các repository của một backend lưu trữ
+
+    Attributes:
+        backend: Tên backend ("json" hoặc "sqlite")
+        accounts: AccountRepository
+        pending: PendingRequestRepository
+        temp_counts: TempCountRepository
+        sessions: SessionRepository
+        otps: OtpRepository
+        transactions: TransactionRepository
+    """
+
+    def __init__(self, backend, accounts, pending, temp_counts, sessions, otps, transactions):
+        self.backend = backend
+        self.accounts = accounts
+        self.pending = pending
+        self.temp_counts = temp_counts
+        self.sessions = sessions
+        self.otps = otps
+        self.transactions = transactions
+
+    @contextmanager
+    def batch(self):
+        """
+        Gom các thay đổi tài khoản và pending request thành một lần ghi (dùng cho các API theo lô)
+
+        Thứ tự lấy lock: tài khoản → pending request (gọi sau khi đã giữ lock của các tài khoản liên quan)
+        """
+        with self.accounts.batch(), self.pending.batch():
+            yield
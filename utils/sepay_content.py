@@ -0,0 +1,133 @@
+"""
+Module tách id tài khoản và số lượng (sl) từ nội dung chuyển khoản SePay
+
+Nội dung chuyển khoản có dạng "<tiền tố ngân hàng> AUTO{id}-{sl}END <phần còn lại>" hoặc "AUTO{id}{sl}END"
+(20 ký tự đầu là id). Ngân hàng có thể thêm tiền tố/hậu tố tùy ý, nên chỉ đoạn giữa AUTO và END được dùng;
+không có đoạn AUTO...END thì toàn bộ nội dung được coi là id_sl.
+
+Dùng chung cho webhook /authentication, hàng đợi webhook và các công cụ replay.
+"""
+from operator import itemgetter
+
+# Độ dài tối thiểu của id tài khoản (id_sl không có dấu "-" thì 20 ký tự đầu là id)
+ID_LENGTH = 20
+
+# Tạo ParsedContent trực tiếp (không qua __new__ viết bằng Python) ở đường thường gặp
+_tuple_new = tuple.__new__
+
+
+class ParsedContent(tuple):
+    """
+    Kết quả tách nội dung chuyển khoản (tuple bất biến (id_sl, id, sl, error), tạo nhanh hơn object thường)
+
+    Attributes:
+        id_sl: Đoạn id + sl (giữa AUTO và END, hoặc toàn bộ nội dung)
+        id: ID tài khoản (None nếu không hợp lệ)
+        sl: Phần sl dạng chuỗi (None nếu không hợp lệ)
+        error: Thông báo lỗi, None nếu hợp lệ
+    """
+
+    __slots__ = ()
+
+    def __new__(cls, id_sl, id=None, sl=None, error=None):
+        return _tuple_new(cls, (id_sl, id, sl, error))
+
+    id_sl = property(itemgetter(0))
+    id = property(itemgetter(1))
+    sl = property(itemgetter(2))
+    error = property(itemgetter(3))
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __repr__(self):
+        return f"ParsedContent(id_sl={self.id_sl!r}, id={self.id!r}, sl={self.sl!r}, error={self.error!r})"
+
+
+def tach_id_sl(id_sl):
+    """
+    Tách id_sl thành id và sl
+
+    - Có dấu "-": phần trước dấu "-" đầu tiên là id (ít nhất 20 ký tự), phần sau là sl
+    - Không có dấu "-": 20 ký tự đầu là id, phần còn lại là sl
+
+    Args:
+        id_sl: Chuỗi id + sl (ví dụ "id0c0nUPf3rjZwzpA3yD-50" hoặc "id0c0nUPf3rjZwzpA3yD50")
+
+    Returns:
+        ParsedContent: Kết quả, error khác None nếu không hợp lệ
+    """
+    if not isinstance(id_sl, str):
+        id_sl = str(id_sl)
+    id_sl = id_sl.strip()
+    if len(id_sl) < ID_LENGTH:
+        return ParsedContent(id_sl, error=f"id_sl phải có ít nhất {ID_LENGTH} ký tự, hiện tại có {len(id_sl)} ký tự")
+
+    id, gach, sl = id_sl.partition('-')
+    if gach:
+        id, sl = id.strip(), sl.strip()
+        if len(id) < ID_LENGTH:
+            return ParsedContent(id_sl, error=f"id phải có ít nhất {ID_LENGTH} ký tự, hiện tại có {len(id)} ký tự")
+    else:
+        id, sl = id_sl[:ID_LENGTH], id_sl[ID_LENGTH:]
+
+    if not sl:
+        return ParsedContent(id_sl, error="Phần sl không được rỗng")
+    return _tuple_new(ParsedContent, (id_sl, id, sl, None))
+
+
+def parse_sepay_content(content):
+    """
+    Tách id và sl từ nội dung chuyển khoản SePay
+
+    Nội dung có nhiều đoạn AUTO...END thì dùng đoạn hợp lệ đầu tiên (không đoạn nào hợp lệ
+    thì trả về kết quả của đoạn đầu tiên để báo lỗi)
+
+    Args:
+        content: Nội dung chuyển khoản (trường content của webhook)
+
+    Returns:
+        ParsedContent: Kết quả, error khác None nếu không hợp lệ
+
+    Example:
+        parse_sepay_content("MBVCB.11605994255.405978 AUTOid0c0nUPf3rjZwzpA3yD-50END tu 1015360468")
+        → ParsedContent(id_sl='id0c0nUPf3rjZwzpA3yD-50', id='id0c0nUPf3rjZwzpA3yD', sl='50', error=None)
+    """
+    if content.__class__ is not str:
+        content = str(content) if content is not None else ''
+    # Một lượt str.find: AUTO đầu tiên rồi END đầu tiên phía sau (giống AUTO(.*?)END nhưng không qua regex)
+    start = content.find("AUTO")
+    if start != -1:
+        end = content.find("END", start + 4)
+        if end != -1:
+            # Đường thường gặp (đoạn đầu tiên hợp lệ): tách ngay tại đây, không gọi thêm hàm
+            id_sl = content[start + 4:end].strip()
+            id, gach, sl = id_sl.partition('-')
+            if gach:
+                id, sl = id.strip(), sl.strip()
+                if len(id) >= ID_LENGTH and sl:
+                    return _tuple_new(ParsedContent, (id_sl, id, sl, None))
+            elif len(id_sl) > ID_LENGTH:
+                return _tuple_new(ParsedContent, (id_sl, id_sl[:ID_LENGTH], id_sl[ID_LENGTH:], None))
+            return _doan_sau(content, end, tach_id_sl(id_sl))
+    return tach_id_sl(content)
+
+
+def _doan_sau(content, end, dau_tien):
+    """
+    Đoạn AUTO...END đầu tiên không hợp lệ: tìm đoạn hợp lệ phía sau (tìm tiếp từ sau END vừa gặp)
+
+    Returns:
+        ParsedContent: Đoạn hợp lệ đầu tiên, không có thì dau_tien (để báo lỗi)
+    """
+    while True:
+        start = content.find("AUTO", end + 3)
+        if start == -1:
+            return dau_tien
+        end = content.find("END", start + 4)
+        if end == -1:
+            return dau_tien
+        result = tach_id_sl(content[start + 4:end])
+        if result.error is None:
+            return result
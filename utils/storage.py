@@ -0,0 +1,60 @@
+"""
+Module chọn backend lưu trữ theo config/db.json (BACKEND: "json" hoặc "sqlite")
+Các module trong apis/ chỉ làm việc với get_storage() thay vì tự đọc/ghi file trong db/
+"""
+import os
+import threading
+
+from utils.db_config import doc_db_config
+from utils.db_lock import lock_manager
+from utils.temp_counter import TempCounterTable
+
+# Thư mục dữ liệu mặc định
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_DB_DIR = os.path.join(root_dir, 'db')
+
+# Các storage đã tạo, key là đường dẫn tuyệt đối của thư mục dữ liệu
+_storages = {}
+_storages_lock = threading.Lock()
+
+
+def get_storage(db_dir=None):
+    """
+    Lấy Storage dùng chung cho một thư mục dữ liệu
+
+    Args:
+        db_dir: Thư mục dữ liệu (mặc định là db/ của project). Dùng thư mục khác
+                để chạy trên một bản sao dữ liệu (ví dụ khi test hoặc replay)
+
+    Returns:
+        Storage: Storage với các repository accounts, pending, temp_counts, sessions, otps
+    """
+    db_dir = os.path.abspath(db_dir) if db_dir else DEFAULT_DB_DIR
+    storage = _storages.get(db_dir)
+    if storage is not None:
+        return storage
+
+    with _storages_lock:
+        storage = _storages.get(db_dir)
+        if storage is None:
+            # Backend chỉ được đọc từ config khi tạo storage (đổi backend cần khởi động lại server)
+            config = doc_db_config()
+            backend = str(config.get("BACKEND") or "json").lower()
+            if backend == "sqlite":
+                from utils.storage_sqlite import tao_sqlite_storage
+                sqlite_file = os.path.join(db_dir, config.get("SQLITE_FILE") or "server.sqlite3")
+                storage = tao_sqlite_storage(db_dir, sqlite_file)
+            elif backend == "json":
+                from utils.storage_json import tao_json_storage
+                storage = tao_json_storage(db_dir)
+            else:
+                raise ValueError(f"BACKEND không hợp lệ trong config/db.json: {backend}")
+            # Count tạm giữ trong bộ nhớ và ghi trễ; nhiều process thì mỗi process một bản
+            # trong bộ nhớ sẽ lệch nhau, nên chế độ "process" vẫn ghi thẳng xuống repository
+            flush_ms = float(config.get("TEMP_COUNT_FLUSH_MS") or 0)
+            if flush_ms > 0 and lock_manager.mode == "thread":
+                storage.temp_counts = TempCounterTable(
+                    storage.temp_counts, flush_ms, config.get("TEMP_COUNT_FLUSH_EVERY")
+                )
+            _storages[db_dir] = storage
+        return storage
@@ -0,0 +1,196 @@
+"""
+Module backend lưu trữ dạng file JSON trong thư mục db/
+Giữ nguyên định dạng các file hiện có: data.json, pending_requests.json, temp_count.json,
+sessions.json và otp.txt (request đã xong được chuyển sang pending_archive.jsonl,
+giao dịch webhook đã xử lý nằm trong transactions.jsonl)
+"""
+import json
+import os
+
+from utils.account_store import get_account_store
+from utils.db_lock import resource_lock
+from utils.json_codec import DB_INDENT, loads
+from utils.json_file import ghi_json_atomic
+from utils.pending_store import PendingStore
+from utils.transaction_store import TRANSACTIONS_FILE_NAME, TransactionStore
+from utils.repository import (
+    OtpRepository,
+    SessionRepository,
+    Storage,
+    TempCountRepository,
+)
+
+
+class JsonDictFile:
+    """
+    File JSON chứa một dict ở cấp ngoài cùng
+
+    File được ghi atomic (file tạm + rename) nên thao tác chỉ đọc không cần lock: luôn thấy một
+    phiên bản đầy đủ. Các thao tác đọc - sửa - ghi giữ `lock` (lock liên process khi LOCK_MODE = "process")
+
+    Args:
+        path: Đường dẫn đến file
+        tolerant: True → file hỏng/không phải dict được coi như dict rỗng (có in cảnh báo);
+                  False → ném lỗi để nơi gọi báo lỗi thay vì ghi đè mất dữ liệu
+    """
+
+    def __init__(self, path, tolerant=False):
+        self.path = os.path.abspath(path)
+        self.tolerant = tolerant
+        self.lock = resource_lock(self.path)
+
+    def read(self):
+        """
+        Đọc toàn bộ file
+
+        Returns:
+            dict: Nội dung file, {} nếu file không tồn tại hoặc rỗng
+        """
+        try:
+            with open(self.path, 'rb') as f:
+                content = f.read().strip()
+            if not content:
+                return {}
+            data = loads(content)
+            if not isinstance(data, dict):
+                raise ValueError(f"Dữ liệu trong {os.path.basename(self.path)} không hợp lệ")
+            return data
+        except FileNotFoundError:
+            return {}
+        except (json.JSONDecodeError, ValueError) as e:
+            if not self.tolerant:
+                raise
+            print(f"⚠️ Lỗi khi đọc {os.path.basename(self.path)}: {e}")
+            return {}
+
+    def write(self, data):
+        """Ghi lại toàn bộ file (atomic, gọn hoặc thụt lề theo JSON_COMPACT)"""
+        ghi_json_atomic(self.path, data, indent=DB_INDENT)
+
+
+class JsonTempCountRepository(TempCountRepository):
+    """Count tạm lưu trong db/temp_count.json"""
+
+    def __init__(self, path):
+        self._file = JsonDictFile(path, tolerant=True)
+
+    def get(self, id):
+        return self._file.read().get(id)
+
+    def get_many(self, ids):
+        temp_count_data = self._file.read()
+        return {id: temp_count_data[id] for id in ids if id in temp_count_data}
+
+    def set(self, id, value):
+        with self._file.lock:
+            temp_count_data = self._file.read()
+            temp_count_data[id] = value
+            self._file.write(temp_count_data)
+
+    def delete(self, id):
+        with self._file.lock:
+            temp_count_data = self._file.read()
+            if id not in temp_count_data:
+                return False
+            del temp_count_data[id]
+            self._file.write(temp_count_data)
+            return True
+
+    def all(self):
+        return self._file.read()
+
+    def write_many(self, values, deleted=()):
+        with self._file.lock:
+            temp_count_data = self._file.read()
+            temp_count_data.update(values)
+            for id in deleted:
+                temp_count_data.pop(id, None)
+            self._file.write(temp_count_data)
+
+
+class JsonSessionRepository(SessionRepository):
+    """Session lưu trong db/sessions.json"""
+
+    def __init__(self, path):
+        self._file = JsonDictFile(path, tolerant=True)
+
+    def get(self, token):
+        item = self._file.read().get(token)
+        return dict(item) if isinstance(item, dict) else None
+
+    def set(self, token, info):
+        with self._file.lock:
+            sessions = self._file.read()
+            sessions[token] = dict(info)
+            self._file.write(sessions)
+
+    def delete(self, token):
+        return self.delete_many([token]) > 0
+
+    def delete_many(self, tokens):
+        with self._file.lock:
+            sessions = self._file.read()
+            deleted = 0
+            for token in tokens:
+                if sessions.pop(token, None) is not None:
+                    deleted += 1
+            if deleted:
+                self._file.write(sessions)
+            return deleted
+
+    def all(self):
+        return self._file.read()
+
+    def replace_all(self, sessions):
+        with self._file.lock:
+            self._file.write(dict(sessions))
+
+
+class JsonOtpRepository(OtpRepository):
+    """OTP lưu trong db/otp.txt (nội dung là JSON)"""
+
+    def __init__(self, path):
+        self._file = JsonDictFile(path, tolerant=True)
+
+    def get(self, email):
+        item = self._file.read().get(email)
+        return dict(item) if isinstance(item, dict) else None
+
+    def set(self, email, info):
+        with self._file.lock:
+            otp_data = self._file.read()
+            otp_data[email] = dict(info)
+            self._file.write(otp_data)
+
+    def delete(self, email):
+        with self._file.lock:
+            otp_data = self._file.read()
+            if email not in otp_data:
+                return False
+            del otp_data[email]
+            self._file.write(otp_data)
+            return True
+
+    def all(self):
+        return self._file.read()
+
+
+def tao_json_storage(db_dir):
+    """
+    Tạo Storage dùng các file JSON trong db_dir
+
+    Args:
+        db_dir: Thư mục chứa các file dữ liệu (thường là db/)
+
+    Returns:
+        Storage: Storage với backend "json"
+    """
+    return Storage(
+        backend="json",
+        accounts=get_account_store(os.path.join(db_dir, 'data.json')),
+        pending=PendingStore(os.path.join(db_dir, 'pending_requests.json')),
+        temp_counts=JsonTempCountRepository(os.path.join(db_dir, 'temp_count.json')),
+        sessions=JsonSessionRepository(os.path.join(db_dir, 'sessions.json')),
+        otps=JsonOtpRepository(os.path.join(db_dir, 'otp.txt')),
+        transactions=TransactionStore(os.path.join(db_dir, TRANSACTIONS_FILE_NAME)),
+    )
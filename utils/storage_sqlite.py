@@ -0,0 +1,604 @@
+"""
+Module backend lưu trữ SQLite
+Một file database (mặc định db/server.sqlite3) ở chế độ WAL, mỗi thread dùng một connection riêng.
+Cập nhật theo từng dòng và truy vấn qua index thay vì ghi lại toàn bộ file JSON.
+"""
+import os
+import sqlite3
+import threading
+import time
+
+from utils.account_store import doc_tai_khoan
+from utils.json_codec import dumps, loads
+from utils.pending_store import (
+    danh_dau_het_han,
+    doc_pending_requests,
+    doc_pending_ttl,
+    thoi_diem_ket_thuc,
+    thoi_diem_tao,
+)
+from utils.transaction_store import TRANSACTIONS_FILE_NAME, doc_dedup_config, doc_giao_dich
+from utils.repository import (
+    AccountRepository,
+    OtpRepository,
+    PendingRequestRepository,
+    SessionRepository,
+    Storage,
+    TempCountRepository,
+    TransactionRepository,
+)
+from utils.storage_json import JsonDictFile
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS accounts (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL UNIQUE,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pending_requests (
+    request_id TEXT PRIMARY KEY,
+    account_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_pending_account_status ON pending_requests (account_id, status);
+CREATE INDEX IF NOT EXISTS idx_pending_status ON pending_requests (status);
+CREATE TABLE IF NOT EXISTS temp_counts (
+    id TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sessions (
+    token TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS otps (
+    email TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS transactions (
+    key TEXT PRIMARY KEY,
+    ts REAL NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_transactions_ts ON transactions (ts);
+"""
+
+# Dọn giao dịch quá hạn / vượt giới hạn sau mỗi số lần thêm này
+TRANSACTION_PURGE_EVERY = 1000
+
+# Số id tối đa trong một câu "IN (...)" (giới hạn tham số mặc định của SQLite cũ là 999)
+SQL_IN_CHUNK = 500
+
+
+def _dumps(data):
+    return dumps(data).decode('utf-8')
+
+
+def _chon_theo_id(conn, sql, ids):
+    """
+    Chạy câu SELECT có điều kiện "id IN ({})" theo từng nhóm id (SQLite giới hạn số tham số mỗi câu lệnh)
+
+    Args:
+        conn: Kết nối SQLite
+        sql: Câu lệnh có chỗ trống {} cho danh sách tham số
+        ids: Danh sách id
+
+    Returns:
+        list: Tất cả các dòng kết quả
+    """
+    ids = list(dict.fromkeys(ids))
+    rows = []
+    for i in range(0, len(ids), SQL_IN_CHUNK):
+        chunk = ids[i:i + SQL_IN_CHUNK]
+        rows.extend(conn.execute(sql.format(",".join("?" * len(chunk))), chunk).fetchall())
+    return rows
+
+
+class SqliteDatabase:
+    """
+    Quản lý connection SQLite theo từng thread
+
+    Args:
+        path: Đường dẫn file database
+    """
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.connection().executescript(SCHEMA)
+
+    def connection(self):
+        """Lấy connection của thread hiện tại (tạo mới nếu chưa có)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # isolation_level=None: autocommit, transaction được mở tường minh bằng BEGIN IMMEDIATE
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def size(self):
+        """
+        Returns:
+            int: Tổng kích thước file database và file -wal của SQLite (byte)
+        """
+        total = 0
+        for path in (self.path, self.path + '-wal'):
+            try:
+                total += os.path.getsize(path)
+            except OSError:
+                pass
+        return total
+
+    def transaction(self):
+        """
+        Context manager mở transaction ghi (BEGIN IMMEDIATE), commit khi thành công, rollback khi lỗi
+
+        Returns:
+            _Transaction: Dùng với câu lệnh with, trả về connection
+        """
+        return _Transaction(self)
+
+
+class _Transaction:
+    """Transaction lồng nhau trong cùng thread dùng chung transaction ngoài cùng (chỉ commit/rollback ở đó)"""
+
+    def __init__(self, db):
+        self.db = db
+        self.conn = db.connection()
+
+    def __enter__(self):
+        depth = getattr(self.db._local, 'depth', 0)
+        if depth == 0:
+            self.conn.execute("BEGIN IMMEDIATE")
+        self.db._local.depth = depth + 1
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.db._local.depth -= 1
+        if self.db._local.depth == 0:
+            if exc_type is None:
+                self.conn.execute("COMMIT")
+            else:
+                self.conn.execute("ROLLBACK")
+        return False
+
+
+class SqliteAccountRepository(AccountRepository):
+    """Tài khoản lưu trong bảng accounts (id là UNIQUE index, data là JSON đầy đủ của object)"""
+
+    def __init__(self, db):
+        self._db = db
+
+    def get(self, id):
+        row = self._db.connection().execute("SELECT data FROM accounts WHERE id = ?", (id,)).fetchone()
+        return loads(row[0]) if row else None
+
+    def all(self):
+        rows = self._db.connection().execute("SELECT data FROM accounts ORDER BY seq").fetchall()
+        return [loads(row[0]) for row in rows]
+
+    def upsert(self, item):
+        with self._db.transaction() as conn:
+            conn.execute(
+                "INSERT INTO accounts (id, data) VALUES (?, ?) ON CONFLICT(id) DO UPDATE SET data = excluded.data",
+                (item['id'], _dumps(item))
+            )
+        return dict(item)
+
+    def update(self, id, **fields):
+        with self._db.transaction() as conn:
+            row = conn.execute("SELECT data FROM accounts WHERE id = ?", (id,)).fetchone()
+            if row is None:
+                return None
+            item = loads(row[0])
+            item.update(fields)
+            conn.execute("UPDATE accounts SET data = ? WHERE id = ?", (_dumps(item), id))
+        return item
+
+    def delete(self, id):
+        with self._db.transaction() as conn:
+            row = conn.execute("SELECT data FROM accounts WHERE id = ?", (id,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("DELETE FROM accounts WHERE id = ?", (id,))
+        return loads(row[0])
+
+    def status(self, id, refresh=True):
+        item = self.get(id)
+        if item is None:
+            return None
+        return bool(item.get('active', False)), item.get('count', 0), item.get('limit', 0)
+
+    def status_many(self, ids, refresh=True):
+        result = {}
+        for item in _chon_theo_id(self._db.connection(), "SELECT data FROM accounts WHERE id IN ({})", ids):
+            item = loads(item[0])
+            result[item['id']] = (bool(item.get('active', False)), item.get('count', 0), item.get('limit', 0))
+        return result
+
+    def batch(self):
+        # Cùng database với pending_requests: Storage.batch() chỉ mở một transaction
+        return self._db.transaction()
+
+    def generation(self):
+        # seq của bảng accounts là AUTOINCREMENT: tăng ở mỗi lần thêm tài khoản, kể cả từ process khác
+        row = self._db.connection().execute(
+            "SELECT seq FROM sqlite_sequence WHERE name = 'accounts'"
+        ).fetchone()
+        return row[0] if row else 0
+
+
+class SqlitePendingRequestRepository(PendingRequestRepository):
+    """
+    Pending request lưu trong bảng pending_requests (index theo account_id + status)
+
+    Request pending quá PENDING_TTL giây được coi là đã hủy khi đọc tới (get, count_pending, không ghi);
+    trạng thái cancelled được ghi xuống khi gọi expire() (thread nén lưu trữ)
+    """
+
+    def __init__(self, db, ttl=None):
+        self._db = db
+        self.ttl = doc_pending_ttl() if ttl is None else float(ttl)
+
+    def _qua_han(self, item):
+        return bool(self.ttl) and thoi_diem_tao(item, time.time()) <= time.time() - self.ttl
+
+    def _huy(self, items):
+        """
+        Tự hủy các request quá hạn
+
+        Args:
+            items: Danh sách (request_id, item) đang pending đã quá hạn
+        """
+        with self._db.transaction() as conn:
+            for request_id, item in items:
+                danh_dau_het_han(item)
+                # Chỉ hủy nếu request vẫn còn pending (có thể vừa được verify ở thread/process khác)
+                conn.execute(
+                    "UPDATE pending_requests SET status = ?, data = ? WHERE request_id = ? AND status = 'pending'",
+                    (item['status'], _dumps(item), request_id)
+                )
+
+    def get(self, request_id):
+        row = self._db.connection().execute(
+            "SELECT data FROM pending_requests WHERE request_id = ?", (request_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        item = loads(row[0])
+        if item.get('status') == 'pending' and self._qua_han(item):
+            return danh_dau_het_han(item)
+        return item
+
+    def add(self, request_id, data):
+        with self._db.transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO pending_requests (request_id, account_id, status, data) VALUES (?, ?, ?, ?)",
+                (request_id, data.get('id'), data.get('status', 'pending'), _dumps(data))
+            )
+
+    def update(self, request_id, **fields):
+        with self._db.transaction() as conn:
+            row = conn.execute(
+                "SELECT data FROM pending_requests WHERE request_id = ?", (request_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            item = loads(row[0])
+            item.update(fields)
+            conn.execute(
+                "UPDATE pending_requests SET account_id = ?, status = ?, data = ? WHERE request_id = ?",
+                (item.get('id'), item.get('status', 'pending'), _dumps(item), request_id)
+            )
+        return item
+
+    def count_pending(self, account_id):
+        if not self.ttl:
+            row = self._db.connection().execute(
+                "SELECT COUNT(*) FROM pending_requests WHERE account_id = ? AND status = 'pending'", (account_id,)
+            ).fetchone()
+            return row[0]
+
+        rows = self._db.connection().execute(
+            "SELECT request_id, data FROM pending_requests WHERE account_id = ? AND status = 'pending'", (account_id,)
+        ).fetchall()
+        return sum(1 for _, data in rows if not self._qua_han(loads(data)))
+
+    def expire(self):
+        if not self.ttl:
+            return 0
+        rows = self._db.connection().execute(
+            "SELECT request_id, data FROM pending_requests WHERE status = 'pending'"
+        ).fetchall()
+        items = [(request_id, loads(data)) for request_id, data in rows]
+        qua_han = [(request_id, item) for request_id, item in items if self._qua_han(item)]
+        if qua_han:
+            self._huy(qua_han)
+        return len(qua_han)
+
+    def batch(self):
+        return self._db.transaction()
+
+    def all(self):
+        rows = self._db.connection().execute("SELECT request_id, data FROM pending_requests").fetchall()
+        return {request_id: loads(data) for request_id, data in rows}
+
+    def compact(self, before, archive_writer):
+        bytes_truoc = self._db.size()
+        with self._db.transaction() as conn:
+            rows = conn.execute(
+                "SELECT request_id, data FROM pending_requests WHERE status != 'pending'"
+            ).fetchall()
+            bay_gio = time.time()
+            cu = []
+            for request_id, data in rows:
+                item = loads(data)
+                if thoi_diem_ket_thuc(item, bay_gio) < before:
+                    cu.append(dict(item, request_id=request_id))
+            if not cu:
+                return 0, bytes_truoc, bytes_truoc
+            # Ghi phân vùng lưu trữ trước khi xóa (lỗi khi ghi → rollback, không mất dữ liệu)
+            archive_writer(cu)
+            conn.executemany("DELETE FROM pending_requests WHERE request_id = ?", [(item['request_id'],) for item in cu])
+        # Trả lại dung lượng trống cho hệ điều hành (VACUUM ghi qua file -wal nên checkpoint để cắt file -wal)
+        conn = self._db.connection()
+        conn.execute("VACUUM")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return len(cu), bytes_truoc, self._db.size()
+
+
+class SqliteTempCountRepository(TempCountRepository):
+    """Count tạm lưu trong bảng temp_counts"""
+
+    def __init__(self, db):
+        self._db = db
+
+    def get(self, id):
+        row = self._db.connection().execute("SELECT value FROM temp_counts WHERE id = ?", (id,)).fetchone()
+        return row[0] if row else None
+
+    def get_many(self, ids):
+        return dict(_chon_theo_id(self._db.connection(), "SELECT id, value FROM temp_counts WHERE id IN ({})", ids))
+
+    def set(self, id, value):
+        self._db.connection().execute(
+            "INSERT INTO temp_counts (id, value) VALUES (?, ?) ON CONFLICT(id) DO UPDATE SET value = excluded.value",
+            (id, value)
+        )
+
+    def delete(self, id):
+        cursor = self._db.connection().execute("DELETE FROM temp_counts WHERE id = ?", (id,))
+        return cursor.rowcount > 0
+
+    def all(self):
+        return dict(self._db.connection().execute("SELECT id, value FROM temp_counts").fetchall())
+
+    def write_many(self, values, deleted=()):
+        with self._db.transaction() as conn:
+            conn.executemany(
+                "INSERT INTO temp_counts (id, value) VALUES (?, ?) ON CONFLICT(id) DO UPDATE SET value = excluded.value",
+                list(values.items())
+            )
+            conn.executemany("DELETE FROM temp_counts WHERE id = ?", [(id,) for id in deleted])
+
+
+class SqliteSessionRepository(SessionRepository):
+    """Session lưu trong bảng sessions"""
+
+    def __init__(self, db):
+        self._db = db
+
+    def get(self, token):
+        row = self._db.connection().execute("SELECT data FROM sessions WHERE token = ?", (token,)).fetchone()
+        return loads(row[0]) if row else None
+
+    def set(self, token, info):
+        self._db.connection().execute(
+            "INSERT OR REPLACE INTO sessions (token, data) VALUES (?, ?)", (token, _dumps(info))
+        )
+
+    def delete(self, token):
+        return self.delete_many([token]) > 0
+
+    def delete_many(self, tokens):
+        tokens = list(tokens)
+        if not tokens:
+            return 0
+        with self._db.transaction() as conn:
+            deleted = 0
+            for token in tokens:
+                deleted += conn.execute("DELETE FROM sessions WHERE token = ?", (token,)).rowcount
+        return deleted
+
+    def all(self):
+        rows = self._db.connection().execute("SELECT token, data FROM sessions").fetchall()
+        return {token: loads(data) for token, data in rows}
+
+    def replace_all(self, sessions):
+        with self._db.transaction() as conn:
+            conn.execute("DELETE FROM sessions")
+            conn.executemany(
+                "INSERT INTO sessions (token, data) VALUES (?, ?)",
+                [(token, _dumps(info)) for token, info in sessions.items()]
+            )
+
+
+class SqliteOtpRepository(OtpRepository):
+    """OTP lưu trong bảng otps"""
+
+    def __init__(self, db):
+        self._db = db
+
+    def get(self, email):
+        row = self._db.connection().execute("SELECT data FROM otps WHERE email = ?", (email,)).fetchone()
+        return loads(row[0]) if row else None
+
+    def set(self, email, info):
+        self._db.connection().execute(
+            "INSERT OR REPLACE INTO otps (email, data) VALUES (?, ?)", (email, _dumps(info))
+        )
+
+    def delete(self, email):
+        cursor = self._db.connection().execute("DELETE FROM otps WHERE email = ?", (email,))
+        return cursor.rowcount > 0
+
+    def all(self):
+        rows = self._db.connection().execute("SELECT email, data FROM otps").fetchall()
+        return {email: loads(data) for email, data in rows}
+
+
+class SqliteTransactionRepository(TransactionRepository):
+    """Giao dịch webhook đã xử lý lưu trong bảng transactions (index theo ts để dọn giao dịch cũ)"""
+
+    def __init__(self, db, ttl=None, max_size=None):
+        self._db = db
+        config_ttl, config_max = doc_dedup_config()
+        self.ttl = config_ttl if ttl is None else float(ttl)
+        self.max_size = config_max if max_size is None else int(max_size)
+        self._so_lan_them = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        row = self._db.connection().execute("SELECT ts, data FROM transactions WHERE key = ?", (key,)).fetchone()
+        if row is None or (self.ttl and row[0] < time.time() - self.ttl):
+            return None
+        return dict(loads(row[1]), key=key, ts=row[0])
+
+    def add(self, key, info):
+        return bool(self.add_many({key: info}))
+
+    def add_many(self, items):
+        ts = time.time()
+        added = []
+        with self._db.transaction() as conn:
+            for key, info in items.items():
+                if self.ttl:
+                    # Giao dịch cùng key nhưng đã quá hạn được coi như chưa có
+                    conn.execute("DELETE FROM transactions WHERE key = ? AND ts < ?", (key, ts - self.ttl))
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO transactions (key, ts, data) VALUES (?, ?, ?)", (key, ts, _dumps(info))
+                )
+                if cursor.rowcount:
+                    added.append(key)
+        if not added:
+            return added
+        with self._lock:
+            self._so_lan_them += len(added)
+            can_don = self._so_lan_them >= TRANSACTION_PURGE_EVERY
+            if can_don:
+                self._so_lan_them = 0
+        if can_don:
+            self._don_dep()
+        return added
+
+    def discard_many(self, keys):
+        removed = []
+        with self._db.transaction() as conn:
+            for key in keys:
+                if conn.execute("DELETE FROM transactions WHERE key = ?", (key,)).rowcount:
+                    removed.append(key)
+        return removed
+
+    def _don_dep(self):
+        """Xóa giao dịch quá hạn và giao dịch cũ nhất vượt max_size"""
+        with self._db.transaction() as conn:
+            if self.ttl:
+                conn.execute("DELETE FROM transactions WHERE ts < ?", (time.time() - self.ttl,))
+            if self.max_size:
+                conn.execute(
+                    "DELETE FROM transactions WHERE key IN "
+                    "(SELECT key FROM transactions ORDER BY ts DESC LIMIT -1 OFFSET ?)", (self.max_size,)
+                )
+
+    def all(self):
+        rows = self._db.connection().execute("SELECT key, ts, data FROM transactions ORDER BY ts").fetchall()
+        return {key: dict(loads(data), key=key, ts=ts) for key, ts, data in rows}
+
+
+def _nhap_tu_json(db, db_dir):
+    """
+    Nhập dữ liệu từ các file JSON trong db_dir vào database (chỉ chạy một lần, lần đầu dùng SQLite)
+
+    Các file JSON chỉ được đọc, không bị sửa: không dùng các store của backend JSON vì chúng
+    ghi lại file khi nạp (chuyển request đã xong sang pending_archive.jsonl, ...)
+
+    Args:
+        db: SqliteDatabase
+        db_dir: Thư mục chứa các file JSON hiện có
+    """
+    conn = db.connection()
+    if conn.execute("SELECT 1 FROM meta WHERE key = 'imported_json'").fetchone():
+        return
+
+    accounts = doc_tai_khoan(os.path.join(db_dir, 'data.json'))
+    pending_requests = doc_pending_requests(os.path.join(db_dir, 'pending_requests.json'))
+    temp_counts = JsonDictFile(os.path.join(db_dir, 'temp_count.json'), tolerant=True).read()
+    sessions = JsonDictFile(os.path.join(db_dir, 'sessions.json'), tolerant=True).read()
+    otps = JsonDictFile(os.path.join(db_dir, 'otp.txt'), tolerant=True).read()
+    transactions = doc_giao_dich(os.path.join(db_dir, TRANSACTIONS_FILE_NAME))
+
+    with db.transaction() as conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO accounts (id, data) VALUES (?, ?)",
+            [(item['id'], _dumps(item)) for item in accounts]
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO pending_requests (request_id, account_id, status, data) VALUES (?, ?, ?, ?)",
+            [
+                (request_id, item.get('id'), item.get('status', 'pending'), _dumps(item))
+                for request_id, item in pending_requests.items() if isinstance(item, dict)
+            ]
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO temp_counts (id, value) VALUES (?, ?)",
+            [(id, value) for id, value in temp_counts.items() if isinstance(value, int)]
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO sessions (token, data) VALUES (?, ?)",
+            [(token, _dumps(info)) for token, info in sessions.items() if isinstance(info, dict)]
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO otps (email, data) VALUES (?, ?)",
+            [(email, _dumps(info)) for email, info in otps.items() if isinstance(info, dict)]
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO transactions (key, ts, data) VALUES (?, ?, ?)",
+            [
+                (key, record['ts'], _dumps({k: v for k, v in record.items() if k not in ('key', 'ts')}))
+                for key, record in transactions.items()
+            ]
+        )
+        conn.execute("INSERT INTO meta (key, value) VALUES ('imported_json', datetime('now'))")
+
+    print(f"✅ Đã nhập {len(accounts)} tài khoản và {len(pending_requests)} pending request từ JSON vào SQLite")
+
+
+def tao_sqlite_storage(db_dir, sqlite_file):
+    """
+    Tạo Storage dùng SQLite
+
+    Args:
+        db_dir: Thư mục chứa các file JSON (để nhập dữ liệu lần đầu)
+        sqlite_file: Đường dẫn file database SQLite
+
+    Returns:
+        Storage: Storage với backend "sqlite"
+    """
+    db = SqliteDatabase(sqlite_file)
+    _nhap_tu_json(db, db_dir)
+    return Storage(
+        backend="sqlite",
+        accounts=SqliteAccountRepository(db),
+        pending=SqlitePendingRequestRepository(db),
+        temp_counts=SqliteTempCountRepository(db),
+        sessions=SqliteSessionRepository(db),
+        otps=SqliteOtpRepository(db),
+        transactions=SqliteTransactionRepository(db),
+    )
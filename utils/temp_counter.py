@@ -0,0 +1,167 @@
+"""
+Module bảng count tạm (/check) thường trú trong bộ nhớ với ghi trễ (write-behind)
+
+/check là endpoint được gọi nhiều nhất; mỗi lần gọi chỉ cập nhật một số nguyên trong bộ nhớ.
+Một thread nền ghi các count tạm đã thay đổi xuống repository gốc (db/temp_count.json hoặc bảng
+temp_counts) sau mỗi TEMP_COUNT_FLUSH_MS mili giây, hoặc sớm hơn khi đủ TEMP_COUNT_FLUSH_EVERY thay đổi.
+Khi process dừng bình thường, phần còn lại được ghi nốt (atexit); crash chỉ mất các thay đổi
+của lần ghi cuối (count tạm chỉ dùng để hiển thị/ước lượng, count thực tế nằm trong data.json).
+"""
+import atexit
+import threading
+import time
+
+from utils.repository import TempCountRepository
+
+# Các bảng đang chạy ghi trễ (để ghi nốt khi process dừng)
+_tables = []
+
+
+class TempCounterTable(TempCountRepository):
+    """
+    Count tạm trong bộ nhớ, ghi trễ xuống repository gốc
+
+    Args:
+        backing: TempCountRepository gốc (JSON hoặc SQLite), cần có write_many
+        flush_ms: Chu kỳ ghi (mili giây)
+        flush_every: Ghi ngay khi số thay đổi chưa ghi đạt ngưỡng này (0 là chỉ ghi theo chu kỳ)
+    """
+
+    def __init__(self, backing, flush_ms=500, flush_every=1000):
+        self._backing = backing
+        self._interval = max(float(flush_ms), 1.0) / 1000.0
+        self._flush_every = int(flush_every or 0)
+        self._lock = threading.Lock()
+        # Chỉ một lần ghi tại một thời điểm, để lần ghi sau không bị lần ghi trước đè mất
+        self._flush_lock = threading.Lock()
+        self._values = None
+        self._dirty = set()
+        self._so_thay_doi = 0
+        self._event = threading.Event()
+        self._thread = None
+        # Số liệu cho /stats
+        self.flushes = 0
+        self.flushed_keys = 0
+        self.last_flush_ms = 0.0
+
+    def _dam_bao_da_nap(self):
+        """Nạp toàn bộ count tạm từ repository gốc ở lần dùng đầu tiên (gọi khi đang giữ _lock)"""
+        if self._values is None:
+            self._values = dict(self._backing.all())
+
+    def _danh_dau(self, id):
+        """Đánh dấu id cần ghi, khởi động thread ghi nền nếu chưa chạy (gọi khi đang giữ _lock)"""
+        self._dirty.add(id)
+        self._so_thay_doi += 1
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._chay, name="temp-count-flusher", daemon=True)
+            self._thread.start()
+            _tables.append(self)
+        if self._flush_every and self._so_thay_doi >= self._flush_every:
+            self._event.set()
+
+    def get(self, id):
+        with self._lock:
+            self._dam_bao_da_nap()
+            return self._values.get(id)
+
+    def get_many(self, ids):
+        with self._lock:
+            self._dam_bao_da_nap()
+            return {id: self._values[id] for id in ids if id in self._values}
+
+    def set(self, id, value):
+        with self._lock:
+            self._dam_bao_da_nap()
+            self._values[id] = value
+            self._danh_dau(id)
+
+    def delete(self, id):
+        with self._lock:
+            self._dam_bao_da_nap()
+            if id not in self._values:
+                return False
+            del self._values[id]
+            self._danh_dau(id)
+            return True
+
+    def all(self):
+        with self._lock:
+            self._dam_bao_da_nap()
+            return dict(self._values)
+
+    def write_many(self, values, deleted=()):
+        with self._lock:
+            self._dam_bao_da_nap()
+            for id, value in values.items():
+                self._values[id] = value
+                self._danh_dau(id)
+            for id in deleted:
+                if self._values.pop(id, None) is not None:
+                    self._danh_dau(id)
+
+    def flush(self):
+        """
+        Ghi các count tạm đã thay đổi xuống repository gốc (một lần ghi cho tất cả)
+
+        Returns:
+            int: Số id đã ghi
+        """
+        with self._flush_lock:
+            with self._lock:
+                if not self._dirty:
+                    return 0
+                ids = self._dirty
+                self._dirty = set()
+                self._so_thay_doi = 0
+                values = {id: self._values[id] for id in ids if id in self._values}
+                deleted = [id for id in ids if id not in self._values]
+
+            bat_dau = time.perf_counter()
+            try:
+                self._backing.write_many(values, deleted)
+            except Exception:
+                # Ghi lỗi → giữ lại để lần sau ghi tiếp
+                with self._lock:
+                    self._dirty |= ids
+                raise
+            self.flushes += 1
+            self.flushed_keys += len(ids)
+            self.last_flush_ms = round((time.perf_counter() - bat_dau) * 1000, 3)
+            return len(ids)
+
+    def _chay(self):
+        """Vòng lặp của thread ghi nền"""
+        while True:
+            self._event.wait(self._interval)
+            self._event.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"⚠️ Lỗi khi ghi count tạm: {e}")
+
+    def stats(self):
+        """
+        Returns:
+            dict: Số liệu ghi trễ (dirty, flushes, flushed_keys, last_flush_ms)
+        """
+        with self._lock:
+            dirty = len(self._dirty)
+        return {
+            "dirty": dirty,
+            "flushes": self.flushes,
+            "flushed_keys": self.flushed_keys,
+            "last_flush_ms": self.last_flush_ms,
+        }
+
+
+def flush_all():
+    """Ghi nốt count tạm của mọi bảng (đăng ký với atexit)"""
+    for table in list(_tables):
+        try:
+            table.flush()
+        except Exception as e:
+            print(f"⚠️ Lỗi khi ghi count tạm lúc dừng: {e}")
+
+
+atexit.register(flush_all)
@@ -0,0 +1,219 @@
+"""
+Module chỉ mục giao dịch webhook đã xử lý (db/transactions.jsonl) để chống xử lý lặp
+
+SePay gửi lại webhook khi không nhận được phản hồi kịp; mỗi giao dịch đã xử lý thành công được
+ghi nhận theo mã giao dịch (id của SePay, hoặc referenceCode nếu không có id) để các lần gửi lại
+được trả lời ngay mà không đọc/ghi data.json lần nữa.
+
+- Nạp file một lần vào dict trong bộ nhớ (tra cứu O(1)), mỗi giao dịch mới chỉ ghi nối một dòng (fsync)
+- Giao dịch quá WEBHOOK_DEDUP_TTL giây bị bỏ; giữ tối đa WEBHOOK_DEDUP_MAX giao dịch (bỏ cũ nhất)
+- File được ghi lại gọn (atomic) khi số dòng vượt quá hai lần số giao dịch còn giữ
+"""
+import os
+import time
+
+from utils.db_config import doc_db_config
+from utils.db_lock import resource_lock
+from utils.json_codec import dumps
+from utils.json_file import ghi_bytes_atomic
+from utils.repository import TransactionRepository
+from utils.wal import WriteAheadLog
+
+# Tên file chỉ mục (nằm trong thư mục dữ liệu db/)
+TRANSACTIONS_FILE_NAME = 'transactions.jsonl'
+
+
+def doc_dedup_config():
+    """
+    Đọc cấu hình chỉ mục giao dịch từ config/db.json
+
+    Returns:
+        tuple: (ttl: float, max_size: int) - ttl 0 là không hết hạn, max_size 0 là không giới hạn
+    """
+    config = doc_db_config()
+    try:
+        ttl = max(float(config.get("WEBHOOK_DEDUP_TTL") or 0), 0.0)
+    except (TypeError, ValueError):
+        ttl = 0.0
+    try:
+        max_size = max(int(config.get("WEBHOOK_DEDUP_MAX") or 0), 0)
+    except (TypeError, ValueError):
+        max_size = 0
+    return ttl, max_size
+
+
+def _ap_dung_ban_ghi(items, records):
+    """Áp dụng các dòng của transactions.jsonl lên items {key: bản ghi} (giữ thứ tự thêm vào)"""
+    for record in records:
+        if isinstance(record, dict) and record.get('key') is not None:
+            items.pop(record['key'], None)
+            if not record.get('del'):
+                items[record['key']] = record
+
+
+def doc_giao_dich(path):
+    """
+    Đọc các giao dịch trong transactions.jsonl mà không ghi gì (không lấy lock, không bỏ giao dịch quá hạn)
+
+    Args:
+        path: Đường dẫn file transactions.jsonl
+
+    Returns:
+        dict: {key: bản ghi} theo thứ tự thêm vào (cũ nhất trước)
+    """
+    items = {}
+    records, _ = WriteAheadLog(path).read_from(0)
+    _ap_dung_ban_ghi(items, records)
+    return items
+
+
+class TransactionStore(TransactionRepository):
+    """
+    Chỉ mục giao dịch đã xử lý trong bộ nhớ, lưu dạng file chỉ ghi nối
+
+    Mỗi dòng: {"key": <mã giao dịch>, "ts": <epoch lúc xử lý>, ...thông tin kết quả}
+    hoặc {"key": <mã giao dịch>, "del": true, "ts": ...} khi bỏ ghi nhận (discard_many)
+
+    Args:
+        path: Đường dẫn file transactions.jsonl
+        ttl: Số giây giữ một giao dịch (mặc định WEBHOOK_DEDUP_TTL)
+        max_size: Số giao dịch tối đa (mặc định WEBHOOK_DEDUP_MAX)
+    """
+
+    def __init__(self, path, ttl=None, max_size=None):
+        self.path = os.path.abspath(path)
+        config_ttl, config_max = doc_dedup_config()
+        self.ttl = config_ttl if ttl is None else float(ttl)
+        self.max_size = config_max if max_size is None else int(max_size)
+        self._lock = resource_lock(self.path)
+        self._log = WriteAheadLog(self.path)
+        # key → bản ghi, theo thứ tự thêm vào (cũ nhất trước)
+        self._items = {}
+        self._offset = 0
+        self._ino = None
+        self._so_dong = 0
+
+    def _dam_bao_moi_nhat(self):
+        """Đọc phần mới ghi thêm của file (kể cả do process khác ghi), nạp lại nếu file bị thay thế"""
+        try:
+            st = os.stat(self.path)
+            ino, size = st.st_ino, st.st_size
+        except FileNotFoundError:
+            ino, size = None, 0
+
+        if ino != self._ino or size < self._offset:
+            # File bị ghi lại gọn (ở process khác) hoặc bị xóa → nạp lại từ đầu
+            self._log.close()
+            self._items = {}
+            self._offset = 0
+            self._so_dong = 0
+            self._ino = ino
+
+        if size > self._offset:
+            records, self._offset = self._log.read_from(self._offset)
+            _ap_dung_ban_ghi(self._items, records)
+            self._so_dong += len(records)
+
+        self._bo_cu()
+
+    def _bo_cu(self):
+        """Bỏ các giao dịch quá hạn và phần vượt max_size (chỉ xét từ giao dịch cũ nhất nên thường là O(1))"""
+        han = time.time() - self.ttl if self.ttl else None
+        while self._items:
+            key = next(iter(self._items))
+            qua_han = han is not None and self._items[key].get('ts', 0) < han
+            qua_nhieu = self.max_size and len(self._items) > self.max_size
+            if not (qua_han or qua_nhieu):
+                break
+            del self._items[key]
+
+    def _ghi_lai(self):
+        """Ghi lại file chỉ gồm các giao dịch còn giữ (atomic)"""
+        content = b''.join(dumps(record) + b'\n' for record in self._items.values())
+        ghi_bytes_atomic(self.path, content)
+        self._log.close()
+        st = os.stat(self.path)
+        self._ino, self._offset = st.st_ino, st.st_size
+        self._so_dong = len(self._items)
+
+    def get(self, key):
+        """
+        Lấy thông tin giao dịch đã xử lý
+
+        Args:
+            key (str): Mã giao dịch
+
+        Returns:
+            dict: Bản sao bản ghi (còn hạn), None nếu chưa xử lý
+        """
+        with self._lock:
+            self._dam_bao_moi_nhat()
+            record = self._items.get(key)
+            return dict(record) if record is not None else None
+
+    def add(self, key, info):
+        """
+        Ghi nhận giao dịch đã xử lý (ghi nối một dòng)
+
+        Args:
+            key (str): Mã giao dịch
+            info (dict): Thông tin kết quả xử lý
+
+        Returns:
+            bool: True nếu ghi nhận mới, False nếu key đã có (không ghi đè)
+        """
+        return bool(self.add_many({key: info}))
+
+    def add_many(self, items):
+        """
+        Ghi nhận nhiều giao dịch đã xử lý (một lần ghi nối, một lần fsync)
+
+        Args:
+            items (dict): {mã giao dịch: thông tin kết quả xử lý}
+
+        Returns:
+            list: Các key được ghi nhận mới (key đã có thì bỏ qua, không ghi đè)
+        """
+        with self._lock:
+            self._dam_bao_moi_nhat()
+            ts = time.time()
+            records = [dict(info, key=key, ts=ts) for key, info in items.items() if key not in self._items]
+            if not records:
+                return []
+            self._offset = self._log.append(records)
+            if self._ino is None:
+                self._ino = os.stat(self.path).st_ino
+            for record in records:
+                self._items[record['key']] = record
+            self._so_dong += len(records)
+            self._bo_cu()
+            if self._so_dong > 2 * len(self._items) + 1000:
+                self._ghi_lai()
+            return [record['key'] for record in records]
+
+    def discard_many(self, keys):
+        """
+        Bỏ ghi nhận các giao dịch (ghi nối một dòng "del" cho mỗi key)
+
+        Args:
+            keys: Các mã giao dịch
+
+        Returns:
+            list: Các key đã bỏ (key không có thì bỏ qua)
+        """
+        with self._lock:
+            self._dam_bao_moi_nhat()
+            ts = time.time()
+            records = [{"key": key, "del": True, "ts": ts} for key in keys if key in self._items]
+            if not records:
+                return []
+            self._offset = self._log.append(records)
+            for record in records:
+                del self._items[record['key']]
+            self._so_dong += len(records)
+            return [record['key'] for record in records]
+
+    def all(self):
+        with self._lock:
+            self._dam_bao_moi_nhat()
+            return {key: dict(record) for key, record in self._items.items()}
@@ -0,0 +1,247 @@
+"""
+Module tạo mã QR chuyển khoản VietQR (chuẩn EMVCo merchant-presented QR của NAPAS) ngay trong process
+
+Payload gồm BIN ngân hàng, số tài khoản, số tiền, nội dung chuyển khoản và CRC16, giống mã QR
+img.vietqr.io trả về, nên /qr không còn phải gọi ra ngoài. Ma trận QR được tạo bằng thư viện qrcode
+(require.txt), ảnh PNG (đen trắng 1 bit) được ghi trực tiếp bằng zlib, không cần Pillow/pypng.
+"""
+import binascii
+import struct
+import zlib
+
+from utils.db_config import doc_db_config
+from utils.lru_cache import ByteLRUCache
+
+try:
+    import qrcode
+    from qrcode.constants import ERROR_CORRECT_M
+except ImportError:
+    qrcode = None
+
+# BIN (mã định danh ngân hàng NAPAS) theo mã/tên viết tắt ngân hàng, key viết hoa, không dấu cách
+BANK_BINS = {
+    "VCB": "970436", "VIETCOMBANK": "970436",
+    "MB": "970422", "MBBANK": "970422",
+    "TCB": "970407", "TECHCOMBANK": "970407",
+    "ACB": "970416",
+    "BIDV": "970418",
+    "ICB": "970415", "CTG": "970415", "VIETINBANK": "970415",
+    "VBA": "970405", "AGRIBANK": "970405",
+    "TPB": "970423", "TPBANK": "970423",
+    "VPB": "970432", "VPBANK": "970432",
+    "STB": "970403", "SACOMBANK": "970403",
+    "SHB": "970443",
+    "HDB": "970437", "HDBANK": "970437",
+    "VIB": "970441",
+    "MSB": "970426",
+    "SEAB": "970440", "SEABANK": "970440",
+    "OCB": "970448",
+    "EIB": "970431", "EXIMBANK": "970431",
+    "LPB": "970449", "LPBANK": "970449", "LIENVIETPOSTBANK": "970449",
+    "SCB": "970429",
+    "NAB": "970428", "NAMABANK": "970428",
+    "ABB": "970425", "ABBANK": "970425",
+    "BAB": "970409", "BACABANK": "970409",
+    "VAB": "970427", "VIETABANK": "970427",
+    "PVCB": "970412", "PVCOMBANK": "970412",
+    "SGICB": "970400", "SAIGONBANK": "970400",
+    "KLB": "970452", "KIENLONGBANK": "970452",
+    "NCB": "970419",
+    "VIETBANK": "970433",
+    "BVB": "970438", "BAOVIETBANK": "970438",
+    "PGB": "970430", "PGBANK": "970430",
+    "GPB": "970408", "GPBANK": "970408",
+    "VRB": "970421",
+    "SHBVN": "970424", "SHINHANBANK": "970424",
+    "WVN": "970457", "WOORIBANK": "970457",
+    "CAKE": "546034",
+    "UBANK": "546035",
+    "TIMO": "963388",
+}
+
+# Mã định danh VietQR (GUID của NAPAS) và mã dịch vụ chuyển nhanh đến tài khoản
+NAPAS_GUID = "A000000727"
+SERVICE_TO_ACCOUNT = "QRIBFTTA"
+# Mã tiền tệ VND (ISO 4217) và mã quốc gia
+CURRENCY_VND = "704"
+COUNTRY_VN = "VN"
+
+# Chữ ký file PNG
+_PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+_config = doc_db_config()
+# Cache phần đầu payload theo (BIN, số tài khoản, số tiền) và cache ảnh PNG theo payload
+_prefix_cache = ByteLRUCache(_config.get("QR_PREFIX_CACHE_BYTES"))
+_image_cache = ByteLRUCache(_config.get("QR_IMAGE_CACHE_BYTES"))
+
+
+def tim_bin(bank_code):
+    """
+    Tìm BIN của ngân hàng
+
+    Args:
+        bank_code: Mã/tên viết tắt ngân hàng trong config (BNK, ví dụ "Mbbank", "VCB") hoặc BIN 6 số
+
+    Returns:
+        str: BIN 6 số, None nếu không biết ngân hàng
+    """
+    key = str(bank_code or "").replace(" ", "").upper()
+    if len(key) == 6 and key.isdigit():
+        return key
+    return BANK_BINS.get(key)
+
+
+def _tlv(tag, value):
+    """Ghép một trường EMVCo: tag 2 số + độ dài 2 số + giá trị"""
+    if len(value) > 99:
+        raise ValueError(f"Trường {tag} dài quá 99 ký tự: {len(value)}")
+    return f"{tag}{len(value):02d}{value}"
+
+
+def crc16(data):
+    """
+    CRC16-CCITT (đa thức 0x1021, giá trị đầu 0xFFFF) theo chuẩn EMVCo
+
+    Args:
+        data: Chuỗi payload (đã gồm "6304" ở cuối)
+
+    Returns:
+        str: 4 ký tự hex viết hoa
+    """
+    return f"{binascii.crc_hqx(data.encode('utf-8'), 0xFFFF):04X}"
+
+
+def _dau_payload(bin, account_no, amount):
+    """
+    Phần đầu payload (từ trường 00 đến 58) và CRC16 của nó, cache theo (BIN, số tài khoản, số tiền)
+
+    Returns:
+        tuple: (prefix, crc) - crc dùng làm giá trị đầu để tính CRC phần còn lại
+    """
+    key = (bin, account_no, amount)
+    cached = _prefix_cache.get(key)
+    if cached is None:
+        merchant_account = (
+            _tlv("00", NAPAS_GUID)
+            + _tlv("01", _tlv("00", bin) + _tlv("01", account_no))
+            + _tlv("02", SERVICE_TO_ACCOUNT)
+        )
+        parts = [
+            _tlv("00", "01"),
+            # 12: QR động (có số tiền), 11: QR tĩnh
+            _tlv("01", "12" if amount else "11"),
+            _tlv("38", merchant_account),
+            _tlv("53", CURRENCY_VND),
+        ]
+        if amount:
+            parts.append(_tlv("54", str(amount)))
+        parts.append(_tlv("58", COUNTRY_VN))
+        prefix = ''.join(parts)
+        cached = (prefix, binascii.crc_hqx(prefix.encode('utf-8'), 0xFFFF))
+        _prefix_cache.put(key, cached, size=len(prefix))
+    return cached
+
+
+def tao_payload(bin, account_no, amount=None, add_info=None):
+    """
+    Tạo payload VietQR chuyển khoản đến tài khoản
+
+    Phần đầu payload (tài khoản, số tiền) và CRC của nó được cache, mỗi lần chỉ ghép và tính CRC
+    phần nội dung chuyển khoản
+
+    Args:
+        bin: BIN 6 số của ngân hàng nhận
+        account_no: Số tài khoản nhận
+        amount: Số tiền VND (None hoặc 0 là để người chuyển tự nhập, QR tĩnh)
+        add_info: Nội dung chuyển khoản
+
+    Returns:
+        str: Payload EMVCo (đã có CRC)
+
+    Raises:
+        ValueError: Trường nào đó dài quá giới hạn của chuẩn
+    """
+    prefix, crc = _dau_payload(str(bin), str(account_no), int(amount) if amount else 0)
+    suffix = (_tlv("62", _tlv("08", str(add_info))) if add_info else "") + "6304"
+    return f"{prefix}{suffix}{binascii.crc_hqx(suffix.encode('utf-8'), crc):04X}"
+
+
+def _png_chunk(kind, data):
+    """Ghép một chunk PNG (độ dài, loại, dữ liệu, CRC32)"""
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+
+def ve_png(matrix, box_size=10):
+    """
+    Ghi ma trận QR thành ảnh PNG đen trắng 1 bit
+
+    Args:
+        matrix: Danh sách hàng, mỗi hàng là danh sách bool (True là ô đen), đã gồm viền trắng
+        box_size: Số pixel mỗi ô
+
+    Returns:
+        bytes: Nội dung file PNG
+    """
+    box_size = max(int(box_size), 1)
+    size = len(matrix) * box_size
+    pad = -size % 8
+    rows = []
+    for row in matrix:
+        # Bit 1 là pixel trắng; mỗi hàng ô được lặp lại box_size hàng pixel
+        bits = ''.join(('0' if cell else '1') * box_size for cell in row) + '1' * pad
+        line = b'\x00' + int(bits, 2).to_bytes((size + pad) // 8, 'big')
+        rows.append(line * box_size)
+    ihdr = struct.pack('>IIBBBBB', size, size, 1, 0, 0, 0, 0)
+    return (
+        _PNG_SIGNATURE
+        + _png_chunk(b'IHDR', ihdr)
+        + _png_chunk(b'IDAT', zlib.compress(b''.join(rows), 6))
+        + _png_chunk(b'IEND', b'')
+    )
+
+
+def tao_qr_png(bank_code, account_no, amount=None, add_info=None, box_size=10, border=4, cache=False):
+    """
+    Tạo ảnh PNG mã QR VietQR ngay trong process
+
+    Args:
+        bank_code: Mã ngân hàng (BNK) hoặc BIN
+        account_no: Số tài khoản nhận (STK)
+        amount: Số tiền VND
+        add_info: Nội dung chuyển khoản
+        box_size: Số pixel mỗi ô
+        border: Số ô viền trắng
+        cache: Lưu/lấy ảnh trong cache ảnh (cho các request cố định, ví dụ cùng id/token; /qr có id
+               ngẫu nhiên nên không dùng)
+
+    Returns:
+        tuple: (success, png_bytes, error_message)
+    """
+    if qrcode is None:
+        return False, None, "Chưa cài thư viện qrcode"
+    bin = tim_bin(bank_code)
+    if bin is None:
+        return False, None, f"Không biết BIN của ngân hàng: {bank_code}"
+    try:
+        payload = tao_payload(bin, account_no, amount, add_info)
+        if cache:
+            png = _image_cache.get((payload, box_size, border))
+            if png is not None:
+                return True, png, None
+        qr = qrcode.QRCode(error_correction=ERROR_CORRECT_M, border=border)
+        qr.add_data(payload)
+        qr.make(fit=True)
+        png = ve_png(qr.get_matrix(), box_size)
+        if cache:
+            _image_cache.put((payload, box_size, border), png)
+        return True, png, None
+    except Exception as e:
+        return False, None, f"Lỗi khi tạo QR code: {e}"
+
+
+def qr_cache_stats():
+    """
+    Returns:
+        dict: Số liệu cache phần đầu payload (prefix) và cache ảnh (image)
+    """
+    return {"prefix": _prefix_cache.stats(), "image": _image_cache.stats()}
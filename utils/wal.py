@@ -0,0 +1,147 @@
+"""
+Module write-ahead log (WAL) dạng append-only
+Mỗi thay đổi được ghi thành một dòng JSON gọn, flush + fsync trước khi coi là đã lưu
+"""
+import os
+import threading
+
+from utils.json_codec import dumps, loads
+
+
+class WriteAheadLog:
+    """
+    File log chỉ ghi nối thêm (mỗi dòng là một bản ghi JSON)
+
+    - append(): ghi nối các bản ghi rồi fsync, chi phí chỉ phụ thuộc kích thước bản ghi
+    - read_from(): đọc lại các bản ghi từ một offset, bỏ qua dòng cuối bị ghi dở (crash giữa chừng)
+    - truncate(): xóa sạch log sau khi đã checkpoint vào snapshot
+    """
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        self._lock = threading.Lock()
+        self._file = None
+
+    def _mo_file(self):
+        if self._file is None or self._file.closed:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._file = open(self.path, 'ab')
+        return self._file
+
+    def size(self):
+        """
+        Returns:
+            int: Kích thước hiện tại của file log (byte), 0 nếu chưa có file
+        """
+        try:
+            return os.stat(self.path).st_size
+        except FileNotFoundError:
+            return 0
+
+    def append(self, records):
+        """
+        Ghi nối các bản ghi vào cuối log và fsync
+
+        Args:
+            records: Danh sách dict cần ghi (mỗi dict một dòng)
+
+        Returns:
+            int: Kích thước file log sau khi ghi
+        """
+        data = b''.join(dumps(record) + b'\n' for record in records)
+        with self._lock:
+            f = self._mo_file()
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+            return f.tell()
+
+    def read_from(self, offset=0):
+        """
+        Đọc các bản ghi từ offset đến cuối log
+
+        Args:
+            offset: Vị trí bắt đầu đọc (byte)
+
+        Returns:
+            tuple: (records: list, end_offset: int)
+                - records: Các bản ghi đọc được
+                - end_offset: Vị trí ngay sau bản ghi hợp lệ cuối cùng
+                  (dòng cuối bị ghi dở hoặc hỏng sẽ không được tính)
+        """
+        entries, end_offset = self.read_entries_from(offset)
+        return [record for _, record in entries], end_offset
+
+    def read_entries_from(self, offset=0, limit=None):
+        """
+        Giống read_from nhưng trả về kèm vị trí bắt đầu của từng bản ghi (để đọc lại một bản ghi bằng read_at)
+
+        Args:
+            offset: Vị trí bắt đầu đọc (byte)
+            limit: Số bản ghi tối đa cần đọc (None là đọc đến cuối log)
+
+        Returns:
+            tuple: (entries: list[(offset, record)], end_offset: int)
+        """
+        entries = []
+        end_offset = offset
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(offset)
+                for line in f:
+                    if limit is not None and len(entries) >= limit:
+                        break
+                    if not line.endswith(b'\n'):
+                        break
+                    try:
+                        entries.append((end_offset, loads(line)))
+                    except ValueError:
+                        break
+                    end_offset += len(line)
+        except FileNotFoundError:
+            pass
+        return entries, end_offset
+
+    def read_at(self, offset):
+        """
+        Đọc một bản ghi bắt đầu tại offset
+
+        Args:
+            offset: Vị trí bắt đầu của bản ghi (lấy từ read_entries_from)
+
+        Returns:
+            dict: Bản ghi, None nếu không đọc được
+        """
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(offset)
+                line = f.readline()
+        except FileNotFoundError:
+            return None
+        if not line.endswith(b'\n'):
+            return None
+        try:
+            return loads(line)
+        except ValueError:
+            return None
+
+    def truncate(self, size=0):
+        """
+        Cắt file log về kích thước size (mặc định xóa sạch sau checkpoint)
+
+        Args:
+            size: Kích thước giữ lại (byte)
+        """
+        with self._lock:
+            if self._file is not None and not self._file.closed:
+                self._file.flush()
+            try:
+                os.truncate(self.path, size)
+            except FileNotFoundError:
+                pass
+
+    def close(self):
+        """Đóng file log đang mở"""
+        with self._lock:
+            if self._file is not None and not self._file.closed:
+                self._file.close()
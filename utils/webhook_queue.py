@@ -0,0 +1,261 @@
+"""
+Module hàng đợi webhook SePay (db/webhook_queue.jsonl) cho chế độ WEBHOOK_MODE = "queue"
+
+/authentication chỉ kiểm tra request, ghi nối payload vào hàng đợi (fsync) rồi trả lời SePay ngay,
+nên thời gian phản hồi không phụ thuộc kích thước data.json. Một thread nền lấy payload theo lô
+(tối đa WEBHOOK_BATCH_MAX) và xử lý cả lô với một lần ghi tài khoản, nên webhook tới dồn dập được gộp lại.
+
+- Vị trí đã xử lý lưu trong db/webhook_queue.offset (ghi atomic sau mỗi lô); xử lý hết thì file hàng đợi được cắt về rỗng
+- Lô lỗi (không ghi được xuống đĩa) được giữ nguyên và thử lại sau WEBHOOK_QUEUE_POLL giây
+- Process dừng giữa chừng thì lần khởi động sau xử lý tiếp từ vị trí đã lưu; giao dịch đã ghi nhận
+  trong transactions.jsonl được bỏ qua nên xử lý lại không reset tài khoản
+
+Khi WEBHOOK_LOG = true, mọi webhook hợp lệ nhận được (ở cả hai chế độ) còn được ghi nối vào
+db/webhook_log.jsonl (không bao giờ bị cắt) để replay lại bằng tools/replay_webhooks.py.
+"""
+import os
+import threading
+import time
+
+from utils.db_config import doc_db_config
+from utils.db_lock import resource_lock
+from utils.json_file import ghi_bytes_atomic
+from utils.storage import DEFAULT_DB_DIR
+from utils.wal import WriteAheadLog
+
+# Tên file hàng đợi và file log webhook (nằm trong thư mục dữ liệu db/)
+WEBHOOK_QUEUE_FILE_NAME = 'webhook_queue.jsonl'
+WEBHOOK_LOG_FILE_NAME = 'webhook_log.jsonl'
+
+# Các hàng đợi / file log đã tạo, key là đường dẫn tuyệt đối của thư mục dữ liệu
+_queues = {}
+_logs = {}
+_queues_lock = threading.Lock()
+
+
+def doc_webhook_mode():
+    """
+    Đọc chế độ xử lý webhook từ config/db.json
+
+    Returns:
+        str: "sync" (xử lý ngay trong request) hoặc "queue" (ghi vào hàng đợi, xử lý nền)
+    """
+    mode = str(doc_db_config().get("WEBHOOK_MODE") or "sync").lower()
+    if mode not in ("sync", "queue"):
+        print(f"⚠️ WEBHOOK_MODE không hợp lệ: {mode}, dùng \"sync\"")
+        return "sync"
+    return mode
+
+
+class WebhookQueue:
+    """
+    Hàng đợi payload webhook lưu dạng file chỉ ghi nối, có một thread nền xử lý theo lô
+
+    Mỗi dòng: {"ts": <epoch lúc nhận>, "payload": <JSON body SePay>}
+
+    Args:
+        path: Đường dẫn file webhook_queue.jsonl
+        batch_max: Số payload tối đa trong một lô (mặc định WEBHOOK_BATCH_MAX)
+        poll: Số giây giữa hai lần kiểm tra hàng đợi khi không được đánh thức (mặc định WEBHOOK_QUEUE_POLL)
+    """
+
+    def __init__(self, path, batch_max=None, poll=None):
+        config = doc_db_config()
+        self.path = os.path.abspath(path)
+        self.offset_path = os.path.splitext(self.path)[0] + '.offset'
+        self.batch_max = max(int(config.get("WEBHOOK_BATCH_MAX") if batch_max is None else batch_max) or 1, 1)
+        self.poll = max(float(config.get("WEBHOOK_QUEUE_POLL") if poll is None else poll) or 1.0, 0.01)
+        self._log = WriteAheadLog(self.path)
+        # Lock ghi nối / cắt file hàng đợi
+        self._lock = resource_lock(self.path)
+        # Chỉ một worker (kể cả ở process khác) lấy và xử lý lô tại một thời điểm
+        self._worker_lock = resource_lock(self.offset_path)
+        self._stats_lock = threading.Lock()
+        self._event = threading.Event()
+        self._thread = None
+        self._handler = None
+        # Số liệu cho /stats
+        self.enqueued = 0
+        self.processed = 0
+        self.failed = 0
+        self.batches = 0
+        self.batch_errors = 0
+        self.last_batch_size = 0
+        self.max_batch_size = 0
+        self.last_batch_ms = 0.0
+
+    def put(self, payload):
+        """
+        Ghi nối payload vào hàng đợi (fsync trước khi trả về) và đánh thức thread xử lý
+
+        Args:
+            payload: JSON body SePay
+        """
+        with self._lock:
+            self._log.append([{"ts": time.time(), "payload": payload}])
+        with self._stats_lock:
+            self.enqueued += 1
+        self._event.set()
+
+    def _doc_offset(self):
+        """Đọc vị trí đã xử lý, 0 nếu chưa có hoặc không hợp lệ"""
+        try:
+            with open(self.offset_path, 'rb') as f:
+                return max(int(f.read().strip() or 0), 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def pending_bytes(self):
+        """
+        Returns:
+            int: Số byte trong hàng đợi chưa được xử lý
+        """
+        return max(self._log.size() - self._doc_offset(), 0)
+
+    def process_once(self, handler):
+        """
+        Lấy một lô từ hàng đợi và xử lý; chỉ lưu vị trí mới sau khi handler chạy xong
+
+        Args:
+            handler: Hàm nhận danh sách payload, trả về danh sách (success, message, data) theo thứ tự;
+                     raise exception thì lô được giữ lại để thử lại
+
+        Returns:
+            int: Số payload đã xử lý (0 nếu hàng đợi rỗng)
+        """
+        with self._worker_lock:
+            offset = self._doc_offset()
+            if offset > self._log.size():
+                # File hàng đợi đã bị cắt nhưng chưa kịp lưu vị trí 0
+                offset = 0
+            entries, end_offset = self._log.read_entries_from(offset, limit=self.batch_max)
+            if not entries:
+                return 0
+
+            payloads = [record.get('payload') for _, record in entries]
+            bat_dau = time.perf_counter()
+            try:
+                ket_qua = handler(payloads)
+            except Exception:
+                with self._stats_lock:
+                    self.batch_errors += 1
+                raise
+
+            so_loi = 0
+            for payload, (success, message, _) in zip(payloads, ket_qua):
+                if not success:
+                    so_loi += 1
+                    ma = payload.get('id') if isinstance(payload, dict) else None
+                    print(f"⚠️ Webhook trong hàng đợi (id={ma}) không xử lý được: {message}")
+
+            with self._lock:
+                if end_offset >= self._log.size():
+                    # Đã xử lý hết: cắt file trước rồi mới lưu vị trí 0
+                    self._log.truncate()
+                    end_offset = 0
+                ghi_bytes_atomic(self.offset_path, str(end_offset).encode())
+
+            with self._stats_lock:
+                self.processed += len(payloads)
+                self.failed += so_loi
+                self.batches += 1
+                self.last_batch_size = len(payloads)
+                self.max_batch_size = max(self.max_batch_size, len(payloads))
+                self.last_batch_ms = round((time.perf_counter() - bat_dau) * 1000, 3)
+            return len(payloads)
+
+    def drain(self, handler):
+        """
+        Xử lý đến khi hàng đợi rỗng
+
+        Returns:
+            int: Tổng số payload đã xử lý
+        """
+        total = 0
+        while True:
+            n = self.process_once(handler)
+            if not n:
+                return total
+            total += n
+
+    def start(self, handler):
+        """
+        Khởi động thread xử lý nền (gọi nhiều lần chỉ chạy một thread); phần còn tồn trong hàng đợi
+        từ lần chạy trước được xử lý ngay
+
+        Args:
+            handler: Hàm xử lý một lô (xem process_once)
+        """
+        with self._stats_lock:
+            if self._thread is None:
+                self._handler = handler
+                self._thread = threading.Thread(target=self._chay, name="webhook-queue", daemon=True)
+                self._thread.start()
+        self._event.set()
+
+    def _chay(self):
+        """Vòng lặp của thread xử lý nền"""
+        while True:
+            self._event.wait(self.poll)
+            self._event.clear()
+            try:
+                self.drain(self._handler)
+            except Exception as e:
+                print(f"⚠️ Lỗi khi xử lý hàng đợi webhook, sẽ thử lại: {e}")
+
+    def stats(self):
+        """
+        Returns:
+            dict: Số liệu hàng đợi (pending_bytes, enqueued, processed, failed, batches, batch_errors,
+                  last_batch_size, max_batch_size, last_batch_ms)
+        """
+        with self._stats_lock:
+            result = {
+                "enqueued": self.enqueued,
+                "processed": self.processed,
+                "failed": self.failed,
+                "batches": self.batches,
+                "batch_errors": self.batch_errors,
+                "last_batch_size": self.last_batch_size,
+                "max_batch_size": self.max_batch_size,
+                "last_batch_ms": self.last_batch_ms,
+            }
+        result["pending_bytes"] = self.pending_bytes()
+        return result
+
+
+def get_webhook_queue(db_dir=None):
+    """
+    Lấy hàng đợi webhook dùng chung cho một thư mục dữ liệu
+
+    Args:
+        db_dir: Thư mục dữ liệu (mặc định là db/ của project)
+
+    Returns:
+        WebhookQueue: Hàng đợi tại <db_dir>/webhook_queue.jsonl
+    """
+    db_dir = os.path.abspath(db_dir) if db_dir else DEFAULT_DB_DIR
+    queue = _queues.get(db_dir)
+    if queue is None:
+        with _queues_lock:
+            queue = _queues.get(db_dir)
+            if queue is None:
+                queue = WebhookQueue(os.path.join(db_dir, WEBHOOK_QUEUE_FILE_NAME))
+                _queues[db_dir] = queue
+    return queue
+
+
+def ghi_log_webhook(payload, db_dir=None):
+    """
+    Ghi nối payload webhook nhận được vào db/webhook_log.jsonl (fsync), dùng để replay/khôi phục dữ liệu
+
+    Args:
+        payload: JSON body SePay
+        db_dir: Thư mục dữ liệu (mặc định là db/ của project)
+    """
+    db_dir = os.path.abspath(db_dir) if db_dir else DEFAULT_DB_DIR
+    log = _logs.get(db_dir)
+    if log is None:
+        with _queues_lock:
+            log = _logs.setdefault(db_dir, WriteAheadLog(os.path.join(db_dir, WEBHOOK_LOG_FILE_NAME)))
+    log.append([{"ts": time.time(), "payload": payload}])